@@ -0,0 +1,33 @@
+"""add HNSW index on facial_embeddings.embedding
+
+Revision ID: a1b2c3d4e5f6
+Revises: n8n_integration_001
+Create Date: 2026-01-12
+
+Backs 1:N kiosk identification (`POST /api/facial/identify`) with pgvector's
+HNSW index for cosine distance, so `ORDER BY embedding <=> :q LIMIT k` no
+longer scans every enrolled embedding.
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a1b2c3d4e5f6"
+down_revision = "n8n_integration_001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY cannot run inside the migration transaction.
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_facial_embeddings_embedding_hnsw "
+            "ON facial_embeddings USING hnsw (embedding vector_cosine_ops) "
+            "WITH (m = 16, ef_construction = 64)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_facial_embeddings_embedding_hnsw")
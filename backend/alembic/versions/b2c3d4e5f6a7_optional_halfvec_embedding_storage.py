@@ -0,0 +1,29 @@
+"""optional halfvec storage for facial_embeddings.embedding
+
+Revision ID: b2c3d4e5f6a7
+Revises: a1b2c3d4e5f6
+Create Date: 2026-01-20
+
+Upgrading changes nothing: the column stays `vector(512)` whatever the
+host's settings, so every database at this revision has the same schema.
+Switching to `halfvec(512)` is an explicit operator step
+(`scripts/convert_embedding_precision.py --to float16`). Downgrading past
+this revision restores `vector(512)` on a converted database.
+"""
+
+from alembic import op
+from app.db.vector import convert_embedding_column
+
+# revision identifiers, used by Alembic.
+revision = "b2c3d4e5f6a7"
+down_revision = "a1b2c3d4e5f6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    pass
+
+
+def downgrade() -> None:
+    convert_embedding_column(op.get_bind(), "float32")
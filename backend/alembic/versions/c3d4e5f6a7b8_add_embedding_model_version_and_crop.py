@@ -0,0 +1,43 @@
+"""add model_version and crop_hash to facial_embeddings
+
+Revision ID: c3d4e5f6a7b8
+Revises: b2c3d4e5f6a7
+Create Date: 2026-01-27
+
+`model_version` tags each embedding with the InsightFace pack that produced
+it, so two recognition models can coexist during a cutover. `crop_hash`
+points at the stored aligned face crop the embedding was computed from.
+Existing rows were all embedded with the baseline model (buffalo_l) and
+have no crop (`scripts/migrate_embedding_model.py --backfill-crops` adds
+them). A deployment that served another pack retags its rows after the
+upgrade (`UPDATE facial_embeddings SET model_version = '<pack>'`).
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c3d4e5f6a7b8"
+down_revision = "b2c3d4e5f6a7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("facial_embeddings", sa.Column("model_version", sa.String(50), nullable=True))
+    op.add_column("facial_embeddings", sa.Column("crop_hash", sa.String(64), nullable=True))
+    op.execute(
+        "UPDATE facial_embeddings SET model_version = 'buffalo_l' WHERE model_version IS NULL"
+    )
+    op.create_index(
+        "ix_embeddings_model_user", "facial_embeddings", ["model_version", "user_id"], unique=False
+    )
+    op.create_index("ix_embeddings_crop_hash", "facial_embeddings", ["crop_hash"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_embeddings_crop_hash", table_name="facial_embeddings")
+    op.drop_index("ix_embeddings_model_user", table_name="facial_embeddings")
+    op.drop_column("facial_embeddings", "crop_hash")
+    op.drop_column("facial_embeddings", "model_version")
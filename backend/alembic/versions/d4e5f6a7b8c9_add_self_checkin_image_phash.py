@@ -0,0 +1,29 @@
+"""add image_phash to self_checkins
+
+Revision ID: d4e5f6a7b8c9
+Revises: c3d4e5f6a7b8
+Create Date: 2026-01-29
+
+64-bit perceptual hash of each check-in photo, stored signed in a BIGINT.
+The API loads them into its replay index on startup
+(`app/services/replay_index.py`). Existing rows have no hash: their photos
+were not kept, so only check-ins from now on are matched.
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d4e5f6a7b8c9"
+down_revision = "c3d4e5f6a7b8"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("self_checkins", sa.Column("image_phash", sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("self_checkins", "image_phash")
@@ -0,0 +1,68 @@
+"""add student_attendance_counters
+
+Revision ID: e5f6a7b8c9d0
+Revises: d4e5f6a7b8c9
+Create Date: 2026-02-03
+
+Per-student attendance totals from which the student statistics are
+derived (`app/services/attendance_counters.py`). Backfilled from
+`attendance_records` here; `scripts/reconcile_attendance_counters.py`
+rebuilds them and the derived student columns at any time.
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e5f6a7b8c9d0"
+down_revision = "d4e5f6a7b8c9"
+branch_labels = None
+depends_on = None
+
+_COUNTERS = (
+    "total_count",
+    "present_count",
+    "late_count",
+    "absent_count",
+    "excused_count",
+    "late_minutes",
+    "absence_hours",
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "student_attendance_counters",
+        sa.Column(
+            "student_id",
+            sa.Integer(),
+            sa.ForeignKey("students.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        *(sa.Column(name, sa.Integer(), nullable=False, server_default="0") for name in _COUNTERS),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=True),
+    )
+    op.execute(
+        """
+        INSERT INTO student_attendance_counters
+            (student_id, total_count, present_count, late_count, absent_count, excused_count,
+             late_minutes, absence_hours)
+        SELECT ar.student_id,
+               COUNT(*),
+               SUM(CASE WHEN ar.status = 'present' THEN 1 ELSE 0 END),
+               SUM(CASE WHEN ar.status = 'late' THEN 1 ELSE 0 END),
+               SUM(CASE WHEN ar.status = 'absent' THEN 1 ELSE 0 END),
+               SUM(CASE WHEN ar.status = 'excused' THEN 1 ELSE 0 END),
+               SUM(CASE WHEN ar.status = 'late' THEN COALESCE(ar.late_minutes, 0) ELSE 0 END),
+               SUM(CASE WHEN ar.status = 'absent' THEN COALESCE(s.duration_minutes, 0) / 60 ELSE 0 END)
+        FROM attendance_records ar
+        JOIN students st ON st.id = ar.student_id
+        LEFT JOIN sessions s ON s.id = ar.session_id
+        GROUP BY ar.student_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("student_attendance_counters")
@@ -8,6 +8,7 @@ from sqlalchemy.orm import Session
 from app.models.student import Student
 from app.models.user import User
 from app.services.auth import get_current_user, get_password_hash
+from app.services.face_reindex import face_reindexer
 from app.services.facial import enroll_user_faces
 from app.utils.deps import get_db
 
@@ -173,6 +174,29 @@ async def list_users(db: Session = Depends(get_db), current_user: User = Depends
     }
 
 
+@router.post("/faces/reindex", status_code=status.HTTP_202_ACCEPTED)
+async def start_face_reindex(
+    force: bool = False,
+    resume: bool = True,
+    current_user: User = Depends(get_current_user),
+):
+    """Re-embed every stored face folder in the background (see `face_reindex`)."""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins")
+    if not face_reindexer.start(force=force, resume=resume):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="A re-index is already running"
+        )
+    return {"queued": True, "progress": face_reindexer.stats()}
+
+
+@router.get("/faces/reindex")
+async def face_reindex_status(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins")
+    return face_reindexer.stats()
+
+
 @router.get("/faces/{user_id}")
 async def list_user_faces(
     user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
@@ -1,6 +1,9 @@
+import base64
 from datetime import datetime
+from typing import Callable
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile, status
+from pydantic import EmailStr
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
@@ -15,10 +18,12 @@ from app.schemas.auth import (
     Token,
 )
 from app.services import auth as auth_service
-from app.services.facial import enroll_user_faces, verify_user_face_by_image
 from app.services.face_engine import warm_up_face_engine
+from app.services.face_reindex import face_reindexer
+from app.services.facial import enroll_user_faces, verify_user_face_by_image
 from app.utils.deps import get_db
 from app.utils.rate_limit import hit
+from app.utils.uploads import check_client_cropped, read_image_upload
 
 router = APIRouter()
 settings = get_settings()
@@ -44,53 +49,62 @@ def login(payload: LoginRequest, db: Session = Depends(get_db)):
     return token
 
 
-@router.post("/login/facial", response_model=Token)
-def login_facial(payload: FacialLoginRequest, request: Request, db: Session = Depends(get_db)):
+def _log_facial_attempt(
+    db: Session, request: Request, *, email: str, user_id: int | None, reason: str
+) -> None:
+    db.execute(
+        text(
+            "INSERT INTO facial_verification_logs (user_id, attempted_email, success, failure_reason, ip_address, user_agent) "
+            "VALUES (:uid, :email, false, :reason, :ip, :ua)"
+        ),
+        {
+            "uid": user_id,
+            "email": email,
+            "reason": reason,
+            "ip": request.client.host if request.client else None,
+            "ua": request.headers.get("user-agent"),
+        },
+    )
+    db.commit()
+
+
+def _decode_base64_image(image_base64: str) -> bytes:
+    b64 = image_base64.split(",", 1)[1] if "," in image_base64 else image_base64
+    return base64.b64decode(b64)
+
+
+def _facial_login(
+    db: Session,
+    request: Request,
+    *,
+    email: str,
+    threshold: float | None,
+    load_image: Callable[[], bytes],
+    client_cropped: bool = False,
+) -> Token:
+    """Shared body of the JSON and multipart facial logins.
+
+    `load_image` is only called once the user is known to have embeddings
+    (base64 decoding is skipped for users who cannot log in anyway).
+    """
+    check_client_cropped(client_cropped)
     ip = request.client.host if request.client else "unknown"
     allowed, count, reset_at = hit(
-        f"rate:facial_login:{payload.email}:{ip}",
+        f"rate:facial_login:{email}:{ip}",
         limit=10,
         window_seconds=300,
     )
     if not allowed:
-        db.execute(
-            text(
-                "INSERT INTO facial_verification_logs (attempted_email, success, failure_reason, ip_address, user_agent) "
-                "VALUES (:email, false, :reason, :ip, :ua)"
-            ),
-            {
-                "email": payload.email,
-                "reason": f"rate_limited:{count}",
-                "ip": ip,
-                "ua": request.headers.get("user-agent"),
-            },
-        )
-        db.commit()
+        _log_facial_attempt(db, request, email=email, user_id=None, reason=f"rate_limited:{count}")
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail=f"Too many attempts. Try again after {datetime.fromtimestamp(reset_at).isoformat()}",
         )
 
-    if not payload.image_base64:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, detail="Face image is required"
-        )
-    user = db.query(User).filter(User.email == payload.email).first()
+    user = db.query(User).filter(User.email == email).first()
     if not user:
         # Log attempt (unknown email)
-        db.execute(
-            text(
-                "INSERT INTO facial_verification_logs (attempted_email, success, failure_reason, ip_address, user_agent) "
-                "VALUES (:email, false, :reason, :ip, :ua)"
-            ),
-            {
-                "email": payload.email,
-                "reason": "user_not_found",
-                "ip": ip,
-                "ua": request.headers.get("user-agent"),
-            },
-        )
-        db.commit()
+        _log_facial_attempt(db, request, email=email, user_id=None, reason="user_not_found")
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
 
     student = db.query(Student).filter(Student.user_id == user.id).first()
@@ -103,89 +117,43 @@ def login_facial(payload: FacialLoginRequest, request: Request, db: Session = De
         ),
         {"uid": user.id, "sid": student_id},
     ).fetchone()
-    if not has_embeddings:
-        # If face images exist on disk (from prior enrollment) but embeddings are missing
-        # (e.g., after DB reset/migration), rebuild embeddings automatically.
-        try:
-            import os
-            from pathlib import Path
-
-            faces_dir = Path(os.getenv("FACE_STORAGE_DIR", "/app/storage/faces")) / str(user.id)
-            if faces_dir.exists():
-                image_paths_and_bytes = []
-                for p in sorted(faces_dir.glob("*.jpg")):
-                    with open(p, "rb") as f:
-                        # Store a stable web path (matches admin_users.list_user_faces)
-                        image_paths_and_bytes.append((f"/storage/faces/{user.id}/{p.name}", f.read()))
-
-                if len(image_paths_and_bytes) >= 3:
-                    enroll_user_faces(db, user.id, image_paths_and_bytes)
-
-                    # Re-check now that we attempted to rebuild.
-                    has_embeddings = db.execute(
-                        text(
-                            "SELECT 1 FROM facial_embeddings "
-                            "WHERE (user_id = :uid OR student_id = (:sid)::int) "
-                            "LIMIT 1"
-                        ),
-                        {"uid": user.id, "sid": student_id},
-                    ).fetchone()
-        except Exception:
-            # If rebuild fails, fall back to the normal error path below.
-            has_embeddings = has_embeddings
+    # Images on disk but no embeddings (e.g. after a DB restore): queue the user
+    # for the background re-indexer instead of embedding inside the request.
+    # Users whose images already failed to index are not queued again.
+    reindex_pending = not has_embeddings and face_reindexer.enqueue_user(user.id)
 
     if not has_embeddings:
-        db.execute(
-            text(
-                "INSERT INTO facial_verification_logs (user_id, attempted_email, success, failure_reason, ip_address, user_agent) "
-                "VALUES (:uid, :email, false, :reason, :ip, :ua)"
-            ),
-            {
-                "uid": user.id,
-                "email": payload.email,
-                "reason": "no_enrolled_embeddings",
-                "ip": request.client.host if request.client else None,
-                "ua": request.headers.get("user-agent"),
-            },
+        _log_facial_attempt(
+            db,
+            request,
+            email=email,
+            user_id=user.id,
+            reason="embeddings_reindex_pending" if reindex_pending else "no_enrolled_embeddings",
         )
-        db.commit()
+        if reindex_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Facial data is being re-indexed. Please retry in a moment.",
+                headers={"Retry-After": str(settings.face_inference_retry_after_seconds)},
+            )
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="No enrolled facial data for user"
         )
-    import base64
-
-    b64 = (
-        payload.image_base64.split(",", 1)[1]
-        if "," in payload.image_base64
-        else payload.image_base64
-    )
     try:
-        img_bytes = base64.b64decode(b64)
-    except Exception:
-        db.execute(
-            text(
-                "INSERT INTO facial_verification_logs (user_id, attempted_email, success, failure_reason, ip_address, user_agent) "
-                "VALUES (:uid, :email, false, :reason, :ip, :ua)"
-            ),
-            {
-                "uid": user.id,
-                "email": payload.email,
-                "reason": "invalid_base64",
-                "ip": request.client.host if request.client else None,
-                "ua": request.headers.get("user-agent"),
-            },
-        )
-        db.commit()
+        img_bytes = load_image()
+    except ValueError:
+        _log_facial_attempt(db, request, email=email, user_id=user.id, reason="invalid_base64")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid base64 face image"
         )
-    threshold = payload.confidence_threshold or settings.facial_confidence_threshold
+    threshold = threshold or settings.facial_confidence_threshold
 
     matched_user_id, similarity, failure_reason, metrics = verify_user_face_by_image(
         db,
-        email=payload.email,
+        email=email,
         image_bytes=img_bytes,
         threshold=threshold,
+        client_crop=client_cropped,
     )
 
     db.execute(
@@ -196,7 +164,7 @@ def login_facial(payload: FacialLoginRequest, request: Request, db: Session = De
         ),
         {
             "uid": user.id,
-            "email": payload.email,
+            "email": email,
             "success": bool(matched_user_id),
             "sim": float(similarity) if similarity is not None else None,
             "thr": float(threshold),
@@ -211,7 +179,15 @@ def login_facial(payload: FacialLoginRequest, request: Request, db: Session = De
     db.commit()
 
     if not matched_user_id:
-        if failure_reason in {"expected_single_face", "image_too_blurry", "image_too_dark", "image_too_bright", "face_too_small", "invalid_image"}:
+        if failure_reason in {
+            "expected_single_face",
+            "image_too_blurry",
+            "image_too_dark",
+            "image_too_bright",
+            "face_too_small",
+            "invalid_image",
+            "invalid_crop",
+        }:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Face image quality issue: {failure_reason}",
@@ -222,6 +198,43 @@ def login_facial(payload: FacialLoginRequest, request: Request, db: Session = De
     return token
 
 
+@router.post("/login/facial", response_model=Token)
+def login_facial(payload: FacialLoginRequest, request: Request, db: Session = Depends(get_db)):
+    if not payload.image_base64:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Face image is required"
+        )
+    return _facial_login(
+        db,
+        request,
+        email=payload.email,
+        threshold=payload.confidence_threshold,
+        load_image=lambda: _decode_base64_image(payload.image_base64),
+        client_cropped=payload.client_cropped,
+    )
+
+
+@router.post("/login/facial/upload", response_model=Token)
+def login_facial_upload(
+    request: Request,
+    email: EmailStr = Form(...),
+    image: UploadFile = File(..., description="JPEG/PNG frame, or a 112x112 aligned crop"),
+    confidence_threshold: float | None = Form(None),
+    client_cropped: bool = Form(False),
+    db: Session = Depends(get_db),
+):
+    """`/login/facial` with a multipart image part instead of base64 JSON."""
+    img_bytes = read_image_upload(image, max_bytes=settings.face_upload_max_bytes)
+    return _facial_login(
+        db,
+        request,
+        email=email,
+        threshold=confidence_threshold,
+        load_image=lambda: img_bytes,
+        client_cropped=client_cropped,
+    )
+
+
 @router.get("/login/facial/prewarm", response_model=dict)
 def login_facial_prewarm():
     """Preload the face engine to reduce first-request latency."""
@@ -231,44 +244,68 @@ def login_facial_prewarm():
     return {"status": "ready"}
 
 
-@router.post("/enroll", response_model=dict)
-def enroll_face(
-    payload: EnrollFacialRequest,
-    current_user: User = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db),
-):
-    if current_user.role != "admin" and current_user.id != payload.user_id:
+def _enroll(
+    db: Session,
+    current_user: User,
+    user_id: int,
+    images: list[bytes],
+    *,
+    client_cropped: bool,
+) -> dict:
+    if current_user.role != "admin" and current_user.id != user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not allowed to enroll facial data for another user",
         )
-    if not payload.requires_three_images():
+    if len(images) < 3:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Provide at least 3 images"
         )
-    import base64
+    check_client_cropped(client_cropped)
+    image_bytes_list = [(f"uploaded_{idx}.jpg", data) for idx, data in enumerate(images)]
+    try:
+        inserted = enroll_user_faces(db, user_id, image_bytes_list, client_crops=client_cropped)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    student = db.query(Student).filter(Student.user_id == user_id).first()
+    if student:
+        student.facial_data_encoded = True
+        db.add(student)
+        db.commit()
+    return {"status": "enrolled", "user_id": user_id, "images_processed": inserted}
+
 
-    image_bytes_list = []
+@router.post("/enroll", response_model=dict)
+def enroll_face(
+    payload: EnrollFacialRequest,
+    current_user: User = Depends(auth_service.get_current_user),
+    db: Session = Depends(get_db),
+):
+    images = []
     for idx, img in enumerate(payload.images_base64):
-        b64 = img.split(",", 1)[1] if "," in img else img
         try:
-            decoded = base64.b64decode(b64)
+            images.append(_decode_base64_image(img))
         except Exception:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Invalid base64 image at index {idx}",
             )
-        image_bytes_list.append((f"uploaded_{idx}.jpg", decoded))
-    try:
-        inserted = enroll_user_faces(db, payload.user_id, image_bytes_list)
-    except ValueError as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
-    student = db.query(Student).filter(Student.user_id == payload.user_id).first()
-    if student:
-        student.facial_data_encoded = True
-        db.add(student)
-        db.commit()
-    return {"status": "enrolled", "user_id": payload.user_id, "images_processed": inserted}
+    return _enroll(db, current_user, payload.user_id, images, client_cropped=payload.client_cropped)
+
+
+@router.post("/enroll/upload", response_model=dict)
+def enroll_face_upload(
+    user_id: int = Form(...),
+    images: list[UploadFile] = File(
+        ..., description="At least 3 JPEG/PNG images or 112x112 aligned crops"
+    ),
+    client_cropped: bool = Form(False),
+    current_user: User = Depends(auth_service.get_current_user),
+    db: Session = Depends(get_db),
+):
+    """`/enroll` with multipart image parts instead of base64 JSON."""
+    data = [read_image_upload(image, max_bytes=settings.face_upload_max_bytes) for image in images]
+    return _enroll(db, current_user, user_id, data, client_cropped=client_cropped)
 
 
 @router.get("/me", response_model=MeResponse)
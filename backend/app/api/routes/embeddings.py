@@ -1,11 +1,11 @@
 import base64
-from pathlib import Path
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 from app.models.user import User
+from app.services.embedding_queue import embedding_queue
 from app.utils.deps import get_db
 
 router = APIRouter()
@@ -22,24 +22,22 @@ def queue_embeddings(payload: QueueEmbeddingsPayload, db: Session = Depends(get_
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    root = Path("/app/storage/embeddings_queue")
-    root.mkdir(parents=True, exist_ok=True)
-    job_dir = root / f"user_{user.id}"
-    job_dir.mkdir(parents=True, exist_ok=True)
-
-    saved = []
-    for idx, b64 in enumerate(payload.imagesBase64[:3]):
+    images = []
+    for b64 in payload.imagesBase64[:3]:
         try:
             if "," in b64:
                 b64 = b64.split(",", 1)[1]
-            data = base64.b64decode(b64)
-            out = job_dir / f"img_{idx+1}.jpg"
-            out.write_bytes(data)
-            saved.append(str(out))
+            images.append(base64.b64decode(b64))
         except Exception:
             continue
 
-    # Write a simple job file to be processed by a worker later
-    (job_dir / "job.json").write_text('{"user_id": %d, "count": %d}' % (user.id, len(saved)))
+    # Picked up by the embedding queue workers (app/services/embedding_queue.py)
+    job_id = embedding_queue.enqueue(user.id, images)
+
+    return {"queued": True, "job_id": job_id, "images": len(images)}
+
 
-    return {"queued": True, "images": saved}
+@router.get("/queue/stats")
+def queue_stats():
+    """Queue depth, jobs in progress and enqueue-to-stored latency."""
+    return embedding_queue.stats()
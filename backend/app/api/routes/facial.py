@@ -1,84 +1,123 @@
 import hashlib
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
+import numpy as np
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from pydantic import BaseModel, Field
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from app.core.config import get_settings
+from app.db.vector import vector_cast, vector_param
+from app.models.user import User
+from app.services.face_gallery import face_gallery
+from app.services.face_identify import identify_face_by_image_async
 from app.services.facial_service import facial_service
-from app.utils.deps import get_db
+from app.services.inference_profiles import model_version
+from app.utils.deps import get_current_user, get_db
+from app.utils.uploads import check_client_cropped, read_image_upload
 
 router = APIRouter()
 settings = get_settings()
 
+IDENTIFY_ROLES = ("trainer", "admin")
+
 
 class EnrollPayload(BaseModel):
     student_id: int
     images_base64: List[str]
+    # Images are 112x112 aligned face crops (detection is skipped)
+    client_cropped: bool = False
 
 
 class VerifyPayload(BaseModel):
     image_base64: str
     student_id: int
+    client_cropped: bool = False
 
 
-@router.post("/enroll", response_model=dict)
-def enroll_face(payload: EnrollPayload, db: Session = Depends(get_db)):
-    """Enroll multiple face images for a student and store embeddings in pgvector."""
-    embeddings = facial_service.encode_multiple(payload.images_base64)
-    if not embeddings:
+class IdentifyPayload(BaseModel):
+    image_base64: str
+    class_name: Optional[str] = None
+    top_k: int = Field(default=5, ge=1, le=20)
+
+
+def _store_student_embeddings(
+    db: Session, student_id: int, embeddings: List[Optional[np.ndarray]], hashes: List[str]
+) -> dict:
+    if not any(emb is not None for emb in embeddings):
         raise HTTPException(status_code=400, detail="No valid face detected in images")
 
     success_count = 0
     for i, emb_np in enumerate(embeddings):
-        emb_list = emb_np.tolist()
-        emb_str = str(emb_list)
-        image_hash = hashlib.sha256(payload.images_base64[i].encode()).hexdigest()
+        if emb_np is None:
+            continue
 
         # Insert into DB with pgvector column via raw SQL
         db.execute(
             text(
                 """
-                INSERT INTO facial_embeddings (student_id, image_path, image_hash, embedding_model, is_primary, embedding)
-                VALUES (:sid, :path, :hash, 'insightface', :is_primary, (:vec)::vector)
+                INSERT INTO facial_embeddings (student_id, image_path, image_hash, embedding_model, is_primary, embedding, model_version)
+                VALUES (:sid, :path, :hash, 'insightface', :is_primary, (:vec)::vector, :mv)
                 """
             ),
             {
-                "sid": payload.student_id,
-                "path": f"/storage/faces/{payload.student_id}_{i}.jpg",
-                "hash": image_hash,
+                "sid": student_id,
+                "path": f"/storage/faces/{student_id}_{i}.jpg",
+                "hash": hashes[i],
                 "is_primary": i == 0,
-                "vec": emb_str,
+                "vec": vector_param(emb_np),
+                "mv": model_version(),
             },
         )
         success_count += 1
     db.commit()
-    return {"enrolled": success_count, "student_id": payload.student_id}
+    face_gallery.refresh_student(db, student_id)
+    return {"enrolled": success_count, "student_id": student_id}
 
 
-@router.post("/verify", response_model=dict)
-def verify_face(payload: VerifyPayload, db: Session = Depends(get_db)):
-    """Verify a face against stored embeddings using cosine similarity via pgvector <=> operator."""
-    test_emb = facial_service.encode_face(payload.image_base64)
+@router.post("/enroll", response_model=dict)
+def enroll_face(payload: EnrollPayload, db: Session = Depends(get_db)):
+    """Enroll multiple face images for a student and store embeddings in pgvector."""
+    check_client_cropped(payload.client_cropped)
+    embeddings = facial_service.encode_batch(
+        payload.images_base64, client_crop=payload.client_cropped
+    )
+    hashes = [hashlib.sha256(img.encode()).hexdigest() for img in payload.images_base64]
+    return _store_student_embeddings(db, payload.student_id, embeddings, hashes)
+
+
+@router.post("/enroll/upload", response_model=dict)
+def enroll_face_upload(
+    student_id: int = Form(...),
+    images: List[UploadFile] = File(..., description="JPEG/PNG images or 112x112 aligned crops"),
+    client_cropped: bool = Form(False),
+    db: Session = Depends(get_db),
+):
+    """`/enroll` with multipart image parts instead of base64 JSON."""
+    check_client_cropped(client_cropped)
+    data = [read_image_upload(image, max_bytes=settings.face_upload_max_bytes) for image in images]
+    embeddings = facial_service.encode_batch_bytes(data, client_crop=client_cropped)
+    hashes = [hashlib.sha256(d).hexdigest() for d in data]
+    return _store_student_embeddings(db, student_id, embeddings, hashes)
+
+
+def _verify_student(db: Session, student_id: int, test_emb: Optional[np.ndarray]) -> dict:
     if test_emb is None:
         raise HTTPException(status_code=400, detail="No face detected in provided image")
 
-    emb_str = str(test_emb.tolist())
-
     # Find closest match via pgvector cosine distance (1 - cosine_similarity)
     result = db.execute(
         text(
-            """
-            SELECT student_id, 1 - (embedding <=> (:vec)::vector) AS similarity
+            f"""
+            SELECT student_id, 1 - (embedding <=> (:vec){vector_cast()}) AS similarity
             FROM facial_embeddings
-            WHERE student_id = :sid
+            WHERE student_id = :sid AND model_version = :mv
             ORDER BY similarity DESC
             LIMIT 1
             """
         ),
-        {"vec": emb_str, "sid": payload.student_id},
+        {"vec": vector_param(test_emb), "sid": student_id, "mv": model_version()},
     ).fetchone()
 
     if not result:
@@ -88,3 +127,53 @@ def verify_face(payload: VerifyPayload, db: Session = Depends(get_db)):
     threshold = settings.facial_confidence_threshold
     verified = similarity >= threshold
     return {"verified": verified, "confidence": round(similarity, 4)}
+
+
+@router.post("/verify", response_model=dict)
+def verify_face(payload: VerifyPayload, db: Session = Depends(get_db)):
+    """Verify a face against stored embeddings using cosine similarity via pgvector <=> operator."""
+    check_client_cropped(payload.client_cropped)
+    test_emb = facial_service.encode_face(payload.image_base64, client_crop=payload.client_cropped)
+    return _verify_student(db, payload.student_id, test_emb)
+
+
+@router.post("/verify/upload", response_model=dict)
+def verify_face_upload(
+    student_id: int = Form(...),
+    image: UploadFile = File(..., description="JPEG/PNG frame, or a 112x112 aligned crop"),
+    client_cropped: bool = Form(False),
+    db: Session = Depends(get_db),
+):
+    """`/verify` with a multipart image part instead of base64 JSON."""
+    check_client_cropped(client_cropped)
+    image_bytes = read_image_upload(image, max_bytes=settings.face_upload_max_bytes)
+    test_emb = facial_service.encode_face_bytes(image_bytes, client_crop=client_cropped)
+    return _verify_student(db, student_id, test_emb)
+
+
+@router.post("/identify", response_model=dict)
+async def identify_face(
+    payload: IdentifyPayload,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Identify a face among all enrolled users (or one class roster) for kiosk check-in.
+
+    Returns user and student ids across the school, so only trainers and
+    admins may call it. Kiosks sign in with a trainer or admin account, as
+    for the offline kiosk routes in smart_attendance.
+    """
+    if current_user.role not in IDENTIFY_ROLES:
+        raise HTTPException(status_code=403, detail="Only trainers and admins can identify faces")
+    try:
+        image_bytes = facial_service._image_base64_to_bytes(payload.image_base64)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid image encoding")
+
+    result = await identify_face_by_image_async(
+        db,
+        image_bytes=image_bytes,
+        class_name=payload.class_name,
+        top_k=payload.top_k,
+    )
+    return result.to_dict()
@@ -2,9 +2,24 @@
 
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    Form,
+    Header,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+)
 from sqlalchemy.orm import Session
 
+from app.api.routes.trainer import _trainer_ids
+from app.core.config import get_settings
+from app.models.session import Session as SessionModel
 from app.models.user import User
 from app.schemas.smart_attendance import (
     AttendanceAlertOut,
@@ -12,14 +27,25 @@ from app.schemas.smart_attendance import (
     AttendanceSessionOut,
     AttendanceSessionUpdate,
     FraudDetectionOut,
+    KioskDeviceKeyOut,
+    KioskSyncIn,
+    KioskSyncOut,
     LiveAttendanceSnapshot,
     SelfCheckinOut,
     TeamsParticipationOut,
 )
+from app.services.kiosk import (
+    build_class_gallery,
+    class_gallery_version,
+    device_key,
+    sync_checkins,
+    verify_sync_signature,
+)
 from app.services.self_checkin import SelfCheckinService
 from app.services.smart_alerts import SmartAlertsService
 from app.services.teams_integration import TeamsIntegrationService
 from app.utils.deps import get_current_user, get_db
+from app.utils.uploads import iter_image_uploads, iter_length_prefixed_frames
 
 router = APIRouter(prefix="/smart-attendance", tags=["smart-attendance"])
 
@@ -120,6 +146,18 @@ async def update_attendance_session(
     return AttendanceSessionOut.from_orm(attendance_session)
 
 
+def _checkin_student_id(db: Session, current_user: User) -> int:
+    if current_user.role != "student":
+        raise HTTPException(status_code=403, detail="Only students can self check-in")
+
+    from app.models.student import Student
+
+    student = db.query(Student).filter(Student.user_id == current_user.id).first()
+    if not student:
+        raise HTTPException(status_code=404, detail="Student record not found")
+    return student.id
+
+
 @router.post("/self-checkin", response_model=SelfCheckinOut, status_code=201)
 async def student_self_checkin(
     *,
@@ -135,15 +173,8 @@ async def student_self_checkin(
     Student self check-in with AI verification.
     Performs liveness detection, facial matching, and location verification.
     """
-    if current_user.role != "student":
-        raise HTTPException(status_code=403, detail="Only students can self check-in")
-    
-    # Get student record
-    from app.models.student import Student
-    student = db.query(Student).filter(Student.user_id == current_user.id).first()
-    if not student:
-        raise HTTPException(status_code=404, detail="Student record not found")
-    
+    student_id = _checkin_student_id(db, current_user)
+
     # Read photo bytes
     photo_bytes = await photo.read()
     if len(photo_bytes) > 10 * 1024 * 1024:  # 10 MB max
@@ -154,7 +185,7 @@ async def student_self_checkin(
     try:
         checkin = await service.process_self_checkin(
             session_id=session_id,
-            student_id=student.id,
+            student_id=student_id,
             image_bytes=photo_bytes,
             latitude=latitude,
             longitude=longitude,
@@ -166,6 +197,163 @@ async def student_self_checkin(
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/self-checkin/burst", response_model=SelfCheckinOut, status_code=201)
+async def student_burst_checkin(
+    *,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    session_id: int = Query(..., description="Session ID to check in to"),
+    photos: List[UploadFile] = File(..., description="Camera frames, in capture order"),
+    latitude: Optional[float] = Form(None, description="Student's current latitude"),
+    longitude: Optional[float] = Form(None, description="Student's current longitude"),
+    device_id: Optional[str] = Form(None, description="Device identifier"),
+) -> SelfCheckinOut:
+    """
+    Self check-in from a short burst of frames.
+    Frames are analysed in order until liveness and face match are established;
+    the remaining frames are not processed.
+    """
+    student_id = _checkin_student_id(db, current_user)
+    checkin = await SelfCheckinService(db).process_burst_checkin(
+        session_id=session_id,
+        student_id=student_id,
+        frames=iter_image_uploads(photos, max_bytes=get_settings().face_upload_max_bytes),
+        latitude=latitude,
+        longitude=longitude,
+        device_id=device_id,
+    )
+    return SelfCheckinOut.from_orm(checkin)
+
+
+@router.post("/self-checkin/burst/stream", response_model=SelfCheckinOut, status_code=201)
+async def student_burst_checkin_stream(
+    request: Request,
+    *,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    session_id: int = Query(..., description="Session ID to check in to"),
+    latitude: Optional[float] = Query(None, description="Student's current latitude"),
+    longitude: Optional[float] = Query(None, description="Student's current longitude"),
+    device_id: Optional[str] = Query(None, description="Device identifier"),
+) -> SelfCheckinOut:
+    """
+    Burst self check-in over a chunked body: each frame is a 4-byte big-endian
+    length followed by the image. Frames are analysed as they arrive and the
+    check-in is decided without waiting for the rest of the stream.
+    """
+    student_id = _checkin_student_id(db, current_user)
+    checkin = await SelfCheckinService(db).process_burst_checkin(
+        session_id=session_id,
+        student_id=student_id,
+        frames=iter_length_prefixed_frames(
+            request.stream(), max_bytes=get_settings().face_upload_max_bytes
+        ),
+        latitude=latitude,
+        longitude=longitude,
+        device_id=device_id,
+    )
+    return SelfCheckinOut.from_orm(checkin)
+
+
+@router.get("/kiosk/gallery", response_class=Response)
+def download_kiosk_gallery(
+    class_name: str = Query(..., description="Class whose enrolled faces the kiosk serves"),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Response:
+    """
+    Signed gallery file of a class's enrolled embeddings, for offline kiosks.
+    The ETag is the gallery version; send it as If-None-Match to get a 304
+    while the class's enrollments have not changed.
+    """
+    if current_user.role not in ["trainer", "admin"]:
+        raise HTTPException(
+            status_code=403, detail="Only trainers and admins can export kiosk galleries"
+        )
+    if current_user.role == "trainer":
+        teaches_class = (
+            db.query(SessionModel.id)
+            .filter(
+                SessionModel.class_name == class_name,
+                SessionModel.trainer_id.in_(_trainer_ids(db, current_user)),
+            )
+            .first()
+        )
+        if not teaches_class:
+            raise HTTPException(status_code=403, detail="Not authorized for this class")
+
+    etag = f'"{class_gallery_version(db, class_name)}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    gallery, blob = build_class_gallery(db, class_name)
+    headers = {
+        "ETag": f'"{gallery.version}"',
+        "X-Gallery-Model-Version": gallery.header["model_version"],
+        "Content-Disposition": f'attachment; filename="gallery-{gallery.version}.spkg"',
+    }
+    return Response(content=blob, media_type="application/octet-stream", headers=headers)
+
+
+@router.post("/kiosk/devices/{device_id}/key", response_model=KioskDeviceKeyOut)
+def issue_kiosk_device_key(
+    device_id: str = Path(..., max_length=100),
+    current_user: User = Depends(get_current_user),
+) -> KioskDeviceKeyOut:
+    """
+    Key a kiosk signs its sync batches with (X-Kiosk-Signature). Admins only;
+    the key is derived from the device id, so issuing it again returns the same key.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can provision kiosks")
+    return KioskDeviceKeyOut(device_id=device_id, device_key=device_key(device_id).hex())
+
+
+async def _raw_body(request: Request) -> bytes:
+    return await request.body()
+
+
+@router.post("/kiosk/sync", response_model=KioskSyncOut)
+def sync_kiosk_checkins(
+    payload: KioskSyncIn,
+    body: bytes = Depends(_raw_body),
+    x_kiosk_signature: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> KioskSyncOut:
+    """
+    Record a batch of check-ins decided offline by a kiosk, in one transaction.
+    The body must be signed with the kiosk's device key (X-Kiosk-Signature).
+    Each item is validated (class roster, match and liveness thresholds,
+    check-in window, duplicates) and reported as accepted or rejected.
+    """
+    if current_user.role not in ["trainer", "admin"]:
+        raise HTTPException(
+            status_code=403, detail="Only trainers and admins can sync kiosk check-ins"
+        )
+    verify_sync_signature(payload.device_id, body, x_kiosk_signature)
+    if len(payload.checkins) > get_settings().kiosk_sync_max_checkins:
+        raise HTTPException(status_code=413, detail="Too many check-ins in one batch")
+    if current_user.role == "trainer":
+        course_session = db.get(SessionModel, payload.session_id)
+        if not course_session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        if course_session.trainer_id not in _trainer_ids(db, current_user):
+            raise HTTPException(status_code=403, detail="Not authorized for this session")
+
+    result = sync_checkins(
+        db,
+        session_id=payload.session_id,
+        checkins=payload.checkins,
+        model_version_used=payload.model_version,
+        device_id=payload.device_id,
+        gallery_version=payload.gallery_version,
+        synced_by=current_user.id,
+    )
+    return KioskSyncOut(**result.to_dict())
+
+
 @router.get("/sessions/{session_id}/live", response_model=LiveAttendanceSnapshot)
 async def get_live_attendance(
     session_id: int,
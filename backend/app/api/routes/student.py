@@ -12,6 +12,7 @@ from app.models.session import Session as SessionModel
 from app.models.student import Student
 from app.models.user import User
 from app.services.attendance import AttendanceService
+from app.services.face_inference import FaceInferenceUnavailable
 from app.utils.deps import get_current_user, get_db
 
 router = APIRouter(tags=["student"])
@@ -871,7 +872,7 @@ async def submit_facial_checkin(
         # Read photo file
         photo_bytes = await photo.read()
         
-        result = service.process_facial_checkin(
+        result = await service.process_facial_checkin(
             photo_data=photo_bytes,
             student_id=student.id,
             session_id=session_id,
@@ -882,6 +883,8 @@ async def submit_facial_checkin(
 
         return result
         
+    except (HTTPException, FaceInferenceUnavailable):
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -1,16 +1,17 @@
 from datetime import datetime, timedelta
 from typing import Dict
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.models.attendance import AttendanceRecord
 from app.models.session import Session as SessionModel
+from app.models.smart_attendance import AttendanceSession
 from app.models.student import Student
 from app.models.trainer import Trainer
 from app.models.user import User
-from app.models.smart_attendance import AttendanceSession
+from app.services.attendance import AttendanceService
 from app.utils.deps import get_current_user, get_db
 
 router = APIRouter(tags=["trainer"])
@@ -309,7 +310,18 @@ def update_attendance_justification(
         if decision == "approved":
             # Minimal implementation: approving a justification turns absent/late into excused.
             if record.status in {"absent", "late"}:
+                previous = (record.status, record.late_minutes or 0)
                 record.status = "excused"
+                db.flush()
+                AttendanceService._update_student_stats(
+                    db,
+                    record.student_id,
+                    record.session_id,
+                    "excused",
+                    late_minutes=record.late_minutes,
+                    previous=previous,
+                    commit=False,
+                )
         else:
             # Rejecting a justification clears it.
             record.justification = None
@@ -557,85 +569,17 @@ def confirm_session_attendance(
     if not session:
         raise HTTPException(status_code=404, detail="Session not found or not yours")
     
-    # Mark session as confirmed
-    session.status = "confirmed"
-    session.attendance_marked = True
-    db.add(session)
-    
-    # Deactivate attendance session
-    from app.models.smart_attendance import AttendanceSession
-    
-    att_session = db.query(AttendanceSession).filter(
-        AttendanceSession.session_id == session_id
-    ).first()
-    
-    if att_session:
-        att_session.is_active = False  # Deactivate after confirmation
-        att_session.confirmed_at = datetime.now()
-        db.add(att_session)
-    
-    # Create absence records for all students in the class who don't have attendance records
-    from app.models.student import Student
-    from app.models.attendance import AttendanceRecord
-    from app.services.attendance import AttendanceService
-    
-    class_name = session.class_name
-    absent_students = []  # Track for N8N logging
-    
-    if class_name:
-        # Get all students in the class
-        all_students = db.query(Student).filter(Student.class_name == class_name).all()
-        
-        # Get students who already have attendance records for this session
-        existing_records = db.query(AttendanceRecord).filter(
-            AttendanceRecord.session_id == session_id
-        ).all()
-        existing_student_ids = {r.student_id for r in existing_records}
-        
-        # Create "absent" records for missing students
-        for student in all_students:
-            if student.id not in existing_student_ids:
-                absent_record = AttendanceRecord(
-                    session_id=session_id,
-                    student_id=student.id,
-                    status="absent",
-                    marked_via="auto_confirmation"
-                )
-                db.add(absent_record)
-                absent_students.append(student.id)
-                
-                # Update student stats for each absent student
-                AttendanceService._update_student_stats(db, student.id, session_id, "absent")
-    
-    # Commit attendance records first
-    db.commit()
-    
-    # ⭐ N8N INTEGRATION: Log absences for email workflow (after session confirmation)
-    for student_id in absent_students:
-        AttendanceService._log_absence_for_n8n(db, student_id, session_id)
-    
-    # Send notification to admins
-    from app.services.notification import NotificationService
-    from app.schemas.notification import NotificationCreate
-    
-    admins = db.query(User).filter(User.role == "admin").all()
-    
-    for admin in admins:
-        payload = NotificationCreate(
-            user_id=admin.id,
-            user_type="admin",
-            title="Attendance Confirmed",
-            message=f"Trainer {current_user.username} confirmed attendance for {session.title or session.topic}",
-            notification_type="attendance_confirmed"
-        )
-        NotificationService.create_notification(db, payload)
-    
-    db.commit()
-    
+    # Mark the rest of the class absent, update their stats, log absences
+    # for N8N and notify admins, set-based in one transaction.
+    from app.services.session_confirmation import confirm_session
+
+    absent_students = confirm_session(db, session, confirmed_by=current_user.username)
+
     return {
         "status": "success",
         "message": f"Attendance confirmed for {session.title}",
         "session_id": session_id,
+        "absent_marked": len(absent_students),
         "confirmed_at": datetime.now().isoformat()
     }
 
@@ -691,3 +635,35 @@ def activate_session_attendance(
         "activated_at": datetime.now().isoformat(),
         "is_active": True
     }
+
+
+@router.post("/group-attendance")
+async def submit_group_attendance(
+    session_id: int = Query(...),
+    photo: UploadFile = File(..., description="Wide photo of the classroom"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Mark every recognised student of the session present from one group photo."""
+    if current_user.role != "trainer":
+        raise HTTPException(status_code=403, detail="Only trainers can submit group attendance")
+
+    trainer_ids = _trainer_ids(db, current_user)
+    session = (
+        db.query(SessionModel)
+        .filter(SessionModel.id == session_id, SessionModel.trainer_id.in_(trainer_ids))
+        .first()
+    )
+
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found or not yours")
+    if not session.class_name:
+        raise HTTPException(status_code=400, detail="Session has no class roster")
+
+    from app.services.group_attendance import process_group_photo
+
+    image_bytes = await photo.read()
+    try:
+        return await process_group_photo(db, session, image_bytes)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid image")
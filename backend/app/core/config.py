@@ -17,6 +17,82 @@ class Settings(BaseSettings):
     access_token_expire_minutes: int = 60 * 24
     facial_confidence_threshold: float = 0.62
 
+    # Face inference executor (see app/services/face_inference.py)
+    face_inference_workers: int = 2  # 0 = run on an in-process thread pool
+    face_inference_max_pending: int = 32
+    face_inference_timeout_seconds: float = 10.0
+    face_inference_retry_after_seconds: int = 2
+    face_batching_enabled: bool = True
+    face_batch_max_size: int = 16
+    face_batch_max_wait_ms: float = 5.0
+
+    # InsightFace runtime profile (see app/services/inference_profiles.py)
+    face_inference_profile: str = "balanced"  # "fast" | "balanced" | "accurate"
+    face_det_size: int = 0  # 0 = profile default
+    face_ort_intra_op_threads: int = 0  # 0 = profile default (cores / workers)
+    face_ort_inter_op_threads: int = 0  # 0 = profile default
+
+    # Embedding results by image hash (see app/services/embedding_cache.py)
+    face_embedding_cache_enabled: bool = True
+    face_embedding_cache_size: int = 2048
+    face_embedding_cache_ttl_seconds: float = 300.0
+    face_embedding_cache_redis: bool = False  # also share entries through REDIS_URL
+
+    # Bulk re-indexing of stored face images (see app/services/face_reindex.py)
+    face_reindex_batch_size: int = 16
+    face_reindex_users_per_chunk: int = 32
+    face_reindex_checkpoint: str = "/app/storage/face_reindex_checkpoint.json"
+
+    # Enrollment queue behind POST /embeddings/queue (see app/services/embedding_queue.py)
+    embedding_queue_dir: str = "/app/storage/embeddings_queue"
+    embedding_queue_workers: int = 1  # in-process worker threads; 0 = external workers only
+    embedding_queue_poll_seconds: float = 1.0
+    embedding_queue_claim_timeout_seconds: float = 600.0
+
+    # Multipart face uploads and client-aligned 112x112 crops (see app/utils/uploads.py)
+    face_upload_max_bytes: int = 10 * 1024 * 1024
+    face_client_crops_enabled: bool = True
+
+    # Burst self check-in, decided early on accumulated frames (see app/services/checkin_burst.py)
+    checkin_burst_max_frames: int = 8
+    checkin_burst_min_live_frames: int = 2
+    checkin_burst_min_match_frames: int = 2
+
+    # Replayed check-in photos, by perceptual hash (see app/services/replay_index.py)
+    checkin_replay_guard_enabled: bool = True
+    checkin_replay_max_distance: int = 6  # Hamming bits out of 64
+    checkin_replay_sync_seconds: int = 2  # pull other workers' check-ins this often
+
+    # Offline kiosks: signed class gallery and batched sync (see app/services/kiosk.py)
+    kiosk_gallery_signing_key: str = ""  # "" = derived from secret_key
+    kiosk_min_liveness_score: float = 0.40
+    kiosk_sync_max_checkins: int = 500
+
+    # Heavy ML stacks imported at startup instead of on first use (see app/core/lazy_imports.py)
+    warm_up_stacks: str = ""  # e.g. "insightface,cv2" or "all"
+
+    # Models loaded and warmed before serving (see app/services/model_preload.py)
+    preload_models: str = ""  # "face", "liveness", "rag" (comma-separated) or "all"
+
+    # Aligned face crops and model versions (see app/services/face_model_migration.py)
+    face_crop_dir: str = "/app/storage/face_crops"
+    face_model_version: str = ""  # "" = INSIGHTFACE_MODEL
+    face_model_dual_read: bool = True  # re-embed crops of other versions on verify
+    face_model_migration_batch_size: int = 256
+
+    # Shared memory-mapped embedding gallery (see app/services/face_gallery.py)
+    face_gallery_enabled: bool = True
+    face_gallery_dir: str = "/app/storage/face_gallery"
+    face_gallery_sync_check_seconds: int = 60  # 0 = only on each process's first use
+
+    # 1:N identification (see app/services/face_identify.py)
+    face_identify_backend: str = "gallery"  # "gallery" | "pgvector"
+    face_identify_min_margin: float = 0.05
+    face_ann_min_rows: int = 100000  # exact search below this many gallery rows
+    face_ann_nlist: int = 0  # 0 = sqrt(rows)
+    face_ann_nprobe: int = 32
+    face_hnsw_ef_search: int = 64
+
     # CORS settings
     allowed_origins: list[str] = ["http://localhost:3000", "http://localhost:8000"]
 
@@ -0,0 +1,152 @@
+"""Lazy loading of the heavy ML and client stacks.
+
+`app.main` imports every router, and with them every service module. The
+stacks behind a few of those services (InsightFace and ONNX Runtime,
+OpenCV, TensorFlow, scikit-learn, reportlab, chromadb, boto3) used to be
+imported at module level, so every cold start, `--reload` and worker paid
+their import time and memory, even for a worker that never serves those
+requests.
+
+Modules now reach them through `lazy_module(name)`, a stand-in whose first
+attribute access does the real import (`cv2.imdecode(...)` works unchanged),
+or through an import inside the function that needs them. `HEAVY_STACKS`
+lists them so they can be loaded ahead of traffic (`warm_up`, the
+`warm_up_stacks` setting) and inspected (`status`,
+`scripts/profile_startup.py`).
+"""
+
+from __future__ import annotations
+
+import importlib
+import importlib.util
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Iterable
+
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class HeavyStack:
+    modules: tuple[str, ...]
+    used_by: str
+
+
+HEAVY_STACKS: dict[str, HeavyStack] = {
+    "insightface": HeavyStack(
+        ("onnxruntime", "insightface.app", "insightface.utils.face_align"),
+        "face detection and recognition (app/services/face_engine.py)",
+    ),
+    "cv2": HeavyStack(("cv2",), "image decoding, face crops, replay hashes and liveness"),
+    "tensorflow": HeavyStack(
+        ("tensorflow", "tensorflow.keras.applications.mobilenet_v2"),
+        "MobileNetV2 anti-spoofing (app/services/advanced_liveness.py)",
+    ),
+    "sklearn": HeavyStack(
+        ("sklearn.ensemble", "sklearn.preprocessing"),
+        "attendance anomaly detection (app/services/anomaly_detection.py)",
+    ),
+    "reportlab": HeavyStack(
+        ("reportlab.platypus", "reportlab.lib.styles"), "PDF reports and exports"
+    ),
+    "chromadb": HeavyStack(("chromadb",), "chatbot RAG store (app/ai_agent/rag_pipeline.py)"),
+    "boto3": HeavyStack(("boto3",), "S3 storage and backups"),
+}
+
+_load_seconds: dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def _import(name: str) -> ModuleType:
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    with _lock:
+        started = time.perf_counter()
+        module = importlib.import_module(name)
+        _load_seconds.setdefault(name, time.perf_counter() - started)
+    logger.info(f"Loaded {name} in {_load_seconds[name] * 1000:.0f} ms")
+    return module
+
+
+class LazyModule:
+    """Stand-in for a module, imported on first attribute access."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: ModuleType | None = None
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            self._module = _import(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self) -> list[str]:
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_module(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+def is_available(name: str) -> bool:
+    """Whether the top-level package of `name` is installed (nothing is imported)."""
+    return importlib.util.find_spec(name.partition(".")[0]) is not None
+
+
+def warm_up(names: Iterable[str] | None = None) -> dict[str, float | None]:
+    """Import the given stacks (default: all installed ones) ahead of traffic.
+
+    Returns the load seconds of each, None for stacks that are not installed
+    or fail to import.
+    """
+    timings: dict[str, float | None] = {}
+    for name in names if names is not None else HEAVY_STACKS:
+        stack = HEAVY_STACKS.get(name)
+        if stack is None:
+            raise ValueError(
+                f"Unknown heavy stack {name!r}; expected one of {sorted(HEAVY_STACKS)}"
+            )
+        if not is_available(stack.modules[0]):
+            timings[name] = None
+            continue
+        started = time.perf_counter()
+        try:
+            for module in stack.modules:
+                _import(module)
+            timings[name] = round(time.perf_counter() - started, 3)
+        except Exception as e:
+            logger.warning(f"Warm-up of {name} failed: {e}")
+            timings[name] = None
+    return timings
+
+
+def parse_stack_names(value: str) -> list[str]:
+    """`"insightface, cv2"` -> names; `"all"` -> every stack."""
+    names = [n.strip() for n in value.split(",") if n.strip()]
+    return list(HEAVY_STACKS) if names == ["all"] else names
+
+
+def status() -> dict[str, dict]:
+    """Installed / loaded state of every heavy stack in this process."""
+    return {
+        name: {
+            "available": is_available(stack.modules[0]),
+            "loaded": all(m in sys.modules for m in stack.modules),
+            "load_ms": round(sum(_load_seconds.get(m, 0.0) for m in stack.modules) * 1000, 1),
+            "used_by": stack.used_by,
+        }
+        for name, stack in HEAVY_STACKS.items()
+    }
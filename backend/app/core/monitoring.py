@@ -3,6 +3,7 @@ Monitoring and metrics collection for SmartPresence AI
 """
 
 import json
+import logging
 import threading
 import time
 from collections import defaultdict
@@ -94,9 +95,8 @@ class MetricsCollector:
         """Record a service metric"""
         with self.lock:
             self.metrics["services"].append(asdict(metric))
-            level = "info" if metric.success else "error"
             logger.log(
-                getattr(logger, level),
+                logging.INFO if metric.success else logging.ERROR,
                 f"{metric.service}: {metric.operation}",
                 extra={
                     "service": metric.service,
@@ -4,9 +4,11 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import get_settings
+from app.db.vector import install_vector_adapter
 
 settings = get_settings()
 engine = create_engine(settings.database_url, future=True)
+install_vector_adapter(engine)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
 
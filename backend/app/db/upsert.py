@@ -0,0 +1,21 @@
+"""`INSERT ... ON CONFLICT` on the databases the app runs on.
+
+Postgres (production) and SQLite (tests) both support it, through their own
+dialect `insert` constructs; `dialect_insert(db)` returns the one for the
+session's connection.
+"""
+
+from __future__ import annotations
+
+from sqlalchemy.orm import Session
+
+
+def dialect_insert(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"INSERT ... ON CONFLICT is not available on {dialect}")
+    return insert
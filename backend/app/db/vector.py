@@ -0,0 +1,194 @@
+"""pgvector binary transport for embedding parameters and bulk inserts.
+
+Embeddings used to travel as text: 512 `f"{x:.6f}"` floats joined into a
+`[...]` literal, parsed back by Postgres with `::vector`. With the psycopg 3
+driver, `install_vector_adapter` registers pgvector's adapters on every new
+connection. NumPy arrays are then sent in the `vector` binary format (raw
+float32, no formatting or parsing on either side), and `vector` columns come
+back as NumPy arrays.
+
+- `vector_param(embedding)`: what to bind for a `(:q)::vector` placeholder
+  (`(:q){vector_cast()}` in queries).
+  It is an ndarray when the adapter is active and the text literal otherwise
+  (other drivers, or a database without the extension), so SQL stays the same.
+- `copy_embeddings(db, rows)`: `COPY facial_embeddings ... FROM STDIN (FORMAT
+  BINARY)` for bulk enrollment; it returns False when COPY is unavailable so
+  the caller can fall back to `executemany`.
+
+`facial_embeddings.embedding` is `vector(512)` (float32) or, after
+`scripts/convert_embedding_precision.py --to float16`, `halfvec(512)` (half
+the bytes per row and per HNSW node; `convert_embedding_column`). The column type is read
+on connect, and queries compare against `(:q){vector_cast()}` so the
+operator matches the column and its HNSW opclass either way.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable, Sequence
+
+import numpy as np
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from app.core.logging_config import get_logger
+
+try:
+    from pgvector.psycopg import register_vector
+
+    PGVECTOR_PSYCOPG_AVAILABLE = True
+except ImportError:  # pragma: no cover - optional dependency
+    PGVECTOR_PSYCOPG_AVAILABLE = False
+
+try:
+    from pgvector import HalfVector
+except ImportError:  # pragma: no cover - pgvector < 0.3 has no halfvec adapter
+    HalfVector = None
+
+logger = get_logger(__name__)
+
+# Set once a connection has registered the adapter (all connections share a database).
+_binary_vectors = False
+# SQL type of facial_embeddings.embedding: "vector" or "halfvec".
+_column_type = "vector"
+
+HNSW_INDEX = "ix_facial_embeddings_embedding_hnsw"
+
+_COLUMN_TYPE_SQL = (
+    "SELECT format_type(a.atttypid, a.atttypmod) FROM pg_attribute a "
+    "WHERE a.attrelid = to_regclass('facial_embeddings') AND a.attname = 'embedding' "
+    "AND NOT a.attisdropped"
+)
+
+EMBEDDING_COPY_COLUMNS: tuple[tuple[str, str], ...] = (
+    ("student_id", "int4"),
+    ("user_id", "int4"),
+    ("image_path", "varchar"),
+    ("image_hash", "varchar"),
+    ("is_primary", "bool"),
+    ("embedding", "vector"),
+    ("embedding_model", "varchar"),
+    ("lighting_conditions", "varchar"),
+    ("model_version", "varchar"),
+    ("crop_hash", "varchar"),
+)
+
+
+def binary_vectors_enabled() -> bool:
+    return _binary_vectors
+
+
+def embedding_column_type() -> str:
+    return _column_type
+
+
+def vector_cast() -> str:
+    """Cast for a bound embedding so it matches the column (`<=>` and HNSW opclass)."""
+    return "::vector::halfvec" if _column_type == "halfvec" else "::vector"
+
+
+def vector_to_text(embedding: Sequence[float] | np.ndarray) -> str:
+    return (
+        "[" + ",".join(f"{x:.6f}" for x in np.asarray(embedding, dtype=np.float32).tolist()) + "]"
+    )
+
+
+def vector_param(embedding: Sequence[float] | np.ndarray):
+    """Bind value for a `(:name)::vector` placeholder."""
+    if _binary_vectors:
+        return np.ascontiguousarray(embedding, dtype=np.float32)
+    return vector_to_text(embedding)
+
+
+def install_vector_adapter(engine: Engine) -> None:
+    """Register the pgvector psycopg adapters on every connection of `engine`."""
+    if not PGVECTOR_PSYCOPG_AVAILABLE or engine.dialect.driver != "psycopg":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _register(dbapi_connection, _connection_record):
+        global _binary_vectors, _column_type
+        try:
+            row = dbapi_connection.execute(_COLUMN_TYPE_SQL).fetchone()
+            _column_type = "halfvec" if row and row[0].startswith("halfvec") else "vector"
+            register_vector(dbapi_connection)
+            _binary_vectors = True
+        except Exception as e:
+            # No `vector` extension yet (fresh database before migrations).
+            logger.warning(f"pgvector adapter not registered: {e}")
+        finally:
+            dbapi_connection.rollback()
+
+
+def copy_embeddings(db: Session, rows: Iterable[dict]) -> bool:
+    """Bulk-load `facial_embeddings` rows with binary COPY in the session's transaction.
+
+    `rows` use the keys of `EMBEDDING_COPY_COLUMNS` (`embedding` as an array).
+    Returns False, without writing anything, when the binary adapter is not
+    active.
+    """
+    if not _binary_vectors:
+        return False
+    half = _column_type == "halfvec"
+    if half and HalfVector is None:
+        return False
+
+    def embedding_value(value):
+        arr = np.ascontiguousarray(value, dtype=np.float32)
+        return HalfVector(arr) if half else arr
+
+    types = [_column_type if name == "embedding" else t for name, t in EMBEDDING_COPY_COLUMNS]
+    dbapi_connection = db.connection().connection.driver_connection
+    columns = ", ".join(name for name, _type in EMBEDDING_COPY_COLUMNS)
+    with dbapi_connection.cursor() as cur:
+        with cur.copy(f"COPY facial_embeddings ({columns}) FROM STDIN (FORMAT BINARY)") as copy:
+            copy.set_types(types)
+            for row in rows:
+                copy.write_row(
+                    [
+                        embedding_value(row[name]) if name == "embedding" else row[name]
+                        for name, _type in EMBEDDING_COPY_COLUMNS
+                    ]
+                )
+    return True
+
+
+def stored_column_type(connection: Connection) -> str | None:
+    """SQL type of `facial_embeddings.embedding` (e.g. `"halfvec(512)"`), or None if missing."""
+    row = connection.execute(text(_COLUMN_TYPE_SQL)).fetchone()
+    return row[0] if row else None
+
+
+def convert_embedding_column(connection: Connection, precision: str) -> bool:
+    """Convert `facial_embeddings.embedding` to `vector` (float32) or `halfvec` (float16).
+
+    Rewrites the table and rebuilds the HNSW index with the matching opclass.
+    Returns False when the column already has the requested type (or does not
+    exist). Running API processes pick the new type up on their next
+    connection; restart them after converting.
+    """
+    target = "halfvec" if precision == "float16" else "vector"
+    current = stored_column_type(connection)
+    if current is None or current.startswith(target):
+        return False
+    if (
+        target == "halfvec"
+        and connection.execute(text("SELECT 1 FROM pg_type WHERE typname = 'halfvec'")).fetchone()
+        is None
+    ):
+        raise RuntimeError("halfvec storage needs the pgvector extension 0.7.0 or newer")
+
+    connection.execute(text(f"DROP INDEX IF EXISTS {HNSW_INDEX}"))
+    connection.execute(
+        text(
+            f"ALTER TABLE facial_embeddings ALTER COLUMN embedding "
+            f"TYPE {target}(512) USING embedding::{target}(512)"
+        )
+    )
+    connection.execute(
+        text(
+            f"CREATE INDEX IF NOT EXISTS {HNSW_INDEX} ON facial_embeddings "
+            f"USING hnsw (embedding {target}_cosine_ops) WITH (m = 16, ef_construction = 64)"
+        )
+    )
+    return True
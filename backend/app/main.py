@@ -9,13 +9,22 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
 from app.api.router import api_router
 from app.core.audit_middleware import AuditMiddleware
 from app.core.config import get_settings
+from app.core.lazy_imports import parse_stack_names, warm_up
+from app.core.lazy_imports import status as heavy_stack_status
 from app.core.logging_config import get_logger, setup_logging
 from app.core.monitoring import RequestMetric, health_status, metrics_collector
+from app.services.embedding_queue import build_workers, embedding_queue
+from app.services.face_gallery import face_gallery
+from app.services.face_inference import FaceInferenceUnavailable, face_inference
+from app.services.model_preload import parse_model_names, preload_models, readiness
+from app.services.replay_index import rebuild_on_startup as rebuild_replay_index
+from app.services.replay_index import replay_index
 from app.utils.scheduler import scheduler
 
 # Setup comprehensive logging
@@ -25,6 +34,8 @@ logger = get_logger(__name__)
 
 settings = get_settings()
 
+embedding_queue_workers = build_workers()
+
 app = FastAPI(
     title=settings.app_name,
     description="Smart Presence AI - Intelligent Attendance Management System",
@@ -107,6 +118,23 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
             "message": exc.detail,
             "status_code": exc.status_code,
         },
+        headers=getattr(exc, "headers", None),
+    )
+
+
+@app.exception_handler(FaceInferenceUnavailable)
+async def face_inference_unavailable_handler(request: Request, exc: FaceInferenceUnavailable):
+    """Face inference is saturated or timed out: ask the client to retry later"""
+    logger.warning(f"Face inference unavailable: {exc.reason}")
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={
+            "success": False,
+            "error": exc.reason,
+            "message": "Face recognition is busy. Please retry in a moment.",
+            "status_code": status.HTTP_503_SERVICE_UNAVAILABLE,
+        },
+        headers={"Retry-After": str(exc.retry_after)},
     )
 
 
@@ -162,6 +190,13 @@ async def health_check() -> dict:
     return health_status.to_dict()
 
 
+@app.get("/health/ready", tags=["Health"])
+async def readiness_check() -> JSONResponse:
+    """Ready once the models in PRELOAD_MODELS are loaded and warm (503 otherwise)"""
+    state = readiness()
+    return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
+
+
 @app.get("/metrics/summary", tags=["Metrics"])
 async def metrics_summary() -> dict:
     """Get metrics summary for the last hour"""
@@ -184,6 +219,17 @@ async def metrics_errors(hours: int = 24) -> dict:
     return metrics_collector.get_error_stats(hours=hours)
 
 
+@app.get("/metrics/face-inference", tags=["Metrics"])
+async def metrics_face_inference() -> dict:
+    """Get face inference executor queue and gallery statistics"""
+    stats = face_inference.stats()
+    stats["gallery"] = face_gallery.stats()
+    stats["embedding_queue"] = embedding_queue.stats()
+    stats["replay_index"] = replay_index.stats()
+    stats["heavy_stacks"] = heavy_stack_status()
+    return stats
+
+
 @app.post("/metrics/export", tags=["Metrics"])
 async def export_metrics() -> dict:
     """Export all collected metrics to file"""
@@ -218,6 +264,20 @@ async def root() -> dict:
 async def on_startup():
     logger.info("Starting scheduler for recurring tasks")
     scheduler.start()
+
+    if embedding_queue_workers.count > 0:
+        embedding_queue_workers.start()
+        logger.info(f"Started {embedding_queue_workers.count} embedding queue worker(s)")
+
+    await run_in_threadpool(rebuild_replay_index)
+
+    if settings.warm_up_stacks:
+        timings = await run_in_threadpool(warm_up, parse_stack_names(settings.warm_up_stacks))
+        logger.info(f"Warmed up heavy stacks: {timings}")
+
+    if settings.preload_models:
+        # Blocks until loaded: uvicorn only accepts connections after startup.
+        await run_in_threadpool(preload_models, parse_model_names(settings.preload_models))
     
     # Initialize event subscribers
     from app.core.event_subscribers import initialize_event_subscribers
@@ -229,3 +289,5 @@ async def on_startup():
 async def on_shutdown():
     logger.info("Stopping scheduler")
     scheduler.stop()
+    embedding_queue_workers.stop()
+    face_inference.shutdown()
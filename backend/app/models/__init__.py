@@ -1,8 +1,8 @@
 from app.models.attendance import AttendanceRecord
 from app.models.audit_log import AuditLog
 from app.models.controle import Controle
-from app.models.feedback import StudentFeedback
 from app.models.facial_verification_log import FacialVerificationLog
+from app.models.feedback import StudentFeedback
 from app.models.message import Message, MessageThread
 from app.models.notification import Notification
 from app.models.notification_preferences import NotificationPreferences
@@ -16,6 +16,7 @@ from app.models.smart_attendance import (
     TeamsParticipation,
 )
 from app.models.student import Student
+from app.models.student_attendance_counters import StudentAttendanceCounters
 from app.models.trainer import Trainer
 from app.models.user import User
 from app.models.webhook import Webhook, WebhookLog
@@ -23,6 +24,7 @@ from app.models.webhook import Webhook, WebhookLog
 __all__ = [
     "User",
     "Student",
+    "StudentAttendanceCounters",
     "Trainer",
     "Session",
     "AttendanceRecord",
@@ -12,6 +12,8 @@ class FacialEmbedding(Base):
         Index("ix_embeddings_student", "student_id"),
         Index("ix_embeddings_user", "user_id"),
         Index("ix_embeddings_image_hash", "image_hash"),
+        Index("ix_embeddings_model_user", "model_version", "user_id"),
+        Index("ix_embeddings_crop_hash", "crop_hash"),
     )
 
     id = Column(Integer, primary_key=True, index=True)
@@ -25,5 +27,8 @@ class FacialEmbedding(Base):
     is_primary = Column(Boolean, default=False)
     capture_angle = Column(VARCHAR(20))
     lighting_conditions = Column(VARCHAR(50))
+    # InsightFace pack that produced `embedding`, and the stored aligned crop it came from
+    model_version = Column(VARCHAR(50))
+    crop_hash = Column(String(64))
 
     embedding = Column(Vector(512), nullable=True)
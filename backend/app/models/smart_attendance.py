@@ -3,7 +3,18 @@
 These models are aligned with the current PostgreSQL schema created by init scripts/migrations.
 """
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, Numeric, String, Text
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    Numeric,
+    String,
+    Text,
+)
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 
@@ -62,6 +73,8 @@ class SelfCheckin(Base):
     distance_from_class_meters = Column(Integer)
 
     verification_photo_path = Column(String(512))
+    # 64-bit perceptual hash of the photo, stored signed (app/services/replay_index.py)
+    image_phash = Column(BigInteger)
     device_id = Column(String(100))
     ip_address = Column(String(45))
 
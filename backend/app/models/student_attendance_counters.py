@@ -0,0 +1,24 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer
+from sqlalchemy.sql import func
+
+from app.db.base import Base
+
+
+class StudentAttendanceCounters(Base):
+    """Per-student attendance totals, kept in step with `attendance_records`.
+
+    Updated by SQL deltas in the transaction that writes the record and
+    rebuilt by `rebuild_counters` (see app/services/attendance_counters.py).
+    """
+
+    __tablename__ = "student_attendance_counters"
+
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), primary_key=True)
+    total_count = Column(Integer, nullable=False, default=0, server_default="0")
+    present_count = Column(Integer, nullable=False, default=0, server_default="0")
+    late_count = Column(Integer, nullable=False, default=0, server_default="0")
+    absent_count = Column(Integer, nullable=False, default=0, server_default="0")
+    excused_count = Column(Integer, nullable=False, default=0, server_default="0")
+    late_minutes = Column(Integer, nullable=False, default=0, server_default="0")
+    absence_hours = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
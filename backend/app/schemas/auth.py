@@ -23,11 +23,14 @@ class FacialLoginRequest(BaseModel):
     email: EmailStr
     image_base64: str
     confidence_threshold: float | None = None
+    # `image_base64` is a 112x112 aligned face crop (detection is skipped)
+    client_cropped: bool = False
 
 
 class EnrollFacialRequest(BaseModel):
     user_id: int
     images_base64: list[str]
+    client_cropped: bool = False
 
     def requires_three_images(self) -> bool:
         return len(self.images_base64) >= 3
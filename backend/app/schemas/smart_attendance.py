@@ -83,6 +83,39 @@ class SelfCheckinOut(BaseModel):
         from_attributes = True
 
 
+class KioskCheckinIn(BaseModel):
+    student_id: int
+    similarity: float = Field(..., ge=-1.0, le=1.0)
+    liveness_score: float = Field(..., ge=0.0, le=1.0)
+    captured_at: datetime
+
+
+class KioskSyncIn(BaseModel):
+    session_id: int
+    model_version: str
+    gallery_version: Optional[str] = None
+    device_id: Optional[str] = Field(None, max_length=100)
+    checkins: List[KioskCheckinIn]
+
+
+class KioskSyncResultItem(BaseModel):
+    index: int
+    student_id: int
+    status: str  # accepted, rejected
+    reason: Optional[str] = None
+
+
+class KioskSyncOut(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[KioskSyncResultItem]
+
+
+class KioskDeviceKeyOut(BaseModel):
+    device_id: str
+    device_key: str  # hex; the kiosk signs sync bodies with HMAC-SHA256 under it
+
+
 # ============================================================================
 # Teams Participation Schemas
 # ============================================================================
@@ -10,6 +10,8 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from app.db.session import SessionLocal
 from app.models.student import Student
 from app.models.user import User
+from app.services.face_gallery import face_gallery
+from app.services.inference_profiles import model_version
 from sqlalchemy import text
 import numpy as np
 
@@ -75,10 +77,10 @@ def enroll_demo_student_face(db, email: str):
             text("""
                 INSERT INTO facial_embeddings 
                 (student_id, user_id, image_path, image_hash, is_primary, 
-                 embedding, embedding_model, lighting_conditions)
+                 embedding, embedding_model, lighting_conditions, model_version)
                 VALUES 
                 (:student_id, :user_id, :image_path, :image_hash, :is_primary,
-                 (:embedding)::vector, :embedding_model, :lighting)
+                 (:embedding)::vector, :embedding_model, :lighting, :model_version)
             """),
             {
                 "student_id": student.id,
@@ -89,6 +91,7 @@ def enroll_demo_student_face(db, email: str):
                 "embedding": embedding_str,
                 "embedding_model": "insightface",
                 "lighting": lighting,
+                "model_version": model_version(),
             }
         )
         print(f"  ✅ Enrolled image {i+1}/3 ({lighting} lighting)")
@@ -96,6 +99,7 @@ def enroll_demo_student_face(db, email: str):
     # Update student record
     student.facial_data_encoded = True
     db.commit()
+    face_gallery.refresh_student(db, student.id)
     
     print(f"\n✅ Successfully enrolled 3 facial embeddings for {student.first_name} {student.last_name}")
     print(f"   Student can now use facial recognition for check-in!")
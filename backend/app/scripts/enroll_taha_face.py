@@ -6,6 +6,7 @@ from sqlalchemy import text
 from app.db.session import SessionLocal
 from app.models.student import Student
 from app.models.user import User
+from app.services.inference_profiles import model_version
 
 
 def enroll_taha_embeddings():
@@ -58,9 +59,9 @@ def enroll_taha_embeddings():
             db.execute(
                 text("""
                     INSERT INTO facial_embeddings 
-                    (user_id, student_id, embedding, lighting_conditions, confidence_score, is_primary, image_path, capture_angle)
+                    (user_id, student_id, embedding, lighting_conditions, confidence_score, is_primary, image_path, capture_angle, model_version)
                     VALUES 
-                    (:user_id, :student_id, :embedding, :lighting, :confidence, :is_primary, :image_path, :angle)
+                    (:user_id, :student_id, :embedding, :lighting, :confidence, :is_primary, :image_path, :angle, :model_version)
                 """),
                 {
                     "user_id": user.id,
@@ -70,7 +71,8 @@ def enroll_taha_embeddings():
                     "confidence": emb_data["confidence"],
                     "is_primary": (idx == 0),
                     "image_path": f"/storage/faces/taha_synthetic_{idx}.jpg",
-                    "angle": "frontal"
+                    "angle": "frontal",
+                    "model_version": model_version(),
                 }
             )
             
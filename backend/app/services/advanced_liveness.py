@@ -1,22 +1,26 @@
 """
 Advanced Liveness Detection with Deep Learning
 Uses MobileNetV2 for anti-spoofing detection
+
+Checks run cheapest first (sharpness, color histogram, vectorized LBP texture,
+Haar face detection, then MobileNetV2) and stop as soon as the verdict can no
+longer become "live". `detect_liveness_batch` scores several frames and runs
+the MobileNetV2 pass for all of them in one batched `predict` call.
 """
 
 import io
-from typing import Any, Dict, Tuple
+import threading
+from typing import Any, Callable, Dict, List, Sequence, Tuple
 
-import cv2
 import numpy as np
 from PIL import Image
 
-try:
-    import tensorflow as tf
-    from tensorflow.keras.applications import MobileNetV2
-    from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
-    TF_AVAILABLE = True
-except ImportError:
-    TF_AVAILABLE = False
+from app.core.lazy_imports import is_available, lazy_module
+
+cv2 = lazy_module("cv2")
+# TensorFlow is only imported when a detector is created (it takes seconds).
+mobilenet_v2 = lazy_module("tensorflow.keras.applications.mobilenet_v2")
+TF_AVAILABLE = is_available("tensorflow")
 
 
 class AdvancedLivenessDetector:
@@ -26,19 +30,22 @@ class AdvancedLivenessDetector:
         self.use_dl = TF_AVAILABLE
         
         if self.use_dl:
-            # Load pretrained MobileNetV2 (lightweight, mobile-friendly)
-            self.model = MobileNetV2(
-                weights='imagenet',
-                include_top=False,
-                pooling='avg',
-                input_shape=(224, 224, 3)
-            )
-            # Freeze the model (we're using it for feature extraction)
-            self.model.trainable = False
-        
-        # Haar Cascade for face detection
-        cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        self.face_cascade = cv2.CascadeClassifier(cascade_path)
+            try:
+                # Load pretrained MobileNetV2 (lightweight, mobile-friendly)
+                self.model = mobilenet_v2.MobileNetV2(
+                    weights="imagenet", include_top=False, pooling="avg", input_shape=(224, 224, 3)
+                )
+            except ImportError:
+                # Installed but not importable (e.g. a broken CUDA build): heuristics only.
+                self.use_dl = False
+            else:
+                # Freeze the model (we're using it for feature extraction)
+                self.model.trainable = False
+
+    @property
+    def face_cascade(self) -> "cv2.CascadeClassifier":
+        """Haar cascade for face detection, loaded once per thread."""
+        return _get_face_cascade()
     
     def detect_liveness(self, image_bytes: bytes) -> Tuple[bool, float, str]:
         """
@@ -47,51 +54,58 @@ class AdvancedLivenessDetector:
         Returns:
             (is_live, confidence, reason)
         """
+        return self.detect_liveness_batch([image_bytes])[0]
+
+    def detect_liveness_batch(self, images: Sequence[bytes]) -> List[Tuple[bool, float, str]]:
+        """Score several frames; the deep-feature pass runs once for the whole batch."""
         
-        # Convert bytes to image
-        image = Image.open(io.BytesIO(image_bytes))
-        img_array = np.array(image)
+        # Convert bytes to image (one decode per frame)
+        arrays = [np.array(Image.open(io.BytesIO(image_bytes))) for image_bytes in images]
+        grays = [_to_gray(img_array) for img_array in arrays]
+        total_checks = len(self._cheap_checks()) + (1 if self.use_dl else 0)
         
-        # Run multiple checks
-        checks = {
-            "texture_analysis": self._check_texture_analysis(img_array),
-            "color_diversity": self._check_color_diversity(img_array),
-            "face_detection": self._check_face_detection(img_array),
-            "sharpness": self._check_sharpness(img_array),
-        }
+        checks: List[Dict[str, Dict[str, Any]]] = []
+        for img_array, gray in zip(arrays, grays):
+            checks.append(self._run_checks(img_array, gray, total_checks))
         
         if self.use_dl:
-            checks["deep_features"] = self._check_deep_features(img_array)
-        
-        # Aggregate results
-        passed_checks = sum(1 for result in checks.values() if result["passed"])
-        total_checks = len(checks)
-        confidence = passed_checks / total_checks
-        
-        # Determine if live
-        is_live = confidence >= 0.6  # At least 60% of checks must pass
-        
-        # Generate reason
-        failed_checks = [name for name, result in checks.items() if not result["passed"]]
-        if failed_checks:
-            reason = f"Failed: {', '.join(failed_checks)}"
-        else:
-            reason = "All liveness checks passed"
-        
-        return is_live, confidence, reason
+            pending = [
+                i
+                for i, frame_checks in enumerate(checks)
+                if not _rejected(frame_checks, total_checks)
+            ]
+            if pending:
+                deep = self._check_deep_features_batch([arrays[i] for i in pending])
+                for i, result in zip(pending, deep):
+                    checks[i]["deep_features"] = result
+        
+        return [_verdict(frame_checks, total_checks) for frame_checks in checks]
+
+    def _cheap_checks(self) -> List[Tuple[str, Callable[[np.ndarray, np.ndarray], Dict[str, Any]]]]:
+        # Cheapest first so a hopeless frame is rejected before the costly checks.
+        return [
+            ("sharpness", lambda img, gray: self._check_sharpness(gray)),
+            ("color_diversity", lambda img, gray: self._check_color_diversity(img)),
+            ("texture_analysis", lambda img, gray: self._check_texture_analysis(gray)),
+            ("face_detection", lambda img, gray: self._check_face_detection(gray)),
+        ]
+
+    def _run_checks(
+        self, img_array: np.ndarray, gray: np.ndarray, total_checks: int
+    ) -> Dict[str, Dict[str, Any]]:
+        results: Dict[str, Dict[str, Any]] = {}
+        for name, check in self._cheap_checks():
+            if _rejected(results, total_checks):
+                break
+            results[name] = check(img_array, gray)
+        return results
     
-    def _check_texture_analysis(self, img_array: np.ndarray) -> Dict[str, Any]:
+    def _check_texture_analysis(self, gray: np.ndarray) -> Dict[str, Any]:
         """
         Analyze image texture to detect screens/photos.
         Real faces have more texture variation than screens.
         """
-        
-        # Convert to grayscale
-        if len(img_array.shape) == 3:
-            gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-        else:
-            gray = img_array
-        
+
         # Calculate Local Binary Pattern (LBP) variance
         # Real faces have higher LBP variance
         lbp = self._calculate_lbp(gray)
@@ -108,23 +122,7 @@ class AdvancedLivenessDetector:
     
     def _calculate_lbp(self, gray: np.ndarray) -> np.ndarray:
         """Calculate Local Binary Pattern."""
-        lbp = np.zeros_like(gray, dtype=np.uint8)
-        
-        for i in range(1, gray.shape[0] - 1):
-            for j in range(1, gray.shape[1] - 1):
-                center = gray[i, j]
-                code = 0
-                code |= (gray[i-1, j-1] > center) << 0
-                code |= (gray[i-1, j] > center) << 1
-                code |= (gray[i-1, j+1] > center) << 2
-                code |= (gray[i, j+1] > center) << 3
-                code |= (gray[i+1, j+1] > center) << 4
-                code |= (gray[i+1, j] > center) << 5
-                code |= (gray[i+1, j-1] > center) << 6
-                code |= (gray[i, j-1] > center) << 7
-                lbp[i, j] = code
-        
-        return lbp
+        return calculate_lbp(gray)
     
     def _check_color_diversity(self, img_array: np.ndarray) -> Dict[str, Any]:
         """
@@ -156,17 +154,11 @@ class AdvancedLivenessDetector:
             "threshold": 5.0,
         }
     
-    def _check_face_detection(self, img_array: np.ndarray) -> Dict[str, Any]:
+    def _check_face_detection(self, gray: np.ndarray) -> Dict[str, Any]:
         """
         Detect face and check quality.
         """
-        
-        # Convert to grayscale for face detection
-        if len(img_array.shape) == 3:
-            gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-        else:
-            gray = img_array
-        
+
         # Detect faces
         faces = self.face_cascade.detectMultiScale(
             gray,
@@ -184,17 +176,11 @@ class AdvancedLivenessDetector:
             "expected": 1,
         }
     
-    def _check_sharpness(self, img_array: np.ndarray) -> Dict[str, Any]:
+    def _check_sharpness(self, gray: np.ndarray) -> Dict[str, Any]:
         """
         Check image sharpness. Blurry images suggest photo of photo.
         """
-        
-        # Convert to grayscale
-        if len(img_array.shape) == 3:
-            gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-        else:
-            gray = img_array
-        
+
         # Calculate Laplacian variance (measure of sharpness)
         laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
         
@@ -211,36 +197,119 @@ class AdvancedLivenessDetector:
         """
         Use deep learning features to detect spoofing.
         """
+        return self._check_deep_features_batch([img_array])[0]
+
+    def _check_deep_features_batch(self, img_arrays: Sequence[np.ndarray]) -> List[Dict[str, Any]]:
+        """`_check_deep_features` for several frames with one MobileNetV2 forward pass."""
         
         if not self.use_dl:
-            return {"passed": True, "note": "Deep learning not available"}
+            return [{"passed": True, "note": "Deep learning not available"} for _ in img_arrays]
         
         try:
-            # Resize to 224x224 for MobileNetV2
-            img_resized = cv2.resize(img_array, (224, 224))
+            # Resize to 224x224 RGB for MobileNetV2
+            img_batch = np.stack([cv2.resize(_to_rgb(img), (224, 224)) for img in img_arrays])
             
             # Preprocess
-            img_batch = np.expand_dims(img_resized, axis=0)
-            img_preprocessed = preprocess_input(img_batch)
+            img_preprocessed = mobilenet_v2.preprocess_input(img_batch.astype(np.float32))
             
             # Extract features
-            features = self.model.predict(img_preprocessed, verbose=0)[0]
-            
+            features = self.model.predict(img_preprocessed, verbose=0)
+        except Exception as e:
+            return [{"passed": True, "error": str(e)} for _ in img_arrays]
+
+        results = []
+        for row in features:
             # Calculate feature statistics
-            feature_mean = np.mean(features)
-            feature_std = np.std(features)
+            feature_mean = np.mean(row)
+            feature_std = np.std(row)
             
             # Real faces tend to have more diverse features
             # This is a simplified heuristic - in production, train a classifier
-            passed = feature_std > 0.5
-            
-            return {
-                "passed": passed,
-                "feature_mean": float(feature_mean),
-                "feature_std": float(feature_std),
-            }
-        except Exception as e:
-            return {"passed": True, "error": str(e)}
+            results.append(
+                {
+                    "passed": bool(feature_std > 0.5),
+                    "feature_mean": float(feature_mean),
+                    "feature_std": float(feature_std),
+                }
+            )
+        return results
+
+
+def calculate_lbp(gray: np.ndarray) -> np.ndarray:
+    """8-neighbour Local Binary Pattern computed with array shifts.
+
+    Bit order matches the former per-pixel loop (top-left neighbour is bit 0,
+    then clockwise); the one-pixel border stays 0.
+    """
+    lbp = np.zeros(gray.shape, dtype=np.uint8)
+    h, w = gray.shape[:2]
+    if h < 3 or w < 3:
+        return lbp
+
+    center = gray[1:-1, 1:-1]
+    codes = np.zeros(center.shape, dtype=np.uint8)
+    for bit, (di, dj) in enumerate(_LBP_OFFSETS):
+        neighbour = gray[1 + di : h - 1 + di, 1 + dj : w - 1 + dj]
+        codes |= (neighbour > center).astype(np.uint8) << bit
+    lbp[1:-1, 1:-1] = codes
+    return lbp
+
+
+_LBP_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1))
+
+_cascade_local = threading.local()
+
+
+def _get_face_cascade() -> "cv2.CascadeClassifier":
+    # CascadeClassifier is not safe to share across threads; load one per thread.
+    cascade = getattr(_cascade_local, "cascade", None)
+    if cascade is None:
+        cascade_path = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+        cascade = cv2.CascadeClassifier(cascade_path)
+        _cascade_local.cascade = cascade
+    return cascade
+
+
+def _to_gray(img_array: np.ndarray) -> np.ndarray:
+    if len(img_array.shape) == 3:
+        return cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
+    return img_array
+
+
+def _to_rgb(img_array: np.ndarray) -> np.ndarray:
+    if len(img_array.shape) == 2:
+        return cv2.cvtColor(img_array, cv2.COLOR_GRAY2RGB)
+    return img_array[:, :, :3]
+
+
+_LIVE_RATIO = 0.6  # At least 60% of checks must pass
+
+
+def _rejected(results: Dict[str, Dict[str, Any]], total_checks: int) -> bool:
+    """True once too many checks failed for the frame to still reach `_LIVE_RATIO`."""
+    failed = sum(1 for r in results.values() if not r["passed"])
+    return (total_checks - failed) / total_checks < _LIVE_RATIO
+
+
+def _verdict(results: Dict[str, Dict[str, Any]], total_checks: int) -> Tuple[bool, float, str]:
+    # Aggregate results; checks skipped after an early rejection count as not passed.
+    passed_checks = sum(1 for result in results.values() if result["passed"])
+    confidence = passed_checks / total_checks
+
+    # Determine if live
+    is_live = confidence >= _LIVE_RATIO
+
+    # Generate reason
+    failed_checks = [name for name, result in results.items() if not result["passed"]]
+    if failed_checks:
+        reason = f"Failed: {', '.join(failed_checks)}"
+        skipped = total_checks - len(results)
+        if skipped:
+            reason += f" ({skipped} check{'s' if skipped > 1 else ''} skipped)"
+    else:
+        reason = "All liveness checks passed"
+
+    return is_live, confidence, reason
 
 
 # Global instance
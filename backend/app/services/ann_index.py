@@ -0,0 +1,130 @@
+"""In-process nearest-neighbour indexes over unit-norm face embeddings.
+
+Used by 1:N identification (`app.services.face_identify`) when searching the
+memory-mapped gallery, and as the reference implementation in tests where
+pgvector is not available.
+
+- `ExactIndex`: one matrix product over every row. Used for class rosters and
+  small galleries, where it is both exact and fast enough.
+- `IVFFlatIndex`: spherical k-means coarse quantizer (`nlist` centroids) with
+  inverted lists; a query scans the rows of its `nprobe` closest lists only.
+  Same idea as pgvector's `ivfflat`, kept in NumPy so it can be built from the
+  gallery snapshot without a database round trip.
+
+Both return `(scores, rows)`: cosine similarities in descending order and the
+matching row numbers of the matrix they were built on.
+"""
+
+from __future__ import annotations
+
+import math
+
+import numpy as np
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the `k` highest scores, best first."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < scores.shape[0]:
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(scores.shape[0])
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+class ExactIndex:
+    def __init__(self, embeddings: np.ndarray):
+        self.embeddings = embeddings
+
+    @property
+    def size(self) -> int:
+        return int(self.embeddings.shape[0])
+
+    def search(self, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        if self.size == 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        scores = self.embeddings @ np.asarray(query, dtype=np.float32)
+        rows = _top_k(scores, k)
+        return scores[rows], rows
+
+
+class IVFFlatIndex:
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        *,
+        nlist: int | None = None,
+        nprobe: int = 32,
+        iterations: int = 10,
+        seed: int = 0,
+    ):
+        self.embeddings = embeddings
+        n = int(embeddings.shape[0])
+        self.nlist = max(1, min(n, nlist or int(math.sqrt(n)) or 1))
+        self.nprobe = max(1, min(self.nlist, int(nprobe)))
+        self.centroids = self._train(iterations, seed)
+
+        assign = self._assign(embeddings)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=self.nlist)
+        self._rows = order.astype(np.int64)
+        self._offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+    @property
+    def size(self) -> int:
+        return int(self.embeddings.shape[0])
+
+    def _train(self, iterations: int, seed: int) -> np.ndarray:
+        rng = np.random.default_rng(seed)
+        n = self.size
+        # Training on a sample keeps a rebuild of a large gallery sub-second.
+        sample_size = min(n, max(self.nlist * 64, 4096))
+        sample = np.asarray(self.embeddings[rng.choice(n, sample_size, replace=False)])
+        centroids = sample[rng.choice(sample_size, self.nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(self.nlist):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-8
+        return centroids
+
+    def _assign(self, rows: np.ndarray, chunk: int = 65536) -> np.ndarray:
+        out = np.empty(rows.shape[0], dtype=np.int64)
+        for start in range(0, rows.shape[0], chunk):
+            out[start : start + chunk] = np.argmax(
+                rows[start : start + chunk] @ self.centroids.T, axis=1
+            )
+        return out
+
+    def search(
+        self, query: np.ndarray, k: int, *, nprobe: int | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        if self.size == 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        query = np.asarray(query, dtype=np.float32)
+        probe = max(1, min(self.nlist, nprobe or self.nprobe))
+        lists = _top_k(self.centroids @ query, probe)
+        candidates = np.concatenate(
+            [self._rows[self._offsets[c] : self._offsets[c + 1]] for c in lists.tolist()]
+        )
+        scores = self.embeddings[candidates] @ query
+        best = _top_k(scores, k)
+        return scores[best], candidates[best]
+
+
+def build_index(
+    embeddings: np.ndarray, *, min_rows: int = 100000, nlist: int | None = None, nprobe: int = 32
+) -> ExactIndex | IVFFlatIndex:
+    """Exact search below `min_rows`, IVF-flat above it.
+
+    An exact scan of 100k rows is a few milliseconds, so IVF (and its recall
+    loss) is only worth it for larger galleries.
+    """
+    if embeddings.shape[0] < max(1, min_rows):
+        return ExactIndex(embeddings)
+    return IVFFlatIndex(embeddings, nlist=nlist, nprobe=nprobe)
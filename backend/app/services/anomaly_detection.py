@@ -7,8 +7,6 @@ from datetime import datetime, timedelta
 from typing import Any, Dict, List
 
 import numpy as np
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
 from sqlalchemy.orm import Session
 
 from app.models.attendance import AttendanceRecord
@@ -19,6 +17,10 @@ class AnomalyDetectionService:
     """ML-based fraud and anomaly detection."""
     
     def __init__(self):
+        # scikit-learn is only imported by services that use it.
+        from sklearn.ensemble import IsolationForest
+        from sklearn.preprocessing import StandardScaler
+
         self.model = IsolationForest(
             contamination=0.1,  # Expect 10% anomalies
             random_state=42,
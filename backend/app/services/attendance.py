@@ -1,13 +1,21 @@
 from datetime import datetime, timedelta
 from decimal import Decimal
 
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 
+from app.models.absence import Absence  # N8N integration
 from app.models.attendance import AttendanceRecord
 from app.models.session import Session as SessionModel
 from app.models.student import Student
-from app.models.absence import Absence  # N8N integration
 from app.schemas.attendance import AttendanceCreate, AttendanceUpdate
+from app.services.attendance_counters import (
+    Counters,
+    apply_delta,
+    apply_deltas,
+    contribution,
+    rebuild_counters,
+)
 
 
 class AttendanceService:
@@ -29,24 +37,18 @@ class AttendanceService:
             AttendanceRecord: Created or existing attendance record
             
         Note:
-            If attendance already exists for this session/student, returns existing record.
+            If attendance already exists for this session/student, returns existing record
+            (`ConflictPolicy.KEEP_FIRST`, see app/services/attendance_upsert.py).
         """
-        # Check if already marked
-        existing = (
-            db.query(AttendanceRecord)
-            .filter(
-                AttendanceRecord.session_id == session_id,
-                AttendanceRecord.student_id == student_id,
-            )
-            .first()
-        )
-        if existing:
-            return existing
+        from app.services.attendance_upsert import ConflictPolicy, upsert_attendance
 
-        record = AttendanceRecord(
+        # ⭐ AUTO-CALCULATE ABSENCE HOURS, ATTENDANCE RATE & ALERT LEVEL (same transaction)
+        result = upsert_attendance(
+            db,
             session_id=session_id,
             student_id=student_id,
             status=payload.status,
+            policy=ConflictPolicy.KEEP_FIRST,
             marked_via=payload.marked_via or "manual",
             facial_confidence=payload.facial_confidence,
             verification_photo_path=payload.verification_photo_path,
@@ -58,16 +60,17 @@ class AttendanceService:
             ip_address=payload.ip_address,
             location_data=payload.location_data,
         )
-        db.add(record)
+        record = result.record
         db.commit()
         db.refresh(record)
         
-        # ⭐ AUTO-CALCULATE ABSENCE HOURS, ATTENDANCE RATE & ALERT LEVEL
-        AttendanceService._update_student_stats(db, student_id, session_id, payload.status)
-        
         # ⭐ N8N INTEGRATION: Log absence for email notification workflow
         # Only if marked via manual/auto_confirmation (when trainer confirms session)
-        if payload.status == "absent" and payload.marked_via in ["auto_confirmation", "manual"]:
+        if (
+            result.created
+            and payload.status == "absent"
+            and payload.marked_via in ["auto_confirmation", "manual"]
+        ):
             AttendanceService._log_absence_for_n8n(db, student_id, session_id)
         
         return record
@@ -90,22 +93,27 @@ class AttendanceService:
         if not record:
             return None
 
-        # Track if status changed for stats recalculation
-        status_changed = False
-        old_status = record.status
-        
+        # Track the record's previous contribution for stats recalculation
+        previous = (record.status, record.late_minutes or 0)
+
         for field, value in payload.dict(exclude_unset=True).items():
-            if field == "status" and value != old_status:
-                status_changed = True
             setattr(record, field, value)
 
+        # ⭐ Recalculate stats if status or late minutes changed (same transaction)
+        if (record.status, record.late_minutes or 0) != previous:
+            AttendanceService._update_student_stats(
+                db,
+                record.student_id,
+                record.session_id,
+                record.status,
+                late_minutes=record.late_minutes,
+                previous=previous,
+                commit=False,
+            )
+
         db.commit()
         db.refresh(record)
-        
-        # ⭐ Recalculate stats if status changed
-        if status_changed:
-            AttendanceService._update_student_stats(db, record.student_id, record.session_id, record.status)
-        
+
         return record
 
     @staticmethod
@@ -222,69 +230,120 @@ class AttendanceService:
         return records
 
     @staticmethod
-    def _update_student_stats(db: Session, student_id: int, session_id: int, status: str):
+    def _update_student_stats(
+        db: Session,
+        student_id: int,
+        session_id: int,
+        status: str,
+        *,
+        late_minutes: int | None = 0,
+        previous: tuple[str, int] | None = None,
+        commit: bool = True,
+    ):
         """Auto-calculate absence hours, attendance rate, and alert level.
-        
+
         This method implements three key automations:
         1. Auto-Calculate Absence Hours: Adds session duration when absent
         2. Auto-Update Attendance Rate: Recalculates percentage after each attendance
         3. Auto-Escalate Alert Level: Updates alert status based on thresholds
+
+        The record's contribution (minus `previous`, its `(status, late_minutes)`
+        before an update) is added to the student's counters as an SQL delta,
+        and the statistics are derived from the counters in O(1).
         """
         student = db.query(Student).filter(Student.id == student_id).first()
         if not student:
             return
 
-        # 1. AUTO-CALCULATE ABSENCE HOURS ⭐
-        if status == "absent":
+        duration_minutes = None
+        if "absent" in (status, previous[0] if previous else None):
             session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
-            if session and session.duration_minutes:
-                # Convert minutes to hours and add to total
-                absence_hours = session.duration_minutes / 60.0
-                student.total_absence_hours = (student.total_absence_hours or 0) + int(absence_hours)
-        
-        # Also track late minutes
-        if status == "late":
-            # Late minutes are already in the attendance record, just aggregate
-            total_late = db.query(AttendanceRecord).filter(
-                AttendanceRecord.student_id == student_id,
-                AttendanceRecord.status == "late"
-            ).all()
-            student.total_late_minutes = sum(r.late_minutes or 0 for r in total_late)
-
-        # 2. AUTO-UPDATE ATTENDANCE RATE ⭐
-        # Get all attendance records for this student
-        all_records = db.query(AttendanceRecord).filter(
-            AttendanceRecord.student_id == student_id
-        ).all()
-        
-        total_sessions = len(all_records)
+            duration_minutes = session.duration_minutes if session else None
+
+        delta = contribution(status, late_minutes, duration_minutes)
+        if previous:
+            delta = delta - contribution(previous[0], previous[1], duration_minutes)
+        AttendanceService._apply_counters(student, apply_delta(db, student_id, delta))
+
+        if commit:
+            db.commit()
+            db.refresh(student)
+
+    @staticmethod
+    def _apply_student_deltas(db: Session, deltas: dict[int, Counters]):
+        """`_update_student_stats` for many students: one counters upsert, one bulk `UPDATE students`."""
+        if deltas:
+            existing = {sid for (sid,) in db.query(Student.id).filter(Student.id.in_(list(deltas)))}
+            deltas = {sid: delta for sid, delta in deltas.items() if sid in existing}
+        if not deltas:
+            return
+        counters = apply_deltas(db, deltas)
+        db.execute(
+            update(Student),
+            [{"id": sid, **AttendanceService._derived_stats(c)} for sid, c in counters.items()],
+        )
+
+    @staticmethod
+    def _apply_counters(student: Student, counters: Counters):
+        """Derive the student's statistics from their attendance counters."""
+        for field, value in AttendanceService._derived_stats(counters).items():
+            setattr(student, field, value)
+
+    @staticmethod
+    def _derived_stats(counters: Counters) -> dict:
+        """Student column values derived from attendance counters (steps 1 to 3 above)."""
+        attendance_rate, alert_level = AttendanceService._rate_and_alert(
+            counters.total_count, counters.attended
+        )
+        return {
+            "total_absence_hours": counters.absence_hours,
+            "total_late_minutes": counters.late_minutes,
+            "attendance_rate": attendance_rate,
+            "alert_level": alert_level,
+        }
+
+    @staticmethod
+    def _rate_and_alert(total_sessions: int, present_count: int) -> tuple[Decimal, str]:
+        """Attendance rate and alert level from record counts (steps 2 and 3 above)."""
         if total_sessions > 0:
-            # Count present (including late and excused as present)
-            present_count = sum(
-                1 for r in all_records 
-                if r.status in ["present", "late", "excused"]
-            )
-            attendance_rate = (present_count / total_sessions) * 100
-            student.attendance_rate = Decimal(str(round(attendance_rate, 2)))
+            attendance_rate = Decimal(str(round((present_count / total_sessions) * 100, 2)))
         else:
-            student.attendance_rate = Decimal("100.00")
+            attendance_rate = Decimal("100.00")
 
         # 3. AUTO-ESCALATE ALERT LEVEL ⭐
         # Calculate absence percentage (inverse of attendance rate)
-        absence_rate = 100 - float(student.attendance_rate or 100)
-        
-        # Update alert level based on thresholds
+        absence_rate = 100 - float(attendance_rate)
+
+        # Alert level based on thresholds
         if absence_rate < 15:
-            student.alert_level = "none"  # Green (OK)
+            return attendance_rate, "none"  # Green (OK)
         elif 15 <= absence_rate < 20:
-            student.alert_level = "warning"  # Yellow (Warning)
+            return attendance_rate, "warning"  # Yellow (Warning)
         elif 20 <= absence_rate < 25:
-            student.alert_level = "critical"  # Orange (Critical)
+            return attendance_rate, "critical"  # Orange (Critical)
         else:  # >= 25%
-            student.alert_level = "failing"  # Red (Failing)
+            return attendance_rate, "failing"  # Red (Failing)
 
-        db.commit()
-        db.refresh(student)
+    @staticmethod
+    def _refresh_attendance_rates(db: Session, student_ids: list[int] | None, commit: bool = True):
+        """Rebuild the counters and statistics of many students at once.
+
+        One grouped query over their records instead of a delta per record;
+        used, with `student_ids=None` (every student), by the reconciliation
+        job. Bulk marking paths apply deltas (`_apply_student_deltas`).
+        """
+        if student_ids is not None and not student_ids:
+            return
+
+        counters = rebuild_counters(db, student_ids)
+        students = db.query(Student)
+        if student_ids is not None:
+            students = students.filter(Student.id.in_(student_ids))
+        for student in students.all():
+            AttendanceService._apply_counters(student, counters.get(student.id, Counters()))
+
+        if commit:
+            db.commit()
 
     @staticmethod
     def _log_absence_for_n8n(db: Session, student_id: int, session_id: int):
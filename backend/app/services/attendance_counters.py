@@ -0,0 +1,178 @@
+"""Per-student attendance counters behind the derived student statistics.
+
+`students.attendance_rate`, `alert_level`, `total_absence_hours` and
+`total_late_minutes` used to be recomputed on every mark by loading all of
+the student's attendance records, so each check-in cost more as the
+student's history grew. They are now derived in O(1) from the student's row
+of `student_attendance_counters`:
+
+- writers pass each record's contribution (`contribution`), minus its
+  previous contribution on an update, to `apply_delta`. That is one
+  `INSERT ... ON CONFLICT DO UPDATE SET n = n + delta ... RETURNING` in the
+  writer's transaction. Concurrent writes for one student serialize on the
+  row, so no increment is lost.
+- bulk writers pass the deltas of many students to `apply_deltas`.
+- `rebuild_counters` recomputes them from `attendance_records` with one
+  grouped query. `scripts/reconcile_attendance_counters.py` uses it to repair
+  drift from writes made outside the service paths (SQL consoles, imports).
+
+Every record counts toward the total whatever its status; `present`, `late`
+and `excused` count as attended. An absence adds its session's duration in
+whole hours (`duration_minutes // 60`), and a late arrival adds its
+`late_minutes`.
+"""
+
+from __future__ import annotations
+
+from dataclasses import asdict, astuple, dataclass, fields
+from typing import Iterable
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app.db.upsert import dialect_insert
+from app.models.attendance import AttendanceRecord
+from app.models.session import Session as SessionModel
+from app.models.student import Student
+from app.models.student_attendance_counters import StudentAttendanceCounters
+
+_STATUS_COUNTERS = {
+    "present": "present_count",
+    "late": "late_count",
+    "absent": "absent_count",
+    "excused": "excused_count",
+}
+# Rows per upsert statement (keeps bind parameters under driver limits).
+_UPSERT_CHUNK = 1000
+
+
+@dataclass(frozen=True)
+class Counters:
+    total_count: int = 0
+    present_count: int = 0
+    late_count: int = 0
+    absent_count: int = 0
+    excused_count: int = 0
+    late_minutes: int = 0
+    absence_hours: int = 0
+
+    @property
+    def attended(self) -> int:
+        return self.present_count + self.late_count + self.excused_count
+
+    def __add__(self, other: Counters) -> Counters:
+        return Counters(*(a + b for a, b in zip(astuple(self), astuple(other))))
+
+    def __sub__(self, other: Counters) -> Counters:
+        return Counters(*(a - b for a, b in zip(astuple(self), astuple(other))))
+
+
+COUNTER_COLUMNS = [f.name for f in fields(Counters)]
+
+
+def contribution(
+    status: str, late_minutes: int | None = 0, duration_minutes: int | None = None
+) -> Counters:
+    """What one attendance record adds to its student's counters."""
+    values = {"total_count": 1}
+    if status in _STATUS_COUNTERS:
+        values[_STATUS_COUNTERS[status]] = 1
+    if status == "late":
+        values["late_minutes"] = late_minutes or 0
+    if status == "absent":
+        values["absence_hours"] = (duration_minutes or 0) // 60
+    return Counters(**values)
+
+
+def _upsert(db: Session, rows: list[dict], *, increment: bool):
+    table = StudentAttendanceCounters.__table__
+    stmt = dialect_insert(db)(table).values(rows)
+    set_ = {
+        name: table.c[name] + stmt.excluded[name] if increment else stmt.excluded[name]
+        for name in COUNTER_COLUMNS
+    }
+    set_["updated_at"] = func.now()
+    return stmt.on_conflict_do_update(index_elements=[table.c.student_id], set_=set_)
+
+
+def apply_delta(db: Session, student_id: int, delta: Counters) -> Counters:
+    """Add `delta` to the student's counters (creating them); returns the new values."""
+    return apply_deltas(db, {student_id: delta})[student_id]
+
+
+def apply_deltas(db: Session, deltas: dict[int, Counters]) -> dict[int, Counters]:
+    """`apply_delta` for many students in one statement per chunk.
+
+    Rows go in student order, so concurrent batches lock them in the same order.
+    """
+    table = StudentAttendanceCounters.__table__
+    rows = [{"student_id": sid, **asdict(delta)} for sid, delta in sorted(deltas.items())]
+    counters: dict[int, Counters] = {}
+    for start in range(0, len(rows), _UPSERT_CHUNK):
+        stmt = _upsert(db, rows[start : start + _UPSERT_CHUNK], increment=True).returning(
+            table.c.student_id, *(table.c[name] for name in COUNTER_COLUMNS)
+        )
+        for sid, *values in db.execute(stmt).all():
+            counters[int(sid)] = Counters(*(int(v) for v in values))
+    return counters
+
+
+def rebuild_counters(db: Session, student_ids: Iterable[int] | None = None) -> dict[int, Counters]:
+    """Recompute the counters of `student_ids` (default: every student) from their records.
+
+    Students left without records lose their counters row. Returns the
+    counters of the students that have records; records of deleted students
+    are skipped.
+    """
+    status = AttendanceRecord.status
+
+    def count(value: str):
+        return func.sum(case((status == value, 1), else_=0))
+
+    query = (
+        db.query(
+            AttendanceRecord.student_id,
+            func.count(AttendanceRecord.id),
+            count("present"),
+            count("late"),
+            count("absent"),
+            count("excused"),
+            func.sum(
+                case((status == "late", func.coalesce(AttendanceRecord.late_minutes, 0)), else_=0)
+            ),
+            func.sum(
+                case(
+                    (status == "absent", func.coalesce(SessionModel.duration_minutes, 0) // 60),
+                    else_=0,
+                )
+            ),
+        )
+        .join(Student, Student.id == AttendanceRecord.student_id)
+        .outerjoin(SessionModel, SessionModel.id == AttendanceRecord.session_id)
+        .group_by(AttendanceRecord.student_id)
+    )
+    stale = db.query(StudentAttendanceCounters).filter(
+        ~StudentAttendanceCounters.student_id.in_(db.query(AttendanceRecord.student_id).distinct())
+    )
+    if student_ids is not None:
+        student_ids = list(student_ids)
+        if not student_ids:
+            return {}
+        query = query.filter(AttendanceRecord.student_id.in_(student_ids))
+        stale = stale.filter(StudentAttendanceCounters.student_id.in_(student_ids))
+
+    counters = {int(sid): Counters(*(int(v or 0) for v in values)) for sid, *values in query.all()}
+    rows = [{"student_id": sid, **asdict(c)} for sid, c in counters.items()]
+    for start in range(0, len(rows), _UPSERT_CHUNK):
+        db.execute(_upsert(db, rows[start : start + _UPSERT_CHUNK], increment=False))
+    stale.delete(synchronize_session=False)
+    return counters
+
+
+def load_counters(db: Session, student_ids: Iterable[int] | None = None) -> dict[int, Counters]:
+    """Stored counters of `student_ids` (default: all)."""
+    table = StudentAttendanceCounters.__table__
+    query = db.query(table.c.student_id, *(table.c[name] for name in COUNTER_COLUMNS))
+    if student_ids is not None:
+        query = query.filter(table.c.student_id.in_(list(student_ids)))
+    return {int(sid): Counters(*(int(v) for v in values)) for sid, *values in query.all()}
@@ -0,0 +1,170 @@
+"""One race-free write path for marking attendance.
+
+Every marking path (manual marking, QR, self check-in, Teams, kiosk sync,
+group photos) used to check for an existing `AttendanceRecord` and then
+insert one. Two check-ins of the same student landing together both passed
+the check, and the second insert failed on the `(session_id, student_id)`
+unique constraint with a 500 (or, in bulk paths, a 409 for the whole batch).
+
+They now write through `upsert_attendance`, which starts with
+`INSERT ... ON CONFLICT DO NOTHING RETURNING`, so exactly one writer creates
+the record and the others learn that it exists without an error. What a
+losing writer does with the existing record is its `ConflictPolicy`:
+
+- `KEEP_FIRST`: leave it (manual marking, QR);
+- `KEEP_BEST`: replace it if the new status ranks higher
+  (absent < excused < late < present), e.g. a check-in after the trainer
+  marked the student absent (self check-in, Teams);
+- `OVERWRITE`: replace it with the new values.
+
+Replacing locks the row (`SELECT ... FOR UPDATE`) before reading it, so the
+counters delta is computed against the status that is actually replaced.
+`insert_attendance_batch` is the bulk `KEEP_FIRST` variant used by kiosk
+sync and group photos. Neither commits: the caller commits the record along
+with its own rows (check-ins, logs).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from enum import Enum
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.db.upsert import dialect_insert
+from app.models.attendance import AttendanceRecord
+from app.models.session import Session as SessionModel
+from app.services.attendance import AttendanceService
+from app.services.attendance_counters import contribution
+
+STATUS_RANK = {"absent": 0, "excused": 1, "late": 2, "present": 3}
+_KEY = ["session_id", "student_id"]
+
+
+class ConflictPolicy(str, Enum):
+    KEEP_FIRST = "keep_first"
+    KEEP_BEST = "keep_best"
+    OVERWRITE = "overwrite"
+
+
+@dataclass
+class UpsertResult:
+    record: AttendanceRecord
+    created: bool
+    changed: bool = False
+    previous_status: str | None = None
+
+    @property
+    def applied(self) -> bool:
+        """Whether this write created or changed the record."""
+        return self.created or self.changed
+
+
+def _replaces(policy: ConflictPolicy, new_status: str, old_status: str) -> bool:
+    if policy is ConflictPolicy.OVERWRITE:
+        return True
+    if policy is ConflictPolicy.KEEP_BEST:
+        return STATUS_RANK.get(new_status, -1) > STATUS_RANK.get(old_status, -1)
+    return False
+
+
+def upsert_attendance(
+    db: Session,
+    *,
+    session_id: int,
+    student_id: int,
+    status: str,
+    policy: ConflictPolicy = ConflictPolicy.KEEP_FIRST,
+    **fields,
+) -> UpsertResult:
+    """Create the student's record for the session, or resolve the conflict by `policy`.
+
+    `fields` are the other `AttendanceRecord` columns. The student's counters
+    and statistics are updated in the same transaction; nothing is committed.
+    """
+    values = {"session_id": session_id, "student_id": student_id, "status": status, **fields}
+    for _ in range(2):
+        stmt = (
+            dialect_insert(db)(AttendanceRecord)
+            .values(values)
+            .on_conflict_do_nothing(index_elements=_KEY)
+            .returning(AttendanceRecord)
+        )
+        record = db.scalars(stmt).first()
+        if record is not None:
+            AttendanceService._update_student_stats(
+                db, student_id, session_id, status, late_minutes=record.late_minutes, commit=False
+            )
+            return UpsertResult(record, created=True)
+
+        existing = (
+            db.query(AttendanceRecord)
+            .filter(
+                AttendanceRecord.session_id == session_id, AttendanceRecord.student_id == student_id
+            )
+            .with_for_update()
+            .populate_existing()
+            .one_or_none()
+        )
+        if existing is None:
+            continue  # deleted since the insert; try again
+
+        previous = (existing.status, existing.late_minutes or 0)
+        if not _replaces(policy, status, existing.status):
+            return UpsertResult(existing, created=False, previous_status=previous[0])
+
+        changed = False
+        for field, value in values.items():
+            if getattr(existing, field) != value:
+                setattr(existing, field, value)
+                changed = True
+        if (existing.status, existing.late_minutes or 0) != previous:
+            db.flush()
+            AttendanceService._update_student_stats(
+                db,
+                student_id,
+                session_id,
+                existing.status,
+                late_minutes=existing.late_minutes,
+                previous=previous,
+                commit=False,
+            )
+        return UpsertResult(existing, created=False, changed=changed, previous_status=previous[0])
+
+    raise HTTPException(
+        status_code=409, detail="Attendance record changed concurrently; please retry"
+    )
+
+
+def insert_attendance_batch(db: Session, session_id: int, rows: list[dict]) -> list[int]:
+    """Insert the records of `rows` that do not exist yet (`KEEP_FIRST`); returns their student ids.
+
+    Each row holds `student_id`, `status` and other `AttendanceRecord`
+    columns, with the same keys in every row. One statement for the records,
+    one counters upsert and one bulk `UPDATE students` for the statistics.
+    """
+    if not rows:
+        return []
+    stmt = (
+        dialect_insert(db)(AttendanceRecord)
+        .values([{**row, "session_id": session_id} for row in rows])
+        .on_conflict_do_nothing(index_elements=_KEY)
+        .returning(
+            AttendanceRecord.student_id, AttendanceRecord.status, AttendanceRecord.late_minutes
+        )
+    )
+    inserted = db.execute(stmt).all()
+    if not inserted:
+        return []
+
+    duration_minutes = None
+    if any(status == "absent" for _, status, _ in inserted):
+        duration_minutes = (
+            db.query(SessionModel.duration_minutes).filter(SessionModel.id == session_id).scalar()
+        )
+    AttendanceService._apply_student_deltas(
+        db,
+        {int(sid): contribution(status, late, duration_minutes) for sid, status, late in inserted},
+    )
+    return sorted(int(sid) for sid, _, _ in inserted)
@@ -0,0 +1,207 @@
+"""Single-pass analysis of a self check-in photo: liveness, quality and embedding.
+
+Every check (liveness heuristics, quality gates, embedding) reads the same
+`FaceFrame`, so the photo is decoded once and the face detector runs once per
+request. The liveness face checks use the InsightFace detections instead of a
+separate Haar cascade pass.
+
+`analyze_checkin_images` runs on the face inference workers
+(`face_inference.analyze_checkin_async`); the embeddings of a batch of photos
+are computed in one recognition forward pass, overlapped with the liveness
+stage, and the per-stage timings are returned with every result.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Sequence
+
+import numpy as np
+
+from app.services.face_engine import (
+    FaceEmbeddingResult,
+    FaceFrame,
+    FaceQualityMetrics,
+    embed_frames_batch,
+)
+
+# Liveness stage of `analyze_checkin_images`; one pool per inference worker process.
+_liveness_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="liveness")
+
+
+@dataclass(frozen=True)
+class CheckinAnalysis:
+    is_live: bool
+    liveness_confidence: float
+    liveness_reason: str
+    embedding: np.ndarray | None
+    metrics: FaceQualityMetrics | None
+    failure_reason: str | None = None
+    # Per-stage wall time of the job that produced this analysis (shared by a batch).
+    timings: dict = field(default_factory=dict)
+
+
+def assess_liveness(frame: FaceFrame) -> tuple[bool, float, str]:
+    """
+    Enhanced liveness detection - detects photos, screenshots, deepfakes.
+
+    Returns: (is_live, confidence, reason)
+    """
+    try:
+        # Ensure minimum size
+        if frame.height < 100 or frame.width < 100:
+            return False, 0.0, "Image too small - minimum 100x100 pixels required"
+
+        gray = frame.gray
+
+        # Check overall brightness first
+        mean_brightness = frame.brightness
+        if mean_brightness < 20:
+            return False, 0.1, "Image too dark - please improve lighting"
+        if mean_brightness > 245:
+            return False, 0.1, "Image overexposed - reduce lighting"
+
+        # Check 1: Laplacian variance (edge sharpness) - RELAXED
+        laplacian_var = frame.blur_score
+
+        # More lenient thresholds for poor lighting conditions
+        if laplacian_var < 10:
+            return False, 0.1, "Image too blurry - ensure camera is focused"
+        if laplacian_var > 2000:
+            return False, 0.2, "Image suspiciously sharp - possible screenshot"
+
+        # Check 2: Face detection (shared with quality gates and embedding)
+        if frame.num_faces == 0:
+            return False, 0.15, "No face detected - ensure good lighting and face the camera"
+        if frame.num_faces > 1:
+            return False, 0.2, "Multiple faces detected - only one person allowed"
+
+        # Check 3: Face size validation - RELAXED
+        x, y, w, h = frame.face_box(0)
+        img_height, img_width = gray.shape
+        face_ratio = (w * h) / (img_width * img_height)
+
+        if face_ratio < 0.03:  # More lenient
+            return False, 0.3, "Face too small - move closer to camera"
+        if face_ratio > 0.9:  # More lenient
+            return False, 0.25, "Face too large - move back from camera"
+
+        # Check 4: Basic lighting validation on face region
+        face_roi = gray[y : y + h, x : x + w]
+        face_brightness_std = np.std(face_roi)
+        face_mean_brightness = np.mean(face_roi)
+
+        if face_mean_brightness < 30:
+            return False, 0.35, "Face too dark - please improve lighting"
+        if face_brightness_std < 10:
+            return False, 0.35, "Very uniform lighting - possible flat photo"
+
+        # Calculate overall confidence - RELAXED scoring
+        quality_score = min(100, max(10, laplacian_var)) / 100.0
+        size_score = 1.0 if 0.05 < face_ratio < 0.8 else 0.6
+        lighting_score = min(80, max(10, face_brightness_std)) / 80.0
+        brightness_score = min(200, max(30, face_mean_brightness)) / 200.0
+
+        confidence = float(
+            quality_score * 0.30
+            + size_score * 0.25
+            + lighting_score * 0.25
+            + brightness_score * 0.20
+        )
+
+        # RELAXED threshold: 0.40 instead of 0.60
+        if confidence < 0.40:
+            return (
+                False,
+                confidence,
+                f"Liveness confidence too low: {confidence:.2f} - improve lighting and camera quality",
+            )
+
+        return True, confidence, "Liveness checks passed"
+
+    except Exception as e:
+        # For debugging, be more lenient with errors
+        return False, 0.0, f"Liveness error: {str(e)}"
+
+
+def _liveness_stage(
+    frames: Sequence[FaceFrame | None], rejected: list[threading.Event]
+) -> tuple[list[tuple[bool, float, str]], float]:
+    start = time.perf_counter()
+    results = []
+    for frame, flag in zip(frames, rejected):
+        result = (
+            assess_liveness(frame)
+            if frame is not None
+            else (False, 0.0, "Liveness error: invalid image")
+        )
+        if not result[0]:
+            flag.set()
+        results.append(result)
+    return results, (time.perf_counter() - start) * 1000.0
+
+
+def analyze_checkin_images(
+    images: Sequence[bytes],
+    stop_on_liveness_failure: bool | Sequence[bool] = False,
+) -> list[CheckinAnalysis]:
+    """Liveness + quality + embedding for each photo, one decode and detection each.
+
+    Liveness runs on a helper thread while this thread runs detection and the
+    recognition pass (OpenCV and ONNX Runtime release the GIL, so the two
+    overlap). For frames with `stop_on_liveness_failure`, a liveness rejection
+    that lands before the recognition pass skips it (`liveness_failed`).
+    """
+    started = time.perf_counter()
+    if isinstance(stop_on_liveness_failure, bool):
+        stop_on_liveness_failure = [stop_on_liveness_failure] * len(images)
+
+    frames: list[FaceFrame | None] = []
+    for image_bytes in images:
+        try:
+            frames.append(FaceFrame.from_bytes(image_bytes))
+        except Exception:
+            frames.append(None)
+    decode_ms = (time.perf_counter() - started) * 1000.0
+
+    rejected = [threading.Event() for _ in frames]
+    liveness_future = _liveness_pool.submit(_liveness_stage, frames, rejected)
+
+    def skip(idx: int) -> str | None:
+        if stop_on_liveness_failure[idx] and rejected[idx].is_set():
+            return "liveness_failed"
+        return None
+
+    recognition_start = time.perf_counter()
+    embeddings: list[FaceEmbeddingResult] = embed_frames_batch(frames, skip=skip)
+    recognition_ms = (time.perf_counter() - recognition_start) * 1000.0
+
+    liveness, liveness_ms = liveness_future.result()
+    timings = {
+        "decode_ms": round(decode_ms, 2),
+        "liveness_ms": round(liveness_ms, 2),
+        "recognition_ms": round(recognition_ms, 2),
+        "total_ms": round((time.perf_counter() - started) * 1000.0, 2),
+        "batch_size": len(images),
+    }
+    return [
+        CheckinAnalysis(
+            is_live=live,
+            liveness_confidence=confidence,
+            liveness_reason=reason,
+            embedding=result.embedding,
+            metrics=result.metrics,
+            failure_reason=result.reason,
+            timings=timings,
+        )
+        for (live, confidence, reason), result in zip(liveness, embeddings)
+    ]
+
+
+def analyze_checkin_image(
+    image_bytes: bytes, stop_on_liveness_failure: bool = False
+) -> CheckinAnalysis:
+    return analyze_checkin_images([image_bytes], stop_on_liveness_failure)[0]
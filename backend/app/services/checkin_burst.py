@@ -0,0 +1,145 @@
+"""Burst self check-in: a few frames, decided as soon as the evidence suffices.
+
+One still frame is weak evidence for both checks. `assess_liveness` is a set
+of heuristics (sharpness, face-ROI contrast), and one similarity can land
+either side of the threshold. A burst check-in sends a short sequence of
+camera frames (`POST /smart-attendance/self-checkin/burst`, multipart or a
+length-prefixed stream). The frames are analysed one at a time, in arrival
+order, and `CheckinBurst` accumulates the results:
+
+- liveness passes once `checkin_burst_min_live_frames` frames passed
+  `assess_liveness`;
+- the face matches once `checkin_burst_min_match_frames` frames reached the
+  match threshold against the student's enrolled embeddings.
+
+The burst is accepted as soon as both hold. It is rejected as soon as the
+frames left (up to `checkin_burst_max_frames`) can no longer reach either
+count. Frames after the decision are never decoded or analysed, so a good
+burst usually costs two frames. A byte-identical repeat of an earlier frame
+is dropped without analysis: a replayed still counts once.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass, field
+
+from app.core.config import get_settings
+from app.services.checkin_analysis import CheckinAnalysis
+
+ACCEPTED = "accepted"
+REJECTED = "rejected"
+
+
+@dataclass
+class CheckinBurst:
+    match_threshold: float
+    min_live_frames: int = 2
+    min_match_frames: int = 2
+    max_frames: int = 8
+    decision: str | None = None
+    frames_analyzed: int = 0
+    frames_repeated: int = 0
+    live_confidences: list[float] = field(default_factory=list)
+    match_similarities: list[float] = field(default_factory=list)
+    best_similarity: float | None = None
+    last_liveness: tuple[float, str] = (0.0, "No frame analysed")
+    last_failure_reason: str | None = None
+    timings: list[dict] = field(default_factory=list)
+    _digests: set[str] = field(default_factory=set, repr=False)
+
+    @classmethod
+    def from_settings(cls, match_threshold: float) -> "CheckinBurst":
+        settings = get_settings()
+        return cls(
+            match_threshold=match_threshold,
+            min_live_frames=max(1, settings.checkin_burst_min_live_frames),
+            min_match_frames=max(1, settings.checkin_burst_min_match_frames),
+            max_frames=max(1, settings.checkin_burst_max_frames),
+        )
+
+    def admit(self, frame: bytes) -> bool:
+        """Whether `frame` should be analysed (no decision yet, not a repeat)."""
+        if self.decision is not None or self.frames_analyzed >= self.max_frames:
+            return False
+        digest = hashlib.sha256(frame).hexdigest()
+        if digest in self._digests:
+            self.frames_repeated += 1
+            return False
+        self._digests.add(digest)
+        return True
+
+    def add(
+        self, analysis: CheckinAnalysis, similarity: float | None, failure_reason: str | None
+    ) -> str | None:
+        """Account one analysed frame; returns the decision once there is one."""
+        self.frames_analyzed += 1
+        self.timings.append(analysis.timings)
+        if analysis.is_live:
+            self.live_confidences.append(float(analysis.liveness_confidence))
+        else:
+            self.last_liveness = (float(analysis.liveness_confidence), analysis.liveness_reason)
+        if similarity is not None:
+            if self.best_similarity is None or similarity > self.best_similarity:
+                self.best_similarity = float(similarity)
+            if similarity >= self.match_threshold:
+                self.match_similarities.append(float(similarity))
+        if failure_reason:
+            self.last_failure_reason = failure_reason
+
+        left = self.max_frames - self.frames_analyzed
+        if self.liveness_passed and self.matched:
+            self.decision = ACCEPTED
+        elif (
+            len(self.live_confidences) + left < self.min_live_frames
+            or len(self.match_similarities) + left < self.min_match_frames
+        ):
+            self.decision = REJECTED
+        return self.decision
+
+    @property
+    def liveness_passed(self) -> bool:
+        return len(self.live_confidences) >= self.min_live_frames
+
+    @property
+    def matched(self) -> bool:
+        return len(self.match_similarities) >= self.min_match_frames
+
+    @property
+    def liveness_confidence(self) -> float:
+        if self.live_confidences:
+            return sum(self.live_confidences) / len(self.live_confidences)
+        return self.last_liveness[0]
+
+    @property
+    def liveness_reason(self) -> str:
+        if self.liveness_passed:
+            return "Liveness checks passed"
+        return (
+            f"{len(self.live_confidences)}/{self.min_live_frames} live frames "
+            f"(last: {self.last_liveness[1]})"
+        )
+
+    @property
+    def face_confidence(self) -> float | None:
+        """Mean similarity of the matching frames, else the best one seen."""
+        if self.match_similarities:
+            return sum(self.match_similarities) / len(self.match_similarities)
+        return self.best_similarity
+
+    def finish(self) -> str:
+        """Decide on what arrived when the burst ends before a decision."""
+        if self.decision is None:
+            self.decision = ACCEPTED if self.liveness_passed and self.matched else REJECTED
+        return self.decision
+
+    def summary(self) -> dict:
+        return {
+            "decision": self.decision,
+            "frames_analyzed": self.frames_analyzed,
+            "frames_repeated": self.frames_repeated,
+            "live_frames": len(self.live_confidences),
+            "match_frames": len(self.match_similarities),
+            "best_similarity": self.best_similarity,
+            "timings": self.timings,
+        }
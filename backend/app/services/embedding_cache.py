@@ -0,0 +1,201 @@
+"""Embedding results keyed by the SHA-256 of the image bytes.
+
+Clients on flaky classroom Wi-Fi re-send the same frame (upload retries,
+double `/auth/login/facial` submits). `face_inference.extract*` looks the
+frame up here first and skips detection and recognition on a repeat.
+
+Both outcomes are cached: an embedding with its `FaceQualityMetrics`, or
+the `FaceQualityError` reason the frame was rejected with (the same bytes
+fail the same way). Entries live in a bounded in-process LRU with a TTL;
+with `face_embedding_cache_redis` they are also written to Redis so every
+API worker shares them. Keys include the model pack and the inference
+profile, since another model or an int8 profile produces different
+embeddings.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Any
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.face_engine import FaceQualityError, FaceQualityMetrics
+from app.services.inference_profiles import model_version
+
+_REDIS_PREFIX = "face_emb:"
+
+CachedResult = tuple[np.ndarray | None, FaceQualityMetrics | None, str | None]
+
+
+def image_hash(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def cache_digest(image_bytes: bytes, *, client_crop: bool = False) -> str:
+    """Cache key of a frame; client-aligned crops get their own key space."""
+    digest = image_hash(image_bytes)
+    return f"crop-{digest}" if client_crop else digest
+
+
+def _encode(entry: CachedResult) -> dict:
+    embedding, metrics, reason = entry
+    return {
+        "e": (
+            base64.b64encode(embedding.astype(np.float32).tobytes()).decode()
+            if embedding is not None
+            else None
+        ),
+        "m": asdict(metrics) if metrics is not None else None,
+        "r": reason,
+    }
+
+
+def _decode(payload: dict) -> CachedResult:
+    embedding = (
+        np.frombuffer(base64.b64decode(payload["e"]), dtype=np.float32).copy()
+        if payload.get("e")
+        else None
+    )
+    metrics = FaceQualityMetrics(**payload["m"]) if payload.get("m") else None
+    return embedding, metrics, payload.get("r")
+
+
+class EmbeddingCache:
+    def __init__(
+        self,
+        *,
+        max_entries: int = 2048,
+        ttl_seconds: float = 300.0,
+        namespace: str = "",
+        redis: Any = None,
+    ):
+        self.max_entries = max(0, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.namespace = namespace
+        self._redis = redis
+        self._entries: OrderedDict[str, tuple[float, CachedResult]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._redis_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _key(self, digest: str) -> str:
+        return f"{self.namespace}:{digest}"
+
+    def get(self, digest: str) -> CachedResult | None:
+        if not self.enabled:
+            return None
+        key = self._key(digest)
+        now = time.monotonic()
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                expires_at, entry = hit
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return entry
+                del self._entries[key]
+
+        entry = self._redis_get(key)
+        with self._lock:
+            if entry is None:
+                self._misses += 1
+                return None
+            self._redis_hits += 1
+            self._store(key, entry, now)
+        return entry
+
+    def put(self, digest: str, entry: CachedResult) -> None:
+        if not self.enabled:
+            return
+        key = self._key(digest)
+        with self._lock:
+            self._store(key, entry, time.monotonic())
+        if self._redis is not None:
+            try:
+                self._redis.set(_REDIS_PREFIX + key, _encode(entry), ttl=int(self.ttl_seconds))
+            except Exception:
+                pass
+
+    def _store(self, key: str, entry: CachedResult, now: float) -> None:
+        self._entries[key] = (now + self.ttl_seconds, entry)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def _redis_get(self, key: str) -> CachedResult | None:
+        if self._redis is None:
+            return None
+        try:
+            payload = self._redis.get(_REDIS_PREFIX + key)
+            return _decode(payload) if isinstance(payload, dict) else None
+        except Exception:
+            return None
+
+    def lookup(
+        self, image_bytes: bytes, *, client_crop: bool = False
+    ) -> tuple[str, CachedResult | None]:
+        """`(digest, entry)` for a frame (or client-aligned crop); `entry` is None on a miss."""
+        digest = cache_digest(image_bytes, client_crop=client_crop)
+        return digest, self.get(digest)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._redis_hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "redis": self._redis is not None,
+                "hits": self._hits,
+                "redis_hits": self._redis_hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": round((self._hits + self._redis_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+def unpack(entry: CachedResult) -> tuple[np.ndarray, FaceQualityMetrics]:
+    """Cached entry as `extract_embedding_with_quality` returns it (or raises)."""
+    embedding, metrics, reason = entry
+    if embedding is None:
+        raise FaceQualityError(reason or "invalid_image", metrics)
+    return embedding.copy(), metrics
+
+
+def _build_cache() -> EmbeddingCache:
+    settings = get_settings()
+    redis = None
+    if settings.face_embedding_cache_redis:
+        from app.utils.cache import redis_cache
+
+        redis = redis_cache if redis_cache and redis_cache.available() else None
+    return EmbeddingCache(
+        max_entries=(
+            settings.face_embedding_cache_size if settings.face_embedding_cache_enabled else 0
+        ),
+        ttl_seconds=settings.face_embedding_cache_ttl_seconds,
+        namespace=f"{model_version()}/{settings.face_inference_profile}",
+        redis=redis,
+    )
+
+
+embedding_cache = _build_cache()
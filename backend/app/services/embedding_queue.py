@@ -0,0 +1,324 @@
+"""Directory-backed enrollment queue behind `POST /embeddings/queue`.
+
+Layout of `embedding_queue_dir`:
+- `<job_id>/`: a pending job, `job.json` (`user_id`, `count`, `queued_at`)
+  plus its `img_*.jpg`. Jobs are staged under `.incoming/` and renamed into
+  place, so a worker never sees a half-written job. Job ids start with the
+  enqueue time in milliseconds, so sorting them is FIFO.
+- `.claimed/<job_id>`: taken by a worker. Claiming is an atomic `rename`;
+  whichever worker renames first owns the job, on any number of processes.
+- `.failed/<job_id>`: the job and an `error.txt`.
+
+A worker embeds a job's images in one batched inference job, copies them to
+`FACE_STORAGE_DIR/<user_id>/` (where the re-indexer finds them later) and
+writes the `facial_embeddings` rows and `Student.facial_data_encoded` in one
+transaction. Jobs left in `.claimed/` by a crashed worker go back to the
+queue after `embedding_queue_claim_timeout_seconds`. The enrolled users are
+patched into the shared face gallery together, every `GALLERY_REFRESH_JOBS`
+jobs and whenever the queue runs dry, since each gallery publish rewrites the
+whole gallery; until then verification finds them through pgvector.
+
+Workers run as threads of the API process (`embedding_queue_workers`) or of
+`scripts/embedding_queue_worker.py`; the inference itself runs on the
+`face_inference` pool.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.logging_config import facial_logger as logger
+from app.services.face_engine import extract_embeddings_batch
+from app.services.face_gallery import face_gallery
+from app.services.face_inference import FaceInferenceUnavailable, face_inference
+from app.services.face_reindex import faces_root
+from app.services.facial import bulk_insert_user_embeddings
+
+MIN_EMBEDDINGS_PER_JOB = 2
+GALLERY_REFRESH_JOBS = 50
+
+
+class EmbeddingQueue:
+    def __init__(self, root: Path | str, *, claim_timeout_seconds: float = 600.0):
+        self.root = Path(root)
+        self.incoming = self.root / ".incoming"
+        self.claimed = self.root / ".claimed"
+        self.failed = self.root / ".failed"
+        self.claim_timeout_seconds = claim_timeout_seconds
+        self._stats_lock = threading.Lock()
+        self._completed = 0
+        self._failed = 0
+        self._latencies_ms: deque[float] = deque(maxlen=500)
+        self._processing_ms: deque[float] = deque(maxlen=500)
+        self._gallery_lock = threading.Lock()
+        self._gallery_pending: set[int] = set()
+
+    def _ensure_dirs(self) -> None:
+        for d in (self.incoming, self.claimed, self.failed):
+            d.mkdir(parents=True, exist_ok=True)
+
+    # ---- producer --------------------------------------------------------------
+
+    def enqueue(self, user_id: int, images: list[bytes]) -> str:
+        """Stage a job and publish it atomically; returns its id."""
+        self._ensure_dirs()
+        job_id = f"{int(time.time() * 1000):013d}-user_{user_id}-{uuid.uuid4().hex[:8]}"
+        staging = self.incoming / job_id
+        staging.mkdir()
+        for idx, data in enumerate(images):
+            (staging / f"img_{idx + 1}.jpg").write_bytes(data)
+        (staging / "job.json").write_text(
+            json.dumps({"user_id": user_id, "count": len(images), "queued_at": time.time()})
+        )
+        os.rename(staging, self.root / job_id)
+        return job_id
+
+    # ---- consumer --------------------------------------------------------------
+
+    def pending_jobs(self) -> list[Path]:
+        if not self.root.exists():
+            return []
+        return sorted(
+            p
+            for p in self.root.iterdir()
+            if p.is_dir() and not p.name.startswith(".") and (p / "job.json").exists()
+        )
+
+    def claim(self) -> Path | None:
+        """Atomically take the oldest pending job, or None when the queue is empty."""
+        self._ensure_dirs()
+        for job_dir in self.pending_jobs():
+            target = self.claimed / job_dir.name
+            try:
+                os.rename(job_dir, target)
+            except OSError:
+                continue  # another worker claimed it first
+            # Claim time, for stale-claim recovery.
+            os.utime(target)
+            return target
+        return None
+
+    def requeue_stale(self) -> int:
+        """Put back jobs whose worker died mid-job."""
+        if not self.claimed.exists():
+            return 0
+        cutoff = time.time() - self.claim_timeout_seconds
+        requeued = 0
+        for job_dir in self.claimed.iterdir():
+            try:
+                if job_dir.stat().st_mtime < cutoff:
+                    os.rename(job_dir, self.root / job_dir.name)
+                    requeued += 1
+            except OSError:
+                continue
+        return requeued
+
+    def process(self, job_dir: Path, db: Session) -> int:
+        """Embed and store one claimed job; returns the rows inserted."""
+        started = time.perf_counter()
+        job = json.loads((job_dir / "job.json").read_text())
+        user_id = int(job["user_id"])
+        image_paths = sorted(job_dir.glob("*.jpg"))
+        images = [p.read_bytes() for p in image_paths]
+
+        results = face_inference.run(
+            extract_embeddings_batch,
+            images,
+            timeout=face_inference.timeout_seconds * max(1, len(images)),
+            keep_crops=True,
+        )
+
+        # Keep the originals with the user's other face images.
+        user_dir = faces_root() / str(user_id)
+        user_dir.mkdir(parents=True, exist_ok=True)
+        items, stored = [], []
+        for path, data, result in zip(image_paths, images, results):
+            name = f"queued_{job_dir.name}_{path.name}"
+            if result.ok:
+                shutil.copyfile(path, user_dir / name)
+                stored.append(user_dir / name)
+            items.append((f"/storage/faces/{user_id}/{name}", data, result))
+
+        try:
+            enrolled, _skipped, rows = bulk_insert_user_embeddings(
+                db, {user_id: items}, min_usable=MIN_EMBEDDINGS_PER_JOB
+            )
+            if not enrolled:
+                reasons = sorted({r.reason or "invalid_image" for _p, _d, r in items if not r.ok})
+                raise ValueError(
+                    f"At least {MIN_EMBEDDINGS_PER_JOB} usable face images are required. "
+                    f"Failures: {', '.join(reasons) or 'unknown'}"
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            for p in stored:
+                p.unlink(missing_ok=True)
+            raise
+
+        with self._gallery_lock:
+            self._gallery_pending.add(user_id)
+        shutil.rmtree(job_dir, ignore_errors=True)
+        with self._stats_lock:
+            self._completed += 1
+            self._processing_ms.append((time.perf_counter() - started) * 1000.0)
+            if job.get("queued_at"):
+                self._latencies_ms.append((time.time() - float(job["queued_at"])) * 1000.0)
+        return rows
+
+    def fail(self, job_dir: Path, error: str) -> None:
+        self._ensure_dirs()
+        target = self.failed / job_dir.name
+        try:
+            os.rename(job_dir, target)
+            (target / "error.txt").write_text(error)
+        except OSError:
+            shutil.rmtree(job_dir, ignore_errors=True)
+        with self._stats_lock:
+            self._failed += 1
+
+    def _refresh_gallery(self, db: Session, *, min_users: int = 1) -> None:
+        with self._gallery_lock:
+            if len(self._gallery_pending) < min_users:
+                return
+            user_ids, self._gallery_pending = self._gallery_pending, set()
+        try:
+            face_gallery.refresh_users(db, user_ids)
+        except Exception:
+            # The gallery's sync check rebuilds it from facial_embeddings.
+            logger.exception("Face gallery refresh after enrollment failed")
+
+    def flush_gallery(self, session_factory: Callable[[], Session]) -> None:
+        """Patch the users enrolled since the last refresh into the face gallery."""
+        if not self._gallery_pending:
+            return
+        db = session_factory()
+        try:
+            self._refresh_gallery(db)
+        finally:
+            db.close()
+
+    def run_once(self, session_factory: Callable[[], Session]) -> bool:
+        """Claim and process one job; False when the queue was empty."""
+        job_dir = self.claim()
+        if job_dir is None:
+            self.flush_gallery(session_factory)
+            return False
+        db = session_factory()
+        try:
+            rows = self.process(job_dir, db)
+            logger.info("Embedding job done", extra={"job": job_dir.name, "rows": rows})
+        except FaceInferenceUnavailable:
+            # Inference is saturated: give the job back and let live traffic through.
+            os.rename(job_dir, self.root / job_dir.name)
+            time.sleep(get_settings().face_inference_retry_after_seconds)
+        except Exception as e:
+            logger.warning("Embedding job failed", extra={"job": job_dir.name, "error": str(e)})
+            self.fail(job_dir, str(e))
+        else:
+            self._refresh_gallery(db, min_users=GALLERY_REFRESH_JOBS)
+        finally:
+            db.close()
+        return True
+
+    def stats(self) -> dict:
+        def p95(values: list[float]) -> float | None:
+            if not values:
+                return None
+            ordered = sorted(values)
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1)
+
+        with self._stats_lock:
+            latencies = list(self._latencies_ms)
+            processing = list(self._processing_ms)
+            completed, failed = self._completed, self._failed
+        claimed = len(list(self.claimed.iterdir())) if self.claimed.exists() else 0
+        return {
+            "depth": len(self.pending_jobs()),
+            "in_progress": claimed,
+            "completed": completed,
+            "failed": failed,
+            "job_latency_ms_avg": round(sum(latencies) / len(latencies), 1) if latencies else None,
+            "job_latency_ms_p95": p95(latencies),
+            "processing_ms_avg": (
+                round(sum(processing) / len(processing), 1) if processing else None
+            ),
+        }
+
+
+class EmbeddingQueueWorkers:
+    """`count` polling threads draining one `EmbeddingQueue`."""
+
+    def __init__(self, queue: EmbeddingQueue, count: int, poll_interval: float):
+        self.queue = queue
+        self.count = count
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._session_factory: Callable[[], Session] | None = None
+
+    def _loop(self, session_factory: Callable[[], Session]) -> None:
+        last_recovery = 0.0
+        while not self._stop.is_set():
+            if time.monotonic() - last_recovery > self.queue.claim_timeout_seconds / 2:
+                self.queue.requeue_stale()
+                last_recovery = time.monotonic()
+            try:
+                worked = self.queue.run_once(session_factory)
+            except Exception:
+                logger.exception("Embedding queue worker error")
+                worked = False
+            if not worked:
+                self._stop.wait(self.poll_interval)
+
+    def start(self, session_factory: Callable[[], Session] | None = None) -> None:
+        if session_factory is None:
+            from app.db.session import SessionLocal
+
+            session_factory = SessionLocal
+        self._session_factory = session_factory
+        for i in range(self.count):
+            thread = threading.Thread(
+                target=self._loop, args=(session_factory,), name=f"embedding-queue-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
+        if self._session_factory is not None:
+            self.queue.flush_gallery(self._session_factory)
+
+
+def _build_queue() -> EmbeddingQueue:
+    settings = get_settings()
+    return EmbeddingQueue(
+        settings.embedding_queue_dir,
+        claim_timeout_seconds=settings.embedding_queue_claim_timeout_seconds,
+    )
+
+
+embedding_queue = _build_queue()
+
+
+def build_workers(count: int | None = None) -> EmbeddingQueueWorkers:
+    settings = get_settings()
+    return EmbeddingQueueWorkers(
+        embedding_queue,
+        settings.embedding_queue_workers if count is None else count,
+        settings.embedding_queue_poll_seconds,
+    )
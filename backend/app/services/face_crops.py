@@ -0,0 +1,70 @@
+"""Content-addressed store of aligned 112x112 face crops.
+
+Enrollment keeps the ArcFace-aligned crop of every embedded image and
+records its hash in `facial_embeddings.crop_hash`. Switching recognition
+model (`INSIGHTFACE_MODEL`, a buffalo_l upgrade) then re-embeds from these
+crops: no full-resolution decode and no detection
+(`app/services/face_model_migration.py`).
+
+Crops are lossless PNGs (about 20 KB each) under
+`face_crop_dir/<hash[:2]>/<hash>.png`. The hash is the SHA-256 of the raw
+BGR pixels, so the same face stored twice is one file, and rows of every
+model version point at the same crop.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.core.lazy_imports import lazy_module
+
+cv2 = lazy_module("cv2")
+
+CROP_SIZE = 112
+
+
+def crop_hash(crop: np.ndarray) -> str:
+    return hashlib.sha256(np.ascontiguousarray(crop, dtype=np.uint8).tobytes()).hexdigest()
+
+
+class FaceCropStore:
+    def __init__(self, root: Path | str):
+        self.root = Path(root)
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.png"
+
+    def put(self, crop: np.ndarray) -> str:
+        """Store an aligned crop (no-op if already stored); returns its hash."""
+        crop = np.ascontiguousarray(crop, dtype=np.uint8)
+        if crop.shape != (CROP_SIZE, CROP_SIZE, 3):
+            raise ValueError(f"Expected a {CROP_SIZE}x{CROP_SIZE} BGR crop, got {crop.shape}")
+        digest = crop_hash(crop)
+        target = self.path(digest)
+        if target.exists():
+            return digest
+        ok, encoded = cv2.imencode(".png", crop)
+        if not ok:
+            raise ValueError("Could not encode face crop")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(encoded.tobytes())
+        os.replace(tmp, target)
+        return digest
+
+    def get(self, digest: str) -> np.ndarray | None:
+        """The stored crop, or None when it is missing or unreadable."""
+        try:
+            data = self.path(digest).read_bytes()
+        except OSError:
+            return None
+        crop = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        return crop if crop is not None and crop.shape == (CROP_SIZE, CROP_SIZE, 3) else None
+
+
+face_crop_store = FaceCropStore(get_settings().face_crop_dir)
@@ -3,10 +3,27 @@ from __future__ import annotations
 import os
 import threading
 from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Sequence
 
-import cv2
 import numpy as np
-from insightface.app import FaceAnalysis
+
+from app.core.lazy_imports import lazy_module
+from app.services.inference_profiles import (
+    InferenceProfile,
+    apply_profile,
+    get_inference_profile,
+    model_version,
+)
+
+if TYPE_CHECKING:
+    from insightface.app import FaceAnalysis
+
+# Loaded on first use (see app/core/lazy_imports.py).
+cv2 = lazy_module("cv2")
+insightface_app = lazy_module("insightface.app")
+face_align = lazy_module("insightface.utils.face_align")
 
 
 @dataclass(frozen=True)
@@ -24,9 +41,62 @@ class FaceQualityError(ValueError):
         self.reason = reason
         self.metrics = metrics
 
+    def __reduce__(self):
+        # Keep `metrics` when the error crosses a process boundary (inference pool).
+        return (self.__class__, (self.reason, self.metrics))
+
+
+@dataclass(frozen=True)
+class FaceEmbeddingResult:
+    """Per-image outcome of `extract_embeddings_batch`.
+
+    Exactly one of `embedding` / `reason` is set. `metrics` is filled whenever
+    the image could be decoded, mirroring `FaceQualityError.metrics`. `crop` is
+    the aligned 112x112 face, kept only when asked for (`keep_crops=True`).
+    """
+
+    embedding: np.ndarray | None
+    metrics: FaceQualityMetrics | None
+    reason: str | None = None
+    crop: np.ndarray | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.embedding is not None
+
+
+@dataclass(frozen=True)
+class DetectedFace:
+    """One face found by `extract_all_face_embeddings` (group photos)."""
+
+    bbox: tuple[int, int, int, int]
+    det_score: float
+    embedding: np.ndarray
+
+
+# Side of the aligned crops recognition takes (and client-cropped uploads must have).
+CLIENT_CROP_SIZE = 112
 
 _face_app: FaceAnalysis | None = None
 _face_app_lock = threading.Lock()
+# Recognition-only models of other packs (`embed_aligned_crops(model=...)`).
+_recognition_models: dict[str, Any] = {}
+
+
+def build_face_app(profile: InferenceProfile) -> FaceAnalysis:
+    """Load and prepare a `FaceAnalysis` configured by an inference profile."""
+    os.environ.setdefault(
+        "INSIGHTFACE_HOME", os.getenv("INSIGHTFACE_HOME", "/app/storage/insightface")
+    )
+    providers = ["CPUExecutionProvider"]
+
+    app = insightface_app.FaceAnalysis(
+        name=model_version(), providers=providers, allowed_modules=list(profile.modules)
+    )
+    # ctx_id=-1 forces CPU context.
+    app.prepare(ctx_id=-1, det_size=profile.det_size)
+    apply_profile(app, profile, providers)
+    return app
 
 
 def _get_face_app() -> FaceAnalysis:
@@ -38,17 +108,40 @@ def _get_face_app() -> FaceAnalysis:
         if _face_app is not None:
             return _face_app
 
-        os.environ.setdefault("INSIGHTFACE_HOME", os.getenv("INSIGHTFACE_HOME", "/app/storage/insightface"))
-        model_name = os.getenv("INSIGHTFACE_MODEL", "buffalo_l")
-
-        app = FaceAnalysis(name=model_name, providers=["CPUExecutionProvider"])
-        # det_size is a practical default for selfie-sized images.
-        # ctx_id=-1 forces CPU context.
-        app.prepare(ctx_id=-1, det_size=(640, 640))
-        _face_app = app
+        _face_app = build_face_app(get_inference_profile())
         return _face_app
 
 
+def _get_recognition_model(model: str | None = None):
+    """Recognition model of pack `model` (default: the one `_get_face_app` loaded).
+
+    Other packs are loaded recognition-only (no detector), which is all that
+    re-embedding stored aligned crops needs.
+    """
+    if model is None or model == model_version():
+        return _get_face_app().models["recognition"]
+
+    with _face_app_lock:
+        rec_model = _recognition_models.get(model)
+        if rec_model is not None:
+            return rec_model
+
+        from insightface.model_zoo import get_model
+        from insightface.utils.storage import ensure_available
+
+        # Same model root as `FaceAnalysis`.
+        model_dir = Path(ensure_available("models", model))
+        for onnx_file in sorted(model_dir.glob("*.onnx")):
+            if onnx_file.name.endswith(".int8.onnx"):
+                continue
+            candidate = get_model(str(onnx_file), providers=["CPUExecutionProvider"])
+            if candidate is not None and getattr(candidate, "taskname", None) == "recognition":
+                candidate.prepare(ctx_id=-1)
+                _recognition_models[model] = candidate
+                return candidate
+    raise ValueError(f"No recognition model in InsightFace pack {model!r}")
+
+
 def _decode_image_bytes_to_bgr(image_bytes: bytes) -> np.ndarray:
     arr = np.frombuffer(image_bytes, dtype=np.uint8)
     img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
@@ -57,11 +150,87 @@ def _decode_image_bytes_to_bgr(image_bytes: bytes) -> np.ndarray:
     return img
 
 
-def _compute_blur_and_brightness(img_bgr: np.ndarray) -> tuple[float, float]:
-    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
-    blur_score = float(cv2.Laplacian(gray, cv2.CV_64F).var())
-    brightness = float(gray.mean())
-    return blur_score, brightness
+class FaceFrame:
+    """One decoded image shared by liveness, quality gates and embedding.
+
+    The JPEG is decoded once; the grayscale image, blur/brightness and the
+    InsightFace detections are computed on first use and cached, so every
+    consumer of the same request works off a single decode and a single
+    detection pass.
+    """
+
+    def __init__(self, img_bgr: np.ndarray):
+        self.bgr = img_bgr
+        self._detections: tuple[np.ndarray, np.ndarray | None] | None = None
+        self._detect_lock = threading.Lock()
+
+    @classmethod
+    def from_bytes(cls, image_bytes: bytes) -> "FaceFrame":
+        return cls(_decode_image_bytes_to_bgr(image_bytes))
+
+    @property
+    def height(self) -> int:
+        return int(self.bgr.shape[0])
+
+    @property
+    def width(self) -> int:
+        return int(self.bgr.shape[1])
+
+    @cached_property
+    def gray(self) -> np.ndarray:
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+
+    @cached_property
+    def blur_score(self) -> float:
+        return float(cv2.Laplacian(self.gray, cv2.CV_64F).var())
+
+    @cached_property
+    def brightness(self) -> float:
+        return float(self.gray.mean())
+
+    @property
+    def detections(self) -> tuple[np.ndarray, np.ndarray | None]:
+        """`(bboxes, kpss)` from the InsightFace detector (run once per frame).
+
+        Liveness and recognition may read this from different threads; the
+        first caller runs the detector, the other waits for its result.
+        """
+        if self._detections is None:
+            with self._detect_lock:
+                if self._detections is None:
+                    self._detections = _detect_faces(_get_face_app(), self.bgr)
+        return self._detections
+
+    @detections.setter
+    def detections(self, value: tuple[np.ndarray, np.ndarray | None]) -> None:
+        self._detections = value
+
+    @property
+    def num_faces(self) -> int:
+        return int(self.detections[0].shape[0])
+
+    def face_box(self, index: int = 0) -> tuple[int, int, int, int]:
+        """`(x, y, w, h)` of a detected face, clipped to the frame."""
+        x1, y1, x2, y2 = np.asarray(self.detections[0][index][:4]).astype(int).tolist()
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(self.width, x2), min(self.height, y2)
+        return x1, y1, max(0, x2 - x1), max(0, y2 - y1)
+
+    def aligned_crop(self, index: int = 0) -> np.ndarray | None:
+        kpss = self.detections[1]
+        if kpss is None:
+            return None
+        return _align_face(self.bgr, kpss[index])
+
+    def quality_metrics(self) -> FaceQualityMetrics:
+        face_w, face_h = _bbox_size(self.detections[0][0]) if self.num_faces == 1 else (0, 0)
+        return FaceQualityMetrics(
+            num_faces=self.num_faces,
+            blur_score=self.blur_score,
+            brightness=self.brightness,
+            face_width=face_w,
+            face_height=face_h,
+        )
 
 
 def warm_up_face_engine() -> bool:
@@ -81,6 +250,86 @@ def warm_up_face_engine() -> bool:
         return False
 
 
+def _detect_faces(
+    app: FaceAnalysis, img_bgr: np.ndarray, *, det_size: tuple[int, int] | None = None
+) -> tuple[np.ndarray, np.ndarray | None]:
+    """Run only the detection model; returns `(bboxes, kpss)` like `FaceAnalysis.get`.
+
+    `det_size` overrides the detector input size (larger finds smaller faces).
+    """
+    bboxes, kpss = app.det_model.detect(img_bgr, input_size=det_size, max_num=0, metric="default")
+    return bboxes, kpss
+
+
+def _align_face(img_bgr: np.ndarray, kps: np.ndarray) -> np.ndarray:
+    """Warp a detected face to the 112x112 ArcFace template."""
+    return face_align.norm_crop(img_bgr, landmark=kps, image_size=112)
+
+
+def _embed_aligned_crops(
+    app: FaceAnalysis, crops: Sequence[np.ndarray], *, batch_size: int = 16
+) -> np.ndarray:
+    """Embed aligned crops with one recognition forward pass per `batch_size` chunk.
+
+    Returns an `(N, 512)` float32 matrix of unit-norm rows.
+    """
+    return _embed_with(app.models["recognition"], crops, batch_size=batch_size)
+
+
+def embed_aligned_crops(
+    crops: Sequence[np.ndarray], *, model: str | None = None, batch_size: int = 64
+) -> np.ndarray:
+    """Embed stored 112x112 aligned crops with the recognition model of pack `model`.
+
+    No decode or detection: this is what makes re-embedding every enrolled
+    face with a new model cheap (`app/services/face_model_migration.py`).
+    """
+    return _embed_with(_get_recognition_model(model), crops, batch_size=batch_size)
+
+
+def _embed_with(rec_model, crops: Sequence[np.ndarray], *, batch_size: int) -> np.ndarray:
+    if not crops:
+        return np.zeros((0, 512), dtype=np.float32)
+
+    chunks = []
+    for start in range(0, len(crops), max(1, batch_size)):
+        chunk = list(crops[start : start + batch_size])
+        chunks.append(np.asarray(rec_model.get_feat(chunk), dtype=np.float32))
+    feats = np.concatenate(chunks, axis=0)
+    # Ensure unit norm (cosine similarity matches pgvector <=> expectations)
+    feats /= np.linalg.norm(feats, axis=1, keepdims=True) + 1e-8
+    return feats
+
+
+def _bbox_size(bbox: np.ndarray) -> tuple[int, int]:
+    x1, y1, x2, y2 = np.asarray(bbox[:4]).astype(int).tolist()
+    return max(0, x2 - x1), max(0, y2 - y1)
+
+
+def _check_quality(
+    metrics: FaceQualityMetrics,
+    *,
+    min_blur_score: float,
+    min_brightness: float,
+    max_brightness: float,
+    min_face_size: int,
+) -> None:
+    if metrics.num_faces != 1:
+        raise FaceQualityError("expected_single_face", metrics)
+
+    if metrics.blur_score < min_blur_score:
+        raise FaceQualityError("image_too_blurry", metrics)
+
+    if metrics.brightness < min_brightness:
+        raise FaceQualityError("image_too_dark", metrics)
+
+    if metrics.brightness > max_brightness:
+        raise FaceQualityError("image_too_bright", metrics)
+
+    if metrics.face_width < min_face_size or metrics.face_height < min_face_size:
+        raise FaceQualityError("face_too_small", metrics)
+
+
 def extract_embedding_with_quality(
     image_bytes: bytes,
     *,
@@ -94,54 +343,282 @@ def extract_embedding_with_quality(
     Raises `FaceQualityError` if the image is not suitable.
     """
 
-    img_bgr = _decode_image_bytes_to_bgr(image_bytes)
-    blur_score, brightness = _compute_blur_and_brightness(img_bgr)
+    return extract_embedding_from_frame(
+        FaceFrame.from_bytes(image_bytes),
+        min_blur_score=min_blur_score,
+        min_brightness=min_brightness,
+        max_brightness=max_brightness,
+        min_face_size=min_face_size,
+    )
 
-    app = _get_face_app()
-    faces = app.get(img_bgr)
-    num_faces = len(faces)
 
-    # Metrics defaults (for logging/diagnostics)
-    face_w = 0
-    face_h = 0
-    if num_faces == 1:
-        x1, y1, x2, y2 = faces[0].bbox.astype(int).tolist()
-        face_w = max(0, x2 - x1)
-        face_h = max(0, y2 - y1)
+def _gate_frame(
+    frame: FaceFrame,
+    *,
+    min_blur_score: float,
+    min_brightness: float,
+    max_brightness: float,
+    min_face_size: int,
+) -> tuple[FaceQualityMetrics, np.ndarray]:
+    """Quality-gate a frame and return its metrics and aligned face crop."""
+    metrics = frame.quality_metrics()
+    _check_quality(
+        metrics,
+        min_blur_score=min_blur_score,
+        min_brightness=min_brightness,
+        max_brightness=max_brightness,
+        min_face_size=min_face_size,
+    )
+    crop = frame.aligned_crop(0)
+    if crop is None:
+        raise FaceQualityError("embedding_unavailable", metrics)
+    return metrics, crop
+
 
+def extract_embedding_from_frame(
+    frame: FaceFrame,
+    *,
+    min_blur_score: float = 8.0,
+    min_brightness: float = 40.0,
+    max_brightness: float = 220.0,
+    min_face_size: int = 80,
+) -> tuple[np.ndarray, FaceQualityMetrics]:
+    """`extract_embedding_with_quality` on an already decoded `FaceFrame`."""
+
+    metrics, crop = _gate_frame(
+        frame,
+        min_blur_score=min_blur_score,
+        min_brightness=min_brightness,
+        max_brightness=max_brightness,
+        min_face_size=min_face_size,
+    )
+    emb = _embed_aligned_crops(_get_face_app(), [crop])[0]
+    if emb.shape[0] != 512:
+        raise FaceQualityError("unexpected_embedding_size", metrics)
+    return emb, metrics
+
+
+def extract_embeddings_batch(
+    images: Sequence[bytes],
+    *,
+    batch_size: int = 16,
+    min_blur_score: float = 8.0,
+    min_brightness: float = 40.0,
+    max_brightness: float = 220.0,
+    min_face_size: int = 80,
+    keep_crops: bool = False,
+) -> list[FaceEmbeddingResult]:
+    """Batched counterpart of `extract_embedding_with_quality`.
+
+    Each image is decoded, detected and quality-gated on its own; the aligned
+    crops of every image that passes are then stacked and embedded with one
+    recognition forward pass per `batch_size` crops. Results are returned in
+    input order and never raise for a single bad image. With `keep_crops`,
+    successful results carry their aligned crop (enrollment stores it).
+    """
+
+    frames: list[FaceFrame | None] = []
+    for image_bytes in images:
+        try:
+            frames.append(FaceFrame.from_bytes(image_bytes))
+        except Exception:
+            frames.append(None)
+    return embed_frames_batch(
+        frames,
+        batch_size=batch_size,
+        min_blur_score=min_blur_score,
+        min_brightness=min_brightness,
+        max_brightness=max_brightness,
+        min_face_size=min_face_size,
+        keep_crops=keep_crops,
+    )
+
+
+def _client_crop(crop_bytes: bytes) -> FaceFrame:
+    try:
+        frame = FaceFrame.from_bytes(crop_bytes)
+    except ValueError:
+        raise FaceQualityError("invalid_image") from None
+    if (frame.height, frame.width) != (CLIENT_CROP_SIZE, CLIENT_CROP_SIZE):
+        raise FaceQualityError("invalid_crop")
+    return frame
+
+
+def _gate_client_crop(
+    frame: FaceFrame, *, min_blur_score: float, min_brightness: float, max_brightness: float
+) -> FaceQualityMetrics:
+    # The client already found exactly one face and aligned it: only the
+    # blur and exposure gates still apply.
     metrics = FaceQualityMetrics(
-        num_faces=num_faces,
-        blur_score=blur_score,
-        brightness=brightness,
-        face_width=face_w,
-        face_height=face_h,
+        num_faces=1,
+        blur_score=frame.blur_score,
+        brightness=frame.brightness,
+        face_width=CLIENT_CROP_SIZE,
+        face_height=CLIENT_CROP_SIZE,
+    )
+    _check_quality(
+        metrics,
+        min_blur_score=min_blur_score,
+        min_brightness=min_brightness,
+        max_brightness=max_brightness,
+        min_face_size=0,
     )
+    return metrics
 
-    if num_faces != 1:
-        raise FaceQualityError("expected_single_face", metrics)
 
-    if blur_score < min_blur_score:
-        raise FaceQualityError("image_too_blurry", metrics)
+def extract_embedding_from_crop(
+    crop_bytes: bytes,
+    *,
+    min_blur_score: float = 8.0,
+    min_brightness: float = 40.0,
+    max_brightness: float = 220.0,
+) -> tuple[np.ndarray, FaceQualityMetrics]:
+    """`extract_embedding_with_quality` for a client-aligned 112x112 face crop.
 
-    if brightness < min_brightness:
-        raise FaceQualityError("image_too_dark", metrics)
+    Skips detection and alignment: the crop goes straight to recognition
+    after the blur and brightness gates. Raises `FaceQualityError`
+    (`invalid_crop` when the image is not 112x112).
+    """
+    frame = _client_crop(crop_bytes)
+    metrics = _gate_client_crop(
+        frame,
+        min_blur_score=min_blur_score,
+        min_brightness=min_brightness,
+        max_brightness=max_brightness,
+    )
+    return _embed_aligned_crops(_get_face_app(), [frame.bgr])[0], metrics
 
-    if brightness > max_brightness:
-        raise FaceQualityError("image_too_bright", metrics)
 
-    if face_w < min_face_size or face_h < min_face_size:
-        raise FaceQualityError("face_too_small", metrics)
+def extract_crop_embeddings_batch(
+    crops: Sequence[bytes],
+    *,
+    batch_size: int = 16,
+    min_blur_score: float = 8.0,
+    min_brightness: float = 40.0,
+    max_brightness: float = 220.0,
+    keep_crops: bool = False,
+) -> list[FaceEmbeddingResult]:
+    """Batched `extract_embedding_from_crop`, with `extract_embeddings_batch` results."""
+    results: list[FaceEmbeddingResult | None] = [None] * len(crops)
+    kept: list[tuple[int, FaceQualityMetrics, np.ndarray]] = []
+    for idx, crop_bytes in enumerate(crops):
+        try:
+            frame = _client_crop(crop_bytes)
+            metrics = _gate_client_crop(
+                frame,
+                min_blur_score=min_blur_score,
+                min_brightness=min_brightness,
+                max_brightness=max_brightness,
+            )
+        except FaceQualityError as e:
+            results[idx] = FaceEmbeddingResult(None, e.metrics, e.reason)
+            continue
+        kept.append((idx, metrics, frame.bgr))
+
+    feats = _embed_aligned_crops(
+        _get_face_app(), [crop for _i, _m, crop in kept], batch_size=batch_size
+    )
+    for (idx, metrics, crop), emb in zip(kept, feats):
+        results[idx] = FaceEmbeddingResult(emb, metrics, crop=crop if keep_crops else None)
+    return [r for r in results if r is not None]
 
-    emb = faces[0].embedding
-    if emb is None:
-        raise FaceQualityError("embedding_unavailable", metrics)
 
-    emb = np.asarray(emb, dtype=np.float32)
-    # Ensure unit norm (cosine similarity matches pgvector <=> expectations)
-    norm = float(np.linalg.norm(emb) + 1e-8)
-    emb = emb / norm
+def embed_frames_batch(
+    frames: Sequence[FaceFrame | None],
+    *,
+    batch_size: int = 16,
+    min_blur_score: float = 8.0,
+    min_brightness: float = 40.0,
+    max_brightness: float = 220.0,
+    min_face_size: int = 80,
+    skip: Callable[[int], str | None] | None = None,
+    keep_crops: bool = False,
+) -> list[FaceEmbeddingResult]:
+    """`extract_embeddings_batch` over decoded frames (`None` = undecodable image).
 
-    if emb.shape[0] != 512:
-        raise FaceQualityError("unexpected_embedding_size", metrics)
+    `skip(index)` is asked right before the recognition pass; returning a
+    reason drops that frame (cooperative cancellation by a concurrent stage).
+    """
 
-    return emb, metrics
+    app = _get_face_app()
+    results: list[FaceEmbeddingResult | None] = [None] * len(frames)
+    crops: list[np.ndarray] = []
+    crop_owners: list[tuple[int, FaceQualityMetrics]] = []
+
+    for idx, frame in enumerate(frames):
+        if frame is None:
+            results[idx] = FaceEmbeddingResult(None, None, "invalid_image")
+            continue
+        try:
+            metrics, crop = _gate_frame(
+                frame,
+                min_blur_score=min_blur_score,
+                min_brightness=min_brightness,
+                max_brightness=max_brightness,
+                min_face_size=min_face_size,
+            )
+        except FaceQualityError as e:
+            results[idx] = FaceEmbeddingResult(None, e.metrics, e.reason)
+            continue
+
+        crops.append(crop)
+        crop_owners.append((idx, metrics))
+
+    if skip is not None:
+        kept = []
+        for (idx, metrics), crop in zip(crop_owners, crops):
+            reason = skip(idx)
+            if reason:
+                results[idx] = FaceEmbeddingResult(None, metrics, reason)
+            else:
+                kept.append(((idx, metrics), crop))
+        crop_owners = [owner for owner, _crop in kept]
+        crops = [crop for _owner, crop in kept]
+
+    feats = _embed_aligned_crops(app, crops, batch_size=batch_size)
+    for (idx, metrics), crop, emb in zip(crop_owners, crops, feats):
+        if emb.shape[0] != 512:
+            results[idx] = FaceEmbeddingResult(None, metrics, "unexpected_embedding_size")
+        else:
+            results[idx] = FaceEmbeddingResult(emb, metrics, crop=crop if keep_crops else None)
+
+    return [r for r in results if r is not None]
+
+
+def extract_all_face_embeddings(
+    image_bytes: bytes,
+    *,
+    batch_size: int = 32,
+    min_face_size: int = 24,
+    det_size: tuple[int, int] = (1280, 1280),
+) -> list[DetectedFace]:
+    """Detect and embed every face in one image (e.g. a classroom photo).
+
+    Unlike `extract_embedding_with_quality` there is no single-face gate: all
+    faces at least `min_face_size` pixels wide and tall are aligned and embedded
+    together in batched recognition passes. Raises `ValueError` if the image
+    cannot be decoded.
+    """
+
+    img_bgr = _decode_image_bytes_to_bgr(image_bytes)
+    app = _get_face_app()
+    bboxes, kpss = _detect_faces(app, img_bgr, det_size=det_size)
+    if kpss is None or bboxes.shape[0] == 0:
+        return []
+
+    kept = []
+    for i in range(bboxes.shape[0]):
+        w, h = _bbox_size(bboxes[i])
+        if w >= min_face_size and h >= min_face_size:
+            kept.append(i)
+
+    crops = [_align_face(img_bgr, kpss[i]) for i in kept]
+    feats = _embed_aligned_crops(app, crops, batch_size=batch_size)
+    return [
+        DetectedFace(
+            bbox=tuple(int(v) for v in bboxes[i][:4]),
+            det_score=float(bboxes[i][4]),
+            embedding=emb,
+        )
+        for i, emb in zip(kept, feats)
+    ]
@@ -0,0 +1,475 @@
+"""Shared in-process gallery of enrolled face embeddings.
+
+1:1 verification used to cost three database round trips (User, Student and a
+pgvector `ORDER BY embedding <=> ...` query). The gallery keeps every enrolled
+embedding as a unit-norm float32 matrix on disk and memory-maps it, so all
+uvicorn workers on a host share one copy through the page cache and a match is
+a NumPy dot product.
+
+Each model version (`facial_embeddings.model_version`) has its own gallery
+under `face_gallery_dir/<version>/`, so workers serving different models
+during a cutover never mix embeddings. Layout of that directory:
+- `embeddings-<version>.npy`: `(N, 512)` float32 rows, sorted by class then user
+- `ids-<version>.npy`: `(N, 3)` int64 `(user_id, student_id or -1,
+  facial_embeddings.id or -1)`
+- `current.json`: the published version, the `class -> [start, end)` ranges
+  and the `fingerprint` (row count and max embedding id) of the rows
+
+Writers take an exclusive `flock`, write a new version and atomically replace
+`current.json`; readers notice the change with one `stat` and re-map. Rows are
+grouped by class and user, so roster and per-user lookups are contiguous views.
+A publish rewrites all N rows, so bulk writers patch many users per publish
+(`refresh_users`: once per re-index chunk, once per enrollment queue drain)
+rather than one publish per user.
+
+The gallery outlives processes and is shared by every worker on the host, but
+`facial_embeddings` can change without it (other API hosts, scripts, SQL).
+`ensure_built` therefore compares the fingerprint with the same aggregate over
+the database, on the first call of each process and then every
+`face_gallery_sync_check_seconds`, and rebuilds when they differ: a deleted
+row changes the count, a replaced one the max id.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator, Sequence
+
+import numpy as np
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.logging_config import facial_logger as logger
+from app.services.inference_profiles import model_version
+
+EMBEDDING_DIM = 512
+
+
+@dataclass
+class GallerySnapshot:
+    version: int
+    embeddings: np.ndarray
+    user_ids: np.ndarray
+    student_ids: np.ndarray
+    class_ranges: dict[str, tuple[int, int]]
+    user_ranges: dict[int, tuple[int, int]] = field(default_factory=dict)
+    embedding_ids: np.ndarray | None = None
+    fingerprint: tuple[int, int] | None = None
+
+    @property
+    def size(self) -> int:
+        return int(self.embeddings.shape[0])
+
+    def row_classes(self) -> list[str]:
+        classes = [""] * self.size
+        for name, (start, end) in self.class_ranges.items():
+            classes[start:end] = [name] * (end - start)
+        return classes
+
+
+@dataclass(frozen=True)
+class UserRows:
+    """One user's rows for `FaceGallery.replace_users`."""
+
+    student_id: int | None
+    class_name: str | None
+    embeddings: np.ndarray | None
+    embedding_ids: Sequence[int] | None = None
+
+
+def _empty_snapshot() -> GallerySnapshot:
+    return GallerySnapshot(
+        version=0,
+        embeddings=np.zeros((0, EMBEDDING_DIM), dtype=np.float32),
+        user_ids=np.zeros(0, dtype=np.int64),
+        student_ids=np.zeros(0, dtype=np.int64),
+        class_ranges={},
+        embedding_ids=np.zeros(0, dtype=np.int64),
+        fingerprint=(0, 0),
+    )
+
+
+def _index_users(user_ids: np.ndarray) -> dict[int, tuple[int, int]]:
+    ranges: dict[int, tuple[int, int]] = {}
+    if user_ids.size == 0:
+        return ranges
+    # Rows are sorted by (class, user), so each user's rows are contiguous.
+    boundaries = np.flatnonzero(np.diff(user_ids)) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [user_ids.size]))
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        ranges[int(user_ids[start])] = (start, end)
+    return ranges
+
+
+def _fingerprint(embedding_ids: np.ndarray) -> tuple[int, int] | None:
+    """`(rows, max id)`; None when some rows were added without their embedding id."""
+    if embedding_ids.size == 0:
+        return 0, 0
+    if int(embedding_ids.min()) < 0:
+        return None
+    return int(embedding_ids.size), int(embedding_ids.max())
+
+
+def parse_pgvector(value) -> np.ndarray:
+    """Convert a pgvector value (text literal, list, ndarray or `HalfVector`) to float32."""
+    if isinstance(value, str):
+        return np.array(value.strip("[]").split(","), dtype=np.float32)
+    if hasattr(value, "to_numpy"):
+        value = value.to_numpy()
+    return np.asarray(value, dtype=np.float32)
+
+
+def _normalize(rows: np.ndarray) -> np.ndarray:
+    rows = np.asarray(rows, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+    return rows / (np.linalg.norm(rows, axis=1, keepdims=True) + 1e-8)
+
+
+class FaceGallery:
+    def __init__(self, root: Path | str):
+        self.root = Path(root)
+        self._snapshot: GallerySnapshot | None = None
+        self._stamp: tuple[int, int] | None = None
+        self._lock = threading.Lock()
+        self._checked_at: float | None = None  # last sync check (monotonic)
+
+    # -- reading -----------------------------------------------------------------
+
+    @property
+    def _pointer(self) -> Path:
+        return self.root / "current.json"
+
+    def _load(self) -> GallerySnapshot:
+        meta = json.loads(self._pointer.read_text())
+        version = int(meta["version"])
+        fingerprint = tuple(meta["fingerprint"]) if meta.get("fingerprint") else None
+        if int(meta.get("count", 0)) == 0:
+            snap = _empty_snapshot()
+            snap.version = version
+            snap.fingerprint = fingerprint
+            return snap
+        embeddings = np.load(self.root / f"embeddings-{version}.npy", mmap_mode="r")
+        ids = np.load(self.root / f"ids-{version}.npy", mmap_mode="r")
+        user_ids = np.ascontiguousarray(ids[:, 0])
+        return GallerySnapshot(
+            version=version,
+            embeddings=embeddings,
+            user_ids=user_ids,
+            student_ids=np.ascontiguousarray(ids[:, 1]),
+            class_ranges={k: (int(v[0]), int(v[1])) for k, v in meta["classes"].items()},
+            user_ranges=_index_users(user_ids),
+            # Galleries written before embedding ids were stored have two columns.
+            embedding_ids=(
+                np.ascontiguousarray(ids[:, 2])
+                if ids.shape[1] > 2
+                else np.full(ids.shape[0], -1, dtype=np.int64)
+            ),
+            fingerprint=fingerprint,
+        )
+
+    def snapshot(self) -> GallerySnapshot | None:
+        """Current published snapshot (re-mapped if another process published)."""
+        try:
+            st = self._pointer.stat()
+        except FileNotFoundError:
+            return None
+        stamp = (st.st_mtime_ns, st.st_size)
+        if self._snapshot is not None and stamp == self._stamp:
+            return self._snapshot
+        with self._lock:
+            if self._snapshot is None or stamp != self._stamp:
+                try:
+                    self._snapshot = self._load()
+                except (FileNotFoundError, ValueError, KeyError):
+                    # Raced with a publish that removed an old version; retry next call.
+                    return self._snapshot
+                self._stamp = stamp
+        return self._snapshot
+
+    def user_embeddings(self, user_id: int) -> np.ndarray | None:
+        snap = self.snapshot()
+        if snap is None or int(user_id) not in snap.user_ranges:
+            return None
+        start, end = snap.user_ranges[int(user_id)]
+        return snap.embeddings[start:end]
+
+    def best_similarity(self, user_id: int, embedding: np.ndarray) -> float | None:
+        """Highest cosine similarity between `embedding` and the user's rows, if enrolled."""
+        rows = self.user_embeddings(user_id)
+        if rows is None or rows.shape[0] == 0:
+            return None
+        return float(np.max(rows @ np.asarray(embedding, dtype=np.float32)))
+
+    def class_slice(self, class_name: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """`(embeddings, user_ids, student_ids)` views for one class roster."""
+        snap = self.snapshot()
+        if snap is None or class_name not in snap.class_ranges:
+            empty = np.zeros(0, dtype=np.int64)
+            return np.zeros((0, EMBEDDING_DIM), dtype=np.float32), empty, empty
+        start, end = snap.class_ranges[class_name]
+        return snap.embeddings[start:end], snap.user_ids[start:end], snap.student_ids[start:end]
+
+    # -- writing -----------------------------------------------------------------
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / "gallery.lock", "w") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _publish(
+        self,
+        embeddings: np.ndarray,
+        user_ids: Sequence[int],
+        student_ids: Sequence[int],
+        classes: Sequence[str],
+        embedding_ids: Sequence[int],
+    ) -> int:
+        """Write a new version and switch `current.json` to it. Caller holds the lock."""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        user_arr = np.asarray(user_ids, dtype=np.int64)
+        student_arr = np.asarray(student_ids, dtype=np.int64)
+        embedding_arr = np.asarray(embedding_ids, dtype=np.int64)
+        class_names = sorted(set(classes))
+        class_idx = np.asarray([class_names.index(c) for c in classes], dtype=np.int64)
+
+        order = np.lexsort((user_arr, class_idx)) if len(classes) else np.zeros(0, dtype=np.int64)
+        embeddings = embeddings[order]
+        ids = (
+            np.stack([user_arr[order], student_arr[order], embedding_arr[order]], axis=1)
+            if len(order)
+            else np.zeros((0, 3), dtype=np.int64)
+        )
+        sorted_idx = class_idx[order]
+
+        class_ranges = {}
+        for i, name in enumerate(class_names):
+            hits = np.flatnonzero(sorted_idx == i)
+            class_ranges[name] = [int(hits[0]), int(hits[-1]) + 1]
+
+        version = time.time_ns()
+        for name, arr in ((f"embeddings-{version}.npy", embeddings), (f"ids-{version}.npy", ids)):
+            tmp = self.root / f".{name}.tmp"
+            with open(tmp, "wb") as fh:
+                np.save(fh, arr)
+            os.replace(tmp, self.root / name)
+
+        tmp = self.root / ".current.json.tmp"
+        tmp.write_text(
+            json.dumps(
+                {
+                    "version": version,
+                    "count": int(len(order)),
+                    "dim": EMBEDDING_DIM,
+                    "classes": class_ranges,
+                    "fingerprint": _fingerprint(embedding_arr),
+                }
+            )
+        )
+        os.replace(tmp, self._pointer)
+        self._cleanup(keep=version)
+        return version
+
+    def _cleanup(self, keep: int) -> None:
+        # Readers that still map an old version keep its inode alive until they re-map.
+        for path in self.root.glob("*-*.npy"):
+            if not path.stem.endswith(str(keep)):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def replace_users(self, updates: dict[int, UserRows]) -> None:
+        """Patch several users' rows in one publish (empty/None `embeddings` removes a user).
+
+        `embedding_ids` are the rows' `facial_embeddings.id`s; without them the
+        gallery has no fingerprint and the next sync check rebuilds it.
+        """
+        if not updates:
+            return
+        with self._write_lock():
+            self._stamp = None  # force a fresh read under the lock
+            snap = self.snapshot() or _empty_snapshot()
+            keep = ~np.isin(snap.user_ids, np.fromiter(updates, dtype=np.int64))
+            rows = [np.asarray(snap.embeddings[keep])]
+            user_ids = snap.user_ids[keep].tolist()
+            student_ids = snap.student_ids[keep].tolist()
+            row_ids = snap.embedding_ids[keep].tolist()
+            classes = [c for c, k in zip(snap.row_classes(), keep.tolist()) if k]
+
+            for user_id, update in updates.items():
+                if update.embeddings is None or not len(update.embeddings):
+                    continue
+                new_rows = _normalize(update.embeddings)
+                count = len(new_rows)
+                rows.append(new_rows)
+                user_ids += [int(user_id)] * count
+                student_ids += [
+                    int(update.student_id) if update.student_id is not None else -1
+                ] * count
+                classes += [update.class_name or ""] * count
+                row_ids += (
+                    list(update.embedding_ids) if update.embedding_ids is not None else [-1] * count
+                )
+
+            self._publish(np.concatenate(rows, axis=0), user_ids, student_ids, classes, row_ids)
+
+    def replace_user(
+        self,
+        user_id: int,
+        *,
+        student_id: int | None,
+        class_name: str | None,
+        embeddings: np.ndarray | None,
+        embedding_ids: Sequence[int] | None = None,
+    ) -> None:
+        """Patch one user's rows in place (see `replace_users`)."""
+        self.replace_users(
+            {int(user_id): UserRows(student_id, class_name, embeddings, embedding_ids)}
+        )
+
+    def remove_user(self, user_id: int) -> None:
+        if self.snapshot() is None:
+            return
+        self.replace_user(user_id, student_id=None, class_name=None, embeddings=None)
+
+    # -- database sync -----------------------------------------------------------
+
+    _ROWS_SQL = (
+        "SELECT COALESCE(fe.user_id, s.user_id) AS user_id, s.id AS student_id, "
+        "COALESCE(s.class, '') AS class_name, fe.embedding AS embedding, fe.id AS embedding_id "
+        "FROM facial_embeddings fe "
+        "LEFT JOIN students s ON s.id = fe.student_id "
+        "OR (fe.student_id IS NULL AND s.user_id = fe.user_id) "
+        "WHERE fe.embedding IS NOT NULL AND fe.model_version = :mv"
+    )
+
+    _FINGERPRINT_SQL = (
+        "SELECT COUNT(*), COALESCE(MAX(g.embedding_id), 0) FROM (" + _ROWS_SQL + ") g "
+        "WHERE g.user_id IS NOT NULL"
+    )
+
+    def db_fingerprint(self, db: Session) -> tuple[int, int]:
+        """`(rows, max id)` of the gallery's rows in `facial_embeddings`."""
+        count, max_id = db.execute(text(self._FINGERPRINT_SQL), {"mv": model_version()}).one()
+        return int(count), int(max_id)
+
+    def rebuild(self, db: Session) -> int:
+        """Rebuild the whole gallery from `facial_embeddings`. Returns the row count."""
+        with self._write_lock():
+            # Read under the lock, so a patch published meanwhile is not overwritten with older rows.
+            rows = [
+                r
+                for r in db.execute(text(self._ROWS_SQL), {"mv": model_version()}).fetchall()
+                if r[0] is not None
+            ]
+            embeddings = (
+                _normalize(np.stack([parse_pgvector(r[3]) for r in rows]))
+                if rows
+                else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+            )
+            self._publish(
+                embeddings,
+                [int(r[0]) for r in rows],
+                [int(r[1]) if r[1] is not None else -1 for r in rows],
+                [r[2] or "" for r in rows],
+                [int(r[4]) for r in rows],
+            )
+        self._checked_at = time.monotonic()
+        logger.info("Face gallery rebuilt", extra={"rows": len(rows)})
+        return len(rows)
+
+    def _in_sync(self, db: Session, snap: GallerySnapshot) -> bool:
+        """Whether `snap` matches the database; checked at most every `face_gallery_sync_check_seconds`."""
+        interval = get_settings().face_gallery_sync_check_seconds
+        now = time.monotonic()
+        if self._checked_at is not None and (interval <= 0 or now - self._checked_at < interval):
+            return True
+        self._checked_at = now
+        try:
+            fingerprint = self.db_fingerprint(db)
+        except Exception:
+            logger.exception("Face gallery sync check failed")
+            return True
+        if snap.fingerprint == fingerprint:
+            return True
+        logger.warning(
+            "Face gallery out of sync with facial_embeddings; rebuilding",
+            extra={"gallery": snap.fingerprint, "database": fingerprint},
+        )
+        return False
+
+    def ensure_built(self, db: Session) -> GallerySnapshot | None:
+        """The published snapshot, built (or rebuilt when out of sync) from the database."""
+        snap = self.snapshot()
+        if snap is not None and self._in_sync(db, snap):
+            return snap
+        try:
+            self.rebuild(db)
+        except Exception:
+            logger.exception("Face gallery rebuild failed")
+            return None
+        return self.snapshot()
+
+    def refresh_users(self, db: Session, user_ids: Iterable[int]) -> None:
+        """Re-read some users' rows from the database and patch them in with one publish."""
+        user_ids = sorted({int(uid) for uid in user_ids})
+        if not user_ids or self.snapshot() is None:
+            return  # built lazily on first use; nothing to patch yet
+        by_user: dict[int, list] = {uid: [] for uid in user_ids}
+        for r in db.execute(
+            text(self._ROWS_SQL + " AND COALESCE(fe.user_id, s.user_id) IN :uids").bindparams(
+                bindparam("uids", expanding=True)
+            ),
+            {"uids": user_ids, "mv": model_version()},
+        ).fetchall():
+            by_user[int(r[0])].append(r)
+        self.replace_users(
+            {
+                uid: UserRows(
+                    student_id=next((int(r[1]) for r in rows if r[1] is not None), None),
+                    class_name=next((r[2] for r in rows if r[2]), None),
+                    embeddings=np.stack([parse_pgvector(r[3]) for r in rows]) if rows else None,
+                    embedding_ids=[int(r[4]) for r in rows],
+                )
+                for uid, rows in by_user.items()
+            }
+        )
+
+    def refresh_user(self, db: Session, user_id: int) -> None:
+        """Re-read one user's rows from the database and patch them in."""
+        self.refresh_users(db, [user_id])
+
+    def refresh_student(self, db: Session, student_id: int) -> None:
+        row = db.execute(
+            text("SELECT user_id FROM students WHERE id = :sid"), {"sid": int(student_id)}
+        ).fetchone()
+        if row and row[0] is not None:
+            self.refresh_user(db, int(row[0]))
+
+    def stats(self) -> dict:
+        snap = self.snapshot()
+        if snap is None:
+            return {"built": False}
+        return {
+            "built": True,
+            "version": snap.version,
+            "rows": snap.size,
+            "users": len(snap.user_ranges),
+            "classes": len(snap.class_ranges),
+        }
+
+
+face_gallery = FaceGallery(Path(get_settings().face_gallery_dir) / model_version())
@@ -0,0 +1,224 @@
+"""1:N face identification for classroom kiosks.
+
+Unlike verification (`app.services.facial`), the caller does not say who the
+person claims to be: the probe embedding is searched against every enrolled
+embedding, optionally restricted to one class roster, and the best matching
+users are returned.
+
+Two backends (`face_identify_backend`):
+- `gallery` (default): searches the memory-mapped gallery. A class roster is a
+  contiguous slice and is scanned exactly; whole-school searches go through an
+  `IVFFlatIndex` rebuilt once per published gallery version.
+- `pgvector`: `ORDER BY embedding <=> :q` served by the HNSW index on
+  `facial_embeddings.embedding`.
+
+Several embeddings are stored per user, so row hits are collapsed to one
+candidate per user (best similarity). Each candidate carries its `margin` to
+the best *other* user; an identification is accepted only if the top candidate
+clears both `facial_confidence_threshold` and `face_identify_min_margin`.
+"""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import asdict, dataclass
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.db.vector import vector_cast, vector_param
+from app.services.ann_index import ExactIndex, IVFFlatIndex, build_index
+from app.services.face_engine import FaceQualityError
+from app.services.face_gallery import face_gallery
+from app.services.face_inference import FaceInferenceUnavailable, face_inference
+from app.services.inference_profiles import model_version
+
+settings = get_settings()
+
+# Row hits fetched per requested user before collapsing to one row per user.
+_ROWS_PER_USER = 8
+
+
+@dataclass(frozen=True)
+class IdentifyCandidate:
+    user_id: int
+    student_id: int | None
+    similarity: float
+    margin: float
+
+
+@dataclass(frozen=True)
+class IdentifyResult:
+    identified: bool
+    candidates: list[IdentifyCandidate]
+    failure_reason: str | None = None
+    backend: str | None = None
+
+    @property
+    def best(self) -> IdentifyCandidate | None:
+        return self.candidates[0] if self.candidates else None
+
+    def to_dict(self) -> dict:
+        return {
+            "identified": self.identified,
+            "user_id": self.best.user_id if self.identified else None,
+            "student_id": self.best.student_id if self.identified else None,
+            "candidates": [
+                {**asdict(c), "similarity": round(c.similarity, 4), "margin": round(c.margin, 4)}
+                for c in self.candidates
+            ],
+            "failure_reason": self.failure_reason,
+            "backend": self.backend,
+        }
+
+
+_index_lock = threading.Lock()
+_index_cache: tuple[int, ExactIndex | IVFFlatIndex] | None = None
+
+
+def _school_index() -> tuple[ExactIndex | IVFFlatIndex, np.ndarray, np.ndarray] | None:
+    """Index over the whole gallery, rebuilt when a new version is published."""
+    global _index_cache
+    snap = face_gallery.snapshot()
+    if snap is None:
+        return None
+    with _index_lock:
+        if _index_cache is None or _index_cache[0] != snap.version:
+            index = build_index(
+                snap.embeddings,
+                min_rows=settings.face_ann_min_rows,
+                nlist=settings.face_ann_nlist or None,
+                nprobe=settings.face_ann_nprobe,
+            )
+            _index_cache = (snap.version, index)
+        index = _index_cache[1]
+    return index, snap.user_ids, snap.student_ids
+
+
+def _collapse(
+    scores: np.ndarray, user_ids: np.ndarray, student_ids: np.ndarray, top_k: int
+) -> list[IdentifyCandidate]:
+    """Best row per user, top `top_k` users, with margins to the best other user."""
+    best: dict[int, tuple[float, int | None]] = {}
+    for score, uid, sid in zip(scores.tolist(), user_ids.tolist(), student_ids.tolist()):
+        uid = int(uid)
+        if uid not in best or score > best[uid][0]:
+            best[uid] = (float(score), int(sid) if sid is not None and sid >= 0 else None)
+
+    ranked = sorted(best.items(), key=lambda item: item[1][0], reverse=True)[:top_k]
+    candidates = []
+    for i, (uid, (score, sid)) in enumerate(ranked):
+        if len(ranked) == 1:
+            margin = score  # no rival: margin against a zero similarity
+        else:
+            rival = ranked[1][1][0] if i == 0 else ranked[0][1][0]
+            margin = score - rival
+        candidates.append(
+            IdentifyCandidate(user_id=uid, student_id=sid, similarity=score, margin=margin)
+        )
+    return candidates
+
+
+def _search_gallery(
+    emb: np.ndarray, *, class_name: str | None, top_k: int
+) -> list[IdentifyCandidate]:
+    fetch = top_k * _ROWS_PER_USER
+    if class_name:
+        embeddings, user_ids, student_ids = face_gallery.class_slice(class_name)
+        scores, rows = ExactIndex(embeddings).search(emb, fetch)
+    else:
+        built = _school_index()
+        if built is None:
+            return []
+        index, user_ids, student_ids = built
+        scores, rows = index.search(emb, fetch)
+    return _collapse(scores, user_ids[rows], student_ids[rows], top_k)
+
+
+def _search_pgvector(
+    db: Session, emb: np.ndarray, *, class_name: str | None, top_k: int
+) -> list[IdentifyCandidate]:
+    q = vector_param(emb)
+    # Only takes effect inside the current transaction.
+    db.execute(text(f"SET LOCAL hnsw.ef_search = {int(settings.face_hnsw_ef_search)}"))
+    sql = (
+        "SELECT COALESCE(fe.user_id, s.user_id) AS user_id, s.id AS student_id, "
+        f"1 - (fe.embedding <=> (:q){vector_cast()}) AS similarity "
+        "FROM facial_embeddings fe "
+        "LEFT JOIN students s ON s.id = fe.student_id "
+        "OR (fe.student_id IS NULL AND s.user_id = fe.user_id) "
+        "WHERE fe.embedding IS NOT NULL AND fe.model_version = :mv "
+    )
+    params: dict = {"q": q, "limit": top_k * _ROWS_PER_USER, "mv": model_version()}
+    if class_name:
+        sql += "AND s.class = :class_name "
+        params["class_name"] = class_name
+    sql += f"ORDER BY fe.embedding <=> (:q){vector_cast()} ASC LIMIT :limit"
+
+    rows = [r for r in db.execute(text(sql), params).fetchall() if r[0] is not None]
+    if not rows:
+        return []
+    return _collapse(
+        np.array([float(r[2]) for r in rows], dtype=np.float32),
+        np.array([int(r[0]) for r in rows], dtype=np.int64),
+        np.array([int(r[1]) if r[1] is not None else -1 for r in rows], dtype=np.int64),
+        top_k,
+    )
+
+
+def identify_embedding(
+    db: Session,
+    emb: np.ndarray,
+    *,
+    class_name: str | None = None,
+    top_k: int = 5,
+    threshold: float | None = None,
+    min_margin: float | None = None,
+) -> IdentifyResult:
+    threshold = settings.facial_confidence_threshold if threshold is None else threshold
+    min_margin = settings.face_identify_min_margin if min_margin is None else min_margin
+    top_k = max(1, min(int(top_k), 20))
+
+    backend = settings.face_identify_backend
+    if backend == "gallery" and (
+        not settings.face_gallery_enabled or face_gallery.ensure_built(db) is None
+    ):
+        backend = "pgvector"
+
+    if backend == "gallery":
+        candidates = _search_gallery(emb, class_name=class_name, top_k=top_k)
+    else:
+        candidates = _search_pgvector(db, emb, class_name=class_name, top_k=top_k)
+
+    if not candidates:
+        return IdentifyResult(False, [], "no_enrolled_embeddings", backend)
+    top = candidates[0]
+    if top.similarity < threshold:
+        return IdentifyResult(False, candidates, "below_threshold", backend)
+    if len(candidates) > 1 and top.margin < min_margin:
+        return IdentifyResult(False, candidates, "ambiguous_match", backend)
+    return IdentifyResult(True, candidates, None, backend)
+
+
+async def identify_face_by_image_async(
+    db: Session,
+    *,
+    image_bytes: bytes,
+    class_name: str | None = None,
+    top_k: int = 5,
+) -> IdentifyResult:
+    """Embed `image_bytes` on the inference executor, then `identify_embedding`.
+
+    `FaceInferenceUnavailable` propagates so the route answers 503.
+    """
+    try:
+        emb, _metrics = await face_inference.extract_async(image_bytes)
+    except FaceQualityError as e:
+        return IdentifyResult(False, [], e.reason)
+    except FaceInferenceUnavailable:
+        raise
+    except Exception:
+        return IdentifyResult(False, [], "invalid_image")
+    return identify_embedding(db, emb, class_name=class_name, top_k=top_k)
@@ -0,0 +1,356 @@
+"""Dedicated executor for face inference (detection + recognition).
+
+Face inference is CPU heavy and used to run inline on the request thread, so a
+burst of check-ins at the start of a class stalled the whole server. Requests
+now hand their work to `face_inference`, which owns:
+
+- a process pool (`face_inference_workers`), each worker holding its own
+  `FaceAnalysis` loaded once by `_init_worker`; with 0 workers jobs run on a
+  thread pool in-process (handy for development and tests),
+- a bounded number of pending jobs (`face_inference_max_pending`); when it is
+  reached new jobs are rejected immediately with `FaceInferenceBusyError`,
+- a per-request deadline (`face_inference_timeout_seconds`),
+- a micro-batcher in front of the recognition model: concurrent `extract`
+  calls are grouped (`face_batch_max_size` / `face_batch_max_wait_ms`) and run
+  as one `extract_embeddings_batch` job, so a burst costs one batched forward
+  pass per group instead of one per request; self check-in photos go through
+  a second batcher whose job also runs liveness on the same decoded frame
+  (`analyze_checkin_async`).
+
+Both errors derive from `FaceInferenceUnavailable`, which `app.main` maps to a
+503 response carrying a `Retry-After` header.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.core.logging_config import facial_logger as logger
+from app.services.checkin_analysis import (
+    CheckinAnalysis,
+    analyze_checkin_image,
+    analyze_checkin_images,
+)
+from app.services.embedding_cache import embedding_cache, unpack
+from app.services.face_engine import (
+    FaceQualityError,
+    FaceQualityMetrics,
+    extract_embedding_from_crop,
+    extract_embedding_with_quality,
+    extract_embeddings_batch,
+)
+from app.utils.micro_batcher import MicroBatcher
+
+
+class FaceInferenceUnavailable(RuntimeError):
+    """Inference could not be served right now; the client should retry later."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class FaceInferenceBusyError(FaceInferenceUnavailable):
+    pass
+
+
+class FaceInferenceTimeoutError(FaceInferenceUnavailable):
+    pass
+
+
+def _init_worker() -> None:
+    """Process-pool initializer: load and warm this worker's own `FaceAnalysis`."""
+    from app.services.face_engine import warm_up_face_engine
+
+    warm_up_face_engine()
+
+
+def _analyze_batch_job(items: list[tuple[bytes, bool]]) -> list:
+    """Pool job behind the check-in batcher: one `CheckinAnalysis` per `(image, stop_flag)`."""
+    return analyze_checkin_images(
+        [image for image, _stop in items], [stop for _image, stop in items]
+    )
+
+
+def _extract_batch_job(images: list[bytes]) -> list:
+    """Pool job behind the micro-batcher: one `(embedding, metrics)` or error per image."""
+    return [
+        (
+            (r.embedding, r.metrics)
+            if r.ok
+            else FaceQualityError(r.reason or "invalid_image", r.metrics)
+        )
+        for r in extract_embeddings_batch(images)
+    ]
+
+
+class FaceInferenceExecutor:
+    """Bounded, deadline-aware executor for face inference jobs."""
+
+    def __init__(
+        self,
+        *,
+        workers: int = 2,
+        max_pending: int = 32,
+        timeout_seconds: float = 10.0,
+        retry_after_seconds: int = 2,
+        batching: bool = True,
+        batch_max_size: int = 16,
+        batch_max_wait_ms: float = 5.0,
+    ):
+        self.workers = max(0, int(workers))
+        self.max_pending = max(1, int(max_pending))
+        self.timeout_seconds = float(timeout_seconds)
+        self.retry_after_seconds = max(1, int(retry_after_seconds))
+
+        self._pool: Executor | None = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._stats_lock = threading.Lock()
+        self._pending = 0
+        self._submitted = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timed_out = 0
+
+        self._batcher: MicroBatcher | None = None
+        self._analysis_batcher: MicroBatcher | None = None
+        if batching:
+            self._batcher = MicroBatcher(
+                lambda images: self._run_batch_job(_extract_batch_job, images),
+                max_batch=batch_max_size,
+                max_wait_ms=batch_max_wait_ms,
+                max_in_flight=max(1, self.workers),
+                name="face-batcher",
+            )
+            self._analysis_batcher = MicroBatcher(
+                lambda images: self._run_batch_job(_analyze_batch_job, images),
+                max_batch=batch_max_size,
+                max_wait_ms=batch_max_wait_ms,
+                max_in_flight=max(1, self.workers),
+                name="checkin-batcher",
+            )
+
+    def _get_pool(self) -> Executor:
+        if self._pool is not None:
+            return self._pool
+        with self._pool_lock:
+            if self._pool is None:
+                if self.workers > 0:
+                    # "spawn" keeps ONNX Runtime / OpenCV thread pools out of the
+                    # children; every worker loads its own models in `_init_worker`.
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                    )
+                else:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=2, thread_name_prefix="face-inference"
+                    )
+                logger.info(
+                    "Face inference executor started",
+                    extra={"workers": self.workers, "max_pending": self.max_pending},
+                )
+        return self._pool
+
+    def _release(self, _future: Future | None = None) -> None:
+        with self._stats_lock:
+            self._pending -= 1
+            self._completed += 1
+        self._slots.release()
+
+    def _acquire_slot(self) -> None:
+        if not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self._rejected += 1
+            raise FaceInferenceBusyError("face_inference_saturated", self.retry_after_seconds)
+        with self._stats_lock:
+            self._pending += 1
+            self._submitted += 1
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """Queue a job, or raise `FaceInferenceBusyError` if the queue is full."""
+        self._acquire_slot()
+        try:
+            future = self._get_pool().submit(fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _run_batch_job(self, job: Callable[[list], list], images: list[bytes]) -> list:
+        # Runs on a batcher dispatch thread; request slots were taken per image.
+        return self._get_pool().submit(job, images).result()
+
+    def _submit_batched(
+        self, batcher: MicroBatcher | None, item: Any, fn: Callable[..., Any], *args: Any
+    ) -> Future:
+        """Queue `item` on `batcher`, or run `fn(*args)` as its own job when batching is off."""
+        if batcher is None:
+            return self.submit(fn, *args)
+        self._acquire_slot()
+        future = batcher.submit(item)
+        future.add_done_callback(self._release)
+        return future
+
+    def _submit_extract(self, image_bytes: bytes) -> Future:
+        return self._submit_batched(
+            self._batcher, image_bytes, extract_embedding_with_quality, image_bytes
+        )
+
+    def _on_timeout(self, future: Future) -> FaceInferenceTimeoutError:
+        # Frees the slot right away if the job had not started yet.
+        future.cancel()
+        with self._stats_lock:
+            self._timed_out += 1
+        return FaceInferenceTimeoutError("face_inference_timeout", self.retry_after_seconds)
+
+    def run(
+        self, fn: Callable[..., Any], *args: Any, timeout: float | None = None, **kwargs: Any
+    ) -> Any:
+        """Submit a job and block the calling thread until its result (or deadline)."""
+        return self._wait(self.submit(fn, *args, **kwargs), timeout)
+
+    async def run_async(
+        self, fn: Callable[..., Any], *args: Any, timeout: float | None = None, **kwargs: Any
+    ) -> Any:
+        """Submit a job and await its result without blocking the event loop."""
+        return await self._wait_async(self.submit(fn, *args, **kwargs), timeout)
+
+    def _wait(self, future: Future, timeout: float | None) -> Any:
+        try:
+            return future.result(timeout=timeout or self.timeout_seconds)
+        except FutureTimeoutError:
+            raise self._on_timeout(future) from None
+
+    async def _wait_async(self, future: Future, timeout: float | None) -> Any:
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(future), timeout=timeout or self.timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            raise self._on_timeout(future) from None
+
+    def _submit_crop(self, crop_bytes: bytes) -> Future:
+        # Client-aligned crops skip detection; they are cheap enough to run unbatched.
+        return self.submit(extract_embedding_from_crop, crop_bytes)
+
+    def extract(
+        self, image_bytes: bytes, *, client_crop: bool = False
+    ) -> tuple[np.ndarray, FaceQualityMetrics]:
+        """Executor-backed `extract_embedding_with_quality` (same return / errors).
+
+        Repeats of a frame seen within the cache TTL are answered from
+        `embedding_cache` without running inference. With `client_crop` the
+        bytes are a 112x112 aligned face (`extract_embedding_from_crop`).
+        """
+        digest, cached = embedding_cache.lookup(image_bytes, client_crop=client_crop)
+        if cached is not None:
+            return unpack(cached)
+        future = (
+            self._submit_crop(image_bytes) if client_crop else self._submit_extract(image_bytes)
+        )
+        try:
+            result = self._wait(future, None)
+        except FaceQualityError as e:
+            embedding_cache.put(digest, (None, e.metrics, e.reason))
+            raise
+        embedding_cache.put(digest, (result[0], result[1], None))
+        return result
+
+    async def extract_async(
+        self, image_bytes: bytes, *, client_crop: bool = False
+    ) -> tuple[np.ndarray, FaceQualityMetrics]:
+        digest, cached = embedding_cache.lookup(image_bytes, client_crop=client_crop)
+        if cached is not None:
+            return unpack(cached)
+        future = (
+            self._submit_crop(image_bytes) if client_crop else self._submit_extract(image_bytes)
+        )
+        try:
+            result = await self._wait_async(future, None)
+        except FaceQualityError as e:
+            embedding_cache.put(digest, (None, e.metrics, e.reason))
+            raise
+        embedding_cache.put(digest, (result[0], result[1], None))
+        return result
+
+    async def analyze_checkin_async(
+        self, image_bytes: bytes, *, stop_on_liveness_failure: bool = False
+    ) -> CheckinAnalysis:
+        """Liveness + quality + embedding of a check-in photo from one decode/detection.
+
+        With `stop_on_liveness_failure` the recognition pass is skipped when
+        liveness has already rejected the photo (`failure_reason="liveness_failed"`).
+        """
+        future = self._submit_batched(
+            self._analysis_batcher,
+            (image_bytes, stop_on_liveness_failure),
+            analyze_checkin_image,
+            image_bytes,
+            stop_on_liveness_failure,
+        )
+        return await self._wait_async(future, None)
+
+    def warm_up(self) -> bool:
+        """Load and warm the models of every pool worker (of this process without a pool)."""
+        from app.services.face_engine import warm_up_face_engine
+
+        if self.workers == 0:
+            return warm_up_face_engine()
+        # Concurrent jobs make the pool start all of its workers.
+        futures = [self._get_pool().submit(warm_up_face_engine) for _ in range(self.workers)]
+        return all(f.result() for f in futures)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+            }
+        stats["profile"] = get_settings().face_inference_profile
+        stats["embedding_cache"] = embedding_cache.stats()
+        stats["batching"] = self._batcher.stats() if self._batcher else None
+        stats["checkin_batching"] = (
+            self._analysis_batcher.stats() if self._analysis_batcher else None
+        )
+        return stats
+
+    def shutdown(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+def _build_executor() -> FaceInferenceExecutor:
+    settings = get_settings()
+    return FaceInferenceExecutor(
+        workers=settings.face_inference_workers,
+        max_pending=settings.face_inference_max_pending,
+        timeout_seconds=settings.face_inference_timeout_seconds,
+        retry_after_seconds=settings.face_inference_retry_after_seconds,
+        batching=settings.face_batching_enabled,
+        batch_max_size=settings.face_batch_max_size,
+        batch_max_wait_ms=settings.face_batch_max_wait_ms,
+    )
+
+
+# Global instance; the pool itself is created lazily on first use.
+face_inference = _build_executor()
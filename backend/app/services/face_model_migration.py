@@ -0,0 +1,336 @@
+"""Switching recognition models by re-embedding stored aligned face crops.
+
+Every `facial_embeddings` row is tagged with the InsightFace pack that
+produced it (`model_version`) and, since enrollment keeps them, the hash of
+its aligned 112x112 crop (`app/services/face_crops.py`). A model cutover
+then never touches the original images or the detector:
+
+1. `backfill_crops`: once, for rows enrolled before crops were kept. Their
+   stored image is decoded, detected and aligned, and the crop recorded.
+2. `migrate(target=...)`: for every row of the serving version that has a
+   crop and no `target` row yet, embed the crops in large batches with the
+   target's recognition model only, on the `face_inference` pool, and insert
+   them as `model_version = target`. The old rows stay, so workers still on
+   the old model keep verifying. The job is resumable: it only picks rows
+   without a target counterpart.
+3. Switch `FACE_MODEL_VERSION` (or `INSIGHTFACE_MODEL`) and restart. Reads
+   are by serving version; a user the job missed (enrolled meanwhile) is
+   re-embedded from their crops on their next verification (`reembed_user`,
+   the dual read in `facial._match_enrolled_embedding`).
+4. `prune_other_versions` drops the old rows once no worker serves them.
+
+Entry point: `scripts/migrate_embedding_model.py`.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.logging_config import facial_logger as logger
+from app.services.face_crops import face_crop_store
+from app.services.face_engine import embed_aligned_crops, extract_embeddings_batch
+from app.services.face_gallery import face_gallery
+from app.services.face_inference import FaceInferenceBusyError, face_inference
+from app.services.face_reindex import faces_root
+from app.services.facial import insert_embedding_rows
+from app.services.inference_profiles import model_version
+
+_ROW_COLUMNS = (
+    "fe.id, fe.student_id, fe.user_id, fe.image_path, fe.image_hash, fe.is_primary, "
+    "fe.embedding_model, fe.lighting_conditions, fe.crop_hash"
+)
+
+# Rows of :source with a crop and no :target row for the same crop and owner.
+_PENDING_WHERE = (
+    "FROM facial_embeddings fe "
+    "WHERE fe.model_version = :source AND fe.crop_hash IS NOT NULL "
+    "AND NOT EXISTS (SELECT 1 FROM facial_embeddings t WHERE t.model_version = :target "
+    "AND t.crop_hash = fe.crop_hash "
+    "AND COALESCE(t.user_id, -1) = COALESCE(fe.user_id, -1) "
+    "AND COALESCE(t.student_id, -1) = COALESCE(fe.student_id, -1)) "
+)
+
+_USER_CROPS_SQL = (
+    f"SELECT {_ROW_COLUMNS} FROM facial_embeddings fe "
+    "LEFT JOIN students s ON s.id = fe.student_id "
+    "WHERE COALESCE(fe.user_id, s.user_id) = :uid AND fe.crop_hash IS NOT NULL "
+    "AND (fe.model_version IS NULL OR fe.model_version <> :mv) "
+    "ORDER BY fe.id"
+)
+
+_STORAGE_PREFIX = "/storage/faces/"
+
+
+@dataclass
+class ModelMigrationProgress:
+    state: str = "idle"  # idle | running | completed | failed
+    source: str = ""
+    target: str = ""
+    rows_total: int = 0
+    rows_done: int = 0
+    rows_missing_crop: int = 0
+    started_at: float | None = None
+    finished_at: float | None = None
+    error: str | None = None
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        data["elapsed_seconds"] = round(elapsed, 2)
+        data["rows_per_second"] = round(self.rows_done / elapsed, 2) if elapsed > 0 else 0.0
+        return data
+
+
+def _embed_crops(crops: list[np.ndarray], target: str, *, wait: bool) -> np.ndarray:
+    """Run `embed_aligned_crops` on the inference pool; batch jobs wait out a busy pool."""
+    batch_size = max(1, get_settings().face_model_migration_batch_size)
+    timeout = face_inference.timeout_seconds * max(1, len(crops) // 16)
+    while True:
+        try:
+            return face_inference.run(
+                embed_aligned_crops, crops, model=target, batch_size=batch_size, timeout=timeout
+            )
+        except FaceInferenceBusyError as e:
+            if not wait:
+                raise
+            # Live traffic has the pool; back off instead of failing the run.
+            time.sleep(e.retry_after)
+
+
+def reembed_rows(
+    db: Session, rows: list[dict], target: str, *, wait: bool = True
+) -> tuple[list[dict], int]:
+    """Insert a `target` copy of each row, embedded from its stored crop.
+
+    Returns `(inserted_rows, missing_crops)`; nothing is committed.
+    """
+    kept, crops = [], []
+    for row in rows:
+        crop = face_crop_store.get(row["crop_hash"])
+        if crop is not None:
+            kept.append(row)
+            crops.append(crop)
+    if not crops:
+        return [], len(rows)
+
+    embeddings = _embed_crops(crops, target, wait=wait)
+    new_rows = [
+        {
+            "student_id": row["student_id"],
+            "user_id": row["user_id"],
+            "image_path": row["image_path"],
+            "image_hash": row["image_hash"],
+            "is_primary": bool(row["is_primary"]),
+            "embedding": emb,
+            "embedding_model": row["embedding_model"] or "insightface",
+            "lighting_conditions": row["lighting_conditions"],
+            "model_version": target,
+            "crop_hash": row["crop_hash"],
+        }
+        for row, emb in zip(kept, embeddings)
+    ]
+    insert_embedding_rows(db, new_rows)
+    return new_rows, len(rows) - len(new_rows)
+
+
+_reembedding_users: set[int] = set()
+_reembedding_lock = threading.Lock()
+
+
+def reembed_user(db: Session, user_id: int) -> np.ndarray | None:
+    """Give a user rows of the serving model from crops stored under other models.
+
+    Returns the new embeddings, or None when there is nothing to re-embed
+    (or another request is already doing it). Raises `FaceInferenceUnavailable`
+    when the inference pool is saturated, like any verification.
+    """
+    with _reembedding_lock:
+        if user_id in _reembedding_users:
+            return None
+        _reembedding_users.add(user_id)
+    try:
+        serving = model_version()
+        rows = (
+            db.execute(text(_USER_CROPS_SQL), {"uid": int(user_id), "mv": serving}).mappings().all()
+        )
+        # One row per crop, whichever older model it was stored under.
+        unique = list({row["crop_hash"]: dict(row) for row in rows}.values())
+        if not unique:
+            return None
+        new_rows, _missing = reembed_rows(db, unique, serving, wait=False)
+        if not new_rows:
+            return None
+        db.commit()
+        face_gallery.refresh_user(db, user_id)
+        logger.info(
+            "Re-embedded user from stored crops",
+            extra={"user_id": user_id, "rows": len(new_rows), "model_version": serving},
+        )
+        return np.stack([row["embedding"] for row in new_rows])
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        with _reembedding_lock:
+            _reembedding_users.discard(user_id)
+
+
+def migrate(
+    session_factory: Callable[[], Session],
+    *,
+    target: str,
+    source: str | None = None,
+    batch_size: int | None = None,
+    on_progress: Callable[[ModelMigrationProgress], None] | None = None,
+) -> ModelMigrationProgress:
+    """Re-embed every `source` row (default: the serving model) with `target`."""
+    source = source or model_version()
+    if source == target:
+        raise ValueError("source and target model versions are the same")
+    batch_size = max(1, batch_size or get_settings().face_model_migration_batch_size)
+    progress = ModelMigrationProgress(
+        state="running", source=source, target=target, started_at=time.time()
+    )
+    params = {"source": source, "target": target}
+
+    db = session_factory()
+    try:
+        progress.rows_total = int(
+            db.execute(text("SELECT COUNT(*) " + _PENDING_WHERE), params).scalar() or 0
+        )
+        after = 0
+        while True:
+            rows = [
+                dict(r)
+                for r in db.execute(
+                    text(
+                        f"SELECT {_ROW_COLUMNS} "
+                        + _PENDING_WHERE
+                        + "AND fe.id > :after ORDER BY fe.id LIMIT :limit"
+                    ),
+                    {**params, "after": after, "limit": batch_size},
+                ).mappings()
+            ]
+            if not rows:
+                break
+            after = rows[-1]["id"]
+            new_rows, missing = reembed_rows(db, rows, target)
+            db.commit()
+            progress.rows_done += len(new_rows)
+            progress.rows_missing_crop += missing
+            logger.info("Embedding model migration progress", extra=progress.to_dict())
+            if on_progress:
+                on_progress(progress)
+
+        if target == model_version() and get_settings().face_gallery_enabled:
+            face_gallery.rebuild(db)
+        progress.state = "completed"
+    except Exception as e:
+        db.rollback()
+        progress.state = "failed"
+        progress.error = str(e)
+        logger.exception("Embedding model migration failed")
+    finally:
+        progress.finished_at = time.time()
+        db.close()
+    return progress
+
+
+def backfill_crops(
+    session_factory: Callable[[], Session],
+    *,
+    batch_size: int = 32,
+    on_progress: Callable[[int, int], None] | None = None,
+) -> tuple[int, int]:
+    """Store the aligned crop of rows enrolled before crops were kept.
+
+    Decodes and detects each row's image under `FACE_STORAGE_DIR` (the
+    one-time full-cost pass). Returns `(rows_backfilled, rows_skipped)`;
+    rows whose image is gone or no longer passes detection are skipped.
+    """
+    root = faces_root()
+    done = skipped = 0
+    after = 0
+    db = session_factory()
+    try:
+        while True:
+            rows = db.execute(
+                text(
+                    "SELECT id, image_path FROM facial_embeddings "
+                    "WHERE crop_hash IS NULL AND id > :after ORDER BY id LIMIT :limit"
+                ),
+                {"after": after, "limit": batch_size},
+            ).fetchall()
+            if not rows:
+                break
+            after = rows[-1][0]
+
+            ids, images = [], []
+            for row_id, image_path in rows:
+                path = root / str(image_path or "").removeprefix(_STORAGE_PREFIX)
+                try:
+                    images.append(path.read_bytes())
+                    ids.append(row_id)
+                except OSError:
+                    skipped += 1
+            if not images:
+                continue
+
+            results = face_inference.run(
+                extract_embeddings_batch,
+                images,
+                keep_crops=True,
+                timeout=face_inference.timeout_seconds * max(1, len(images)),
+            )
+            updates = [
+                {"id": row_id, "crop_hash": face_crop_store.put(result.crop)}
+                for row_id, result in zip(ids, results)
+                if result.crop is not None
+            ]
+            skipped += len(ids) - len(updates)
+            if updates:
+                db.execute(
+                    text("UPDATE facial_embeddings SET crop_hash = :crop_hash WHERE id = :id"),
+                    updates,
+                )
+                db.commit()
+            done += len(updates)
+            if on_progress:
+                on_progress(done, skipped)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return done, skipped
+
+
+def version_counts(db: Session) -> dict[str, dict]:
+    """`{model_version: {"rows": n, "with_crop": m}}` for every stored version."""
+    return {
+        str(r[0]): {"rows": int(r[1]), "with_crop": int(r[2])}
+        for r in db.execute(
+            text(
+                "SELECT COALESCE(model_version, ''), COUNT(*), COUNT(crop_hash) "
+                "FROM facial_embeddings GROUP BY COALESCE(model_version, '') ORDER BY 1"
+            )
+        ).fetchall()
+    }
+
+
+def prune_other_versions(db: Session, keep: str) -> int:
+    """Delete the rows of every model version but `keep`; returns the count (not committed)."""
+    result = db.execute(
+        text("DELETE FROM facial_embeddings WHERE model_version IS NULL OR model_version <> :keep"),
+        {"keep": keep},
+    )
+    return int(result.rowcount or 0)
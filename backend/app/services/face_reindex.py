@@ -0,0 +1,353 @@
+"""Bulk re-indexing of stored face images into `facial_embeddings`.
+
+After a database restore the JPEGs under `FACE_STORAGE_DIR/<user_id>/` are
+still on disk but the embeddings are gone. The re-indexer rebuilds them in
+the background, so no request has to:
+
+- scan the storage tree for users with at least 3 images (by default only
+  users without embeddings; `force` re-embeds everyone it scans);
+- embed the images of `face_reindex_users_per_chunk` users at a time, split in
+  `face_reindex_batch_size` batches that run concurrently on the
+  `face_inference` process pool;
+- bulk-insert each chunk's rows and flag its students as enrolled in one
+  transaction, then checkpoint the indexed user ids so an interrupted run
+  resumes where it stopped (a finished run deletes the checkpoint, so the
+  next full run, e.g. after the next restore, starts over);
+- rebuild the shared face gallery once at the end.
+
+Entry points: `scripts/reindex_faces.py` (CLI), `POST /admin/faces/reindex`
+(full run on the background thread) and `face_reindexer.enqueue_user`,
+which facial login calls when a user has images but no embeddings. Users
+whose images gave too few usable embeddings are remembered (until their
+images change), so login reports them as not enrolled instead of queueing
+them again on every attempt.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Iterable
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.logging_config import facial_logger as logger
+from app.services.face_engine import FaceEmbeddingResult, extract_embeddings_batch
+from app.services.face_gallery import face_gallery
+from app.services.face_inference import FaceInferenceBusyError, face_inference
+from app.services.facial import bulk_insert_user_embeddings
+
+MIN_IMAGES_PER_USER = 3
+MIN_EMBEDDINGS_PER_USER = 2
+
+
+def faces_root() -> Path:
+    return Path(os.getenv("FACE_STORAGE_DIR", "/app/storage/faces"))
+
+
+@dataclass
+class ReindexProgress:
+    state: str = "idle"  # idle | running | completed | failed
+    users_total: int = 0
+    users_done: int = 0
+    users_resumed: int = 0
+    users_failed: int = 0
+    images_total: int = 0
+    images_embedded: int = 0
+    images_rejected: int = 0
+    rows_inserted: int = 0
+    started_at: float | None = None
+    finished_at: float | None = None
+    error: str | None = None
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        processed = self.images_embedded + self.images_rejected
+        data["elapsed_seconds"] = round(elapsed, 2)
+        data["images_per_second"] = round(processed / elapsed, 2) if elapsed > 0 else 0.0
+        return data
+
+
+class FaceReindexer:
+    def __init__(self, root: Path | str, checkpoint_path: Path | str):
+        self.root = Path(root)
+        self.checkpoint_path = Path(checkpoint_path)
+        self.progress = ReindexProgress()
+        self._lock = threading.Lock()
+        self._jobs: queue.Queue[dict] = queue.Queue()
+        self._pending_users: set[int] = set()
+        # user_id -> `_images_signature` of the images that failed to index
+        self._failed_users: dict[int, tuple[int, int]] = {}
+        self._worker: threading.Thread | None = None
+
+    # ---- scanning / checkpoint -------------------------------------------------
+
+    def scan(self, user_ids: Iterable[int] | None = None) -> list[tuple[int, list[Path]]]:
+        """`(user_id, jpeg paths)` for every user folder with enough images."""
+        if not self.root.exists():
+            return []
+        wanted = set(user_ids) if user_ids is not None else None
+        found = []
+        for entry in sorted(self.root.iterdir(), key=lambda p: p.name):
+            if not entry.is_dir() or not entry.name.isdigit():
+                continue
+            user_id = int(entry.name)
+            if wanted is not None and user_id not in wanted:
+                continue
+            paths = sorted(entry.glob("*.jpg"))
+            if len(paths) >= MIN_IMAGES_PER_USER:
+                found.append((user_id, paths))
+        return found
+
+    def _images_signature(self, user_id: int) -> tuple[int, int]:
+        paths = list((self.root / str(user_id)).glob("*.jpg"))
+        mtimes = []
+        for p in paths:
+            try:
+                mtimes.append(p.stat().st_mtime_ns)
+            except OSError:
+                continue
+        return len(mtimes), max(mtimes, default=0)
+
+    def load_checkpoint(self) -> set[int]:
+        try:
+            return set(json.loads(self.checkpoint_path.read_text()).get("done_user_ids", []))
+        except (OSError, ValueError):
+            return set()
+
+    def _save_checkpoint(self, done: set[int]) -> None:
+        self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.checkpoint_path.with_name(f"{self.checkpoint_path.name}.tmp")
+        tmp.write_text(json.dumps({"done_user_ids": sorted(done), "updated_at": time.time()}))
+        os.replace(tmp, self.checkpoint_path)
+
+    def _clear_checkpoint(self) -> None:
+        self.checkpoint_path.unlink(missing_ok=True)
+
+    # ---- embedding -------------------------------------------------------------
+
+    def _submit(self, images: list[bytes]) -> Future:
+        while True:
+            try:
+                return face_inference.submit(extract_embeddings_batch, images, keep_crops=True)
+            except FaceInferenceBusyError as e:
+                # Live traffic has the pool; back off instead of failing the run.
+                time.sleep(e.retry_after)
+
+    def embed_users(
+        self, users: list[tuple[int, list[Path]]], *, batch_size: int
+    ) -> dict[int, list[tuple[str, bytes, FaceEmbeddingResult]]]:
+        """Embed every image of `users`; `{user_id: [(path, bytes, result), ...]}`.
+
+        Batches are submitted up to the pool size at a time so every inference
+        worker stays busy.
+        """
+        items = []
+        for user_id, paths in users:
+            for p in paths:
+                try:
+                    items.append((user_id, p, p.read_bytes()))
+                except OSError:
+                    continue
+
+        batch_size = max(1, batch_size)
+        batches = [items[i : i + batch_size] for i in range(0, len(items), batch_size)]
+        in_flight = max(1, face_inference.workers)
+        results: list[FaceEmbeddingResult] = []
+        futures: list[Future] = []
+        for batch in batches:
+            futures.append(self._submit([b for _uid, _p, b in batch]))
+            if len(futures) >= in_flight:
+                results.extend(futures.pop(0).result())
+        for future in futures:
+            results.extend(future.result())
+
+        by_user: dict[int, list[tuple[str, bytes, FaceEmbeddingResult]]] = {}
+        for (user_id, path, data), result in zip(items, results):
+            by_user.setdefault(user_id, []).append(
+                (f"/storage/faces/{user_id}/{path.name}", data, result)
+            )
+        return by_user
+
+    # ---- writing ---------------------------------------------------------------
+
+    def write_users(
+        self,
+        db: Session,
+        embedded: dict[int, list[tuple[str, bytes, FaceEmbeddingResult]]],
+        *,
+        force: bool = False,
+    ) -> tuple[list[int], list[int]]:
+        """Insert the rows of every user with enough usable images, in one transaction.
+
+        Returns `(indexed_user_ids, failed_user_ids)`.
+        """
+        indexed, failed, rows = bulk_insert_user_embeddings(
+            db, embedded, replace=force, min_usable=MIN_EMBEDDINGS_PER_USER
+        )
+        db.commit()
+        usable = sum(1 for images in embedded.values() for _p, _d, r in images if r.ok)
+        self.progress.images_embedded += usable
+        self.progress.images_rejected += sum(len(images) for images in embedded.values()) - usable
+        self.progress.rows_inserted += rows
+        return indexed, failed
+
+    # ---- runs ------------------------------------------------------------------
+
+    def _record_outcome(self, indexed: Iterable[int], failed: Iterable[int]) -> None:
+        with self._lock:
+            for uid in indexed:
+                self._failed_users.pop(uid, None)
+        signatures = {uid: self._images_signature(uid) for uid in failed}
+        with self._lock:
+            self._failed_users.update(signatures)
+
+    def _users_with_embeddings(self, db: Session) -> set[int]:
+        return {
+            int(r[0])
+            for r in db.execute(
+                text(
+                    "SELECT fe.user_id FROM facial_embeddings fe WHERE fe.user_id IS NOT NULL "
+                    "UNION SELECT s.user_id FROM facial_embeddings fe "
+                    "JOIN students s ON s.id = fe.student_id"
+                )
+            ).fetchall()
+            if r[0] is not None
+        }
+
+    def run(
+        self,
+        session_factory: Callable[[], Session],
+        *,
+        user_ids: Iterable[int] | None = None,
+        force: bool = False,
+        resume: bool = True,
+        on_progress: Callable[[ReindexProgress], None] | None = None,
+    ) -> ReindexProgress:
+        """Re-index the scanned users. Full runs (no `user_ids`) are checkpointed."""
+        settings = get_settings()
+        full_run = user_ids is None
+        with self._lock:
+            self.progress = ReindexProgress(state="running", started_at=time.time())
+        progress = self.progress
+
+        db = session_factory()
+        users: list[tuple[int, list[Path]]] = []
+        try:
+            users = self.scan(user_ids)
+            if not force:
+                existing = self._users_with_embeddings(db)
+                users = [u for u in users if u[0] not in existing]
+            done = self.load_checkpoint() if full_run and resume else set()
+            if done:
+                progress.users_resumed = sum(1 for uid, _ in users if uid in done)
+                users = [u for u in users if u[0] not in done]
+            progress.users_total = len(users)
+            progress.images_total = sum(len(paths) for _uid, paths in users)
+
+            chunk_size = max(1, settings.face_reindex_users_per_chunk)
+            for start in range(0, len(users), chunk_size):
+                chunk = users[start : start + chunk_size]
+                embedded = self.embed_users(chunk, batch_size=settings.face_reindex_batch_size)
+                indexed, failed = self.write_users(db, embedded, force=force)
+                progress.users_done += len(indexed) + len(failed)
+                progress.users_failed += len(failed)
+                self._record_outcome(indexed, failed)
+                if full_run:
+                    done.update(indexed)
+                    self._save_checkpoint(done)
+                else:
+                    face_gallery.refresh_users(db, indexed)
+                logger.info("Face re-index progress", extra=progress.to_dict())
+                if on_progress:
+                    on_progress(progress)
+
+            if full_run and settings.face_gallery_enabled:
+                face_gallery.rebuild(db)
+            if full_run:
+                self._clear_checkpoint()
+            progress.state = "completed"
+        except Exception as e:
+            db.rollback()
+            progress.state = "failed"
+            progress.error = str(e)
+            logger.exception("Face re-index failed")
+            if not full_run:
+                # Don't leave a login waiting on a re-index that will not happen.
+                self._record_outcome([], [uid for uid, _paths in users])
+        finally:
+            progress.finished_at = time.time()
+            db.close()
+        return progress
+
+    # ---- background worker -----------------------------------------------------
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._work_loop, name="face-reindex", daemon=True
+                )
+                self._worker.start()
+
+    def _work_loop(self) -> None:
+        from app.db.session import SessionLocal
+
+        while True:
+            job = self._jobs.get()
+            if job.get("pending_users"):
+                with self._lock:
+                    user_ids, self._pending_users = self._pending_users, set()
+                if not user_ids:
+                    continue
+                job = {"user_ids": user_ids}
+            self.run(SessionLocal, **job)
+
+    def start(self, *, force: bool = False, resume: bool = True) -> bool:
+        """Queue a full run on the background thread; False if one is already running."""
+        if self.progress.state == "running":
+            return False
+        self._jobs.put({"force": force, "resume": resume})
+        self._ensure_worker()
+        return True
+
+    def enqueue_user(self, user_id: int) -> bool:
+        """Queue one user's images for indexing.
+
+        False if there is nothing to index, or if the same images already
+        failed to give enough usable embeddings.
+        """
+        signature = self._images_signature(user_id)
+        if signature[0] < MIN_IMAGES_PER_USER:
+            return False
+        with self._lock:
+            if self._failed_users.get(user_id) == signature:
+                return False
+            if user_id in self._pending_users:
+                return True
+            first = not self._pending_users
+            self._pending_users.add(user_id)
+        if first:
+            self._jobs.put({"pending_users": True})
+        self._ensure_worker()
+        return True
+
+    def stats(self) -> dict:
+        data = self.progress.to_dict()
+        with self._lock:
+            data["pending_users"] = len(self._pending_users)
+            data["failed_users"] = len(self._failed_users)
+        return data
+
+
+face_reindexer = FaceReindexer(faces_root(), get_settings().face_reindex_checkpoint)
@@ -1,21 +1,140 @@
-import hashlib
 from typing import List, Tuple
 
 import numpy as np
-from sqlalchemy import text
+from sqlalchemy import text, update
 from sqlalchemy.orm import Session
 
+from app.core.config import get_settings
+from app.db.vector import copy_embeddings, vector_cast, vector_param
 from app.models.student import Student
 from app.models.user import User
+from app.services.checkin_analysis import CheckinAnalysis
+from app.services.embedding_cache import cache_digest, embedding_cache, image_hash
+from app.services.face_crops import face_crop_store
 from app.services.face_engine import (
+    FaceEmbeddingResult,
     FaceQualityError,
     FaceQualityMetrics,
-    extract_embedding_with_quality,
+    extract_crop_embeddings_batch,
+    extract_embeddings_batch,
 )
+from app.services.face_gallery import face_gallery
+from app.services.face_inference import FaceInferenceUnavailable, face_inference
+from app.services.inference_profiles import model_version
 
+settings = get_settings()
 
-def _embedding_to_pgvector_str(embedding: List[float]) -> str:
-    return "[" + ",".join(f"{x:.6f}" for x in embedding) + "]"
+
+_INSERT_EMBEDDING_SQL = text(
+    "INSERT INTO facial_embeddings (student_id, user_id, image_path, image_hash, is_primary, embedding, embedding_model, lighting_conditions, model_version, crop_hash) "
+    "VALUES (:student_id, :user_id, :image_path, :image_hash, :is_primary, (:embedding)::vector, :embedding_model, :lighting_conditions, :model_version, :crop_hash)"
+)
+
+
+def insert_embedding_rows(db: Session, rows: list[dict]) -> None:
+    """Binary COPY when the pgvector adapter is active, else one executemany INSERT."""
+    if not rows or copy_embeddings(db, rows):
+        return
+    db.execute(
+        _INSERT_EMBEDDING_SQL,
+        [{**row, "embedding": vector_param(row["embedding"])} for row in rows],
+    )
+
+
+def lighting_condition(metrics: FaceQualityMetrics) -> str:
+    return "dark" if metrics.brightness < 80 else "bright" if metrics.brightness > 170 else "normal"
+
+
+def _store_crop(result: FaceEmbeddingResult) -> str | None:
+    if result.crop is None:
+        return None
+    try:
+        return face_crop_store.put(result.crop)
+    except (OSError, ValueError):
+        # The embedding is still usable; this row just cannot be re-embedded from a crop.
+        return None
+
+
+def _embedding_row(
+    *,
+    student_id: int | None,
+    user_id: int,
+    image_path: str,
+    digest: str,
+    is_primary: bool,
+    result: FaceEmbeddingResult,
+) -> dict:
+    return {
+        "student_id": student_id,
+        "user_id": user_id,
+        "image_path": image_path,
+        "image_hash": digest,
+        "is_primary": is_primary,
+        "embedding": result.embedding,
+        "embedding_model": "insightface",
+        "lighting_conditions": lighting_condition(result.metrics),
+        "model_version": model_version(),
+        "crop_hash": _store_crop(result),
+    }
+
+
+def _match_enrolled_embedding(
+    db: Session,
+    *,
+    user_id: int,
+    emb_np: np.ndarray,
+    metrics: FaceQualityMetrics,
+    threshold: float,
+) -> tuple[int | None, float | None, str | None, FaceQualityMetrics | None]:
+    similarity = None
+    if settings.face_gallery_enabled and face_gallery.ensure_built(db) is not None:
+        similarity = face_gallery.best_similarity(user_id, emb_np)
+    if similarity is None:
+        similarity = _pgvector_best_similarity(db, user_id=user_id, emb_np=emb_np)
+    if similarity is None and settings.face_model_dual_read:
+        similarity = _crop_fallback_similarity(db, user_id=user_id, emb_np=emb_np)
+
+    if similarity is None:
+        return None, None, "no_enrolled_embeddings", metrics
+
+    if similarity >= threshold:
+        return int(user_id), similarity, None, metrics
+
+    return None, similarity, "below_threshold", metrics
+
+
+def _pgvector_best_similarity(db: Session, *, user_id: int, emb_np: np.ndarray) -> float | None:
+    """Fallback for users missing from the gallery (or gallery disabled)."""
+    student = db.query(Student).filter(Student.user_id == user_id).first()
+    student_id = student.id if student else None
+
+    q = f"(:q){vector_cast()}"
+    row = db.execute(
+        text(
+            f"SELECT user_id, student_id, image_path, 1 - (embedding <=> {q}) AS similarity "
+            "FROM facial_embeddings "
+            "WHERE embedding IS NOT NULL AND model_version = :mv "
+            "AND (user_id = :uid OR student_id = (:sid)::int) "
+            f"ORDER BY embedding <=> {q} ASC LIMIT 1"
+        ),
+        {"q": vector_param(emb_np), "uid": user_id, "sid": student_id, "mv": model_version()},
+    ).fetchone()
+
+    return float(row[3]) if row else None
+
+
+def _crop_fallback_similarity(db: Session, *, user_id: int, emb_np: np.ndarray) -> float | None:
+    """Dual read during a model cutover: the user only has rows of another model.
+
+    Their stored crops are re-embedded with the serving model (and saved), so
+    only their first verification after the switch pays for it.
+    """
+    from app.services.face_model_migration import reembed_user
+
+    embeddings = reembed_user(db, user_id)
+    if embeddings is None or embeddings.shape[0] == 0:
+        return None
+    return float(np.max(embeddings @ np.asarray(emb_np, dtype=np.float32)))
 
 
 def verify_user_face_by_image(
@@ -24,91 +143,146 @@ def verify_user_face_by_image(
     email: str,
     image_bytes: bytes,
     threshold: float,
+    client_crop: bool = False,
 ) -> tuple[int | None, float | None, str | None, FaceQualityMetrics | None]:
     """Verify a face image for a given email.
 
     Returns: (matched_user_id, similarity, failure_reason, quality_metrics)
     - `failure_reason` is a short machine-readable string.
     - `quality_metrics` is returned even for some failures.
+
+    Inference runs on the shared `face_inference` executor; when it is saturated
+    `FaceInferenceUnavailable` propagates so the caller can answer 503. With
+    `client_crop`, `image_bytes` is a client-aligned 112x112 face crop.
     """
 
     user = db.query(User).filter(User.email == email).first()
     if not user:
         return None, None, "user_not_found", None
 
-    student = db.query(Student).filter(Student.user_id == user.id).first()
-    student_id = student.id if student else None
+    try:
+        emb_np, metrics = face_inference.extract(image_bytes, client_crop=client_crop)
+    except FaceQualityError as e:
+        return None, None, e.reason, e.metrics
+    except FaceInferenceUnavailable:
+        raise
+    except Exception:
+        return None, None, "invalid_image", None
+
+    return _match_enrolled_embedding(
+        db,
+        user_id=user.id,
+        emb_np=emb_np,
+        metrics=metrics,
+        threshold=threshold,
+    )
+
+
+async def verify_user_face_by_image_async(
+    db: Session,
+    *,
+    email: str,
+    image_bytes: bytes,
+    threshold: float,
+    client_crop: bool = False,
+) -> tuple[int | None, float | None, str | None, FaceQualityMetrics | None]:
+    """`verify_user_face_by_image` for async routes: awaits the inference executor."""
+
+    user = db.query(User).filter(User.email == email).first()
+    if not user:
+        return None, None, "user_not_found", None
 
     try:
-        emb_np, metrics = extract_embedding_with_quality(image_bytes)
+        emb_np, metrics = await face_inference.extract_async(image_bytes, client_crop=client_crop)
     except FaceQualityError as e:
         return None, None, e.reason, e.metrics
+    except FaceInferenceUnavailable:
+        raise
     except Exception:
         return None, None, "invalid_image", None
 
-    emb = emb_np.astype(np.float32).tolist()
-    emb_str = _embedding_to_pgvector_str(emb)
+    return _match_enrolled_embedding(
+        db,
+        user_id=user.id,
+        emb_np=emb_np,
+        metrics=metrics,
+        threshold=threshold,
+    )
 
-    row = db.execute(
-        text(
-            "SELECT user_id, student_id, image_path, 1 - (embedding <=> (:q)::vector) AS similarity "
-            "FROM facial_embeddings "
-            "WHERE embedding IS NOT NULL AND (user_id = :uid OR student_id = (:sid)::int) "
-            "ORDER BY embedding <=> (:q)::vector ASC LIMIT 1"
-        ),
-        {"q": emb_str, "uid": user.id, "sid": student_id},
-    ).fetchone()
 
-    if not row:
-        return None, None, "no_enrolled_embeddings", metrics
+def verify_user_face_from_analysis(
+    db: Session,
+    *,
+    email: str,
+    analysis: CheckinAnalysis,
+    threshold: float,
+) -> tuple[int | None, float | None, str | None, FaceQualityMetrics | None]:
+    """`verify_user_face_by_image` for a photo already analysed by the inference workers."""
 
-    similarity = float(row[3])
-    if similarity >= threshold:
-        return int(user.id), similarity, None, metrics
+    user = db.query(User).filter(User.email == email).first()
+    if not user:
+        return None, None, "user_not_found", None
 
-    return None, similarity, "below_threshold", metrics
+    if analysis.embedding is None:
+        return None, None, analysis.failure_reason or "invalid_image", analysis.metrics
 
+    return _match_enrolled_embedding(
+        db,
+        user_id=user.id,
+        emb_np=analysis.embedding,
+        metrics=analysis.metrics,
+        threshold=threshold,
+    )
 
-def enroll_user_faces(db: Session, user_id: int, image_paths_and_bytes: List[Tuple[str, bytes]]):
+
+def enroll_user_faces(
+    db: Session,
+    user_id: int,
+    image_paths_and_bytes: List[Tuple[str, bytes]],
+    *,
+    client_crops: bool = False,
+):
     student = db.query(Student).filter(Student.user_id == user_id).first()
-    inserted = 0
     failures: list[str] = []
 
-    for idx, (path, bytes_) in enumerate(image_paths_and_bytes):
-        try:
-            emb_np, metrics = extract_embedding_with_quality(bytes_)
-        except FaceQualityError as e:
-            failures.append(e.reason)
-            continue
-        except Exception:
-            failures.append("invalid_image")
-            continue
+    images = [bytes_ for _path, bytes_ in image_paths_and_bytes]
+    try:
+        results = face_inference.run(
+            extract_crop_embeddings_batch if client_crops else extract_embeddings_batch,
+            images,
+            timeout=face_inference.timeout_seconds * max(1, len(images)),
+            keep_crops=True,
+        )
+    except FaceInferenceUnavailable:
+        raise
+    except Exception:
+        results = []
+        failures.append("invalid_image")
 
-        emb = emb_np.astype(np.float32).tolist()
-        emb_str = _embedding_to_pgvector_str(emb)
-        hsh = hashlib.sha256(bytes_).hexdigest()
+    rows = []
+    for idx, ((path, bytes_), result) in enumerate(zip(image_paths_and_bytes, results)):
+        if not result.ok:
+            failures.append(result.reason or "invalid_image")
+            continue
+        metrics = result.metrics
 
-        lighting = (
-            "dark" if metrics.brightness < 80 else "bright" if metrics.brightness > 170 else "normal"
+        hsh = image_hash(bytes_)
+        # A login with the enrollment frame itself is then answered from the cache.
+        embedding_cache.put(
+            cache_digest(bytes_, client_crop=client_crops), (result.embedding, metrics, None)
         )
 
-        db.execute(
-            text(
-                "INSERT INTO facial_embeddings (student_id, user_id, image_path, image_hash, is_primary, embedding, embedding_model, lighting_conditions) "
-                "VALUES (:student_id, :user_id, :image_path, :image_hash, :is_primary, (:embedding)::vector, :embedding_model, :lighting)"
-            ),
-            {
-                "student_id": student.id if student else None,
-                "user_id": user_id,
-                "image_path": path,
-                "image_hash": hsh,
-                "is_primary": idx == 0,
-                "embedding": emb_str,
-                "embedding_model": "insightface",
-                "lighting": lighting,
-            },
+        rows.append(
+            _embedding_row(
+                student_id=student.id if student else None,
+                user_id=user_id,
+                image_path=path,
+                digest=hsh,
+                is_primary=idx == 0,
+                result=result,
+            )
         )
-        inserted += 1
+    inserted = len(rows)
 
     if inserted < 2:
         db.rollback()
@@ -116,14 +290,76 @@ def enroll_user_faces(db: Session, user_id: int, image_paths_and_bytes: List[Tup
             f"At least 2 usable face images are required (got {inserted}). Failures: {', '.join(failures) or 'unknown'}. Please ensure good lighting and hold the camera steady."
         )
 
+    insert_embedding_rows(db, rows)
     db.commit()
     if student:
         student.facial_data_encoded = True
         db.add(student)
         db.commit()
+    face_gallery.refresh_user(db, user_id)
     return inserted
 
 
+def bulk_insert_user_embeddings(
+    db: Session,
+    embedded: dict[int, list[tuple[str, bytes, FaceEmbeddingResult]]],
+    *,
+    replace: bool = False,
+    min_usable: int = 2,
+) -> tuple[list[int], list[int], int]:
+    """Insert the embeddings of several users in one statement, without committing.
+
+    `embedded` maps a user id to its `(image_path, image_bytes, result)` list.
+    Users with fewer than `min_usable` good images are skipped; the others get
+    their rows (first usable image primary, aligned crop stored when the
+    result carries one) and `Student.facial_data_encoded`. With `replace`,
+    their existing rows of the serving model are deleted first.
+
+    Returns `(enrolled_user_ids, skipped_user_ids, rows_inserted)`.
+    """
+    user_ids = list(embedded)
+    student_ids = (
+        dict(db.query(Student.user_id, Student.id).filter(Student.user_id.in_(user_ids)).all())
+        if user_ids
+        else {}
+    )
+
+    rows, enrolled, skipped = [], [], []
+    for user_id, images in embedded.items():
+        usable = [(path, data, r) for path, data, r in images if r.ok]
+        if len(usable) < min_usable:
+            skipped.append(user_id)
+            continue
+        enrolled.append(user_id)
+        for idx, (path, data, result) in enumerate(usable):
+            digest = image_hash(data)
+            embedding_cache.put(digest, (result.embedding, result.metrics, None))
+            rows.append(
+                _embedding_row(
+                    student_id=student_ids.get(user_id),
+                    user_id=user_id,
+                    image_path=path,
+                    digest=digest,
+                    is_primary=idx == 0,
+                    result=result,
+                )
+            )
+
+    if enrolled:
+        if replace:
+            db.execute(
+                text(
+                    "DELETE FROM facial_embeddings WHERE user_id = ANY(:uids) AND model_version = :mv"
+                ),
+                {"uids": enrolled, "mv": model_version()},
+            )
+        insert_embedding_rows(db, rows)
+        db.execute(
+            update(Student).where(Student.user_id.in_(enrolled)).values(facial_data_encoded=True)
+        )
+    return enrolled, skipped, len(rows)
+
+
 def match_user_by_image(
     db: Session, email: str, image_bytes: bytes, threshold: float = 0.85
 ) -> int | None:
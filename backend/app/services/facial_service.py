@@ -1,7 +1,9 @@
 """Facial service helpers used by `/api/facial/*` routes.
 
-This module provides a small API (`facial_service.encode_face/encode_multiple`) that
-works with base64-encoded images and returns numeric embeddings.
+This module provides a small API (`facial_service.encode_face/encode_multiple/encode_batch`)
+that works with base64-encoded images and returns numeric embeddings; the
+`*_bytes` variants take raw bytes (multipart uploads). With `client_crop` the
+images are client-aligned 112x112 face crops and detection is skipped.
 
 Note: The main attendance/self-checkin flow uses `app.services.facial` helpers.
 """
@@ -13,7 +15,13 @@ from typing import List, Optional
 
 import numpy as np
 
-from app.services.face_engine import FaceQualityError, extract_embedding_with_quality
+from app.services.face_engine import (
+    FaceQualityError,
+    extract_crop_embeddings_batch,
+    extract_embedding_from_crop,
+    extract_embedding_with_quality,
+    extract_embeddings_batch,
+)
 
 
 class FacialService:
@@ -26,26 +34,65 @@ class FacialService:
             image_base64 = image_base64.split(",", 1)[1]
         return base64.b64decode(image_base64)
 
-    def _bytes_to_embedding(self, image_bytes: bytes) -> np.ndarray:
-        emb, _metrics = extract_embedding_with_quality(image_bytes)
+    def _bytes_to_embedding(self, image_bytes: bytes, *, client_crop: bool = False) -> np.ndarray:
+        extract = extract_embedding_from_crop if client_crop else extract_embedding_with_quality
+        emb, _metrics = extract(image_bytes)
         return emb.astype(np.float32)
 
-    def encode_face(self, image_base64: str) -> Optional[np.ndarray]:
+    def encode_face(self, image_base64: str, *, client_crop: bool = False) -> Optional[np.ndarray]:
         try:
             image_bytes = self._image_base64_to_bytes(image_base64)
-            return self._bytes_to_embedding(image_bytes)
+        except Exception:
+            return None
+        return self.encode_face_bytes(image_bytes, client_crop=client_crop)
+
+    def encode_face_bytes(
+        self, image_bytes: bytes, *, client_crop: bool = False
+    ) -> Optional[np.ndarray]:
+        try:
+            return self._bytes_to_embedding(image_bytes, client_crop=client_crop)
         except FaceQualityError:
             return None
         except Exception:
             return None
 
-    def encode_multiple(self, images_base64: List[str]) -> List[np.ndarray]:
-        embeddings: List[np.ndarray] = []
+    def encode_batch(
+        self, images_base64: List[str], *, client_crop: bool = False
+    ) -> List[Optional[np.ndarray]]:
+        """Encode several images in one batched pass.
+
+        The result is aligned with the input: unusable images yield `None`.
+        """
+        decoded: List[Optional[bytes]] = []
         for img in images_base64:
-            emb = self.encode_face(img)
-            if emb is not None:
-                embeddings.append(emb)
+            try:
+                decoded.append(self._image_base64_to_bytes(img))
+            except Exception:
+                decoded.append(None)
+        return self.encode_batch_bytes(decoded, client_crop=client_crop)
+
+    def encode_batch_bytes(
+        self, decoded: List[Optional[bytes]], *, client_crop: bool = False
+    ) -> List[Optional[np.ndarray]]:
+        """`encode_batch` on raw image bytes (`None` entries stay `None`)."""
+        valid = [b for b in decoded if b is not None]
+        extract_batch = extract_crop_embeddings_batch if client_crop else extract_embeddings_batch
+        try:
+            results = iter(extract_batch(valid))
+        except Exception:
+            return [None] * len(decoded)
+
+        embeddings: List[Optional[np.ndarray]] = []
+        for image_bytes in decoded:
+            if image_bytes is None:
+                embeddings.append(None)
+                continue
+            res = next(results)
+            embeddings.append(res.embedding.astype(np.float32) if res.ok else None)
         return embeddings
 
+    def encode_multiple(self, images_base64: List[str]) -> List[np.ndarray]:
+        return [emb for emb in self.encode_batch(images_base64) if emb is not None]
+
 
 facial_service = FacialService()
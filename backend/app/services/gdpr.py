@@ -244,10 +244,16 @@ class GDPRService:
         ).delete()
         
         # Delete user account
+        user_id = user.id
         db.delete(user)
         deleted_counts["user_account"] = 1
         
         db.commit()
+
+        # Drop the user's rows from the shared face gallery as well
+        from app.services.face_gallery import face_gallery
+
+        face_gallery.remove_user(user_id)
         
         return deleted_counts
     
@@ -0,0 +1,190 @@
+"""Group-photo attendance: one classroom photo instead of one selfie per student.
+
+Pipeline:
+1. detect and embed every face in the photo in one inference job
+   (`extract_all_face_embeddings`, batched recognition passes);
+2. load the session's class roster embeddings (a contiguous slice of the
+   memory-mapped gallery, or one pgvector query when the gallery is off);
+3. build the `(faces, students)` similarity matrix with one matrix product,
+   keeping each student's best enrolled embedding;
+4. solve the one-to-one assignment (Hungarian via SciPy when available,
+   greedy otherwise) and drop pairs below the confidence threshold;
+5. insert the `AttendanceRecord`s in bulk, keeping existing ones
+   (`insert_attendance_batch`), and update the students' stats in one pass,
+   all in a single commit.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from decimal import Decimal
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.logging_config import facial_logger as logger
+from app.models.session import Session as SessionModel
+from app.services.attendance_upsert import insert_attendance_batch
+from app.services.face_engine import DetectedFace, extract_all_face_embeddings
+from app.services.face_gallery import face_gallery, parse_pgvector
+from app.services.face_inference import face_inference
+from app.services.inference_profiles import model_version
+
+try:
+    from scipy.optimize import linear_sum_assignment
+
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+settings = get_settings()
+
+
+@dataclass(frozen=True)
+class GroupMatch:
+    face_index: int
+    student_id: int
+    similarity: float
+
+
+def _roster_embeddings(db: Session, class_name: str) -> tuple[np.ndarray, np.ndarray]:
+    """`(embeddings, student_ids)` for every enrolled embedding of the class roster."""
+    if settings.face_gallery_enabled and face_gallery.ensure_built(db) is not None:
+        embeddings, _user_ids, student_ids = face_gallery.class_slice(class_name)
+        keep = student_ids >= 0
+        return np.asarray(embeddings[keep]), student_ids[keep]
+
+    rows = db.execute(
+        text(
+            "SELECT s.id, fe.embedding FROM facial_embeddings fe "
+            "JOIN students s ON s.id = fe.student_id "
+            "OR (fe.student_id IS NULL AND s.user_id = fe.user_id) "
+            "WHERE s.class = :class_name AND fe.embedding IS NOT NULL "
+            "AND fe.model_version = :mv "
+            "ORDER BY s.id"
+        ),
+        {"class_name": class_name, "mv": model_version()},
+    ).fetchall()
+    if not rows:
+        return np.zeros((0, 512), dtype=np.float32), np.zeros(0, dtype=np.int64)
+    embeddings = np.stack([parse_pgvector(r[1]) for r in rows])
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-8
+    return embeddings, np.array([int(r[0]) for r in rows], dtype=np.int64)
+
+
+def similarity_matrix(
+    faces: np.ndarray, roster: np.ndarray, roster_student_ids: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """`(F, S)` best cosine similarity of each face to each student, and the `S` student ids."""
+    student_ids, inverse = np.unique(roster_student_ids, return_inverse=True)
+    if faces.shape[0] == 0 or roster.shape[0] == 0:
+        return np.zeros((faces.shape[0], student_ids.shape[0]), dtype=np.float32), student_ids
+
+    row_scores = faces @ roster.T  # (F, rows)
+    scores = np.full((faces.shape[0], student_ids.shape[0]), -1.0, dtype=np.float32)
+    # Max over each student's rows: scatter-max along the column axis.
+    np.maximum.at(scores.T, inverse, row_scores.T)
+    return scores, student_ids
+
+
+def assign_faces(
+    scores: np.ndarray, student_ids: np.ndarray, *, threshold: float
+) -> list[GroupMatch]:
+    """One-to-one face/student assignment maximising the total above-threshold similarity."""
+    if scores.size == 0:
+        return []
+
+    if SCIPY_AVAILABLE:
+        # Below-threshold pairs weigh nothing, so they cannot displace a real match.
+        eligible = np.where(scores >= threshold, scores, 0.0)
+        face_idx, student_idx = linear_sum_assignment(eligible, maximize=True)
+        pairs = zip(face_idx.tolist(), student_idx.tolist())
+    else:
+        # Greedy: take the best remaining pair until faces or students run out.
+        order = np.argsort(-scores, axis=None, kind="stable")
+        used_faces: set[int] = set()
+        used_students: set[int] = set()
+        pairs = []
+        for flat in order.tolist():
+            f, s = divmod(flat, scores.shape[1])
+            if f in used_faces or s in used_students:
+                continue
+            if scores[f, s] < threshold:
+                break
+            used_faces.add(f)
+            used_students.add(s)
+            pairs.append((f, s))
+
+    return [
+        GroupMatch(face_index=f, student_id=int(student_ids[s]), similarity=float(scores[f, s]))
+        for f, s in pairs
+        if scores[f, s] >= threshold
+    ]
+
+
+def record_group_attendance(
+    db: Session, session: SessionModel, matches: list[GroupMatch]
+) -> tuple[list[int], list[int]]:
+    """Bulk-insert `present` records; returns `(marked, already_marked)` student ids."""
+    if not matches:
+        return [], []
+
+    marked = insert_attendance_batch(
+        db,
+        session.id,
+        [
+            {
+                "student_id": m.student_id,
+                "status": "present",
+                "marked_via": "group_photo",
+                "facial_confidence": Decimal(str(round(m.similarity, 4))),
+            }
+            for m in matches
+        ],
+    )
+    db.commit()
+    return marked, sorted({m.student_id for m in matches} - set(marked))
+
+
+async def process_group_photo(db: Session, session: SessionModel, image_bytes: bytes) -> dict:
+    """Run the whole pipeline for one classroom photo of `session`."""
+    faces: list[DetectedFace] = await face_inference.run_async(
+        extract_all_face_embeddings, image_bytes
+    )
+    roster, roster_student_ids = _roster_embeddings(db, session.class_name or "")
+    face_matrix = (
+        np.stack([f.embedding for f in faces]) if faces else np.zeros((0, 512), dtype=np.float32)
+    )
+    scores, student_ids = similarity_matrix(face_matrix, roster, roster_student_ids)
+    matches = assign_faces(scores, student_ids, threshold=settings.facial_confidence_threshold)
+    marked, already_marked = record_group_attendance(db, session, matches)
+
+    logger.info(
+        "Group attendance processed",
+        extra={
+            "session_id": session.id,
+            "faces": len(faces),
+            "roster_students": int(student_ids.shape[0]),
+            "matched": len(matches),
+            "marked": len(marked),
+        },
+    )
+    matched_faces = {m.face_index for m in matches}
+    return {
+        "session_id": session.id,
+        "faces_detected": len(faces),
+        "roster_size": int(student_ids.shape[0]),
+        "marked_present": marked,
+        "already_marked": already_marked,
+        "matches": [
+            {
+                "student_id": m.student_id,
+                "similarity": round(m.similarity, 4),
+                "bbox": list(faces[m.face_index].bbox),
+            }
+            for m in matches
+        ],
+        "unmatched_faces": [list(f.bbox) for i, f in enumerate(faces) if i not in matched_faces],
+    }
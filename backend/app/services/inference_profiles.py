@@ -0,0 +1,175 @@
+"""Named InsightFace runtime profiles (`settings.face_inference_profile`).
+
+A profile decides how `face_engine._get_face_app` builds its `FaceAnalysis`:
+
+- which buffalo_l modules are loaded (we only ever use detection and
+  recognition; gender/age and the landmark models are skipped);
+- the detector input size;
+- ONNX Runtime intra/inter-op thread counts and graph optimization level;
+- whether recognition runs an int8 dynamically-quantized copy of the model.
+
+Thread counts of 0 mean "this worker's share of the cores": the CPU count
+divided by `face_inference_workers`, so the process pool does not
+oversubscribe the machine.
+
+The int8 model produces slightly different embeddings than the float one;
+`scripts/bench_face_batch.py --profile` reports the verification score drift
+before a profile is switched on against a gallery enrolled in float.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+from app.core.config import get_settings
+from app.core.logging_config import facial_logger as logger
+
+_GRAPH_OPT_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+
+@dataclass(frozen=True)
+class InferenceProfile:
+    name: str
+    modules: tuple[str, ...]
+    det_size: tuple[int, int]
+    intra_op_threads: int = 0  # 0 = cores / inference workers
+    inter_op_threads: int = 1
+    graph_optimization: str = "all"  # disable | basic | extended | all
+    int8_recognition: bool = False
+
+
+PROFILES: dict[str, InferenceProfile] = {
+    "fast": InferenceProfile(
+        name="fast",
+        modules=("detection", "recognition"),
+        det_size=(320, 320),
+        int8_recognition=True,
+    ),
+    "balanced": InferenceProfile(
+        name="balanced",
+        modules=("detection", "recognition"),
+        det_size=(640, 640),
+    ),
+    "accurate": InferenceProfile(
+        name="accurate",
+        modules=("detection", "recognition"),
+        det_size=(960, 960),
+        graph_optimization="extended",
+    ),
+}
+
+
+def model_version() -> str:
+    """The InsightFace model pack this process embeds with (`facial_embeddings.model_version`)."""
+    return get_settings().face_model_version or os.getenv("INSIGHTFACE_MODEL", "buffalo_l")
+
+
+def get_inference_profile(name: str | None = None) -> InferenceProfile:
+    """The configured profile with the per-setting overrides applied."""
+    settings = get_settings()
+    name = (name or settings.face_inference_profile or "balanced").lower()
+    profile = PROFILES.get(name)
+    if profile is None:
+        raise ValueError(
+            f"Unknown face inference profile {name!r}; expected one of {sorted(PROFILES)}"
+        )
+
+    overrides = {}
+    if settings.face_det_size > 0:
+        overrides["det_size"] = (settings.face_det_size, settings.face_det_size)
+    if settings.face_ort_intra_op_threads > 0:
+        overrides["intra_op_threads"] = settings.face_ort_intra_op_threads
+    if settings.face_ort_inter_op_threads > 0:
+        overrides["inter_op_threads"] = settings.face_ort_inter_op_threads
+    return replace(profile, **overrides) if overrides else profile
+
+
+def resolved_intra_op_threads(profile: InferenceProfile) -> int:
+    if profile.intra_op_threads > 0:
+        return profile.intra_op_threads
+    workers = max(1, get_settings().face_inference_workers)
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def session_options(profile: InferenceProfile):
+    """`onnxruntime.SessionOptions` for `profile`."""
+    import onnxruntime as ort
+
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = resolved_intra_op_threads(profile)
+    opts.inter_op_num_threads = max(1, profile.inter_op_threads)
+    opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    level = _GRAPH_OPT_LEVELS.get(profile.graph_optimization, "ORT_ENABLE_ALL")
+    opts.graph_optimization_level = getattr(ort.GraphOptimizationLevel, level)
+    return opts
+
+
+def quantized_model_path(model_file: str) -> str:
+    """Path of the int8 copy of `model_file`, quantizing it on first use.
+
+    The copy is written next to the float model (`<name>.int8.onnx`) so every
+    worker after the first reuses it.
+    """
+    src = Path(model_file)
+    dst = src.with_name(f"{src.stem}.int8.onnx")
+    if dst.exists():
+        return str(dst)
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    tmp = dst.with_name(f"{dst.name}.{os.getpid()}.tmp")
+    logger.info("Quantizing recognition model to int8", extra={"model": str(src)})
+    quantize_dynamic(str(src), str(tmp), weight_type=QuantType.QInt8)
+    os.replace(tmp, dst)
+    return str(dst)
+
+
+def apply_profile(app, profile: InferenceProfile, providers: list[str]) -> None:
+    """Re-create the ONNX sessions of a prepared `FaceAnalysis` with the profile's options.
+
+    insightface does not forward `SessionOptions` to its model sessions, so
+    the sessions are rebuilt on the same model files (input/output names are
+    unchanged). The recognition session is pointed at the int8 model when the
+    profile asks for it; on failure it stays on the float model.
+    """
+    import onnxruntime as ort
+
+    opts = session_options(profile)
+    int8_active = False
+    for taskname, model in app.models.items():
+        if taskname == "recognition" and profile.int8_recognition:
+            # Quantizing or loading can fail (e.g. no int8 kernels on the provider).
+            try:
+                model.session = ort.InferenceSession(
+                    quantized_model_path(model.model_file), sess_options=opts, providers=providers
+                )
+                int8_active = True
+                continue
+            except Exception as e:
+                logger.warning(
+                    "int8 recognition model unavailable, using float model",
+                    extra={"error": str(e)},
+                )
+        model.session = ort.InferenceSession(
+            model.model_file, sess_options=opts, providers=providers
+        )
+
+    logger.info(
+        "Face inference profile applied",
+        extra={
+            "profile": profile.name,
+            "modules": list(app.models),
+            "det_size": list(profile.det_size),
+            "intra_op_threads": opts.intra_op_num_threads,
+            "inter_op_threads": opts.inter_op_num_threads,
+            "graph_optimization": profile.graph_optimization,
+            "int8_recognition": int8_active,
+        },
+    )
@@ -0,0 +1,343 @@
+"""Offline classroom kiosks: signed class gallery export and batched check-in sync.
+
+In rooms with poor connectivity a kiosk matches faces locally instead of
+making one round trip per student:
+
+1. `GET /smart-attendance/kiosk/gallery?class_name=...` returns the class's
+   enrolled embeddings (`facial_embeddings` joined to `students`, serving
+   model only) as one signed file (`build_class_gallery`). The response
+   `ETag` is the gallery version. `class_gallery_version` computes it with
+   one aggregate query, so an unchanged gallery costs a 304 without being
+   built.
+2. The kiosk identifies students against it, runs its own liveness check,
+   and queues the decisions.
+3. `POST /smart-attendance/kiosk/sync` sends the whole batch, signed with
+   the kiosk's device key (`verify_sync_signature`); `sync_checkins`
+   validates every item and writes the `SelfCheckin` and `AttendanceRecord`
+   rows of the accepted ones in one transaction.
+
+Gallery file layout (little-endian):
+
+    b"SPKG" | u16 format version | u32 header length | header (UTF-8 JSON)
+    | int32[count] student ids | float16[count, dim] unit-norm embeddings
+    | HMAC-SHA256 of everything before it (32 bytes)
+
+The header carries `class_name`, `model_version`, `version` (a digest of
+the serving model and the count, max and sum of the rows' `facial_embeddings`
+ids: rows are only ever added or deleted, never re-embedded in place),
+`created_at`, `count`, `dim` and `dtype`. float16
+halves the download; on unit-norm ArcFace embeddings it moves cosine
+similarities by well under 1e-3 (`scripts/eval_embedding_precision.py`).
+Files are signed with `kiosk_gallery_signing_key`. When that is unset, a key
+derived from `secret_key` is used, so kiosks never hold the JWT secret.
+
+Kiosks report their own similarity and liveness scores, so a sync is only
+accepted from a provisioned device: an admin issues each kiosk a key
+(`device_key`, derived from `secret_key` and the device id, not from the
+gallery key every kiosk holds) and the kiosk sends the HMAC-SHA256 of the
+request body under it as `X-Kiosk-Signature`.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import struct
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Sequence
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.attendance import AttendanceRecord
+from app.models.session import Session as CourseSession
+from app.models.smart_attendance import AttendanceSession, SelfCheckin, SmartAttendanceLog
+from app.models.student import Student
+from app.services.attendance_upsert import insert_attendance_batch
+from app.services.face_gallery import EMBEDDING_DIM, parse_pgvector
+from app.services.inference_profiles import model_version
+
+MAGIC = b"SPKG"
+FORMAT_VERSION = 1
+_PREFIX = struct.Struct("<4sHI")
+SIGNATURE_BYTES = 32
+
+# Accepted clock drift between a kiosk and the server.
+CLOCK_SKEW = timedelta(minutes=2)
+
+_CLASS_FROM_SQL = (
+    "FROM facial_embeddings fe "
+    "JOIN students s ON s.id = fe.student_id "
+    "OR (fe.student_id IS NULL AND s.user_id = fe.user_id) "
+    "WHERE s.class = :class_name AND fe.embedding IS NOT NULL AND fe.model_version = :mv "
+)
+_CLASS_ROWS_SQL = (
+    "SELECT s.id AS student_id, fe.embedding AS embedding, fe.id AS embedding_id "
+    + _CLASS_FROM_SQL
+    + "ORDER BY s.id, fe.id"
+)
+_CLASS_VERSION_SQL = "SELECT COUNT(fe.id), MAX(fe.id), SUM(fe.id) " + _CLASS_FROM_SQL
+
+
+def signing_key() -> bytes:
+    settings = get_settings()
+    if settings.kiosk_gallery_signing_key:
+        return settings.kiosk_gallery_signing_key.encode()
+    return hmac.new(settings.secret_key.encode(), b"kiosk-gallery", hashlib.sha256).digest()
+
+
+def device_key(device_id: str) -> bytes:
+    """The key a kiosk signs its sync batches with; an admin provisions it on the device."""
+    secret = get_settings().secret_key.encode()
+    return hmac.new(secret, b"kiosk-device:" + device_id.encode(), hashlib.sha256).digest()
+
+
+def sign_sync(device_id: str, body: bytes) -> str:
+    return hmac.new(device_key(device_id), body, hashlib.sha256).hexdigest()
+
+
+def verify_sync_signature(device_id: str | None, body: bytes, signature: str | None) -> None:
+    """Reject a sync batch not signed with its device's key (401)."""
+    if not device_id or not signature:
+        raise HTTPException(status_code=401, detail="Kiosk sync must be signed by a device")
+    if not hmac.compare_digest(sign_sync(device_id, body), signature.strip().lower()):
+        raise HTTPException(status_code=401, detail="Invalid kiosk device signature")
+
+
+def _version(serving: str, count: int, max_id: int | None, id_sum: int | None) -> str:
+    key = f"{FORMAT_VERSION}:{serving}:{int(count)}:{int(max_id or 0)}:{int(id_sum or 0)}"
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def class_gallery_version(db: Session, class_name: str) -> str:
+    """The version `build_class_gallery` would stamp, from one aggregate query."""
+    serving = model_version()
+    count, max_id, id_sum = db.execute(
+        text(_CLASS_VERSION_SQL), {"class_name": class_name, "mv": serving}
+    ).one()
+    return _version(serving, count, max_id, id_sum)
+
+
+@dataclass(frozen=True)
+class KioskGallery:
+    header: dict
+    student_ids: np.ndarray
+    embeddings: np.ndarray
+
+    @property
+    def version(self) -> str:
+        return self.header["version"]
+
+
+def build_class_gallery(db: Session, class_name: str) -> tuple[KioskGallery, bytes]:
+    """The class's enrolled embeddings and their signed file."""
+    serving = model_version()
+    rows = db.execute(text(_CLASS_ROWS_SQL), {"class_name": class_name, "mv": serving}).fetchall()
+    student_ids = np.asarray([int(r[0]) for r in rows], dtype="<i4")
+    if rows:
+        embeddings = np.stack([parse_pgvector(r[1]) for r in rows])
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-8
+    else:
+        embeddings = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+    embeddings = embeddings.astype("<f2")
+
+    embedding_ids = [int(r[2]) for r in rows]
+    version = _version(serving, len(rows), max(embedding_ids, default=0), sum(embedding_ids))
+    header = {
+        "class_name": class_name,
+        "model_version": serving,
+        "version": version,
+        "created_at": datetime.utcnow().isoformat(),
+        "count": int(student_ids.size),
+        "students": int(np.unique(student_ids).size),
+        "dim": EMBEDDING_DIM,
+        "dtype": "float16",
+    }
+    header_bytes = json.dumps(header, separators=(",", ":")).encode()
+    body = (
+        _PREFIX.pack(MAGIC, FORMAT_VERSION, len(header_bytes))
+        + header_bytes
+        + student_ids.tobytes()
+        + embeddings.tobytes()
+    )
+    signature = hmac.new(signing_key(), body, hashlib.sha256).digest()
+    return KioskGallery(header, student_ids, embeddings), body + signature
+
+
+def read_gallery(blob: bytes, key: bytes | None = None) -> KioskGallery:
+    """Verify and parse a gallery file (what a kiosk does on download)."""
+    if len(blob) < _PREFIX.size + SIGNATURE_BYTES:
+        raise ValueError("Truncated kiosk gallery")
+    body, signature = blob[:-SIGNATURE_BYTES], blob[-SIGNATURE_BYTES:]
+    expected = hmac.new(key or signing_key(), body, hashlib.sha256).digest()
+    if not hmac.compare_digest(signature, expected):
+        raise ValueError("Invalid kiosk gallery signature")
+    magic, fmt, header_len = _PREFIX.unpack_from(body)
+    if magic != MAGIC or fmt != FORMAT_VERSION:
+        raise ValueError("Unsupported kiosk gallery format")
+    offset = _PREFIX.size
+    header = json.loads(body[offset : offset + header_len])
+    offset += header_len
+    count, dim = int(header["count"]), int(header["dim"])
+    student_ids = np.frombuffer(body, dtype="<i4", count=count, offset=offset)
+    offset += student_ids.nbytes
+    embeddings = np.frombuffer(body, dtype="<f2", count=count * dim, offset=offset).reshape(
+        count, dim
+    )
+    return KioskGallery(header, student_ids, embeddings)
+
+
+@dataclass
+class KioskSyncResult:
+    accepted: list[dict] = field(default_factory=list)
+    rejected: list[dict] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "accepted": len(self.accepted),
+            "rejected": len(self.rejected),
+            "results": sorted(self.accepted + self.rejected, key=lambda r: r["index"]),
+        }
+
+
+def sync_checkins(
+    db: Session,
+    *,
+    session_id: int,
+    checkins: Sequence,
+    model_version_used: str,
+    device_id: str | None = None,
+    gallery_version: str | None = None,
+    synced_by: int | None = None,
+) -> KioskSyncResult:
+    """Validate a kiosk's locally decided check-ins and record the valid ones.
+
+    `checkins` items have `student_id`, `similarity`, `liveness_score` and
+    `captured_at`. All accepted rows are written in one transaction. A student
+    checked in concurrently by another path keeps that record and comes back
+    as `already_recorded` (`insert_attendance_batch`).
+    """
+    settings = get_settings()
+    if model_version_used != model_version():
+        raise HTTPException(
+            status_code=409,
+            detail="Kiosk gallery is from another face model; download it again",
+        )
+
+    att_session = (
+        db.query(AttendanceSession).filter(AttendanceSession.session_id == session_id).first()
+    )
+    if not att_session:
+        raise HTTPException(status_code=404, detail="Attendance session not configured")
+    course_session = db.query(CourseSession).filter(CourseSession.id == session_id).first()
+    if not course_session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if not course_session.session_date or not course_session.start_time:
+        raise HTTPException(status_code=500, detail="Session timing not configured")
+
+    session_start = datetime.combine(course_session.session_date, course_session.start_time)
+    window = timedelta(minutes=att_session.checkin_window_minutes)
+    now = datetime.utcnow()
+
+    student_ids = {int(item.student_id) for item in checkins}
+    students: dict[int, Student] = {}
+    already: set[int] = set()
+    if student_ids:
+        students = {s.id: s for s in db.query(Student).filter(Student.id.in_(student_ids)).all()}
+        already.update(
+            int(r[0])
+            for r in db.query(AttendanceRecord.student_id).filter(
+                AttendanceRecord.session_id == session_id,
+                AttendanceRecord.student_id.in_(student_ids),
+            )
+        )
+        already.update(
+            int(r[0])
+            for r in db.query(SelfCheckin.student_id).filter(
+                SelfCheckin.attendance_session_id == att_session.id,
+                SelfCheckin.student_id.in_(student_ids),
+                SelfCheckin.status.in_(["approved", "pending"]),
+            )
+        )
+
+    result = KioskSyncResult()
+    seen: set[int] = set()
+    valid: list[tuple[dict, datetime, object]] = []
+    for index, item in enumerate(checkins):
+        student = students.get(int(item.student_id))
+        captured_at = item.captured_at
+        if captured_at.tzinfo is not None:
+            captured_at = captured_at.astimezone(timezone.utc).replace(tzinfo=None)
+        reason = None
+        if student is None or student.class_name != course_session.class_name:
+            reason = "not_in_class"
+        elif student.id in seen or student.id in already:
+            reason = "already_recorded"
+        elif item.similarity < settings.facial_confidence_threshold:
+            reason = "below_threshold"
+        elif item.liveness_score < settings.kiosk_min_liveness_score:
+            reason = "liveness_failed"
+        elif captured_at > now + CLOCK_SKEW or abs(captured_at - session_start) > window:
+            reason = "outside_window"
+        entry = {"index": index, "student_id": int(item.student_id)}
+        if reason:
+            result.rejected.append({**entry, "status": "rejected", "reason": reason})
+            continue
+        seen.add(student.id)
+        valid.append((entry, captured_at, item))
+
+    inserted = set(
+        insert_attendance_batch(
+            db,
+            session_id,
+            [
+                {
+                    "student_id": entry["student_id"],
+                    "status": "present",
+                    "marked_via": "kiosk",
+                    "facial_confidence": float(item.similarity),
+                    "marked_at": captured_at,
+                    "device_id": device_id,
+                }
+                for entry, captured_at, item in valid
+            ],
+        )
+    )
+    for entry, captured_at, item in valid:
+        if entry["student_id"] not in inserted:
+            result.rejected.append({**entry, "status": "rejected", "reason": "already_recorded"})
+            continue
+        db.add(
+            SelfCheckin(
+                attendance_session_id=att_session.id,
+                student_id=entry["student_id"],
+                face_confidence=float(item.similarity),
+                liveness_passed=True,
+                location_verified=True,
+                device_id=device_id,
+                status="approved",
+                created_at=captured_at,
+            )
+        )
+        result.accepted.append({**entry, "status": "accepted"})
+
+    db.add(
+        SmartAttendanceLog(
+            event_type="kiosk_sync",
+            user_id=synced_by,
+            session_id=session_id,
+            details={
+                "device_id": device_id,
+                "gallery_version": gallery_version,
+                "accepted": len(result.accepted),
+                "rejected": len(result.rejected),
+            },
+        )
+    )
+    db.commit()
+    return result
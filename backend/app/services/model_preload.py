@@ -0,0 +1,135 @@
+"""Loading and warming the inference models before a worker serves traffic.
+
+The models load lazily on first use: InsightFace in `face_engine._get_face_app`,
+MobileNetV2 in `get_advanced_liveness_detector`, and the sentence-transformers
+encoder in `rag_pipeline.get_embedding_function`. The first request then pays
+seconds of loading, and every API worker holds its own copy.
+
+`preload_models` loads the models listed in `preload_models` (the setting),
+either from the startup hook of each worker, or once in the master of
+`scripts/serve_prefork.py`, which then forks the workers so that they share
+the weights copy-on-write. Loading state is module-global, so workers forked
+from that master find their models already loaded. `readiness()` backs
+`GET /health/ready`.
+
+Only this module and the model modules are imported before the fork. `app.main`
+(whose imports start the micro-batcher and task queue threads) is imported by
+each worker. TensorFlow does not survive `fork` (its runtime threads are not
+re-created in the child), so MobileNetV2 is always loaded by each worker.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+from app.core.config import get_settings
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def _load_face() -> bool:
+    if get_settings().face_inference_workers > 0:
+        # Inference runs in the executor's pool; warm its worker processes.
+        from app.services.face_inference import face_inference
+
+        return face_inference.warm_up()
+    from app.services.face_engine import warm_up_face_engine
+
+    return warm_up_face_engine()
+
+
+def _load_liveness() -> bool:
+    from app.services.advanced_liveness import get_advanced_liveness_detector
+
+    get_advanced_liveness_detector()
+    return True
+
+
+def _load_rag() -> bool:
+    from app.ai_agent.rag_pipeline import get_embedding_function
+
+    return get_embedding_function() is not None
+
+
+@dataclass(frozen=True)
+class ModelLoader:
+    load: Callable[[], bool]
+    fork_safe: bool
+    description: str
+
+
+MODEL_LOADERS: dict[str, ModelLoader] = {
+    "face": ModelLoader(_load_face, True, "InsightFace detection and recognition"),
+    "liveness": ModelLoader(_load_liveness, False, "MobileNetV2 anti-spoofing (TensorFlow)"),
+    "rag": ModelLoader(_load_rag, True, "chatbot sentence-transformers encoder"),
+}
+
+# name -> {"state": "loading" | "ready" | "failed", "seconds": ..., "pid": ...}
+_state: dict[str, dict] = {}
+_requested: list[str] = []
+_lock = threading.Lock()
+
+
+def parse_model_names(value: str) -> list[str]:
+    """`"face, rag"` -> names; `"all"` -> every model."""
+    names = [n.strip() for n in value.split(",") if n.strip()]
+    return list(MODEL_LOADERS) if names == ["all"] else names
+
+
+def preload_models(names: Iterable[str], *, fork_safe_only: bool = False) -> dict[str, bool]:
+    """Load and warm the given models; returns whether each is ready.
+
+    Models already loaded (by this process or the master it was forked from)
+    are skipped. With `fork_safe_only`, models that cannot be shared with
+    forked children are left to the workers.
+    """
+    names = list(names)
+    unknown = [n for n in names if n not in MODEL_LOADERS]
+    if unknown:
+        raise ValueError(f"Unknown model(s) {unknown}; expected some of {sorted(MODEL_LOADERS)}")
+
+    results: dict[str, bool] = {}
+    with _lock:
+        for name in names:
+            if name not in _requested:
+                _requested.append(name)
+            if _state.get(name, {}).get("state") == "ready":
+                results[name] = True
+                continue
+            loader = MODEL_LOADERS[name]
+            if fork_safe_only and not loader.fork_safe:
+                continue
+
+            _state[name] = {"state": "loading", "pid": os.getpid()}
+            started = time.perf_counter()
+            try:
+                ok = bool(loader.load())
+            except Exception as e:
+                logger.warning(f"Preloading {name} failed: {e}")
+                ok = False
+            seconds = round(time.perf_counter() - started, 3)
+            _state[name] = {
+                "state": "ready" if ok else "failed",
+                "seconds": seconds,
+                "pid": os.getpid(),
+            }
+            logger.info(
+                f"Preloaded {name} ({loader.description}): {_state[name]['state']} in {seconds:.1f}s"
+            )
+            results[name] = ok
+    return results
+
+
+def readiness() -> dict:
+    """Whether every requested model is loaded, with per-model state."""
+    models = {name: _state.get(name, {"state": "pending"}) for name in _requested}
+    return {
+        "ready": all(m["state"] == "ready" for m in models.values()),
+        "pid": os.getpid(),
+        "models": models,
+    }
@@ -10,11 +10,10 @@ from sqlalchemy.orm import Session
 
 from app.core.config import settings
 from app.core.logging_config import logger
-from app.models.attendance import Attendance
 from app.models.session import Session as ClassSession
+from app.services.attendance_upsert import ConflictPolicy, upsert_attendance
 from app.utils.cache import TTLCache, redis_cache
 
-
 _local_qr_cache = TTLCache(default_ttl=15 * 60)
 
 
@@ -155,38 +154,31 @@ class QRCodeService:
         
         session_id = metadata['session_id']
         
-        # Check if already checked in
-        existing = (
-            self.db.query(Attendance)
-            .filter(
-                Attendance.session_id == session_id,
-                Attendance.student_id == student_id,
-            )
-            .first()
-        )
-        
-        if existing:
-            return {
-                'success': False,
-                'error': 'Already checked in for this session',
-                'attendance_id': existing.id,
-            }
-        
-        # Create attendance record
-        attendance = Attendance(
+        location_data = None
+        if gps_lat is not None and gps_lng is not None:
+            location_data = {"latitude": gps_lat, "longitude": gps_lng}
+
+        # Create attendance record unless already checked in
+        result = upsert_attendance(
+            self.db,
             session_id=session_id,
             student_id=student_id,
             status='present',
+            policy=ConflictPolicy.KEEP_FIRST,
             marked_via='qr_code',
             marked_at=datetime.utcnow(),
+            location_data=location_data,
         )
-        
-        # Add GPS if provided
-        if gps_lat is not None and gps_lng is not None:
-            attendance.location_data = {"latitude": gps_lat, "longitude": gps_lng}
-        
-        self.db.add(attendance)
         self.db.commit()
+        attendance = result.record
+
+        if not result.created:
+            return {
+                "success": False,
+                "error": "Already checked in for this session",
+                "attendance_id": attendance.id,
+            }
+
         self.db.refresh(attendance)
         
         logger.info(f"QR check-in successful: student {student_id}, session {session_id}")
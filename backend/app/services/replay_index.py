@@ -0,0 +1,271 @@
+"""Perceptual-hash index of self check-in photos, for replay detection.
+
+A replayed photo (the same selfie sent again, or a photo of the screen
+showing an earlier check-in) used to go through liveness and recognition
+before anything flagged it. Every check-in image now gets a 64-bit DCT
+perceptual hash (`perceptual_hash`), stored in `self_checkins.image_phash`.
+The hashes are kept per student, in one BK-tree over Hamming distance each.
+A new photo within `checkin_replay_max_distance` bits of one of the same
+student's approved check-ins of an earlier session is rejected before any
+model runs. Other students' photos are not compared: a fixed webcam or
+kiosk takes near-identical shots of different people. Nor are the
+student's attempts in the current session, or rejected and flagged ones: a
+retry seconds after a failed burst comes from the same phone and pose and
+is a near-duplicate by construction. The lookup is in memory and takes
+microseconds; the hash itself is computed from a 1/4-scale grayscale decode
+(JPEG decodes at that scale directly).
+
+The trees are rebuilt from `self_checkins` on startup. After that no database
+round trip happens on the lookup path:
+- rows inserted by this process are indexed on insert (an ORM `after_insert`
+  listener on `SelfCheckin`);
+- rows inserted by other API workers are pulled every
+  `checkin_replay_sync_seconds` by a scheduler job (one indexed query on
+  `id`, run without holding the index lock). It re-reads the last
+  `CATCH_UP_OVERLAP` ids, because ids are allocated before commit and a
+  concurrent check-in can become visible after a higher id.
+
+Only a match costs a query, which keeps the approved check-ins of other
+sessions and skips those deleted (GDPR erasure) or rolled back since they
+were indexed; status changes after indexing (a trainer approving a flagged
+check-in) are therefore seen too. A student cannot check in twice for the
+same session anyway, so the few seconds before another worker's check-in is
+indexed do not open a replay window.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Callable
+
+import numpy as np
+from sqlalchemy import bindparam, event, text
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.lazy_imports import lazy_module
+from app.core.logging_config import facial_logger as logger
+from app.models.smart_attendance import SelfCheckin
+
+cv2 = lazy_module("cv2")
+
+HASH_BITS = 64
+_SIGN_BIT = 1 << (HASH_BITS - 1)
+_MASK = (1 << HASH_BITS) - 1
+CATCH_UP_OVERLAP = 256
+
+
+def perceptual_hash(image_bytes: bytes) -> int | None:
+    """64-bit pHash of an image (None when it cannot be decoded).
+
+    The image is reduced to 32x32 grayscale, and each bit of the hash is one
+    of the 8x8 lowest DCT frequencies compared to their median. Re-encoding,
+    rescaling and moderate lighting or moiré changes only flip a few bits.
+    """
+    gray = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if gray is None or gray.size == 0:
+        return None
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def to_db(phash: int) -> int:
+    """Unsigned 64-bit hash as the signed value a BIGINT column holds."""
+    return phash - (1 << HASH_BITS) if phash & _SIGN_BIT else phash
+
+
+def from_db(value: int) -> int:
+    return int(value) & _MASK
+
+
+class BKTree:
+    """Burkhard-Keller tree: radius queries over Hamming distance.
+
+    Each node stores a hash, the payloads filed under it, and children keyed
+    by their distance to it. By the triangle inequality, a query of radius r
+    at distance d from a node only needs the children in `[d - r, d + r]`.
+    """
+
+    def __init__(self):
+        self._root: list | None = None  # [hash, payloads, {distance: child}]
+        self.size = 0
+
+    def add(self, phash: int, payload) -> None:
+        self.size += 1
+        if self._root is None:
+            self._root = [phash, [payload], {}]
+            return
+        node = self._root
+        while True:
+            distance = hamming(phash, node[0])
+            if distance == 0:
+                node[1].append(payload)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [phash, [payload], {}]
+                return
+            node = child
+
+    def search(self, phash: int, radius: int) -> list[tuple[int, object]]:
+        """`(distance, payload)` of every entry within `radius`, nearest first."""
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(phash, node[0])
+            if distance <= radius:
+                found.extend((distance, payload) for payload in node[1])
+            for edge, child in node[2].items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        found.sort(key=lambda item: item[0])
+        return found
+
+
+class ReplayIndex:
+    """Check-in photo hashes of every student, shared by the requests of one process."""
+
+    def __init__(self, max_distance: int):
+        self.max_distance = max_distance
+        self._trees: dict[int, BKTree] = {}
+        self._ids: set[int] = set()
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return len(self._ids)
+
+    def _add(self, checkin_id: int, student_id: int, phash: int) -> None:
+        """Caller holds the lock."""
+        if checkin_id in self._ids:
+            return
+        self._ids.add(checkin_id)
+        self._trees.setdefault(student_id, BKTree()).add(phash, checkin_id)
+        self._last_id = max(self._last_id, checkin_id)
+
+    def add(self, checkin_id: int, student_id: int, phash: int) -> None:
+        with self._lock:
+            self._add(int(checkin_id), int(student_id), phash)
+
+    @staticmethod
+    def _fetch(db: Session, after: int) -> list:
+        return db.execute(
+            text(
+                "SELECT id, student_id, image_phash FROM self_checkins "
+                "WHERE id > :after AND image_phash IS NOT NULL ORDER BY id"
+            ),
+            {"after": after},
+        ).fetchall()
+
+    def catch_up(self, db: Session) -> int:
+        """Index the rows inserted since the last catch-up (by any worker); returns how many were new."""
+        rows = self._fetch(db, max(0, self._last_id - CATCH_UP_OVERLAP))
+        with self._lock:
+            before = len(self._ids)
+            for checkin_id, student_id, value in rows:
+                self._add(int(checkin_id), int(student_id), from_db(value))
+            return len(self._ids) - before
+
+    def rebuild(self, db: Session) -> int:
+        """Reload every stored hash; returns the number indexed."""
+        rows = self._fetch(db, 0)
+        with self._lock:
+            self._trees = {}
+            self._ids = set()
+            self._last_id = 0
+            for checkin_id, student_id, value in rows:
+                self._add(int(checkin_id), int(student_id), from_db(value))
+            size = self.size
+        logger.info("Check-in replay index built", extra={"hashes": size})
+        return size
+
+    def find(
+        self, db: Session, phash: int, student_id: int, attendance_session_id: int
+    ) -> tuple[int, int] | None:
+        """Nearest approved check-in of the student, in another session, within `max_distance`.
+
+        Returns `(checkin_id, distance)`.
+        """
+        with self._lock:
+            tree = self._trees.get(int(student_id))
+            matches = tree.search(phash, self.max_distance) if tree is not None else []
+        if not matches:
+            return None
+        # Check-ins deleted (GDPR erasure) or rolled back since they were indexed no longer count.
+        existing = {
+            int(r[0])
+            for r in db.execute(
+                text(
+                    "SELECT id FROM self_checkins WHERE id IN :ids AND status = 'approved' "
+                    "AND attendance_session_id <> :attendance_session_id"
+                ).bindparams(bindparam("ids", expanding=True)),
+                {
+                    "ids": [checkin_id for _d, checkin_id in matches],
+                    "attendance_session_id": int(attendance_session_id),
+                },
+            ).fetchall()
+        }
+        for distance, checkin_id in matches:
+            if checkin_id in existing:
+                return checkin_id, distance
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "hashes": self.size,
+            "students": len(self._trees),
+            "last_checkin_id": self._last_id,
+            "max_distance": self.max_distance,
+        }
+
+
+replay_index = ReplayIndex(get_settings().checkin_replay_max_distance)
+
+
+@event.listens_for(SelfCheckin, "after_insert")
+def _index_inserted_checkin(_mapper, _connection, target: SelfCheckin) -> None:
+    if target.image_phash is not None:
+        replay_index.add(target.id, target.student_id, from_db(target.image_phash))
+
+
+def _with_session(
+    session_factory: Callable[[], Session] | None, work: Callable[[Session], object]
+) -> None:
+    if session_factory is None:
+        from app.db.session import SessionLocal
+
+        session_factory = SessionLocal
+    db = session_factory()
+    try:
+        work(db)
+    finally:
+        db.close()
+
+
+def rebuild_on_startup(session_factory: Callable[[], Session] | None = None) -> None:
+    """Build the index and schedule the catch-up on other workers' check-ins."""
+    settings = get_settings()
+    if not settings.checkin_replay_guard_enabled:
+        return
+    try:
+        _with_session(session_factory, replay_index.rebuild)
+    except Exception:
+        logger.exception("Could not build the check-in replay index")
+
+    from app.utils.scheduler import scheduler
+
+    def catch_up() -> None:
+        try:
+            _with_session(session_factory, replay_index.catch_up)
+        except Exception as e:
+            logger.warning(f"Check-in replay index catch-up failed: {e}")
+
+    scheduler.schedule("replay_index_catch_up", settings.checkin_replay_sync_seconds, catch_up)
@@ -4,12 +4,6 @@ from io import BytesIO, StringIO
 
 from openpyxl import Workbook
 from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
-from reportlab.lib.units import inch
-from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
 from sqlalchemy.orm import Session
 
 from app.models.attendance import AttendanceRecord
@@ -316,6 +310,14 @@ class ReportService:
     @staticmethod
     def generate_pdf_report(db: Session, student_id: int = None, class_name: str = None) -> BytesIO:
         """Generate PDF report using reportlab."""
+        # reportlab is imported on first report, not at API startup.
+        from reportlab.lib import colors
+        from reportlab.lib.enums import TA_CENTER
+        from reportlab.lib.pagesizes import letter
+        from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+        from reportlab.lib.units import inch
+        from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
         output = BytesIO()
         doc = SimpleDocTemplate(
             output, pagesize=letter, topMargin=0.5 * inch, bottomMargin=0.5 * inch
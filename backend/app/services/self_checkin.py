@@ -1,17 +1,13 @@
 """Self Check-in Service - Student-initiated attendance with AI verification."""
-import io
 import math
 from datetime import datetime, timedelta
-from typing import Optional, Tuple
+from typing import AsyncIterator, Optional, Tuple, Union
 
-import cv2
-import numpy as np
 from fastapi import HTTPException
-from PIL import Image
 from sqlalchemy.orm import Session
 
 from app.core.config import get_settings
-from app.models.attendance import AttendanceRecord
+from app.core.monitoring import ServiceMetric, metrics_collector
 from app.models.session import Session as CourseSession
 from app.models.smart_attendance import (
     AttendanceAlert,
@@ -21,18 +17,43 @@ from app.models.smart_attendance import (
     SmartAttendanceLog,
 )
 from app.models.student import Student
-from app.services.facial import verify_user_face_by_image
+from app.services.attendance_upsert import ConflictPolicy, upsert_attendance
+from app.services.checkin_analysis import CheckinAnalysis, assess_liveness
+from app.services.checkin_burst import CheckinBurst
+from app.services.face_engine import FaceFrame
+from app.services.face_inference import FaceInferenceUnavailable, face_inference
+from app.services.facial import verify_user_face_from_analysis
+from app.services.replay_index import perceptual_hash, replay_index, to_db
 
 settings = get_settings()
 
 
+def _record_stage_timings(operation: str, analysis: CheckinAnalysis) -> None:
+    """Record per-stage latency of the check-in analysis job as service metrics."""
+    now = datetime.utcnow().isoformat()
+    for stage in ("decode", "liveness", "recognition", "total"):
+        duration = analysis.timings.get(f"{stage}_ms")
+        if duration is None:
+            continue
+        metrics_collector.record_service_metric(
+            ServiceMetric(
+                timestamp=now,
+                service="checkin_analysis",
+                operation=f"{operation}.{stage}",
+                success=True,
+                duration_ms=float(duration),
+                details={"batch_size": analysis.timings.get("batch_size")},
+            )
+        )
+
+
 class SelfCheckinService:
     """Handle student self check-ins with AI verification."""
 
     def __init__(self, db: Session = None):
         self.db = db
     
-    def process_facial_checkin(
+    async def process_facial_checkin(
         self,
         photo_data: bytes,
         student_id: int,
@@ -108,8 +129,18 @@ class SelfCheckinService:
                 detail="Already checked in for this session"
             )
         
-        # Step 5: Advanced liveness detection
-        liveness_passed, liveness_confidence, liveness_reason = self.detect_liveness(photo_data)
+        # Replayed photo of an earlier check-in: rejected before any model runs
+        image_phash = self._check_replay(db, att_session, student_record, photo_data)
+
+        # Step 5: Advanced liveness detection (photo decoded and analysed once);
+        # recognition runs alongside and is skipped if liveness rejects first.
+        analysis = await face_inference.analyze_checkin_async(
+            photo_data, stop_on_liveness_failure=True
+        )
+        _record_stage_timings("facial_checkin", analysis)
+        liveness_passed = analysis.is_live
+        liveness_confidence = analysis.liveness_confidence
+        liveness_reason = analysis.liveness_reason
         
         if not liveness_passed:
             # Log fraud attempt
@@ -148,11 +179,13 @@ class SelfCheckinService:
             
             # Try to verify face against enrolled embeddings
             try:
-                matched_user_id, similarity, failure_reason, _metrics = verify_user_face_by_image(
-                    db=db,
-                    email=user.email,
-                    image_bytes=photo_data,
-                    threshold=0.70,  # 70% threshold
+                matched_user_id, similarity, failure_reason, _metrics = (
+                    verify_user_face_from_analysis(
+                        db=db,
+                        email=user.email,
+                        analysis=analysis,
+                        threshold=0.70,  # 70% threshold
+                    )
                 )
                 
                 if matched_user_id is not None:
@@ -164,12 +197,14 @@ class SelfCheckinService:
                     print(f"⚠️ Face match failed: {failure_reason} - Allowing for testing with synthetic embeddings")
                     face_confidence = 0.65  # Lower confidence indicates testing mode
                     
+            except FaceInferenceUnavailable:
+                raise
             except Exception as face_error:
                 # Face verification failed - for testing, continue anyway
                 print(f"⚠️ Face verification error: {face_error} - Allowing for testing")
                 face_confidence = 0.60  # Even lower confidence
                 
-        except HTTPException:
+        except (HTTPException, FaceInferenceUnavailable):
             raise
         except Exception as e:
             # For testing, don't fail the whole check-in on face errors
@@ -214,21 +249,27 @@ class SelfCheckinService:
             checkin_lat=latitude,
             checkin_lng=longitude,
             distance_from_class_meters=distance_meters,
+            image_phash=to_db(image_phash) if image_phash is not None else None,
             status="approved",
         )
         db.add(checkin)
         
-        # Step 9: Create attendance record
-        attendance = AttendanceRecord(
-            student_id=student_id,
+        # Step 9: Create attendance record (or upgrade an absent/late one)
+        result = upsert_attendance(
+            db,
             session_id=session_id,
+            student_id=student_id,
             status="present",
+            policy=ConflictPolicy.KEEP_BEST,
             marked_via="facial_recognition",
             facial_confidence=face_confidence,
             marked_at=datetime.now(),
         )
-        db.add(attendance)
-        
+        if not result.applied:
+            # A concurrent check-in got there first
+            db.rollback()
+            raise HTTPException(status_code=400, detail="You already checked in for this session")
+
         db.commit()
         db.refresh(checkin)
         
@@ -258,118 +299,20 @@ class SelfCheckinService:
         return R * c
 
     @staticmethod
-    def detect_liveness(image_bytes: bytes) -> Tuple[bool, float, str]:
+    def detect_liveness(image: Union[bytes, FaceFrame]) -> Tuple[bool, float, str]:
         """
         Enhanced liveness detection - detects photos, screenshots, deepfakes.
         
+        Accepts raw bytes or an already decoded `FaceFrame` (see `assess_liveness`).
         Returns: (is_live, confidence, reason)
         """
+        if isinstance(image, FaceFrame):
+            return assess_liveness(image)
         try:
-            # Convert bytes to OpenCV image with robust handling
-            image = Image.open(io.BytesIO(image_bytes))
-            
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            img_array = np.array(image)
-            
-            # Ensure we have a valid image array
-            if img_array is None or img_array.size == 0:
-                return False, 0.0, "Empty image data"
-            
-            # Convert RGB to BGR for OpenCV
-            if len(img_array.shape) == 3 and img_array.shape[2] >= 3:
-                # Handle RGBA or RGB
-                if img_array.shape[2] == 4:
-                    # Convert RGBA to RGB first
-                    img_array = img_array[:, :, :3]
-                img_cv = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-            elif len(img_array.shape) == 2:
-                # Grayscale image - convert to BGR
-                img_cv = cv2.cvtColor(img_array, cv2.COLOR_GRAY2BGR)
-            else:
-                return False, 0.0, f"Unsupported image shape: {img_array.shape}"
-            
-            # Ensure minimum size
-            if img_cv.shape[0] < 100 or img_cv.shape[1] < 100:
-                return False, 0.0, "Image too small - minimum 100x100 pixels required"
-            
-            gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
-            
-            # Check overall brightness first
-            mean_brightness = np.mean(gray)
-            if mean_brightness < 20:
-                return False, 0.1, "Image too dark - please improve lighting"
-            if mean_brightness > 245:
-                return False, 0.1, "Image overexposed - reduce lighting"
-            
-            # Check 1: Laplacian variance (edge sharpness) - RELAXED
-            laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-            
-            # More lenient thresholds for poor lighting conditions
-            if laplacian_var < 10:
-                return False, 0.1, "Image too blurry - ensure camera is focused"
-            if laplacian_var > 2000:
-                return False, 0.2, "Image suspiciously sharp - possible screenshot"
-            
-            # Check 2: Face detection with RELAXED parameters
-            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-            faces = face_cascade.detectMultiScale(
-                gray, 
-                scaleFactor=1.1,   # Less sensitive for poor lighting
-                minNeighbors=4,     # More lenient
-                minSize=(40, 40),   # Smaller minimum
-                flags=cv2.CASCADE_SCALE_IMAGE
-            )
-            
-            if len(faces) == 0:
-                return False, 0.15, "No face detected - ensure good lighting and face the camera"
-            if len(faces) > 1:
-                return False, 0.2, "Multiple faces detected - only one person allowed"
-            
-            # Check 3: Face size validation - RELAXED
-            x, y, w, h = faces[0]
-            img_height, img_width = gray.shape
-            face_ratio = (w * h) / (img_width * img_height)
-            
-            if face_ratio < 0.03:  # More lenient
-                return False, 0.3, "Face too small - move closer to camera"
-            if face_ratio > 0.9:   # More lenient
-                return False, 0.25, "Face too large - move back from camera"
-            
-            # Check 4: Basic lighting validation on face region
-            face_roi = gray[y:y+h, x:x+w]
-            face_brightness_std = np.std(face_roi)
-            face_mean_brightness = np.mean(face_roi)
-            
-            if face_mean_brightness < 30:
-                return False, 0.35, "Face too dark - please improve lighting"
-            if face_brightness_std < 10:
-                return False, 0.35, "Very uniform lighting - possible flat photo"
-            
-            # Calculate overall confidence - RELAXED scoring
-            quality_score = min(100, max(10, laplacian_var)) / 100.0
-            size_score = 1.0 if 0.05 < face_ratio < 0.8 else 0.6
-            lighting_score = min(80, max(10, face_brightness_std)) / 80.0
-            brightness_score = min(200, max(30, face_mean_brightness)) / 200.0
-            
-            confidence = (
-                quality_score * 0.30 +
-                size_score * 0.25 +
-                lighting_score * 0.25 +
-                brightness_score * 0.20
-            )
-            
-            # RELAXED threshold: 0.40 instead of 0.60
-            if confidence < 0.40:
-                return False, confidence, f"Liveness confidence too low: {confidence:.2f} - improve lighting and camera quality"
-            
-            return True, confidence, "Liveness checks passed"
-            
+            frame = FaceFrame.from_bytes(image)
         except Exception as e:
-            # For debugging, be more lenient with errors
             return False, 0.0, f"Liveness error: {str(e)}"
+        return assess_liveness(frame)
 
     @staticmethod
     def verify_location(
@@ -405,18 +348,10 @@ class SelfCheckinService:
         )
         return existing
 
-    async def process_self_checkin(
-        self,
-        *,
-        session_id: int,
-        student_id: int,
-        image_bytes: bytes,
-        latitude: Optional[float] = None,
-        longitude: Optional[float] = None,
-        device_id: Optional[str] = None,
-        ip_address: Optional[str] = None,
-    ) -> SelfCheckin:
-        """Process a student self check-in attempt and return the created `SelfCheckin` ORM object."""
+    def _checkin_target(
+        self, session_id: int, student_id: int
+    ) -> Tuple[AttendanceSession, Student]:
+        """Attendance session and student of a check-in; raises on a closed window or a duplicate."""
         db = self.db
 
         # Get attendance session config
@@ -468,48 +403,210 @@ class SelfCheckinService:
         student = db.query(Student).filter(Student.id == student_id).first()
         if not student:
             raise HTTPException(status_code=404, detail="Student not found")
-        
-        # Step 1: Liveness detection (if required)
-        is_live, liveness_confidence, liveness_reason = SelfCheckinService.detect_liveness(image_bytes)
-        liveness_passed = bool(is_live)
-        
+
+        return att_session, student
+
+    @staticmethod
+    def _check_replay(
+        db: Session, att_session: AttendanceSession, student: Student, image_bytes: bytes
+    ) -> Optional[int]:
+        """Perceptual hash of a check-in photo; rejects a near-duplicate of the student's earlier check-ins.
+
+        Runs before any model: a replayed photo never reaches liveness or recognition.
+        Only approved check-ins of other sessions count, so a retry after a
+        rejected or flagged attempt goes through.
+        """
+        phash = perceptual_hash(image_bytes)
+        if phash is None or not settings.checkin_replay_guard_enabled:
+            return phash
+
+        match = replay_index.find(db, phash, student.id, att_session.id)
+        if match is None:
+            return phash
+        checkin_id, distance = match
+        fraud = FraudDetection(
+            student_id=student.id,
+            session_id=att_session.session_id,
+            checkin_id=checkin_id,
+            fraud_type="replay_photo",
+            severity="high",
+            evidence={
+                "previous_checkin_id": checkin_id,
+                "hamming_distance": distance,
+            },
+            description="Photo is a near-duplicate of an earlier check-in",
+        )
+        db.add(fraud)
+        db.commit()
+        raise HTTPException(
+            status_code=400,
+            detail="This photo was already used for a check-in. Please take a new photo.",
+        )
+
+    async def process_self_checkin(
+        self,
+        *,
+        session_id: int,
+        student_id: int,
+        image_bytes: bytes,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        device_id: Optional[str] = None,
+        ip_address: Optional[str] = None,
+    ) -> SelfCheckin:
+        """Process a student self check-in attempt and return the created `SelfCheckin` ORM object."""
+        att_session, student = self._checkin_target(session_id, student_id)
+        image_phash = self._check_replay(self.db, att_session, student, image_bytes)
+
+        # Step 1: Liveness detection (if required); one decode + detection for both steps.
+        # Recognition is not cancelled on a liveness failure here: a spoofed photo
+        # of someone else must still be caught as proxy attendance below.
+        analysis = await face_inference.analyze_checkin_async(image_bytes)
+        _record_stage_timings("self_checkin", analysis)
+
         # Step 2: Facial verification
         try:
-            matched_user_id, similarity, failure_reason, _metrics = verify_user_face_by_image(
-                db,
+            matched_user_id, similarity, failure_reason, _metrics = verify_user_face_from_analysis(
+                self.db,
                 email=student.email,
-                image_bytes=image_bytes,
+                analysis=analysis,
                 threshold=settings.facial_confidence_threshold,
             )
-            
-            if not matched_user_id or matched_user_id != student.user_id:
-                # Face doesn't match - possible proxy attendance
-                fraud = FraudDetection(
-                    student_id=student_id,
-                    session_id=att_session.session_id,
-                    fraud_type="proxy_attendance",
-                    severity="critical",
-                    evidence={
-                        "matched_user_id": matched_user_id,
-                        "similarity": float(similarity) if similarity is not None else None,
-                        "reason": failure_reason,
-                    },
-                    description="Face verification failed (possible proxy attendance)",
-                )
-                db.add(fraud)
-                db.commit()
-                
-                raise HTTPException(
-                    status_code=401,
-                    detail="Face verification failed. This check-in has been flagged for review.",
-                )
-            
-            # Use actual cosine similarity as confidence
-            face_confidence = float(similarity) if similarity is not None else 0.0
-            
+        except FaceInferenceUnavailable:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Facial verification error: {str(e)}")
-        
+
+        return self._complete_checkin(
+            att_session,
+            student,
+            matched_user_id=matched_user_id,
+            similarity=similarity,
+            failure_reason=failure_reason,
+            liveness_passed=bool(analysis.is_live),
+            liveness_confidence=analysis.liveness_confidence,
+            liveness_reason=analysis.liveness_reason,
+            latitude=latitude,
+            longitude=longitude,
+            device_id=device_id,
+            ip_address=ip_address,
+            details={"timings": analysis.timings},
+            image_phash=image_phash,
+        )
+
+    async def process_burst_checkin(
+        self,
+        *,
+        session_id: int,
+        student_id: int,
+        frames: AsyncIterator[bytes],
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        device_id: Optional[str] = None,
+        ip_address: Optional[str] = None,
+    ) -> SelfCheckin:
+        """Self check-in from a burst of frames, analysed until `CheckinBurst` decides.
+
+        `frames` is consumed lazily: once the burst is decided it is not read
+        any further, so the remaining frames are never decoded or analysed.
+        """
+        att_session, student = self._checkin_target(session_id, student_id)
+        burst = CheckinBurst.from_settings(settings.facial_confidence_threshold)
+        image_phash = None
+
+        async for frame in frames:
+            if not burst.admit(frame):
+                continue
+            frame_phash = self._check_replay(self.db, att_session, student, frame)
+            if image_phash is None:
+                image_phash = frame_phash
+            analysis = await face_inference.analyze_checkin_async(frame)
+            _record_stage_timings("burst_checkin", analysis)
+            try:
+                _matched, similarity, failure_reason, _metrics = verify_user_face_from_analysis(
+                    self.db,
+                    email=student.email,
+                    analysis=analysis,
+                    threshold=settings.facial_confidence_threshold,
+                )
+            except FaceInferenceUnavailable:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Facial verification error: {str(e)}")
+            if burst.add(analysis, similarity, failure_reason):
+                break
+
+        if burst.frames_analyzed == 0:
+            raise HTTPException(status_code=400, detail="No usable frame in the burst")
+        burst.finish()
+
+        return self._complete_checkin(
+            att_session,
+            student,
+            matched_user_id=student.user_id if burst.matched else None,
+            similarity=burst.face_confidence,
+            failure_reason=(
+                None if burst.matched else burst.last_failure_reason or "below_threshold"
+            ),
+            liveness_passed=burst.liveness_passed,
+            liveness_confidence=burst.liveness_confidence,
+            liveness_reason=burst.liveness_reason,
+            latitude=latitude,
+            longitude=longitude,
+            device_id=device_id,
+            ip_address=ip_address,
+            details={"burst": burst.summary()},
+            image_phash=image_phash,
+        )
+
+    def _complete_checkin(
+        self,
+        att_session: AttendanceSession,
+        student: Student,
+        *,
+        matched_user_id: Optional[int],
+        similarity: Optional[float],
+        failure_reason: Optional[str],
+        liveness_passed: bool,
+        liveness_confidence: float,
+        liveness_reason: str,
+        latitude: Optional[float],
+        longitude: Optional[float],
+        device_id: Optional[str],
+        ip_address: Optional[str],
+        details: dict,
+        image_phash: Optional[int] = None,
+    ) -> SelfCheckin:
+        """Record the verified check-in: fraud flags, location, attendance and logs."""
+        db = self.db
+        student_id = student.id
+        stored_phash = to_db(image_phash) if image_phash is not None else None
+
+        if not matched_user_id or matched_user_id != student.user_id:
+            # Face doesn't match - possible proxy attendance
+            fraud = FraudDetection(
+                student_id=student_id,
+                session_id=att_session.session_id,
+                fraud_type="proxy_attendance",
+                severity="critical",
+                evidence={
+                    "matched_user_id": matched_user_id,
+                    "similarity": float(similarity) if similarity is not None else None,
+                    "reason": failure_reason,
+                },
+                description="Face verification failed (possible proxy attendance)",
+            )
+            db.add(fraud)
+            db.commit()
+
+            raise HTTPException(
+                status_code=401,
+                detail="Face verification failed. This check-in has been flagged for review.",
+            )
+
+        # Use actual cosine similarity as confidence
+        face_confidence = float(similarity) if similarity is not None else 0.0
+
         # Step 3: Location verification (if required)
         location_verified = True
         distance_meters = None
@@ -557,6 +654,7 @@ class SelfCheckinService:
                     checkin_lat=latitude,
                     checkin_lng=longitude,
                     distance_from_class_meters=distance_meters,
+                    image_phash=stored_phash,
                     device_id=device_id,
                     ip_address=ip_address,
                     status="flagged",
@@ -587,6 +685,7 @@ class SelfCheckinService:
                 checkin_lat=latitude,
                 checkin_lng=longitude,
                 distance_from_class_meters=distance_meters,
+                image_phash=stored_phash,
                 device_id=device_id,
                 ip_address=ip_address,
                 status="flagged",
@@ -606,6 +705,7 @@ class SelfCheckinService:
             checkin_lat=latitude,
             checkin_lng=longitude,
             distance_from_class_meters=distance_meters,
+            image_phash=stored_phash,
             device_id=device_id,
             ip_address=ip_address,
             status="approved",
@@ -613,11 +713,13 @@ class SelfCheckinService:
         db.add(checkin)
         db.flush()
         
-        # Create attendance record
-        attendance = AttendanceRecord(
-            student_id=student_id,
+        # Create attendance record (or upgrade an absent/late one)
+        result = upsert_attendance(
+            db,
             session_id=att_session.session_id,
+            student_id=student_id,
             status="present",
+            policy=ConflictPolicy.KEEP_BEST,
             marked_via="self_checkin",
             facial_confidence=face_confidence,
             device_id=device_id,
@@ -630,8 +732,10 @@ class SelfCheckinService:
             if latitude is not None and longitude is not None
             else None,
         )
-        db.add(attendance)
-        db.flush()
+        if not result.applied:
+            # A concurrent check-in got there first
+            db.rollback()
+            raise HTTPException(status_code=400, detail="You already checked in for this session")
         
         # Link check-in to attendance record (if field exists)
         # checkin.attendance_record_id = attendance.id
@@ -647,6 +751,7 @@ class SelfCheckinService:
                 "liveness_passed": liveness_passed,
                 "location_verified": location_verified,
                 "distance_meters": distance_meters,
+                **details,
             },
         )
         db.add(log)
@@ -0,0 +1,109 @@
+"""Set-based confirmation of a session's attendance (`POST /trainer/confirm-attendance`).
+
+Confirming a session marks every student of the class without a record as
+absent, updates their statistics, queues their absences for the N8N
+parent-notification workflow and notifies the admins. This used to happen
+one student at a time, with hundreds of queries and a commit per absence
+and per admin. `confirm_session` does it with a fixed number of
+statements, all in one transaction:
+
+1. one `INSERT ... SELECT` of the absent records, for the class's students
+   with no record for the session (`ON CONFLICT DO NOTHING`, so a check-in
+   landing at the same moment is kept) `RETURNING` their ids;
+2. one counters upsert and one bulk `UPDATE students` for the statistics
+   (see app/services/attendance_counters.py);
+3. one bulk insert into `absence` for N8N;
+4. one `INSERT ... SELECT` of a notification for every admin.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import exists, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+from app.db.upsert import dialect_insert
+from app.models.absence import Absence
+from app.models.attendance import AttendanceRecord
+from app.models.notification import Notification
+from app.models.session import Session as SessionModel
+from app.models.smart_attendance import AttendanceSession
+from app.models.student import Student
+from app.models.user import User
+from app.services.attendance import AttendanceService
+from app.services.attendance_counters import contribution
+
+
+def _insert_absentees(db: Session, session: SessionModel) -> list[int]:
+    if not session.class_name:
+        return []
+    missing = select(
+        Student.id,
+        literal(session.id),
+        literal("absent"),
+        literal("auto_confirmation"),
+    ).where(
+        Student.class_name == session.class_name,
+        ~exists().where(
+            AttendanceRecord.session_id == session.id,
+            AttendanceRecord.student_id == Student.id,
+        ),
+    )
+    stmt = (
+        dialect_insert(db)(AttendanceRecord)
+        .from_select(["student_id", "session_id", "status", "marked_via"], missing)
+        .on_conflict_do_nothing(index_elements=["session_id", "student_id"])
+        .returning(AttendanceRecord.student_id)
+    )
+    return sorted(int(sid) for (sid,) in db.execute(stmt).all())
+
+
+def confirm_session(db: Session, session: SessionModel, *, confirmed_by: str) -> list[int]:
+    """Confirm `session` and mark the rest of its class absent; returns the absent student ids."""
+    now = datetime.now()
+    session.status = "confirmed"
+    session.attendance_marked = True
+    db.execute(
+        update(AttendanceSession)
+        .where(AttendanceSession.session_id == session.id)
+        .values(is_active=False, confirmed_at=now)
+    )
+
+    absent_ids = _insert_absentees(db, session)
+    if absent_ids:
+        delta = contribution("absent", duration_minutes=session.duration_minutes)
+        AttendanceService._apply_student_deltas(db, {sid: delta for sid in absent_ids})
+
+        # ⭐ N8N INTEGRATION: absences for the parent email workflow
+        if session.session_date and session.start_time:
+            absence_date = datetime.combine(session.session_date, session.start_time)
+        else:
+            absence_date = now
+        hours = Decimal(str(round((session.duration_minutes or 0) / 60.0, 2)))
+        db.execute(
+            insert(Absence),
+            [
+                {"studentid": sid, "date": absence_date, "hours": hours, "notified": False}
+                for sid in absent_ids
+            ],
+        )
+
+    admins = select(
+        User.id,
+        literal("admin"),
+        literal("Attendance Confirmed"),
+        literal(
+            f"Trainer {confirmed_by} confirmed attendance for {session.title or session.topic}"
+        ),
+        literal("attendance_confirmed"),
+    ).where(User.role == "admin")
+    db.execute(
+        insert(Notification).from_select(
+            ["user_id", "user_type", "title", "message", "notification_type"], admins
+        )
+    )
+
+    db.commit()
+    return absent_ids
@@ -6,7 +6,6 @@ from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
 
 from app.core.config import get_settings
-from app.models.attendance import AttendanceRecord
 from app.models.session import Session as CourseSession
 from app.models.smart_attendance import (
     AttendanceSession,
@@ -14,6 +13,7 @@ from app.models.smart_attendance import (
     TeamsParticipation,
 )
 from app.models.student import Student
+from app.services.attendance_upsert import ConflictPolicy, upsert_attendance
 
 settings = get_settings()
 
@@ -169,28 +169,15 @@ class TeamsIntegrationService:
         
         # Create or update attendance record if present
         if participation.status == "present":
-            existing_attendance = (
-                db.query(AttendanceRecord)
-                .filter(
-                    AttendanceRecord.student_id == student.id,
-                    AttendanceRecord.session_id == att_session.session_id,
-                )
-                .first()
+            upsert_attendance(
+                db,
+                session_id=att_session.session_id,
+                student_id=student.id,
+                status="present",
+                policy=ConflictPolicy.KEEP_BEST,
+                marked_via="teams_auto",
             )
             
-            if existing_attendance:
-                existing_attendance.status = "present"
-                attendance = existing_attendance
-            else:
-                attendance = AttendanceRecord(
-                    student_id=student.id,
-                    session_id=att_session.session_id,
-                    status="present",
-                    marked_via="teams_auto",
-                )
-                db.add(attendance)
-                db.flush()
-            
             # Link participation to attendance (field commented out in model)
             # participation.attendance_record_id = attendance.id
         
@@ -0,0 +1,141 @@
+"""Dynamic micro-batching of concurrent calls into one batched call.
+
+Callers `submit()` single items and get a `concurrent.futures.Future` back. A
+collector thread groups queued items and hands each group to `batch_fn`, which
+must return one result per item (in order). A result that is an `Exception`
+instance is raised to that item's caller instead of returned.
+
+Batching policy:
+- when nothing is in flight the first item is dispatched straight away, so a
+  lone request does not pay the batching window;
+- while other batches are running, items queue up and the next batch also
+  waits up to `max_wait_ms` for more items, capped at `max_batch` items;
+- at most `max_in_flight` batches run concurrently.
+"""
+
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Sequence
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        batch_fn: Callable[[list], Sequence[Any]],
+        *,
+        max_batch: int = 16,
+        max_wait_ms: float = 5.0,
+        max_in_flight: int = 1,
+        name: str = "micro-batcher",
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.name = name
+
+        self._queue: "queue.Queue[tuple[Any, Future, float]]" = queue.Queue()
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._dispatch = ThreadPoolExecutor(
+            max_workers=self.max_in_flight, thread_name_prefix=f"{name}-dispatch"
+        )
+        self._in_flight = 0
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._sizes: Counter = Counter()
+        self._queue_wait_total = 0.0
+
+        self._thread = threading.Thread(target=self._collect_loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        future: Future = Future()
+        self._queue.put((item, future, time.monotonic()))
+        return future
+
+    def _take(self, batch: list, timeout: float | None) -> bool:
+        try:
+            if timeout is None:
+                batch.append(self._queue.get_nowait())
+            else:
+                batch.append(self._queue.get(timeout=timeout))
+            return True
+        except queue.Empty:
+            return False
+
+    def _collect_loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            # Wait for a free slot first: items arriving meanwhile join this batch.
+            self._slots.acquire()
+            with self._stats_lock:
+                busy = self._in_flight > 0
+                self._in_flight += 1
+
+            while len(batch) < self.max_batch and self._take(batch, None):
+                pass
+
+            if busy and self.max_wait > 0:
+                deadline = time.monotonic() + self.max_wait
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._take(batch, remaining):
+                        break
+
+            self._dispatch.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: list) -> None:
+        try:
+            now = time.monotonic()
+            # Skip items whose caller gave up (cancelled) while they were queued.
+            live = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if not live:
+                return
+
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(live)
+                self._sizes[len(live)] += 1
+                self._queue_wait_total += sum(now - queued_at for _item, _fut, queued_at in live)
+
+            try:
+                results = list(self.batch_fn([item for item, _fut, _queued_at in live]))
+                if len(results) != len(live):
+                    raise RuntimeError(
+                        f"{self.name}: batch_fn returned {len(results)} results for {len(live)} items"
+                    )
+            except Exception as exc:
+                for _item, fut, _queued_at in live:
+                    fut.set_exception(exc)
+                return
+
+            for (_item, fut, _queued_at), result in zip(live, results):
+                if isinstance(result, Exception):
+                    fut.set_exception(result)
+                else:
+                    fut.set_result(result)
+        finally:
+            with self._stats_lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "max_in_flight": self.max_in_flight,
+                "queued": self._queue.qsize(),
+                "in_flight": self._in_flight,
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": (self._items / self._batches) if self._batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._sizes.items())),
+                "avg_queue_wait_ms": (
+                    self._queue_wait_total / self._items * 1000.0 if self._items else 0.0
+                ),
+            }
@@ -0,0 +1,79 @@
+"""Multipart face image uploads (the binary alternative to base64 JSON)."""
+
+from typing import AsyncIterator, Iterable
+
+from fastapi import HTTPException, UploadFile, status
+
+from app.core.config import get_settings
+
+# Length header of each frame in a streamed burst (`iter_length_prefixed_frames`).
+FRAME_HEADER_BYTES = 4
+
+
+def read_image_upload(upload: UploadFile, *, max_bytes: int) -> bytes:
+    """Bytes of one multipart image part.
+
+    Starlette streams the part into a spooled temporary file while the body
+    arrives, so no base64 text is ever held in memory. Raises 413 above
+    `max_bytes` and 400 for an empty part.
+    """
+    data = upload.file.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Image exceeds {max_bytes // (1024 * 1024)} MB",
+        )
+    if not data:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty image upload")
+    return data
+
+
+def check_client_cropped(client_cropped: bool) -> None:
+    """400 when a client sends an aligned crop while `face_client_crops_enabled` is off."""
+    if client_cropped and not get_settings().face_client_crops_enabled:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Client-cropped face images are disabled",
+        )
+
+
+async def iter_image_uploads(
+    uploads: Iterable[UploadFile], *, max_bytes: int
+) -> AsyncIterator[bytes]:
+    """`read_image_upload` of each part, read only when the consumer asks for it."""
+    for upload in uploads:
+        yield read_image_upload(upload, max_bytes=max_bytes)
+
+
+async def iter_length_prefixed_frames(
+    chunks: AsyncIterator[bytes], *, max_bytes: int
+) -> AsyncIterator[bytes]:
+    """Frames of a streamed body: each a 4-byte big-endian length, then the image.
+
+    Frames are yielded as soon as they are complete, so a consumer that stops
+    early never waits for (or buffers) the rest of the body.
+    """
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer += chunk
+        while len(buffer) >= FRAME_HEADER_BYTES:
+            size = int.from_bytes(buffer[:FRAME_HEADER_BYTES], "big")
+            if size > max_bytes:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Image exceeds {max_bytes // (1024 * 1024)} MB",
+                )
+            if size == 0:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail="Empty image upload"
+                )
+            end = FRAME_HEADER_BYTES + size
+            if len(buffer) < end:
+                break
+            frame = bytes(buffer[FRAME_HEADER_BYTES:end])
+            del buffer[:end]
+            yield frame
+    if buffer:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Truncated frame stream"
+        )
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Benchmark batched face embedding throughput (images/sec).
+
+Usage:
+    python scripts/bench_face_batch.py --images /app/storage/faces/12
+    python scripts/bench_face_batch.py            # recognition-only, synthetic crops
+
+With `--images`, every JPEG/PNG found under the directory is pushed through the
+full pipeline (decode + detect + quality gates + embedding), once through the
+per-image `extract_embedding_with_quality` loop and once through
+`extract_embeddings_batch` at each batch size.
+
+Without `--images`, random 112x112 crops are embedded directly so the numbers
+isolate the recognition forward pass.
+
+With `--profile NAME`, the profile's model (e.g. the int8 recognition model of
+`fast`) is compared against the same profile running the float model: crops
+per second of each, and the drift of the pairwise verification scores, with
+the number of accept/reject decisions that flip at the configured threshold.
+"""
+import argparse
+import sys
+import time
+from dataclasses import replace
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.face_engine import (
+    FaceQualityError,
+    _align_face,
+    _detect_faces,
+    _embed_aligned_crops,
+    _get_face_app,
+    build_face_app,
+    extract_embedding_with_quality,
+    extract_embeddings_batch,
+)
+from app.services.inference_profiles import get_inference_profile
+
+
+def _load_images(root: Path) -> list[bytes]:
+    paths = sorted(p for p in root.rglob("*") if p.suffix.lower() in {".jpg", ".jpeg", ".png"})
+    return [p.read_bytes() for p in paths]
+
+
+def _timed(fn, repeat: int) -> float:
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def bench_pipeline(images: list[bytes], batch_sizes: list[int], repeat: int) -> None:
+    def sequential():
+        for b in images:
+            try:
+                extract_embedding_with_quality(b)
+            except FaceQualityError:
+                pass
+
+    elapsed = _timed(sequential, repeat)
+    print(f"sequential loop     : {len(images) / elapsed:8.1f} images/sec")
+
+    for bs in batch_sizes:
+        elapsed = _timed(lambda: extract_embeddings_batch(images, batch_size=bs), repeat)
+        print(f"batched (batch={bs:>3}): {len(images) / elapsed:8.1f} images/sec")
+
+
+def bench_recognition(n: int, batch_sizes: list[int], repeat: int) -> None:
+    app = _get_face_app()
+    rng = np.random.default_rng(0)
+    crops = [rng.integers(0, 255, (112, 112, 3), dtype=np.uint8) for _ in range(n)]
+
+    for bs in batch_sizes:
+        elapsed = _timed(lambda: _embed_aligned_crops(app, crops, batch_size=bs), repeat)
+        print(f"recognition (batch={bs:>3}): {n / elapsed:8.1f} crops/sec")
+
+
+def _aligned_crops(app, images: list[bytes]) -> list[np.ndarray]:
+    crops = []
+    for b in images:
+        img = cv2.imdecode(np.frombuffer(b, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            continue
+        bboxes, kpss = _detect_faces(app, img)
+        if bboxes.shape[0] == 1 and kpss is not None:
+            crops.append(_align_face(img, kpss[0]))
+    return crops
+
+
+def bench_profile_drift(
+    profile_name: str, images: list[bytes] | None, count: int, repeat: int
+) -> None:
+    profile = get_inference_profile(profile_name)
+    reference_app = build_face_app(replace(profile, int8_recognition=False))
+    candidate_app = build_face_app(profile)
+
+    if images:
+        crops = _aligned_crops(reference_app, images)
+    else:
+        rng = np.random.default_rng(0)
+        crops = [rng.integers(0, 255, (112, 112, 3), dtype=np.uint8) for _ in range(count)]
+    if len(crops) < 2:
+        print("❌ Need at least two single-face images to compare scores")
+        sys.exit(1)
+
+    for label, app in (("float", reference_app), (profile.name, candidate_app)):
+        elapsed = _timed(lambda: _embed_aligned_crops(app, crops), repeat)
+        print(f"recognition {label:>9}: {len(crops) / elapsed:8.1f} crops/sec")
+
+    ref = _embed_aligned_crops(reference_app, crops)
+    cand = _embed_aligned_crops(candidate_app, crops)
+    self_sim = np.sum(ref * cand, axis=1)
+    iu = np.triu_indices(len(crops), k=1)
+    ref_scores = (ref @ ref.T)[iu]
+    cand_scores = (cand @ cand.T)[iu]
+    drift = np.abs(cand_scores - ref_scores)
+    threshold = get_settings().facial_confidence_threshold
+    flipped = int(np.sum((ref_scores >= threshold) != (cand_scores >= threshold)))
+
+    print(f"📊 {len(crops)} crops, {len(ref_scores)} pairs, profile={profile.name} vs float")
+    print(f"same-crop cosine   : mean {self_sim.mean():.4f}  min {self_sim.min():.4f}")
+    print(
+        f"score drift        : mean {drift.mean():.4f}  p99 {np.percentile(drift, 99):.4f}"
+        f"  max {drift.max():.4f}"
+    )
+    print(f"flipped @ {threshold:.2f}     : {flipped} / {len(ref_scores)} pairs")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--images", type=Path, help="Directory of face images")
+    parser.add_argument("--batch-sizes", default="1,4,16")
+    parser.add_argument("--count", type=int, default=64, help="Synthetic crops (no --images)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--profile", help="Compare this inference profile against the float model")
+    args = parser.parse_args()
+
+    batch_sizes = [int(x) for x in args.batch_sizes.split(",") if x]
+
+    if args.profile:
+        images = _load_images(args.images) if args.images else None
+        bench_profile_drift(args.profile, images, args.count, args.repeat)
+    elif args.images:
+        images = _load_images(args.images)
+        if not images:
+            print(f"❌ No images found under {args.images}")
+            sys.exit(1)
+        print(f"📊 Full pipeline on {len(images)} images")
+        bench_pipeline(images, batch_sizes, args.repeat)
+    else:
+        print(f"📊 Recognition-only on {args.count} synthetic crops")
+        bench_recognition(args.count, batch_sizes, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
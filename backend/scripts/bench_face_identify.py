@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Benchmark 1:N identification query latency at several gallery sizes.
+
+Usage:
+    python scripts/bench_face_identify.py
+    python scripts/bench_face_identify.py --sizes 1000,10000,100000 --nprobe 8
+
+Builds synthetic galleries (3 noisy embeddings per user around a random
+identity vector) and measures, for each size, the per-query latency of the
+exact scan and of `IVFFlatIndex`, plus the IVF recall@1 against exact search.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from app.services.ann_index import ExactIndex, IVFFlatIndex
+
+DIM = 512
+ROWS_PER_USER = 3
+
+
+def _unit(x: np.ndarray) -> np.ndarray:
+    return (x / np.linalg.norm(x, axis=-1, keepdims=True)).astype(np.float32)
+
+
+def _gallery(rows: int, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    users = max(1, rows // ROWS_PER_USER)
+    identities = _unit(rng.standard_normal((users, DIM)))
+    owner = np.repeat(np.arange(users), ROWS_PER_USER)[:rows]
+    noise = rng.standard_normal((owner.shape[0], DIM)).astype(np.float32) * 0.03
+    return _unit(identities[owner] + noise), identities
+
+
+def _latency_ms(fn, queries: np.ndarray) -> tuple[float, float]:
+    samples = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return float(np.percentile(samples, 50)), float(np.percentile(samples, 95))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=40)
+    parser.add_argument("--nprobe", type=int, default=32)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(
+        f"{'rows':>8} | {'exact p50/p95 ms':>18} | {'ivf build s':>11} | {'ivf p50/p95 ms':>16} | recall@1"
+    )
+    for size in [int(x) for x in args.sizes.split(",") if x]:
+        embeddings, identities = _gallery(size, rng)
+        picks = rng.integers(0, identities.shape[0], args.queries)
+        queries = _unit(
+            identities[picks] + rng.standard_normal((args.queries, DIM)).astype(np.float32) * 0.05
+        )
+
+        exact = ExactIndex(embeddings)
+        start = time.perf_counter()
+        ivf = IVFFlatIndex(embeddings, nprobe=args.nprobe)
+        build_s = time.perf_counter() - start
+
+        e50, e95 = _latency_ms(lambda q: exact.search(q, args.k), queries)
+        i50, i95 = _latency_ms(lambda q: ivf.search(q, args.k), queries)
+        hits = sum(int(exact.search(q, 1)[1][0] == ivf.search(q, 1)[1][0]) for q in queries)
+        print(
+            f"{size:>8} | {e50:8.2f} / {e95:7.2f} | {build_s:11.2f} | {i50:7.2f} / {i95:6.2f} | "
+            f"{hits / len(queries):.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
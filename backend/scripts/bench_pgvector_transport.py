@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Benchmark text vs binary pgvector transport against DATABASE_URL.
+
+Usage:
+    python scripts/bench_pgvector_transport.py --rows 5000 --queries 500
+
+Compares, on random unit-norm 512-d embeddings:
+- bulk insert into `facial_embeddings`: text-literal executemany (the former
+  path), binary executemany, and `COPY ... FROM STDIN (FORMAT BINARY)`,
+  in rows/sec;
+- the 1:1 verification query (`ORDER BY embedding <=> :q LIMIT 1`) with a
+  text literal vs a binary parameter, in client CPU and wall time per query.
+
+Every write happens in a transaction that is rolled back.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from sqlalchemy import text
+
+from app.db.session import SessionLocal
+from app.db.vector import (
+    binary_vectors_enabled,
+    copy_embeddings,
+    vector_cast,
+    vector_param,
+    vector_to_text,
+)
+from app.services.facial import _INSERT_EMBEDDING_SQL
+
+
+def _verify_sql():
+    q = f"(:q){vector_cast()}"
+    return text(
+        f"SELECT 1 - (embedding <=> {q}) FROM facial_embeddings "
+        f"WHERE embedding IS NOT NULL AND user_id = :uid ORDER BY embedding <=> {q} LIMIT 1"
+    )
+
+
+def _rows(n: int, user_id: int) -> list[dict]:
+    rng = np.random.default_rng(0)
+    emb = rng.normal(size=(n, 512)).astype(np.float32)
+    emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+    return [
+        {
+            "student_id": None,
+            "user_id": user_id,
+            "image_path": f"/bench/{i}.jpg",
+            "image_hash": None,
+            "is_primary": False,
+            "embedding": emb[i],
+            "embedding_model": "bench",
+            "lighting_conditions": "normal",
+            "model_version": "bench",
+            "crop_hash": None,
+        }
+        for i in range(n)
+    ]
+
+
+def _insert_rate(label: str, rows: list[dict], insert) -> None:
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        insert(db, rows)
+        db.flush()
+        elapsed = time.perf_counter() - start
+        print(f"{label:<26}: {len(rows) / elapsed:10.0f} rows/sec")
+    finally:
+        db.rollback()
+        db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument(
+        "--user-id", type=int, default=-4242, help="user_id for the rolled-back bench rows"
+    )
+    args = parser.parse_args()
+
+    # Open one connection so the adapter registration has run.
+    SessionLocal().close()
+    if not binary_vectors_enabled():
+        print(
+            "❌ pgvector binary adapter not active (needs the psycopg driver and the vector extension)"
+        )
+        sys.exit(1)
+
+    rows = _rows(args.rows, args.user_id)
+    print(f"📊 {args.rows} rows, {args.queries} verification queries")
+
+    _insert_rate(
+        "insert text executemany",
+        rows,
+        lambda db, r: db.execute(
+            _INSERT_EMBEDDING_SQL, [{**x, "embedding": vector_to_text(x["embedding"])} for x in r]
+        ),
+    )
+    _insert_rate(
+        "insert binary executemany",
+        rows,
+        lambda db, r: db.execute(
+            _INSERT_EMBEDDING_SQL, [{**x, "embedding": vector_param(x["embedding"])} for x in r]
+        ),
+    )
+    _insert_rate("COPY binary", rows, copy_embeddings)
+
+    # Verification against 10 (uncommitted) rows of the bench user.
+    db = SessionLocal()
+    try:
+        copy_embeddings(db, rows[:10])
+        verify_sql = _verify_sql()
+        queries = np.stack([r["embedding"] for r in rows[: args.queries]])
+        for label, to_param in (
+            ("verify text literal", vector_to_text),
+            ("verify binary param", vector_param),
+        ):
+            cpu, wall = time.process_time(), time.perf_counter()
+            for q in queries:
+                db.execute(verify_sql, {"q": to_param(q), "uid": args.user_id}).fetchone()
+            cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+            n = len(queries)
+            print(
+                f"{label:<26}: {cpu / n * 1e6:8.0f} µs CPU  {wall / n * 1e3:7.2f} ms wall / query"
+            )
+    finally:
+        db.rollback()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Switch facial_embeddings.embedding between vector (float32) and halfvec (float16).
+
+Usage:
+    python scripts/convert_embedding_precision.py --status
+    python scripts/convert_embedding_precision.py --to float16   # halfvec(512)
+    python scripts/convert_embedding_precision.py --to float32   # back to vector(512)
+
+`halfvec(512)` stores 2 bytes per dimension instead of 4, in the table and
+in the HNSW index. Compare the precisions on your own gallery first with
+scripts/eval_embedding_precision.py. The conversion rewrites the table and
+rebuilds the HNSW index in one transaction (app/db/vector.py), so run it in
+a maintenance window and restart the API afterwards. Needs pgvector 0.7.0 or
+newer for float16. Running it again with the current precision does nothing.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.db.session import engine
+from app.db.vector import convert_embedding_column, stored_column_type
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--status", action="store_true", help="print the current column type")
+    group.add_argument("--to", choices=["float32", "float16"], help="precision to convert to")
+    args = parser.parse_args()
+
+    with engine.begin() as connection:
+        current = stored_column_type(connection)
+        if current is None:
+            print("❌ facial_embeddings.embedding not found; run `alembic upgrade head` first")
+            sys.exit(1)
+        if args.status:
+            print(f"📐 facial_embeddings.embedding is {current}")
+            return
+        if convert_embedding_column(connection, args.to):
+            print(
+                f"✅ Converted facial_embeddings.embedding from {current} to {args.to}; restart the API"
+            )
+        else:
+            print(f"👌 facial_embeddings.embedding is already {current}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Drain the enrollment queue written by `POST /api/embeddings/queue`.
+
+Usage:
+    python scripts/embedding_queue_worker.py --workers 4
+    python scripts/embedding_queue_worker.py --drain      # exit once the queue is empty
+
+Runs `--workers` claiming threads against `EMBEDDING_QUEUE_DIR`; any number
+of these processes (and the API's own in-process workers) can share the
+queue, jobs are claimed with an atomic rename. Queue depth and job latency
+are printed every `--report-seconds`.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.db.session import SessionLocal
+from app.services.embedding_queue import build_workers, embedding_queue
+from app.services.face_inference import face_inference
+
+
+def _report() -> dict:
+    s = embedding_queue.stats()
+    print(
+        f"  depth {s['depth']}  in progress {s['in_progress']}  done {s['completed']}"
+        f"  failed {s['failed']}  latency avg {s['job_latency_ms_avg']} ms p95 {s['job_latency_ms_p95']} ms"
+    )
+    return s
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--drain", action="store_true", help="Exit when the queue is empty")
+    parser.add_argument("--report-seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"📂 Draining {embedding_queue.root} with {args.workers} worker(s)")
+    workers = build_workers(args.workers)
+    workers.start(SessionLocal)
+    try:
+        while True:
+            time.sleep(args.report_seconds)
+            stats = _report()
+            if args.drain and stats["depth"] == 0 and stats["in_progress"] == 0:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        workers.stop()
+        face_inference.shutdown()
+    print("✅ Stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Compare float32, float16 and int8 embedding storage before switching precision.
+
+Usage:
+    python scripts/eval_embedding_precision.py                 # synthetic gallery
+    python scripts/eval_embedding_precision.py --from-db       # enrolled embeddings
+    python scripts/eval_embedding_precision.py --from-db --sizes
+
+For each storage format, against the float32 gallery:
+- bytes per embedding;
+- cosine score drift on genuine (same identity) and top-1 pairs;
+- top-1 identification agreement with float32;
+- exact-search latency per query over the whole gallery, as NumPy runs it
+  for the in-process face gallery.
+
+float16 only applies to the Postgres column (`halfvec`, where pgvector
+computes distances natively); the NumPy timing shows why the shared gallery
+stays float32. int8 (one scale per vector) is reported for comparison only: pgvector has no
+int8 vector type, and NumPy int8 matmuls are slower than float32 BLAS, so it
+is not a `scripts/convert_embedding_precision.py` option.
+
+`--sizes` also prints the on-disk size of `facial_embeddings`, its HNSW index
+and the average stored embedding, for the current column type. Run it before
+and after `scripts/convert_embedding_precision.py --to float16`.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+
+def _unit(x: np.ndarray) -> np.ndarray:
+    return (x / np.linalg.norm(x, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _synthetic(identities: int, per_identity: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    centers = _unit(rng.standard_normal((identities, 512)))
+    labels = np.repeat(np.arange(identities), per_identity)
+    return _unit(centers[labels] + rng.standard_normal((len(labels), 512)) * 0.04), labels
+
+
+def _from_db() -> tuple[np.ndarray, np.ndarray]:
+    from sqlalchemy import text
+
+    from app.db.session import SessionLocal
+    from app.services.face_gallery import parse_pgvector
+    from app.services.inference_profiles import model_version
+
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            text(
+                "SELECT COALESCE(fe.user_id, s.user_id), fe.embedding FROM facial_embeddings fe "
+                "LEFT JOIN students s ON s.id = fe.student_id "
+                "WHERE fe.embedding IS NOT NULL AND fe.model_version = :mv"
+            ),
+            {"mv": model_version()},
+        ).fetchall()
+    finally:
+        db.close()
+    rows = [r for r in rows if r[0] is not None]
+    if not rows:
+        print("❌ No enrolled embeddings found")
+        sys.exit(1)
+    return _unit(np.stack([parse_pgvector(r[1]) for r in rows])), np.asarray(
+        [int(r[0]) for r in rows]
+    )
+
+
+def _int8(embeddings: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    scale = np.abs(embeddings).max(axis=1, keepdims=True) / 127.0
+    return np.round(embeddings / scale).astype(np.int8), scale.astype(np.float32)
+
+
+def _print_sizes() -> None:
+    from sqlalchemy import text
+
+    from app.db.session import SessionLocal
+    from app.db.vector import HNSW_INDEX, embedding_column_type
+
+    db = SessionLocal()
+    try:
+        table, index, avg = db.execute(
+            text(
+                "SELECT pg_total_relation_size('facial_embeddings'), "
+                "pg_relation_size(to_regclass(:index)), "
+                "(SELECT avg(pg_column_size(embedding)) FROM facial_embeddings)"
+            ),
+            {"index": HNSW_INDEX},
+        ).fetchone()
+    finally:
+        db.close()
+    print(f"\n📂 facial_embeddings.embedding: {embedding_column_type()}")
+    print(f"   table (with indexes): {table / 1024 / 1024:8.1f} MiB")
+    print(f"   HNSW index          : {(index or 0) / 1024 / 1024:8.1f} MiB")
+    print(f"   avg embedding       : {float(avg or 0):8.0f} bytes")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "--from-db", action="store_true", help="use the enrolled embeddings (DATABASE_URL)"
+    )
+    parser.add_argument(
+        "--sizes", action="store_true", help="print table/index sizes (DATABASE_URL)"
+    )
+    parser.add_argument("--identities", type=int, default=2000, help="synthetic identities")
+    parser.add_argument("--per-identity", type=int, default=5, help="synthetic images per identity")
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    from app.services.ann_index import ExactIndex
+
+    embeddings, labels = (
+        _from_db() if args.from_db else _synthetic(args.identities, args.per_identity)
+    )
+    rng = np.random.default_rng(1)
+    picks = rng.choice(len(embeddings), min(args.queries, len(embeddings)), replace=False)
+    # Probe with a noisy copy of a stored image, as a new camera frame would be.
+    queries = _unit(embeddings[picks] + rng.standard_normal((len(picks), 512)) * 0.03)
+    print(
+        f"📊 {len(embeddings)} embeddings, {len(np.unique(labels))} identities, {len(queries)} queries"
+    )
+
+    reference = embeddings @ queries.T
+    ref_top1 = np.argmax(reference, axis=0)
+
+    q8, scale = _int8(embeddings)
+    formats = {
+        "float32": (embeddings, embeddings.nbytes),
+        "float16": (embeddings.astype(np.float16), embeddings.astype(np.float16).nbytes),
+        "int8": (q8.astype(np.float32) * scale, q8.nbytes + scale.nbytes),
+    }
+
+    print(
+        f"\n{'format':<8} {'bytes/row':>9} {'max drift':>10} {'mean drift':>11} {'top-1 agree':>12} {'ms/query':>9}"
+    )
+    for name, (stored, nbytes) in formats.items():
+        scores = np.asarray(stored, dtype=np.float32) @ queries.T
+        drift = np.abs(scores - reference)
+        genuine = drift[picks, np.arange(len(picks))]
+        agree = float(np.mean(labels[np.argmax(scores, axis=0)] == labels[ref_top1]))
+
+        index = ExactIndex(q8 if name == "int8" else stored)
+        start = time.perf_counter()
+        for q in queries:
+            index.search(q, 1)
+        ms = (time.perf_counter() - start) / len(queries) * 1000
+        print(
+            f"{name:<8} {nbytes / len(embeddings):9.0f} {genuine.max():10.5f} {drift.mean():11.6f} "
+            f"{agree * 100:11.2f}% {ms:9.3f}"
+        )
+
+    if args.sizes:
+        _print_sizes()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Move enrolled faces to another InsightFace model pack from their stored crops.
+
+Usage:
+    python scripts/migrate_embedding_model.py --status
+    python scripts/migrate_embedding_model.py --backfill-crops      # once, older rows
+    python scripts/migrate_embedding_model.py --to antelopev2       # re-embed crops
+    python scripts/migrate_embedding_model.py --prune antelopev2    # after the switch
+
+`--to` embeds the aligned crop of every row of the serving model (or `--from`)
+with the target's recognition model only, in `FACE_MODEL_MIGRATION_BATCH_SIZE`
+batches, and inserts rows tagged with the target version next to the old
+ones. It can be rerun; only rows without a target counterpart are picked up.
+Then set FACE_MODEL_VERSION/INSIGHTFACE_MODEL to the target and restart the
+API; users enrolled in between are re-embedded on their next verification.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.db.session import SessionLocal
+from app.services.face_inference import face_inference
+from app.services.face_model_migration import (
+    ModelMigrationProgress,
+    backfill_crops,
+    migrate,
+    prune_other_versions,
+    version_counts,
+)
+from app.services.inference_profiles import model_version
+
+
+def _print_status() -> None:
+    db = SessionLocal()
+    try:
+        counts = version_counts(db)
+    finally:
+        db.close()
+    print(f"📊 Serving model: {model_version()}")
+    for version, c in counts.items():
+        print(f"  {version or '(none)':<16} {c['rows']:8d} rows  {c['with_crop']:8d} with crop")
+
+
+def _print_progress(p: ModelMigrationProgress) -> None:
+    d = p.to_dict()
+    print(
+        f"  rows {d['rows_done']}/{d['rows_total']} (missing crop {d['rows_missing_crop']})"
+        f"  {d['rows_per_second']:.1f} rows/sec"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--status", action="store_true", help="Rows and crops per model version")
+    parser.add_argument(
+        "--backfill-crops", action="store_true", help="Store crops of rows enrolled without one"
+    )
+    parser.add_argument("--to", dest="target", help="Model pack to re-embed into")
+    parser.add_argument(
+        "--from", dest="source", help="Model version to read (default: serving model)"
+    )
+    parser.add_argument("--batch-size", type=int, help="Crops per inference job")
+    parser.add_argument(
+        "--prune", metavar="VERSION", help="Delete the rows of every other model version"
+    )
+    args = parser.parse_args()
+
+    if not (args.status or args.backfill_crops or args.target or args.prune):
+        parser.print_help()
+        sys.exit(2)
+
+    try:
+        if args.status:
+            _print_status()
+
+        if args.backfill_crops:
+            print("📂 Backfilling crops from stored images")
+            done, skipped = backfill_crops(
+                SessionLocal, on_progress=lambda d, s: print(f"  {d} crops stored, {s} skipped")
+            )
+            print(f"✅ {done} crops stored, {skipped} rows skipped (image missing or no face)")
+
+        if args.target:
+            print(f"📊 Re-embedding {args.source or model_version()} → {args.target}")
+            progress = migrate(
+                SessionLocal,
+                target=args.target,
+                source=args.source,
+                batch_size=args.batch_size,
+                on_progress=_print_progress,
+            )
+            d = progress.to_dict()
+            if progress.state != "completed":
+                print(f"❌ Migration {progress.state}: {progress.error}")
+                sys.exit(1)
+            print(
+                f"✅ {d['rows_done']} rows re-embedded ({d['rows_missing_crop']} missing a crop) "
+                f"in {d['elapsed_seconds']:.1f}s ({d['rows_per_second']:.1f} rows/sec)"
+            )
+
+        if args.prune:
+            db = SessionLocal()
+            try:
+                deleted = prune_other_versions(db, args.prune)
+                db.commit()
+            finally:
+                db.close()
+            print(f"✅ Deleted {deleted} rows not embedded with {args.prune}")
+    finally:
+        face_inference.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Profile the API's import-time startup cost.
+
+Usage:
+    python scripts/profile_startup.py                    # import app.main
+    python scripts/profile_startup.py --warm-up all      # ... then load every heavy stack
+    python scripts/profile_startup.py --module app.services.face_engine --top 30
+    python scripts/profile_startup.py --json > startup.json
+
+Imports the module in a fresh interpreter under `python -X importtime` and
+reports:
+- wall time of the import and the process RSS right after it;
+- the slowest modules by cumulative import time;
+- self import time summed per top-level package (fastapi, sqlalchemy, cv2, ...);
+- which heavy stacks (app/core/lazy_imports.py) got loaded.
+
+A heavy stack showing up as loaded after a plain `app.main` import means some
+module imports it at module level again. `--warm-up` shows what
+WARM_UP_STACKS adds to a worker's startup time and memory.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Runs in the child interpreter; the JSON report is its last stdout line.
+_CHILD = """
+import json, resource, sys, time
+started = time.perf_counter()
+import importlib
+importlib.import_module({module!r})
+imported = time.perf_counter() - started
+from app.core import lazy_imports
+warm_up = lazy_imports.warm_up(lazy_imports.parse_stack_names({warm_up!r})) if {warm_up!r} else {{}}
+total = time.perf_counter() - started
+
+def rss_mib():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+print(json.dumps({{
+    "module": {module!r},
+    "import_seconds": round(imported, 3),
+    "total_seconds": round(total, 3),
+    "rss_mib": round(rss_mib(), 1),
+    "modules_loaded": len(sys.modules),
+    "warm_up": warm_up,
+    "heavy_stacks": {{n: s["loaded"] for n, s in lazy_imports.status().items()}},
+}}))
+"""
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """`(module, self_us, cumulative_us)` of each `-X importtime` line."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:") :].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # the header line
+        entries.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+    return entries
+
+
+def profile(module: str, warm_up: str = "") -> dict:
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(
+            filter(None, [str(BACKEND_DIR), os.environ.get("PYTHONPATH")])
+        ),
+    }
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD.format(module=module, warm_up=warm_up)],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        tail = "\n".join(
+            line for line in proc.stderr.splitlines() if not line.startswith("import time:")
+        )[-2000:]
+        raise SystemExit(f"❌ Importing {module} failed:\n{tail}")
+    report = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    entries = parse_importtime(proc.stderr)
+    per_package: dict[str, int] = defaultdict(int)
+    for name, self_us, _cumulative in entries:
+        per_package[name.partition(".")[0]] += self_us
+    report["slowest_modules"] = [
+        {
+            "module": name,
+            "cumulative_ms": round(cumulative / 1000, 1),
+            "self_ms": round(self_us / 1000, 1),
+        }
+        for name, self_us, cumulative in sorted(entries, key=lambda e: e[2], reverse=True)
+    ]
+    report["packages"] = [
+        {"package": name, "self_ms": round(us / 1000, 1)}
+        for name, us in sorted(per_package.items(), key=lambda item: item[1], reverse=True)
+    ]
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--module", default="app.main", help="module to import (default: app.main)")
+    parser.add_argument(
+        "--warm-up", default="", help='heavy stacks to load after the import ("all" or a list)'
+    )
+    parser.add_argument("--top", type=int, default=20, help="rows per table")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    args = parser.parse_args()
+
+    report = profile(args.module, args.warm_up)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(
+        f"🚀 import {report['module']}: {report['import_seconds'] * 1000:.0f} ms, "
+        f"{report['modules_loaded']} modules, RSS {report['rss_mib']:.0f} MiB"
+    )
+    if report["warm_up"]:
+        print(f"🔥 after warm-up: {report['total_seconds'] * 1000:.0f} ms total")
+        for name, seconds in report["warm_up"].items():
+            print(
+                f"   {name:<12} {'not installed' if seconds is None else f'{seconds * 1000:.0f} ms'}"
+            )
+
+    print(f"\n{'module':<60} {'cumulative ms':>14} {'self ms':>9}")
+    for row in report["slowest_modules"][: args.top]:
+        print(f"{row['module'][:60]:<60} {row['cumulative_ms']:>14.1f} {row['self_ms']:>9.1f}")
+
+    print(f"\n{'package':<30} {'self ms':>9}")
+    for row in report["packages"][: args.top]:
+        print(f"{row['package']:<30} {row['self_ms']:>9.1f}")
+
+    loaded = [name for name, is_loaded in report["heavy_stacks"].items() if is_loaded]
+    print(f"\n📦 heavy stacks loaded: {', '.join(loaded) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
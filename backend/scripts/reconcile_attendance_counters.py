@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Rebuild the attendance counters and the student statistics derived from them.
+
+Usage:
+    python scripts/reconcile_attendance_counters.py                   # every student
+    python scripts/reconcile_attendance_counters.py --students 12,40  # only these students
+    python scripts/reconcile_attendance_counters.py --dry-run         # report drift only
+
+The service paths that write attendance records keep
+`student_attendance_counters` in step with them
+(app/services/attendance_counters.py). Records written any other way (SQL
+consoles, imports, seed scripts) make the counters drift. Run this after such
+writes, or nightly from cron. It recomputes the counters with one grouped
+query, re-derives attendance rate, alert level, absence hours and late
+minutes, and lists the students whose counters had drifted.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.db.session import SessionLocal
+from app.services.attendance import AttendanceService
+from app.services.attendance_counters import load_counters
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--students", help="comma-separated student ids (default: every student)")
+    parser.add_argument("--dry-run", action="store_true", help="report drift without writing")
+    args = parser.parse_args()
+    student_ids = [int(s) for s in args.students.split(",") if s.strip()] if args.students else None
+
+    db = SessionLocal()
+    try:
+        before = load_counters(db, student_ids)
+        AttendanceService._refresh_attendance_rates(db, student_ids, commit=False)
+        after = load_counters(db, student_ids)
+        drifted = sorted(
+            sid for sid in before.keys() | after.keys() if before.get(sid) != after.get(sid)
+        )
+
+        for sid in drifted[:50]:
+            print(f"   student {sid}: {before.get(sid)} -> {after.get(sid)}")
+        if len(drifted) > 50:
+            print(f"   ... and {len(drifted) - 50} more")
+
+        if args.dry_run:
+            db.rollback()
+            print(
+                f"🔎 {len(drifted)} of {len(after)} students have drifted counters (dry run, nothing written)"
+            )
+        else:
+            db.commit()
+            print(f"✅ Rebuilt counters of {len(after)} students ({len(drifted)} had drifted)")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
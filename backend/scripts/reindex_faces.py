@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Re-embed the stored face images of every user into `facial_embeddings`.
+
+Usage:
+    python scripts/reindex_faces.py                  # users without embeddings
+    python scripts/reindex_faces.py --force          # re-embed everyone
+    python scripts/reindex_faces.py --fresh          # ignore the checkpoint
+    python scripts/reindex_faces.py --users 12,57    # only these users
+
+Scans `FACE_STORAGE_DIR/<user_id>/*.jpg`, embeds the images in batches on the
+face inference process pool and bulk-inserts the rows one chunk of users per
+transaction. Finished users are checkpointed to `FACE_REINDEX_CHECKPOINT`, so
+rerunning after an interruption resumes where it stopped.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.db.session import SessionLocal
+from app.services.face_inference import face_inference
+from app.services.face_reindex import ReindexProgress, face_reindexer
+
+
+def _print_progress(p: ReindexProgress) -> None:
+    d = p.to_dict()
+    print(
+        f"  users {d['users_done']}/{d['users_total']} (failed {d['users_failed']})"
+        f"  images {d['images_embedded'] + d['images_rejected']}/{d['images_total']}"
+        f"  rows {d['rows_inserted']}  {d['images_per_second']:.1f} images/sec"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Re-embed users that already have embeddings"
+    )
+    parser.add_argument(
+        "--fresh", action="store_true", help="Ignore the checkpoint of a previous run"
+    )
+    parser.add_argument("--users", help="Comma-separated user ids (not checkpointed)")
+    args = parser.parse_args()
+
+    user_ids = [int(x) for x in args.users.split(",") if x] if args.users else None
+    print(f"📂 Scanning {face_reindexer.root}")
+    try:
+        progress = face_reindexer.run(
+            SessionLocal,
+            user_ids=user_ids,
+            force=args.force,
+            resume=not args.fresh,
+            on_progress=_print_progress,
+        )
+    finally:
+        face_inference.shutdown()
+
+    d = progress.to_dict()
+    if progress.state != "completed":
+        print(f"❌ Re-index {progress.state}: {progress.error}")
+        sys.exit(1)
+    print(
+        f"✅ {d['users_done']} users ({d['users_resumed']} already done, {d['users_failed']} failed), "
+        f"{d['rows_inserted']} rows in {d['elapsed_seconds']:.1f}s ({d['images_per_second']:.1f} images/sec)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Serve the API from forked uvicorn workers that share preloaded models.
+
+Usage:
+    python scripts/serve_prefork.py --workers 8
+    python scripts/serve_prefork.py --workers 4 --models face,rag --port 8000
+
+`uvicorn --workers N` spawns fresh interpreters, so each worker loads its own
+InsightFace models (and MobileNetV2, and the RAG encoder): N copies of
+several hundred MB. This launcher instead:
+
+1. loads and warms the models once (app/services/model_preload.py), without
+   importing app.main, whose imports start threads that would not survive
+   the fork;
+2. freezes the garbage collector, so the collector does not write to the
+   pages holding the model objects after the fork;
+3. binds the listening socket (connections are refused until the models
+   are warm) and forks the workers. Each worker imports app.main and serves
+   on the shared socket, reading the models copy-on-write;
+4. supervises them: a worker that dies is replaced, and SIGTERM/SIGINT stop
+   them all gracefully.
+
+Face inference runs on each worker's threads (FACE_INFERENCE_WORKERS=0) against
+the shared models. The workers replace the inference process pool. ONNX
+Runtime thread pools do not survive fork, so the sessions are built
+single-threaded (FACE_ORT_INTRA_OP_THREADS=1); parallelism comes from the
+workers. MobileNetV2 (TensorFlow is not fork-safe) is loaded by each worker
+on startup. GET /health/ready reports per-model state. Linux/macOS only.
+"""
+import argparse
+import gc
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# A worker that dies sooner than this after starting is restarted after a pause.
+MIN_WORKER_LIFETIME_SECONDS = 10
+
+
+def _force_env(name: str, value: str) -> None:
+    current = os.environ.get(name)
+    if current not in (None, "", "0", value):
+        print(f"⚠️  {name}={current} is not supported in pre-fork mode; using {value}")
+    os.environ[name] = value
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        help="worker processes (default: WEB_CONCURRENCY or the number of cores)",
+    )
+    parser.add_argument(
+        "--models",
+        default=os.getenv("PRELOAD_MODELS") or "face",
+        help='models to preload: "face", "liveness", "rag" or "all" (default: PRELOAD_MODELS or face)',
+    )
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    # Before any app module reads the settings.
+    _force_env("FACE_INFERENCE_WORKERS", "0")
+    _force_env("FACE_ORT_INTRA_OP_THREADS", "1")
+    os.environ["PRELOAD_MODELS"] = args.models
+
+    import uvicorn
+
+    from app.services.model_preload import parse_model_names, preload_models
+
+    started = time.perf_counter()
+    results = preload_models(parse_model_names(args.models), fork_safe_only=True)
+    print(f"🔥 Preloaded {results} in {time.perf_counter() - started:.1f}s (pid {os.getpid()})")
+    if threading.active_count() > 1:
+        names = [t.name for t in threading.enumerate() if t is not threading.main_thread()]
+        print(f"⚠️  Threads running before fork will not exist in the workers: {names}")
+
+    gc.collect()
+    gc.freeze()
+
+    config = uvicorn.Config(
+        "app.main:app", host=args.host, port=args.port, log_level=args.log_level
+    )
+    sock = config.bind_socket()
+
+    workers: dict[int, float] = {}  # pid -> start time
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                uvicorn.Server(config).run(sockets=[sock])
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        workers[pid] = time.monotonic()
+
+    def stop(signum, _frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(max(1, args.workers)):
+        spawn()
+    print(f"🚀 Serving on http://{args.host}:{args.port} with {len(workers)} pre-forked workers")
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started_at = workers.pop(pid, None)
+        if started_at is None or stopping:
+            continue
+        print(f"⚠️  Worker {pid} exited (status {status}); starting a new one")
+        if time.monotonic() - started_at < MIN_WORKER_LIFETIME_SECONDS:
+            time.sleep(1)
+        if not stopping:
+            spawn()
+
+    sock.close()
+    print("👋 All workers stopped")
+
+
+if __name__ == "__main__":
+    main()
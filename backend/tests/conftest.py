@@ -19,6 +19,7 @@ def db_session():
     from app.models.notification import Notification
     from app.models.session import Session
     from app.models.student import Student
+    from app.models.student_attendance_counters import StudentAttendanceCounters
     from app.models.trainer import Trainer
     from app.models.user import User
 
@@ -28,6 +29,7 @@ def db_session():
         Student.__table__,
         Session.__table__,
         AttendanceRecord.__table__,
+        StudentAttendanceCounters.__table__,
         Notification.__table__,
     ]
     Base.metadata.create_all(engine, tables=tables)
@@ -0,0 +1,47 @@
+import cv2
+import numpy as np
+
+from app.services.advanced_liveness import AdvancedLivenessDetector, calculate_lbp
+
+
+def _reference_lbp(gray):
+    """The former per-pixel implementation."""
+    lbp = np.zeros_like(gray, dtype=np.uint8)
+    for i in range(1, gray.shape[0] - 1):
+        for j in range(1, gray.shape[1] - 1):
+            center = gray[i, j]
+            code = 0
+            code |= (gray[i - 1, j - 1] > center) << 0
+            code |= (gray[i - 1, j] > center) << 1
+            code |= (gray[i - 1, j + 1] > center) << 2
+            code |= (gray[i, j + 1] > center) << 3
+            code |= (gray[i + 1, j + 1] > center) << 4
+            code |= (gray[i + 1, j] > center) << 5
+            code |= (gray[i + 1, j - 1] > center) << 6
+            code |= (gray[i, j - 1] > center) << 7
+            lbp[i, j] = code
+    return lbp
+
+
+def test_vectorized_lbp_matches_reference_loop():
+    gray = np.random.default_rng(0).integers(0, 256, (37, 53), dtype=np.uint8)
+    gray[5:9, 5:9] = 128  # ties must not set bits
+
+    assert np.array_equal(calculate_lbp(gray), _reference_lbp(gray))
+    assert not calculate_lbp(np.zeros((2, 2), dtype=np.uint8)).any()
+
+
+def test_flat_frame_is_rejected_early_and_batch_matches_single():
+    detector = AdvancedLivenessDetector()
+    detector.use_dl = False
+
+    _ok, flat = cv2.imencode(".png", np.full((120, 160, 3), 128, dtype=np.uint8))
+    noisy_rgb = np.random.default_rng(1).integers(0, 256, (120, 160, 3), dtype=np.uint8)
+    _ok, noisy = cv2.imencode(".png", noisy_rgb)
+
+    is_live, confidence, reason = detector.detect_liveness(flat.tobytes())
+    assert is_live is False
+    assert "skipped" in reason
+
+    singles = [detector.detect_liveness(b) for b in (flat.tobytes(), noisy.tobytes())]
+    assert detector.detect_liveness_batch([flat.tobytes(), noisy.tobytes()]) == singles
@@ -0,0 +1,36 @@
+import numpy as np
+
+from app.services.ann_index import ExactIndex, IVFFlatIndex, build_index
+
+
+def _unit(x):
+    return (x / np.linalg.norm(x, axis=-1, keepdims=True)).astype(np.float32)
+
+
+def test_exact_index_returns_best_rows_first():
+    rng = np.random.default_rng(0)
+    embeddings = _unit(rng.standard_normal((50, 512)))
+    scores, rows = ExactIndex(embeddings).search(embeddings[7], 3)
+
+    assert rows[0] == 7
+    assert abs(scores[0] - 1.0) < 1e-5
+    assert list(scores) == sorted(scores, reverse=True)
+
+
+def test_ivf_index_agrees_with_exact_search():
+    rng = np.random.default_rng(1)
+    identities = _unit(rng.standard_normal((400, 512)))
+    embeddings = _unit(np.repeat(identities, 3, axis=0) + rng.standard_normal((1200, 512)) * 0.03)
+    queries = _unit(identities[:50] + rng.standard_normal((50, 512)) * 0.05)
+
+    exact = ExactIndex(embeddings)
+    ivf = IVFFlatIndex(embeddings, nprobe=8)
+    hits = sum(int(exact.search(q, 1)[1][0] == ivf.search(q, 1)[1][0]) for q in queries)
+
+    assert hits >= 48
+
+
+def test_build_index_uses_exact_search_for_small_galleries():
+    embeddings = _unit(np.random.default_rng(2).standard_normal((10, 512)))
+    assert isinstance(build_index(embeddings, min_rows=100), ExactIndex)
+    assert isinstance(build_index(embeddings, min_rows=5), IVFFlatIndex)
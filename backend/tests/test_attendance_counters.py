@@ -0,0 +1,134 @@
+from datetime import date, time
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from app.api.routes.trainer import update_attendance_justification
+from app.models.attendance import AttendanceRecord
+from app.models.session import Session as SessionModel
+from app.models.student import Student
+from app.models.student_attendance_counters import StudentAttendanceCounters
+from app.schemas.attendance import AttendanceCreate, AttendanceUpdate
+from app.services.attendance import AttendanceService
+from app.services.attendance_counters import Counters, load_counters, rebuild_counters
+
+
+@pytest.fixture
+def student(db_session):
+    student = Student(
+        user_id=1,
+        student_code="CNT001",
+        first_name="Counter",
+        last_name="Student",
+        email="counter@student.com",
+        class_name="CS101",
+    )
+    db_session.add(student)
+    db_session.commit()
+    return student
+
+
+def _sessions(db, count, duration_minutes=150):
+    sessions = [
+        SessionModel(
+            module_id=1,
+            trainer_id=1,
+            classroom_id=1,
+            session_date=date(2026, 1, 5 + i),
+            start_time=time(9),
+            end_time=time(11, 30),
+            duration_minutes=duration_minutes,
+            class_name="CS101",
+        )
+        for i in range(count)
+    ]
+    db.add_all(sessions)
+    db.commit()
+    return sessions
+
+
+def _mark(db, session, student, status, **extra):
+    payload = AttendanceCreate(
+        session_id=session.id, student_id=student.id, status=status, marked_via="facial", **extra
+    )
+    return AttendanceService.mark_attendance(db, session.id, student.id, payload)
+
+
+def test_counters_follow_marks_and_updates(db_session, student):
+    s1, s2, s3, s4 = _sessions(db_session, 4)
+    _mark(db_session, s1, student, "present")
+    late = _mark(db_session, s2, student, "late", late_minutes=12)
+    absent = _mark(db_session, s3, student, "absent")
+    _mark(db_session, s4, student, "excused")
+
+    assert load_counters(db_session)[student.id] == Counters(
+        total_count=4,
+        present_count=1,
+        late_count=1,
+        absent_count=1,
+        excused_count=1,
+        late_minutes=12,
+        absence_hours=2,
+    )
+    db_session.refresh(student)
+    assert (student.total_absence_hours, student.total_late_minutes) == (2, 12)
+    assert student.attendance_rate == Decimal("75.00")
+    assert student.alert_level == "failing"
+
+    # Updates move the record's contribution instead of adding another one.
+    AttendanceService.update_attendance(db_session, absent.id, AttendanceUpdate(status="present"))
+    AttendanceService.update_attendance(db_session, late.id, AttendanceUpdate(late_minutes=20))
+    counters = load_counters(db_session)[student.id]
+    assert (counters.total_count, counters.present_count, counters.absent_count) == (4, 2, 0)
+    db_session.refresh(student)
+    assert (student.total_absence_hours, student.total_late_minutes) == (0, 20)
+    assert student.attendance_rate == Decimal("100.00")
+    assert student.alert_level == "none"
+
+
+def test_approved_justification_moves_the_counters(db_session, student):
+    s1, s2 = _sessions(db_session, 2)
+    absent = _mark(db_session, s1, student, "absent")
+    _mark(db_session, s2, student, "present")
+    trainer = SimpleNamespace(id=1, role="trainer")
+
+    update_attendance_justification(absent.id, {"status": "approved"}, db_session, trainer)
+
+    assert load_counters(db_session)[student.id] == Counters(
+        total_count=2, present_count=1, excused_count=1
+    )
+    assert load_counters(db_session) == rebuild_counters(db_session)
+    db_session.refresh(student)
+    assert student.total_absence_hours == 0
+    assert student.alert_level == "none"
+
+
+def test_rebuild_repairs_drifted_counters(db_session, student):
+    sessions = _sessions(db_session, 5, duration_minutes=120)
+    # Written behind the service's back: no counter deltas.
+    for session, status in zip(sessions, ["present", "absent", "absent", "late", "present"]):
+        db_session.add(
+            AttendanceRecord(
+                session_id=session.id, student_id=student.id, status=status, late_minutes=5
+            )
+        )
+    db_session.add(StudentAttendanceCounters(student_id=999, total_count=3, absent_count=3))
+    db_session.commit()
+
+    AttendanceService._refresh_attendance_rates(db_session, None)
+
+    assert load_counters(db_session) == {
+        student.id: Counters(
+            total_count=5,
+            present_count=2,
+            late_count=1,
+            absent_count=2,
+            late_minutes=5,
+            absence_hours=4,
+        )
+    }
+    db_session.refresh(student)
+    assert student.total_absence_hours == 4
+    assert student.attendance_rate == Decimal("60.00")
+    assert student.alert_level == "failing"
@@ -91,3 +91,20 @@ def test_get_student_attendance_summary(db_session, test_student):
     assert summary["present"] == 8
     assert summary["absent"] == 2
     assert summary["attendance_rate"] == 80.0
+
+
+def test_refresh_attendance_rates_matches_per_student_update(db_session, test_student):
+    """Bulk rate refresh gives the same rate and alert level as the per-record path."""
+    for session_id, status in enumerate(
+        ["present", "absent", "late", "absent", "present"], start=1
+    ):
+        db_session.add(
+            AttendanceRecord(session_id=session_id, student_id=test_student.id, status=status)
+        )
+    db_session.commit()
+
+    AttendanceService._refresh_attendance_rates(db_session, [test_student.id])
+    db_session.refresh(test_student)
+
+    assert test_student.attendance_rate == Decimal("60.00")
+    assert test_student.alert_level == "failing"
@@ -0,0 +1,155 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.models.attendance import AttendanceRecord
+from app.models.session import Session as SessionModel
+from app.models.student import Student
+from app.models.student_attendance_counters import StudentAttendanceCounters
+from app.services.attendance_counters import Counters, load_counters, rebuild_counters
+from app.services.attendance_upsert import (
+    ConflictPolicy,
+    insert_attendance_batch,
+    upsert_attendance,
+)
+
+
+def _setup(db, students=1):
+    session = SessionModel(
+        module_id=1,
+        trainer_id=1,
+        classroom_id=1,
+        session_date=date(2026, 3, 2),
+        start_time=time(9),
+        end_time=time(11),
+        duration_minutes=120,
+        class_name="CS101",
+    )
+    db.add(session)
+    db.add_all(
+        Student(
+            user_id=i,
+            student_code=f"UPS{i:03d}",
+            first_name="Upsert",
+            last_name=str(i),
+            email=f"upsert{i}@student.com",
+            class_name="CS101",
+        )
+        for i in range(1, students + 1)
+    )
+    db.commit()
+    return session.id, [s.id for s in db.query(Student).order_by(Student.id)]
+
+
+def _upsert(db, session_id, student_id, status, policy, **fields):
+    result = upsert_attendance(
+        db, session_id=session_id, student_id=student_id, status=status, policy=policy, **fields
+    )
+    db.commit()
+    return result
+
+
+def test_conflict_policies(db_session):
+    session_id, (sid,) = _setup(db_session)
+
+    first = _upsert(db_session, session_id, sid, "absent", ConflictPolicy.KEEP_FIRST)
+    assert first.created
+    kept = _upsert(db_session, session_id, sid, "present", ConflictPolicy.KEEP_FIRST)
+    assert not kept.applied and kept.record.status == "absent"
+
+    upgraded = _upsert(
+        db_session, session_id, sid, "late", ConflictPolicy.KEEP_BEST, late_minutes=7
+    )
+    assert upgraded.changed and upgraded.previous_status == "absent"
+    not_downgraded = _upsert(db_session, session_id, sid, "excused", ConflictPolicy.KEEP_BEST)
+    assert not not_downgraded.applied and not_downgraded.record.status == "late"
+    assert load_counters(db_session)[sid] == Counters(total_count=1, late_count=1, late_minutes=7)
+
+    overwritten = _upsert(
+        db_session, session_id, sid, "absent", ConflictPolicy.OVERWRITE, late_minutes=0
+    )
+    assert overwritten.changed and overwritten.record.status == "absent"
+    assert load_counters(db_session)[sid] == Counters(
+        total_count=1, absent_count=1, absence_hours=2
+    )
+    assert db_session.get(Student, sid).total_absence_hours == 2
+    assert db_session.query(AttendanceRecord).count() == 1
+
+
+def test_batch_insert_keeps_existing_records(db_session):
+    session_id, (a, b, c) = _setup(db_session, students=3)
+    _upsert(db_session, session_id, a, "absent", ConflictPolicy.KEEP_FIRST)
+
+    rows = [{"student_id": sid, "status": "present", "marked_via": "kiosk"} for sid in (a, b, c)]
+    assert insert_attendance_batch(db_session, session_id, rows) == [b, c]
+    db_session.commit()
+
+    assert db_session.query(AttendanceRecord).filter_by(student_id=a).one().status == "absent"
+    assert load_counters(db_session) == rebuild_counters(db_session)
+    assert db_session.get(Student, b).attendance_rate == 100
+
+
+@pytest.fixture
+def file_engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'attendance.db'}",
+        connect_args={"timeout": 30, "check_same_thread": False},
+        pool_size=16,
+    )
+    Base.metadata.create_all(
+        engine,
+        tables=[
+            Student.__table__,
+            SessionModel.__table__,
+            AttendanceRecord.__table__,
+            StudentAttendanceCounters.__table__,
+        ],
+    )
+    yield engine
+    engine.dispose()
+
+
+def test_simultaneous_checkins_create_one_record_per_student(file_engine):
+    make_session = sessionmaker(bind=file_engine)
+    with make_session() as db:
+        session_id, student_ids = _setup(db, students=50)
+
+    # Every student is marked by six writers at once, in every status.
+    attempts = [
+        ("absent", ConflictPolicy.KEEP_FIRST, {}),
+        ("late", ConflictPolicy.KEEP_BEST, {"late_minutes": 5}),
+        ("present", ConflictPolicy.KEEP_BEST, {"marked_via": "self_checkin"}),
+        ("present", ConflictPolicy.KEEP_FIRST, {"marked_via": "qr_code"}),
+        ("excused", ConflictPolicy.KEEP_FIRST, {}),
+        ("present", ConflictPolicy.KEEP_BEST, {"marked_via": "teams_auto"}),
+    ]
+    jobs = [(sid, *attempt) for sid in student_ids for attempt in attempts]
+    go = threading.Event()
+
+    def check_in(job):
+        sid, status, policy, fields = job
+        go.wait()
+        with make_session() as db:
+            return _upsert(db, session_id, sid, status, policy, **fields).created
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        futures = [pool.submit(check_in, job) for job in jobs]
+        go.set()
+        created = [f.result() for f in futures]  # re-raises any writer's error
+
+    assert len(created) == 300 and sum(created) == 50
+    with make_session() as db:
+        records = db.query(AttendanceRecord).all()
+        assert sorted(r.student_id for r in records) == student_ids
+        # A KEEP_BEST `present` always wins, whatever the order.
+        assert {r.status for r in records} == {"present"}
+
+        counters = load_counters(db)
+        assert counters == rebuild_counters(db)
+        assert set(counters.values()) == {Counters(total_count=1, present_count=1)}
+        assert {s.attendance_rate for s in db.query(Student)} == {100}
@@ -0,0 +1,74 @@
+import numpy as np
+
+from app.services.checkin_analysis import assess_liveness
+from app.services.face_engine import FaceFrame
+
+
+class _StubFrame(FaceFrame):
+    """FaceFrame with canned detections, so no model is loaded."""
+
+    def __init__(self, img_bgr, bboxes):
+        super().__init__(img_bgr)
+        self.detections = (np.asarray(bboxes, dtype=np.float32).reshape(-1, 5), None)
+
+
+def _textured_image(size=320):
+    # Horizontal gradient plus mild noise: passes the brightness/sharpness checks.
+    rng = np.random.default_rng(0)
+    gray = np.tile(np.linspace(40, 220, size), (size, 1)) + rng.normal(0, 8, (size, size))
+    return np.repeat(np.clip(gray, 0, 255).astype(np.uint8)[:, :, None], 3, axis=2)
+
+
+def test_frame_caches_gray_and_metrics():
+    frame = _StubFrame(_textured_image(), [[80, 80, 240, 240, 0.99]])
+
+    assert frame.gray is frame.gray
+    metrics = frame.quality_metrics()
+    assert metrics.num_faces == 1
+    assert (metrics.face_width, metrics.face_height) == (160, 160)
+    assert frame.face_box(0) == (80, 80, 160, 160)
+
+
+def test_liveness_uses_shared_detections():
+    no_face = _StubFrame(_textured_image(), [])
+    assert assess_liveness(no_face)[0] is False
+    assert "No face detected" in assess_liveness(no_face)[2]
+
+    two_faces = _StubFrame(_textured_image(), [[10, 10, 110, 110, 0.9], [150, 150, 250, 250, 0.9]])
+    assert "Multiple faces" in assess_liveness(two_faces)[2]
+
+    small = _StubFrame(_textured_image(), [[100, 100, 130, 130, 0.9]])
+    assert "Face too small" in assess_liveness(small)[2]
+
+    one_face = _StubFrame(_textured_image(), [[80, 60, 240, 260, 0.99]])
+    assert assess_liveness(one_face)[0] is True
+
+
+def test_recognition_is_skipped_after_liveness_rejection(monkeypatch):
+    import threading
+
+    from app.services import checkin_analysis
+
+    liveness_done = threading.Event()
+
+    def fake_liveness(frames, rejected):
+        for flag in rejected:
+            flag.set()
+        liveness_done.set()
+        return [(False, 0.1, "Image too dark - please improve lighting")] * len(frames), 1.0
+
+    def fake_embed(frames, skip=None):
+        liveness_done.wait(timeout=2)
+        return [
+            checkin_analysis.FaceEmbeddingResult(None, None, skip(i) or "embedded")
+            for i in range(len(frames))
+        ]
+
+    monkeypatch.setattr(checkin_analysis, "_liveness_stage", fake_liveness)
+    monkeypatch.setattr(checkin_analysis, "embed_frames_batch", fake_embed)
+    monkeypatch.setattr(checkin_analysis.FaceFrame, "from_bytes", classmethod(lambda cls, b: None))
+
+    results = checkin_analysis.analyze_checkin_images([b"a", b"b"], [True, False])
+
+    assert [r.failure_reason for r in results] == ["liveness_failed", "embedded"]
+    assert set(results[0].timings) >= {"decode_ms", "liveness_ms", "recognition_ms", "total_ms"}
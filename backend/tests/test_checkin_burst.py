@@ -0,0 +1,118 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.checkin_analysis import CheckinAnalysis
+from app.services.checkin_burst import ACCEPTED, REJECTED, CheckinBurst
+from app.utils.uploads import iter_length_prefixed_frames
+
+
+def _analysis(live=True, confidence=0.7):
+    return CheckinAnalysis(
+        is_live=live,
+        liveness_confidence=confidence,
+        liveness_reason=(
+            "Liveness checks passed" if live else "Image too blurry - ensure camera is focused"
+        ),
+        embedding=None,
+        metrics=None,
+        timings={"total_ms": 1.0},
+    )
+
+
+def test_burst_accepts_once_enough_frames_agree():
+    burst = CheckinBurst(match_threshold=0.6, min_live_frames=2, min_match_frames=2, max_frames=5)
+
+    assert burst.add(_analysis(), 0.72, None) is None
+    assert burst.add(_analysis(live=False, confidence=0.1), 0.4, "below_threshold") is None
+    assert burst.add(_analysis(confidence=0.9), 0.68, None) == ACCEPTED
+
+    assert burst.frames_analyzed == 3
+    assert burst.liveness_passed and burst.matched
+    assert burst.face_confidence == pytest.approx(0.70)
+    assert burst.liveness_confidence == pytest.approx(0.80)
+    assert burst.admit(b"late frame") is False
+
+
+def test_burst_rejects_when_remaining_frames_cannot_match():
+    burst = CheckinBurst(match_threshold=0.6, min_live_frames=2, min_match_frames=2, max_frames=3)
+
+    assert burst.add(_analysis(), 0.3, "below_threshold") is None
+    assert burst.add(_analysis(), 0.35, "below_threshold") == REJECTED
+    assert burst.liveness_passed and not burst.matched
+    assert burst.face_confidence == pytest.approx(0.35)
+
+
+def test_burst_skips_repeated_frames():
+    burst = CheckinBurst(match_threshold=0.6)
+
+    assert burst.admit(b"frame-1") is True
+    assert burst.admit(b"frame-1") is False
+    assert burst.frames_repeated == 1
+
+
+def test_burst_checkin_stops_reading_frames_after_decision(monkeypatch):
+    from app.services import self_checkin
+
+    service = self_checkin.SelfCheckinService(db=None)
+    student = SimpleNamespace(id=7, user_id=70, email="s@example.com")
+    monkeypatch.setattr(service, "_checkin_target", lambda session_id, student_id: ("att", student))
+    recorded = {}
+    monkeypatch.setattr(
+        service, "_complete_checkin", lambda *a, **kw: recorded.update(kw) or "checkin"
+    )
+
+    async def analyze(frame, stop_on_liveness_failure=False):
+        return _analysis()
+
+    monkeypatch.setattr(self_checkin.face_inference, "analyze_checkin_async", analyze)
+    monkeypatch.setattr(
+        self_checkin, "verify_user_face_from_analysis", lambda *a, **kw: (70, 0.8, None, None)
+    )
+
+    pulled = []
+
+    async def frames():
+        for i in range(6):
+            pulled.append(i)
+            yield f"frame-{i}".encode()
+
+    result = asyncio.run(service.process_burst_checkin(session_id=1, student_id=7, frames=frames()))
+
+    assert result == "checkin"
+    assert pulled == [0, 1]
+    assert recorded["matched_user_id"] == 70
+    assert recorded["liveness_passed"] is True
+    assert recorded["details"]["burst"]["frames_analyzed"] == 2
+
+
+def test_length_prefixed_frames_are_yielded_as_they_complete():
+    body = b"".join(len(f).to_bytes(4, "big") + f for f in (b"abc", b"defgh"))
+
+    async def chunks():
+        for i in range(0, len(body), 3):
+            yield body[i : i + 3]
+
+    async def collect(stream):
+        return [frame async for frame in stream]
+
+    assert asyncio.run(collect(iter_length_prefixed_frames(chunks(), max_bytes=16))) == [
+        b"abc",
+        b"defgh",
+    ]
+
+    async def truncated():
+        yield (10).to_bytes(4, "big") + b"abc"
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(collect(iter_length_prefixed_frames(truncated(), max_bytes=16)))
+    assert exc.value.status_code == 400
+
+    async def too_large():
+        yield (100).to_bytes(4, "big")
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(collect(iter_length_prefixed_frames(too_large(), max_bytes=16)))
+    assert exc.value.status_code == 413
@@ -0,0 +1,64 @@
+import io
+
+import cv2
+import numpy as np
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.services import face_engine
+from app.utils.uploads import read_image_upload
+
+
+class _Recognition:
+    def __init__(self):
+        self.calls = []
+
+    def get_feat(self, crops):
+        self.calls.append(len(crops))
+        return np.ones((len(crops), 512), dtype=np.float32)
+
+
+class _App:
+    def __init__(self):
+        self.models = {"recognition": _Recognition()}
+
+
+def _png(img: np.ndarray) -> bytes:
+    return cv2.imencode(".png", img)[1].tobytes()
+
+
+def _face_like(size: int) -> np.ndarray:
+    rng = np.random.default_rng(size)
+    return rng.integers(60, 200, size=(size, size, 3), dtype=np.uint8)
+
+
+def test_client_crops_skip_detection_and_keep_blur_and_light_gates(monkeypatch):
+    app = _App()
+    monkeypatch.setattr(face_engine, "_get_face_app", lambda: app)
+    monkeypatch.setattr(face_engine, "_detect_faces", lambda *a, **k: pytest.fail("detector ran"))
+    crops = [
+        _png(_face_like(112)),
+        _png(_face_like(160)),  # not an aligned crop
+        _png(
+            np.random.default_rng(0).integers(0, 30, size=(112, 112, 3), dtype=np.uint8)
+        ),  # too dark
+        b"not an image",
+    ]
+
+    results = face_engine.extract_crop_embeddings_batch(crops, keep_crops=True)
+
+    assert [r.reason for r in results] == [None, "invalid_crop", "image_too_dark", "invalid_image"]
+    assert results[0].ok and results[0].crop.shape == (112, 112, 3)
+    assert results[0].metrics.num_faces == 1
+    assert app.models["recognition"].calls == [1]
+
+
+def test_read_image_upload_enforces_size_limit():
+    upload = UploadFile(file=io.BytesIO(b"x" * 11), filename="a.jpg")
+    with pytest.raises(HTTPException) as exc:
+        read_image_upload(upload, max_bytes=10)
+    assert exc.value.status_code == 413
+
+    assert read_image_upload(UploadFile(file=io.BytesIO(b"abc")), max_bytes=10) == b"abc"
+    with pytest.raises(HTTPException):
+        read_image_upload(UploadFile(file=io.BytesIO(b"")), max_bytes=10)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from app.services.embedding_cache import EmbeddingCache, _decode, _encode, unpack
+from app.services.face_engine import FaceQualityError, FaceQualityMetrics
+
+METRICS = FaceQualityMetrics(
+    num_faces=1, blur_score=50.0, brightness=120.0, face_width=90, face_height=110
+)
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.data[key] = value
+
+
+def test_lru_evicts_oldest_and_counts_hits():
+    cache = EmbeddingCache(max_entries=2, ttl_seconds=60)
+    emb = np.ones(512, dtype=np.float32)
+    cache.put("a", (emb, METRICS, None))
+    cache.put("b", (emb, METRICS, None))
+    assert cache.get("a") is not None  # "a" becomes most recent
+    cache.put("c", (emb, METRICS, None))
+
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (2, 1, 1)
+    assert stats["hit_rate"] == pytest.approx(2 / 3, abs=1e-4)
+
+
+def test_expired_entries_are_misses(monkeypatch):
+    from app.services import embedding_cache as module
+
+    now = [100.0]
+    monkeypatch.setattr(module.time, "monotonic", lambda: now[0])
+    cache = EmbeddingCache(max_entries=4, ttl_seconds=5)
+    cache.put("a", (np.zeros(512, dtype=np.float32), METRICS, None))
+    now[0] += 6
+
+    assert cache.get("a") is None
+
+
+def test_quality_failures_are_replayed():
+    cache = EmbeddingCache()
+    cache.put("a", (None, METRICS, "too_blurry"))
+
+    with pytest.raises(FaceQualityError) as exc:
+        unpack(cache.get("a"))
+    assert exc.value.reason == "too_blurry"
+    assert exc.value.metrics == METRICS
+
+
+def test_redis_entries_round_trip_between_instances():
+    redis = _FakeRedis()
+    emb = np.random.default_rng(0).normal(size=512).astype(np.float32)
+    EmbeddingCache(namespace="balanced", redis=redis).put("a", (emb, METRICS, None))
+
+    other = EmbeddingCache(namespace="balanced", redis=redis)
+    embedding, metrics, reason = other.get("a")
+
+    np.testing.assert_array_equal(embedding, emb)
+    assert metrics == METRICS and reason is None
+    assert other.stats()["redis_hits"] == 1
+    assert EmbeddingCache(namespace="fast", redis=redis).get("a") is None
+    assert _decode(_encode((None, None, "no_face"))) == (None, None, "no_face")
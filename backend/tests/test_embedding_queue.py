@@ -0,0 +1,88 @@
+import os
+import time
+
+from app.services.embedding_queue import EmbeddingQueue
+
+
+class _FakeSession:
+    def close(self):
+        pass
+
+
+def test_enqueue_publishes_complete_jobs_in_fifo_order(tmp_path):
+    queue = EmbeddingQueue(tmp_path)
+    first = queue.enqueue(1, [b"a", b"b", b"c"])
+    second = queue.enqueue(2, [b"d"])
+
+    pending = queue.pending_jobs()
+    assert [p.name for p in pending] == sorted([first, second])
+    assert sorted(p.name for p in pending[0].iterdir()) == [
+        "img_1.jpg",
+        "img_2.jpg",
+        "img_3.jpg",
+        "job.json",
+    ]
+    assert list(queue.incoming.iterdir()) == []
+    assert queue.stats()["depth"] == 2
+
+
+def test_each_job_is_claimed_once(tmp_path):
+    queue = EmbeddingQueue(tmp_path)
+    job_id = queue.enqueue(1, [b"a"])
+    other_worker = EmbeddingQueue(tmp_path)
+
+    claimed = queue.claim()
+
+    assert claimed == queue.claimed / job_id
+    assert other_worker.claim() is None
+    assert queue.stats()["in_progress"] == 1
+
+
+def test_stale_claims_are_requeued(tmp_path):
+    queue = EmbeddingQueue(tmp_path, claim_timeout_seconds=60)
+    queue.enqueue(1, [b"a"])
+    claimed = queue.claim()
+    old = time.time() - 120
+    os.utime(claimed, (old, old))
+
+    assert queue.requeue_stale() == 1
+    assert len(queue.pending_jobs()) == 1
+
+
+def test_failed_job_is_kept_with_its_error(tmp_path, monkeypatch):
+    queue = EmbeddingQueue(tmp_path)
+    job_id = queue.enqueue(1, [b"a"])
+
+    def boom(job_dir, db):
+        raise ValueError("At least 2 usable face images are required.")
+
+    monkeypatch.setattr(queue, "process", boom)
+
+    assert queue.run_once(_FakeSession) is True
+    assert queue.run_once(_FakeSession) is False
+    assert (queue.failed / job_id / "error.txt").read_text().startswith("At least 2")
+    assert queue.stats()["failed"] == 1
+
+
+def test_enrolled_users_are_patched_into_the_gallery_once_per_drain(tmp_path, monkeypatch):
+    from app.services import embedding_queue as module
+
+    queue = EmbeddingQueue(tmp_path)
+    for user_id in (1, 2, 3):
+        queue.enqueue(user_id, [b"a"])
+    refreshes = []
+    monkeypatch.setattr(
+        module.face_gallery, "refresh_users", lambda db, ids: refreshes.append(sorted(ids))
+    )
+
+    def process(job_dir, db):
+        with queue._gallery_lock:
+            queue._gallery_pending.add(int(job_dir.name.split("user_")[1].split("-")[0]))
+        return 1
+
+    monkeypatch.setattr(queue, "process", process)
+
+    while queue.run_once(_FakeSession):
+        pass
+
+    assert refreshes == [[1, 2, 3]]
@@ -0,0 +1,122 @@
+import numpy as np
+
+from app.services.face_gallery import EMBEDDING_DIM, FaceGallery
+
+
+def _unit(seed: int) -> np.ndarray:
+    vec = np.random.default_rng(seed).standard_normal(EMBEDDING_DIM).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+def test_best_similarity_and_class_slice(tmp_path):
+    gallery = FaceGallery(tmp_path)
+    assert gallery.snapshot() is None
+
+    gallery.replace_user(
+        1, student_id=10, class_name="DEV101", embeddings=np.stack([_unit(1), _unit(2)])
+    )
+    gallery.replace_user(2, student_id=20, class_name="DEV102", embeddings=_unit(3)[None, :])
+    gallery.replace_user(3, student_id=30, class_name="DEV101", embeddings=_unit(4)[None, :])
+
+    assert abs(gallery.best_similarity(1, _unit(2)) - 1.0) < 1e-5
+    assert gallery.best_similarity(99, _unit(2)) is None
+
+    embeddings, user_ids, student_ids = gallery.class_slice("DEV101")
+    assert embeddings.shape == (3, EMBEDDING_DIM)
+    assert sorted(set(user_ids.tolist())) == [1, 3]
+    assert sorted(set(student_ids.tolist())) == [10, 30]
+    assert gallery.class_slice("unknown")[0].shape == (0, EMBEDDING_DIM)
+
+
+def test_updates_are_visible_to_other_instances(tmp_path):
+    writer = FaceGallery(tmp_path)
+    reader = FaceGallery(tmp_path)
+
+    writer.replace_user(1, student_id=10, class_name="DEV101", embeddings=_unit(1)[None, :])
+    assert abs(reader.best_similarity(1, _unit(1)) - 1.0) < 1e-5
+
+    writer.replace_user(1, student_id=10, class_name="DEV101", embeddings=_unit(5)[None, :])
+    assert abs(reader.best_similarity(1, _unit(5)) - 1.0) < 1e-5
+
+    writer.remove_user(1)
+    assert reader.best_similarity(1, _unit(5)) is None
+    assert reader.stats()["rows"] == 0
+    # Only the published version is kept on disk.
+    assert len(list(tmp_path.glob("embeddings-*.npy"))) <= 1
+
+
+def _embeddings_db():
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import sessionmaker
+
+    from app.services.inference_profiles import model_version
+
+    db = sessionmaker(bind=create_engine("sqlite://"))()
+    db.execute(text("CREATE TABLE students (id INTEGER PRIMARY KEY, user_id INTEGER, class TEXT)"))
+    db.execute(
+        text(
+            "CREATE TABLE facial_embeddings (id INTEGER PRIMARY KEY, user_id INTEGER, student_id INTEGER, "
+            "embedding TEXT, model_version TEXT)"
+        )
+    )
+    db.execute(text("INSERT INTO students VALUES (10, 1, 'DEV101'), (20, 2, 'DEV101')"))
+
+    def enroll(row_id, student_id, seed):
+        db.execute(
+            text("INSERT INTO facial_embeddings VALUES (:id, NULL, :sid, :emb, :mv)"),
+            {
+                "id": row_id,
+                "sid": student_id,
+                "emb": str(_unit(seed).tolist()),
+                "mv": model_version(),
+            },
+        )
+
+    return db, enroll
+
+
+def test_ensure_built_rebuilds_when_the_database_changed_elsewhere(tmp_path):
+    from sqlalchemy import text
+
+    db, enroll = _embeddings_db()
+    enroll(1, 10, seed=1)
+    enroll(2, 20, seed=2)
+    gallery = FaceGallery(tmp_path)
+    assert gallery.ensure_built(db).fingerprint == (2, 2)
+
+    # Another host replaces student 20's embedding: same count, new max id.
+    db.execute(text("DELETE FROM facial_embeddings WHERE id = 2"))
+    enroll(3, 20, seed=3)
+    restarted = FaceGallery(tmp_path)  # first use in a new process checks the fingerprint
+    snap = restarted.ensure_built(db)
+    assert snap.fingerprint == (2, 3)
+    assert abs(restarted.best_similarity(2, _unit(3)) - 1.0) < 1e-5
+
+    # Patches that know the embedding ids keep the fingerprint in step.
+    enroll(4, 10, seed=4)
+    restarted.refresh_user(db, 1)
+    assert restarted.snapshot().fingerprint == restarted.db_fingerprint(db) == (3, 4)
+
+    # Rows patched in without their ids leave no fingerprint, so the next check rebuilds.
+    restarted.replace_user(1, student_id=10, class_name="DEV101", embeddings=_unit(5)[None, :])
+    assert restarted.snapshot().fingerprint is None
+    assert FaceGallery(tmp_path).ensure_built(db).fingerprint == (3, 4)
+
+
+def test_refresh_users_patches_many_users_in_one_publish(tmp_path, monkeypatch):
+    db, enroll = _embeddings_db()
+    enroll(1, 10, seed=1)
+    gallery = FaceGallery(tmp_path)
+    gallery.ensure_built(db)
+    publishes = []
+    publish = gallery._publish
+    monkeypatch.setattr(gallery, "_publish", lambda *a: publishes.append(1) or publish(*a))
+
+    enroll(2, 20, seed=2)
+    enroll(3, 10, seed=3)
+    gallery.refresh_users(db, [1, 2])
+
+    assert len(publishes) == 1
+    assert gallery.snapshot().fingerprint == gallery.db_fingerprint(db) == (3, 3)
+    assert abs(gallery.best_similarity(1, _unit(3)) - 1.0) < 1e-5
+    assert abs(gallery.best_similarity(2, _unit(2)) - 1.0) < 1e-5
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from app.services import face_model_migration
+from app.services.face_crops import FaceCropStore
+
+
+def _crop(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 256, size=(112, 112, 3), dtype=np.uint8)
+
+
+def test_crop_store_is_lossless_and_content_addressed(tmp_path):
+    store = FaceCropStore(tmp_path)
+    crop = _crop(0)
+
+    digest = store.put(crop)
+
+    assert store.put(crop.copy()) == digest
+    assert len(list(tmp_path.rglob("*.png"))) == 1
+    np.testing.assert_array_equal(store.get(digest), crop)
+    assert store.get("0" * 64) is None
+    with pytest.raises(ValueError):
+        store.put(np.zeros((64, 64, 3), dtype=np.uint8))
+
+
+def test_reembed_rows_embeds_crops_with_target_model(tmp_path, monkeypatch):
+    store = FaceCropStore(tmp_path)
+    monkeypatch.setattr(face_model_migration, "face_crop_store", store)
+    digests = [store.put(_crop(1)), store.put(_crop(2))]
+    calls, inserted = [], []
+
+    def fake_embed(crops, target, *, wait):
+        calls.append((len(crops), target))
+        return np.ones((len(crops), 512), dtype=np.float32)
+
+    monkeypatch.setattr(face_model_migration, "_embed_crops", fake_embed)
+    monkeypatch.setattr(
+        face_model_migration, "insert_embedding_rows", lambda db, rows: inserted.extend(rows)
+    )
+    base = {
+        "student_id": 4,
+        "user_id": 9,
+        "image_path": "/storage/faces/9/a.jpg",
+        "image_hash": "h",
+        "is_primary": True,
+        "embedding_model": "insightface",
+        "lighting_conditions": "normal",
+    }
+    rows = [
+        {**base, "id": 1, "crop_hash": digests[0]},
+        {**base, "id": 2, "crop_hash": "f" * 64},  # crop file lost
+        {**base, "id": 3, "crop_hash": digests[1]},
+    ]
+
+    new_rows, missing = face_model_migration.reembed_rows(None, rows, "antelopev2")
+
+    assert calls == [(2, "antelopev2")]
+    assert missing == 1
+    assert inserted == new_rows
+    assert [r["crop_hash"] for r in new_rows] == digests
+    assert all(r["model_version"] == "antelopev2" and "id" not in r for r in new_rows)
@@ -0,0 +1,116 @@
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.services import face_reindex
+from app.services.face_engine import FaceEmbeddingResult, FaceQualityMetrics
+from app.services.face_reindex import FaceReindexer
+
+METRICS = FaceQualityMetrics(
+    num_faces=1, blur_score=50.0, brightness=120.0, face_width=90, face_height=110
+)
+
+
+def _make_tree(root, counts):
+    for user_id, count in counts.items():
+        folder = root / str(user_id)
+        folder.mkdir(parents=True)
+        for i in range(count):
+            (folder / f"{i}.jpg").write_bytes(f"{user_id}-{i}".encode())
+    (root / "not-a-user").mkdir()
+
+
+def test_scan_keeps_users_with_enough_images(tmp_path):
+    _make_tree(tmp_path / "faces", {3: 3, 7: 2, 12: 4})
+    reindexer = FaceReindexer(tmp_path / "faces", tmp_path / "ckpt.json")
+
+    assert [(uid, len(paths)) for uid, paths in reindexer.scan()] == [(12, 4), (3, 3)]
+    assert [uid for uid, _ in reindexer.scan([3])] == [3]
+
+
+def test_checkpoint_round_trip(tmp_path):
+    reindexer = FaceReindexer(tmp_path, tmp_path / "state" / "ckpt.json")
+    assert reindexer.load_checkpoint() == set()
+
+    reindexer._save_checkpoint({4, 9})
+
+    assert reindexer.load_checkpoint() == {4, 9}
+
+
+def test_embed_users_batches_and_groups_by_user(tmp_path, monkeypatch):
+    _make_tree(tmp_path, {1: 3, 2: 3})
+    reindexer = FaceReindexer(tmp_path, tmp_path / "ckpt.json")
+    batches = []
+
+    def fake_submit(images):
+        batches.append(len(images))
+        future = Future()
+        future.set_result(
+            [
+                (
+                    FaceEmbeddingResult(np.ones(512, dtype=np.float32), METRICS)
+                    if not data.endswith(b"-0")
+                    else FaceEmbeddingResult(None, METRICS, "no_face")
+                )
+                for data in images
+            ]
+        )
+        return future
+
+    monkeypatch.setattr(reindexer, "_submit", fake_submit)
+
+    embedded = reindexer.embed_users(reindexer.scan(), batch_size=4)
+
+    assert batches == [4, 2]
+    assert sorted(embedded) == [1, 2]
+    assert [path for path, _data, _r in embedded[2]] == [
+        f"/storage/faces/2/{i}.jpg" for i in range(3)
+    ]
+    assert [r.ok for _path, _data, r in embedded[1]] == [False, True, True]
+
+
+def test_enqueue_user_deduplicates(tmp_path, monkeypatch):
+    _make_tree(tmp_path, {5: 3, 6: 1})
+    reindexer = FaceReindexer(tmp_path, tmp_path / "ckpt.json")
+    monkeypatch.setattr(reindexer, "_ensure_worker", lambda: None)
+
+    assert reindexer.enqueue_user(5) is True
+    assert reindexer.enqueue_user(5) is True
+    assert reindexer.enqueue_user(6) is False
+    assert reindexer._jobs.qsize() == 1
+    assert reindexer.stats()["pending_users"] == 1
+
+
+def test_full_run_checkpoints_indexed_users_and_clears_when_done(tmp_path, monkeypatch):
+    _make_tree(tmp_path / "faces", {1: 3, 2: 3})
+    reindexer = FaceReindexer(tmp_path / "faces", tmp_path / "ckpt.json")
+    checkpoints = []
+    monkeypatch.setattr(reindexer, "_users_with_embeddings", lambda db: set())
+    monkeypatch.setattr(reindexer, "embed_users", lambda users, batch_size: {})
+    monkeypatch.setattr(reindexer, "write_users", lambda db, embedded, force: ([1], [2]))
+    monkeypatch.setattr(reindexer, "_save_checkpoint", lambda done: checkpoints.append(set(done)))
+    monkeypatch.setattr(face_reindex.face_gallery, "rebuild", lambda db: None)
+    reindexer.checkpoint_path.write_text('{"done_user_ids": []}')
+    db = SimpleNamespace(close=lambda: None, rollback=lambda: None)
+
+    progress = reindexer.run(lambda: db)
+
+    assert progress.state == "completed" and progress.users_failed == 1
+    assert checkpoints == [{1}]
+    assert not reindexer.checkpoint_path.exists()
+
+
+def test_failed_user_is_not_queued_again_until_images_change(tmp_path, monkeypatch):
+    _make_tree(tmp_path, {5: 3})
+    reindexer = FaceReindexer(tmp_path, tmp_path / "ckpt.json")
+    monkeypatch.setattr(reindexer, "_ensure_worker", lambda: None)
+
+    reindexer._record_outcome([], [5])
+    assert reindexer.enqueue_user(5) is False
+    assert reindexer.stats()["failed_users"] == 1
+
+    (tmp_path / "5" / "3.jpg").write_bytes(b"new capture")
+    assert reindexer.enqueue_user(5) is True
+    reindexer._record_outcome([5], [])
+    assert reindexer.stats()["failed_users"] == 0
@@ -0,0 +1,27 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.routes import facial
+from app.api.routes.facial import IdentifyPayload, identify_face
+
+
+def test_identify_requires_a_trainer_or_admin_account(monkeypatch):
+    async def fake_identify(db, **kwargs):
+        return SimpleNamespace(to_dict=lambda: {"matches": []})
+
+    monkeypatch.setattr(facial, "identify_face_by_image_async", fake_identify)
+    monkeypatch.setattr(facial.facial_service, "_image_base64_to_bytes", lambda value: b"jpeg")
+    payload = IdentifyPayload(image_base64="aGk=")
+
+    for role in ("student", "kiosk"):
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(identify_face(payload, db=None, current_user=SimpleNamespace(role=role)))
+        assert exc.value.status_code == 403
+
+    result = asyncio.run(
+        identify_face(payload, db=None, current_user=SimpleNamespace(role="trainer"))
+    )
+    assert result == {"matches": []}
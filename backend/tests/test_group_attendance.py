@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+
+from app.services import group_attendance
+from app.services.group_attendance import GroupMatch, assign_faces
+
+# Face 0 is clearly student 10. Face 1 only just passes for student 10 too, and
+# pairing face 0 with student 11 (below threshold) gives the larger raw total.
+SCORES = np.array([[0.90, 0.55], [0.62, -0.50]], dtype=np.float32)
+STUDENT_IDS = np.array([10, 11])
+
+
+@pytest.mark.parametrize("use_scipy", [False, True])
+def test_below_threshold_pairs_do_not_displace_a_match(monkeypatch, use_scipy):
+    if use_scipy:
+        pytest.importorskip("scipy")
+    monkeypatch.setattr(group_attendance, "SCIPY_AVAILABLE", use_scipy)
+
+    matches = assign_faces(SCORES, STUDENT_IDS, threshold=0.6)
+
+    assert matches == [GroupMatch(face_index=0, student_id=10, similarity=pytest.approx(0.9))]
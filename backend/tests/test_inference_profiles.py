@@ -0,0 +1,82 @@
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import Settings
+from app.services import inference_profiles
+from app.services.inference_profiles import (
+    PROFILES,
+    get_inference_profile,
+    resolved_intra_op_threads,
+)
+
+
+def _use_settings(monkeypatch, **values):
+    monkeypatch.setattr(inference_profiles, "get_settings", lambda: Settings(**values))
+
+
+def test_profiles_only_load_detection_and_recognition():
+    for profile in PROFILES.values():
+        assert set(profile.modules) == {"detection", "recognition"}
+    assert PROFILES["fast"].int8_recognition is True
+    assert PROFILES["balanced"].det_size == (640, 640)
+
+
+def test_settings_override_profile_values(monkeypatch):
+    _use_settings(
+        monkeypatch, face_inference_profile="fast", face_det_size=480, face_ort_intra_op_threads=3
+    )
+
+    profile = get_inference_profile()
+
+    assert profile.name == "fast"
+    assert profile.det_size == (480, 480)
+    assert resolved_intra_op_threads(profile) == 3
+    assert profile.int8_recognition is True
+
+
+def test_intra_op_threads_default_to_worker_share(monkeypatch):
+    _use_settings(monkeypatch, face_inference_workers=4)
+    monkeypatch.setattr(inference_profiles.os, "cpu_count", lambda: 8)
+
+    assert resolved_intra_op_threads(get_inference_profile("balanced")) == 2
+
+
+def test_unknown_profile_is_rejected(monkeypatch):
+    _use_settings(monkeypatch)
+    with pytest.raises(ValueError):
+        get_inference_profile("turbo")
+
+
+def test_int8_session_failure_falls_back_to_float_model(monkeypatch):
+    opened = []
+
+    def inference_session(path, sess_options=None, providers=None):
+        if path.endswith(".int8.onnx"):
+            raise RuntimeError("ConvInteger not implemented")
+        opened.append(path)
+        return f"session:{path}"
+
+    monkeypatch.setitem(
+        sys.modules, "onnxruntime", SimpleNamespace(InferenceSession=inference_session)
+    )
+    monkeypatch.setattr(
+        inference_profiles,
+        "session_options",
+        lambda profile: SimpleNamespace(intra_op_num_threads=1, inter_op_num_threads=1),
+    )
+    monkeypatch.setattr(
+        inference_profiles, "quantized_model_path", lambda f: f.replace(".onnx", ".int8.onnx")
+    )
+    app = SimpleNamespace(
+        models={
+            "detection": SimpleNamespace(model_file="det_10g.onnx", session=None),
+            "recognition": SimpleNamespace(model_file="w600k_r50.onnx", session=None),
+        }
+    )
+
+    inference_profiles.apply_profile(app, PROFILES["fast"], ["CPUExecutionProvider"])
+
+    assert opened == ["det_10g.onnx", "w600k_r50.onnx"]
+    assert app.models["recognition"].session == "session:w600k_r50.onnx"
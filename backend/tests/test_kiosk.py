@@ -0,0 +1,217 @@
+from datetime import datetime, time, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+
+from app.api.routes import smart_attendance
+from app.api.routes.smart_attendance import download_kiosk_gallery
+from app.models.attendance import AttendanceRecord
+from app.models.session import Session as CourseSession
+from app.models.smart_attendance import AttendanceSession, SelfCheckin, SmartAttendanceLog
+from app.models.student import Student
+from app.services import kiosk
+from app.services.inference_profiles import model_version
+
+
+@compiles(JSONB, "sqlite")
+def _jsonb_on_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+@pytest.fixture
+def kiosk_db(db_session):
+    engine = db_session.get_bind()
+    for model in (AttendanceSession, SelfCheckin, SmartAttendanceLog):
+        model.__table__.create(engine)
+    db_session.execute(
+        text(
+            "CREATE TABLE facial_embeddings (id INTEGER PRIMARY KEY, student_id INTEGER, "
+            "user_id INTEGER, embedding TEXT, model_version VARCHAR(50))"
+        )
+    )
+    return db_session
+
+
+def _student(db, idx, class_name="CS101"):
+    student = Student(
+        user_id=100 + idx,
+        student_code=f"S{idx:03d}",
+        first_name="Kiosk",
+        last_name=str(idx),
+        email=f"s{idx}@example.com",
+        class_name=class_name,
+    )
+    db.add(student)
+    db.flush()
+    return student
+
+
+def _embedding_row(db, student, seed):
+    emb = np.random.default_rng(seed).normal(size=512).astype(np.float32)
+    db.execute(
+        text(
+            "INSERT INTO facial_embeddings (student_id, embedding, model_version) VALUES (:sid, :e, :mv)"
+        ),
+        {
+            "sid": student.id,
+            "e": "[" + ",".join(f"{x:.6f}" for x in emb) + "]",
+            "mv": model_version(),
+        },
+    )
+    return emb / np.linalg.norm(emb)
+
+
+def test_class_gallery_round_trip_and_signature(kiosk_db):
+    a, b, other = _student(kiosk_db, 1), _student(kiosk_db, 2), _student(kiosk_db, 3, "CS202")
+    expected = [
+        _embedding_row(kiosk_db, a, 1),
+        _embedding_row(kiosk_db, a, 2),
+        _embedding_row(kiosk_db, b, 3),
+    ]
+    _embedding_row(kiosk_db, other, 4)
+    kiosk_db.commit()
+
+    gallery, blob = kiosk.build_class_gallery(kiosk_db, "CS101")
+    parsed = kiosk.read_gallery(blob)
+
+    assert parsed.header == gallery.header
+    assert parsed.header["students"] == 2
+    assert parsed.student_ids.tolist() == [a.id, a.id, b.id]
+    assert np.abs(parsed.embeddings.astype(np.float32) - np.stack(expected)).max() < 1e-3
+    # Same enrollments, same version (the kiosk's ETag), computed without building.
+    assert kiosk.build_class_gallery(kiosk_db, "CS101")[0].version == gallery.version
+    assert kiosk.class_gallery_version(kiosk_db, "CS101") == gallery.version
+    _embedding_row(kiosk_db, b, 5)
+    changed = kiosk.class_gallery_version(kiosk_db, "CS101")
+    assert changed != gallery.version
+    assert changed == kiosk.build_class_gallery(kiosk_db, "CS101")[0].version
+
+    tampered = bytearray(blob)
+    tampered[-40] ^= 1
+    with pytest.raises(ValueError, match="signature"):
+        kiosk.read_gallery(bytes(tampered))
+    with pytest.raises(ValueError, match="signature"):
+        kiosk.read_gallery(blob, key=b"another kiosk key")
+
+
+def test_sync_writes_valid_checkins_in_one_batch(kiosk_db):
+    start = datetime.utcnow().replace(microsecond=0) - timedelta(minutes=5)
+    course = CourseSession(
+        module_id=1,
+        trainer_id=1,
+        classroom_id=1,
+        session_date=start.date(),
+        start_time=start.time(),
+        end_time=time(23, 59),
+        class_name="CS101",
+    )
+    kiosk_db.add(course)
+    kiosk_db.flush()
+    kiosk_db.add(
+        AttendanceSession(session_id=course.id, mode="self_checkin", checkin_window_minutes=15)
+    )
+    ok, weak, spoof, late, already = (_student(kiosk_db, i) for i in range(1, 6))
+    outsider = _student(kiosk_db, 6, "CS202")
+    kiosk_db.add(AttendanceRecord(session_id=course.id, student_id=already.id, status="present"))
+    kiosk_db.commit()
+
+    def item(student, similarity=0.8, liveness=0.7, at=start):
+        return SimpleNamespace(
+            student_id=student.id, similarity=similarity, liveness_score=liveness, captured_at=at
+        )
+
+    result = kiosk.sync_checkins(
+        kiosk_db,
+        session_id=course.id,
+        model_version_used=model_version(),
+        device_id="kiosk-1",
+        checkins=[
+            item(ok),
+            item(weak, similarity=0.2),
+            item(spoof, liveness=0.1),
+            item(late, at=start + timedelta(hours=2)),
+            item(already),
+            item(outsider),
+            item(ok),
+        ],
+    ).to_dict()
+
+    reasons = {r["index"]: r.get("reason") for r in result["results"]}
+    assert result["accepted"] == 1
+    assert reasons == {
+        0: None,
+        1: "below_threshold",
+        2: "liveness_failed",
+        3: "outside_window",
+        4: "already_recorded",
+        5: "not_in_class",
+        6: "already_recorded",
+    }
+    record = kiosk_db.query(AttendanceRecord).filter_by(student_id=ok.id).one()
+    assert record.marked_via == "kiosk" and record.marked_at == start
+    assert kiosk_db.query(SelfCheckin).filter_by(student_id=ok.id, status="approved").count() == 1
+    assert kiosk_db.query(SmartAttendanceLog).filter_by(event_type="kiosk_sync").count() == 1
+
+
+def test_sync_rejects_gallery_of_another_model(kiosk_db):
+    with pytest.raises(HTTPException) as exc:
+        kiosk.sync_checkins(
+            kiosk_db, session_id=1, model_version_used="antelopev2-old", checkins=[]
+        )
+    assert exc.value.status_code == 409
+
+
+def test_gallery_route_checks_class_and_etag_before_building(kiosk_db, monkeypatch):
+    kiosk_db.add(
+        CourseSession(
+            module_id=1,
+            trainer_id=7,
+            classroom_id=1,
+            session_date=datetime(2026, 3, 2).date(),
+            start_time=time(9),
+            end_time=time(11),
+            duration_minutes=120,
+            class_name="CS101",
+        )
+    )
+    _embedding_row(kiosk_db, _student(kiosk_db, 1), 1)
+    kiosk_db.commit()
+    owner = SimpleNamespace(id=7, role="trainer")
+
+    with pytest.raises(HTTPException) as exc:
+        download_kiosk_gallery("CS101", None, kiosk_db, SimpleNamespace(id=8, role="trainer"))
+    assert exc.value.status_code == 403
+    with pytest.raises(HTTPException):
+        download_kiosk_gallery("CS202", None, kiosk_db, owner)
+
+    response = download_kiosk_gallery("CS101", None, kiosk_db, owner)
+    etag = response.headers["ETag"]
+    assert kiosk.read_gallery(response.body).version == etag.strip('"')
+
+    monkeypatch.setattr(smart_attendance, "build_class_gallery", None)  # a 304 must not build
+    assert download_kiosk_gallery("CS101", etag, kiosk_db, owner).status_code == 304
+    admin = SimpleNamespace(id=1, role="admin")
+    assert download_kiosk_gallery("CS101", etag, kiosk_db, admin).status_code == 304
+
+
+def test_sync_signature_is_per_device():
+    body = b'{"session_id": 1, "device_id": "room-12", "checkins": []}'
+    signature = kiosk.sign_sync("room-12", body)
+    kiosk.verify_sync_signature("room-12", body, signature)
+
+    for device_id, signed_body, sig in [
+        ("room-13", body, signature),
+        ("room-12", body.replace(b"1", b"2"), signature),
+        ("room-12", body, None),
+        (None, body, signature),
+    ]:
+        with pytest.raises(HTTPException) as exc:
+            kiosk.verify_sync_signature(device_id, signed_body, sig)
+        assert exc.value.status_code == 401
+    # Kiosks hold the gallery key, so it must not be able to sign syncs.
+    assert kiosk.device_key("room-12") != kiosk.signing_key()
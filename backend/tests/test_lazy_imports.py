@@ -0,0 +1,50 @@
+import sys
+
+import pytest
+
+from app.core import lazy_imports
+from app.core.lazy_imports import HEAVY_STACKS, lazy_module, parse_stack_names, status, warm_up
+
+
+def test_lazy_module_imports_on_first_attribute_access():
+    name = "colorsys"
+    sys.modules.pop(name, None)
+    module = lazy_module(name)
+    assert name not in sys.modules
+    assert "not loaded" in repr(module)
+
+    assert module.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+    assert name in sys.modules
+    assert lazy_imports._load_seconds[name] >= 0
+
+
+def test_warm_up_skips_missing_stacks_and_rejects_unknown_names(monkeypatch):
+    monkeypatch.setitem(
+        HEAVY_STACKS, "missing", lazy_imports.HeavyStack(("no_such_package_xyz",), "tests")
+    )
+    monkeypatch.setitem(
+        HEAVY_STACKS, "stdlib", lazy_imports.HeavyStack(("json", "json.decoder"), "tests")
+    )
+
+    timings = warm_up(["missing", "stdlib"])
+    assert timings["missing"] is None
+    assert timings["stdlib"] >= 0
+    assert status()["stdlib"]["loaded"] and not status()["missing"]["available"]
+
+    with pytest.raises(ValueError, match="Unknown heavy stack"):
+        warm_up(["tensorflw"])
+
+
+def test_parse_stack_names():
+    assert parse_stack_names("") == []
+    assert parse_stack_names(" insightface, cv2 ,") == ["insightface", "cv2"]
+    assert parse_stack_names("all") == list(HEAVY_STACKS)
+
+
+def test_service_modules_do_not_import_heavy_stacks():
+    import app.services.export_service  # noqa: F401
+    import app.services.face_crops  # noqa: F401
+    import app.services.replay_index  # noqa: F401
+    import app.services.report  # noqa: F401
+
+    assert isinstance(app.services.replay_index.cv2, lazy_imports.LazyModule)
@@ -0,0 +1,52 @@
+import threading
+import time
+
+import pytest
+
+from app.utils.micro_batcher import MicroBatcher
+
+
+def test_lone_item_is_dispatched_without_waiting():
+    batcher = MicroBatcher(lambda items: [x * 2 for x in items], max_wait_ms=500)
+
+    start = time.monotonic()
+    assert batcher.submit(21).result(timeout=2) == 42
+    # Idle batcher must not sit out the 500ms window for a single request.
+    assert time.monotonic() - start < 0.25
+
+
+def test_concurrent_items_are_grouped_into_batches():
+    release = threading.Event()
+    seen_sizes = []
+
+    def batch_fn(items):
+        seen_sizes.append(len(items))
+        release.wait(timeout=2)
+        return [x + 1 for x in items]
+
+    batcher = MicroBatcher(batch_fn, max_batch=8, max_wait_ms=20)
+    first = batcher.submit(0)
+    time.sleep(0.05)  # first batch is now in flight and blocked
+    rest = [batcher.submit(i) for i in range(1, 9)]
+    release.set()
+
+    assert first.result(timeout=2) == 1
+    assert [f.result(timeout=2) for f in rest] == list(range(2, 10))
+    assert seen_sizes[0] == 1
+    assert max(seen_sizes[1:]) > 1
+    stats = batcher.stats()
+    assert stats["items"] == 9
+    assert stats["avg_batch_size"] > 1
+
+
+def test_per_item_exceptions_are_fanned_out():
+    def batch_fn(items):
+        return [ValueError("bad") if x < 0 else x for x in items]
+
+    batcher = MicroBatcher(batch_fn)
+    ok = batcher.submit(5)
+    bad = batcher.submit(-1)
+
+    assert ok.result(timeout=2) == 5
+    with pytest.raises(ValueError):
+        bad.result(timeout=2)
@@ -0,0 +1,58 @@
+import pytest
+
+from app.services import model_preload
+from app.services.model_preload import ModelLoader, parse_model_names, preload_models, readiness
+
+
+@pytest.fixture
+def loaders(monkeypatch):
+    calls = []
+
+    def loader(name, ok=True):
+        def load():
+            calls.append(name)
+            if ok is None:
+                raise RuntimeError("no model files")
+            return ok
+
+        return load
+
+    monkeypatch.setattr(
+        model_preload,
+        "MODEL_LOADERS",
+        {
+            "face": ModelLoader(loader("face"), True, "face"),
+            "liveness": ModelLoader(loader("liveness"), False, "liveness"),
+            "rag": ModelLoader(loader("rag", ok=None), True, "rag"),
+        },
+    )
+    monkeypatch.setattr(model_preload, "_state", {})
+    monkeypatch.setattr(model_preload, "_requested", [])
+    return calls
+
+
+def test_fork_safe_preload_leaves_the_rest_to_workers(loaders):
+    assert preload_models(["face", "liveness"], fork_safe_only=True) == {"face": True}
+    state = readiness()
+    assert not state["ready"]
+    assert state["models"]["liveness"] == {"state": "pending"}
+
+    # A worker's startup hook: face is already loaded (inherited), liveness loads now.
+    assert preload_models(["face", "liveness"]) == {"face": True, "liveness": True}
+    assert loaders == ["face", "liveness"]
+    assert readiness()["ready"]
+
+
+def test_failed_model_keeps_the_worker_not_ready(loaders):
+    assert preload_models(["face", "rag"]) == {"face": True, "rag": False}
+    state = readiness()
+    assert not state["ready"]
+    assert state["models"]["rag"]["state"] == "failed"
+
+
+def test_unknown_model_names_are_rejected(loaders):
+    with pytest.raises(ValueError, match="Unknown model"):
+        preload_models(["face", "insightface"])
+    assert loaders == []
+    assert parse_model_names("all") == ["face", "liveness", "rag"]
+    assert parse_model_names(" face ,rag") == ["face", "rag"]
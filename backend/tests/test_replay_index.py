@@ -0,0 +1,186 @@
+import random
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.services.replay_index import (
+    BKTree,
+    ReplayIndex,
+    from_db,
+    hamming,
+    perceptual_hash,
+    to_db,
+)
+
+
+def _jpeg(img, quality=90):
+    ok, data = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    assert ok
+    return data.tobytes()
+
+
+def _scene(seed, size=480):
+    rng = np.random.default_rng(seed)
+    img = cv2.GaussianBlur(rng.integers(0, 256, (size, size, 3), dtype=np.uint8), (0, 0), 12)
+    cv2.circle(
+        img, (int(rng.integers(150, 330)), int(rng.integers(150, 330))), 90, (200, 180, 160), -1
+    )
+    return img
+
+
+def _create_checkins(db):
+    db.execute(
+        text(
+            "CREATE TABLE self_checkins (id INTEGER PRIMARY KEY, attendance_session_id INTEGER, "
+            "student_id INTEGER, image_phash BIGINT, status VARCHAR(20) DEFAULT 'approved')"
+        )
+    )
+
+
+def test_phash_survives_reencoding_and_rescaling():
+    img = _scene(1)
+    original = perceptual_hash(_jpeg(img))
+    recompressed = perceptual_hash(_jpeg(cv2.resize(img, (360, 360)), quality=60))
+    brighter = perceptual_hash(_jpeg(cv2.convertScaleAbs(img, alpha=1.0, beta=15)))
+    other = perceptual_hash(_jpeg(_scene(2)))
+
+    assert hamming(original, recompressed) <= 6
+    assert hamming(original, brighter) <= 6
+    assert hamming(original, other) > 12
+    assert perceptual_hash(b"not an image") is None
+
+
+def test_bktree_radius_search_matches_brute_force():
+    rnd = random.Random(0)
+    hashes = [rnd.getrandbits(64) for _ in range(500)]
+    # Near-duplicates of a few entries.
+    hashes += [h ^ (1 << rnd.randrange(64)) ^ (1 << rnd.randrange(64)) for h in hashes[:50]]
+    tree = BKTree()
+    for i, h in enumerate(hashes):
+        tree.add(h, i)
+
+    for query in hashes[:20] + [rnd.getrandbits(64) for _ in range(20)]:
+        expected = sorted(i for i, h in enumerate(hashes) if hamming(query, h) <= 6)
+        assert sorted(payload for _d, payload in tree.search(query, 6)) == expected
+
+
+def test_signed_storage_round_trip():
+    for value in (0, 1, (1 << 63) - 1, 1 << 63, (1 << 64) - 1):
+        stored = to_db(value)
+        assert -(1 << 63) <= stored < (1 << 63)
+        assert from_db(stored) == value
+
+
+def test_index_rebuilds_and_catches_up_from_self_checkins():
+    engine = create_engine("sqlite:///:memory:")
+    db = sessionmaker(bind=engine)()
+    _create_checkins(db)
+    first = perceptual_hash(_jpeg(_scene(1)))
+    db.execute(
+        text("INSERT INTO self_checkins VALUES (1, 1, 10, :h, 'approved')"), {"h": to_db(first)}
+    )
+    db.commit()
+
+    index = ReplayIndex(max_distance=6)
+    assert index.rebuild(db) == 1
+    assert index.find(db, first, student_id=10, attendance_session_id=2) == (1, 0)
+
+    # Inserted by another worker after the rebuild: visible after the next catch-up.
+    second = perceptual_hash(_jpeg(_scene(2)))
+    db.execute(
+        text("INSERT INTO self_checkins VALUES (2, 1, 11, :h, 'approved')"), {"h": to_db(second)}
+    )
+    db.commit()
+    assert index.find(db, second ^ 1, student_id=11, attendance_session_id=2) is None
+    assert index.catch_up(db) == 1
+    assert index.find(db, second ^ 1, student_id=11, attendance_session_id=2) == (2, 1)
+    assert (
+        index.find(db, perceptual_hash(_jpeg(_scene(3))), student_id=11, attendance_session_id=2)
+        is None
+    )
+
+    # Deleted check-ins stop matching without a rebuild.
+    db.execute(text("DELETE FROM self_checkins WHERE id = 1"))
+    db.commit()
+    assert index.find(db, first, student_id=10, attendance_session_id=2) is None
+    db.close()
+
+
+def test_matches_are_scoped_to_the_submitting_student():
+    engine = create_engine("sqlite:///:memory:")
+    db = sessionmaker(bind=engine)()
+    _create_checkins(db)
+    # A fixed kiosk camera: two students' photos hash almost the same.
+    kiosk_shot = perceptual_hash(_jpeg(_scene(1)))
+    db.execute(
+        text("INSERT INTO self_checkins VALUES (1, 1, 10, :h, 'approved')"),
+        {"h": to_db(kiosk_shot)},
+    )
+    db.commit()
+
+    index = ReplayIndex(max_distance=6)
+    index.rebuild(db)
+    assert index.find(db, kiosk_shot ^ 0b11, student_id=20, attendance_session_id=2) is None
+    assert index.find(db, kiosk_shot ^ 0b11, student_id=10, attendance_session_id=2) == (1, 2)
+    db.close()
+
+
+def test_checkins_are_indexed_on_insert(monkeypatch):
+    from app.models.smart_attendance import SelfCheckin
+    from app.services import replay_index as module
+
+    engine = create_engine("sqlite:///:memory:")
+    SelfCheckin.__table__.create(engine)
+    db = sessionmaker(bind=engine)()
+    index = ReplayIndex(max_distance=6)
+    monkeypatch.setattr(module, "replay_index", index)
+
+    phash = perceptual_hash(_jpeg(_scene(4)))
+    checkin = SelfCheckin(
+        attendance_session_id=1, student_id=10, image_phash=to_db(phash), status="approved"
+    )
+    db.add(checkin)
+    db.commit()
+
+    # No catch-up query needed for this process's own check-ins.
+    assert index.find(db, phash, student_id=10, attendance_session_id=2) == (checkin.id, 0)
+    db.close()
+
+
+def test_retry_after_a_rejected_burst_is_not_a_replay(monkeypatch):
+    from app.models.smart_attendance import SelfCheckin
+    from app.services import replay_index as module
+    from app.services.self_checkin import SelfCheckinService
+
+    engine = create_engine("sqlite:///:memory:")
+    SelfCheckin.__table__.create(engine)
+    db = sessionmaker(bind=engine)()
+    index = ReplayIndex(max_distance=6)
+    monkeypatch.setattr(module, "replay_index", index)
+    monkeypatch.setattr("app.services.self_checkin.replay_index", index)
+
+    # The burst was rejected (liveness) and stored flagged with its first frame's hash.
+    img = _scene(5)
+    first_frame = perceptual_hash(_jpeg(img))
+    db.add(
+        SelfCheckin(
+            attendance_session_id=1, student_id=10, image_phash=to_db(first_frame), status="flagged"
+        )
+    )
+    db.commit()
+
+    # Seconds later, same phone and pose: a near-duplicate frame.
+    retry = _jpeg(cv2.convertScaleAbs(img, alpha=1.0, beta=5), quality=80)
+    att_session = SimpleNamespace(id=1, session_id=100)
+    student = SimpleNamespace(id=10)
+    assert SelfCheckinService._check_replay(db, att_session, student, retry) is not None
+
+    # An approved check-in is only a replay source for later sessions.
+    db.query(SelfCheckin).update({"status": "approved"})
+    db.commit()
+    assert index.find(db, first_frame, student_id=10, attendance_session_id=1) is None
+    assert index.find(db, first_frame, student_id=10, attendance_session_id=2) is not None
+    db.close()
@@ -0,0 +1,121 @@
+from datetime import date, time
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+
+from app.models.absence import Absence
+from app.models.attendance import AttendanceRecord
+from app.models.notification import Notification
+from app.models.session import Session as SessionModel
+from app.models.smart_attendance import AttendanceSession
+from app.models.student import Student
+from app.models.user import User
+from app.services.attendance_counters import load_counters
+from app.services.session_confirmation import confirm_session
+
+
+@pytest.fixture
+def confirmation_db(db_session):
+    engine = db_session.get_bind()
+    for model in (Absence, AttendanceSession):
+        model.__table__.create(engine)
+    return db_session
+
+
+def _class(db, size):
+    students = [
+        Student(
+            user_id=100 + i,
+            student_code=f"C{i:03d}",
+            first_name="Class",
+            last_name=str(i),
+            email=f"c{i}@example.com",
+            class_name="CS101",
+        )
+        for i in range(size)
+    ]
+    session = SessionModel(
+        module_id=1,
+        trainer_id=1,
+        classroom_id=1,
+        session_date=date(2026, 2, 2),
+        start_time=time(9),
+        end_time=time(11, 30),
+        duration_minutes=150,
+        title="Algorithms",
+        class_name="CS101",
+    )
+    db.add_all(students + [session])
+    db.add_all(
+        [
+            User(
+                username=f"admin{i}", email=f"admin{i}@example.com", password_hash="x", role="admin"
+            )
+            for i in range(2)
+        ]
+    )
+    db.flush()
+    db.add(AttendanceSession(session_id=session.id, mode="self_checkin", is_active=True))
+    db.commit()
+    return session, students
+
+
+def test_confirm_marks_the_rest_of_the_class_absent_in_one_pass(confirmation_db):
+    db = confirmation_db
+    session, students = _class(db, 30)
+    present, late = students[0], students[1]
+    db.add_all(
+        [
+            AttendanceRecord(session_id=session.id, student_id=present.id, status="present"),
+            AttendanceRecord(
+                session_id=session.id, student_id=late.id, status="late", late_minutes=7
+            ),
+        ]
+    )
+    db.add(
+        Student(
+            user_id=999,
+            student_code="X001",
+            first_name="Other",
+            last_name="Class",
+            email="other@example.com",
+            class_name="CS202",
+        )
+    )
+    db.commit()
+
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.get_bind(), "before_cursor_execute", count)
+    absent = confirm_session(db, session, confirmed_by="trainer1")
+    event.remove(db.get_bind(), "before_cursor_execute", count)
+
+    # A fixed number of statements, whatever the class size.
+    assert len(statements) <= 10
+    assert absent == sorted(s.id for s in students[2:])
+
+    statuses = dict(db.query(AttendanceRecord.student_id, AttendanceRecord.status).all())
+    assert statuses[present.id] == "present" and statuses[late.id] == "late"
+    assert all(statuses[sid] == "absent" for sid in absent)
+
+    counters = load_counters(db, absent)
+    assert all(c.absent_count == 1 and c.absence_hours == 2 for c in counters.values())
+    student = db.get(Student, absent[0])
+    assert student.total_absence_hours == 2
+    assert student.attendance_rate == Decimal("0.00") and student.alert_level == "failing"
+
+    assert db.query(Absence).count() == 28
+    assert {a.hours for a in db.query(Absence)} == {Decimal("2.50")}
+    notifications = db.query(Notification).all()
+    assert len(notifications) == 2
+    assert notifications[0].message == "Trainer trainer1 confirmed attendance for Algorithms"
+    assert session.status == "confirmed"
+    assert db.query(AttendanceSession).one().is_active is False
+
+    # Confirming again marks nobody twice.
+    assert confirm_session(db, session, confirmed_by="trainer1") == []
+    assert load_counters(db, absent)[absent[0]].absent_count == 1
@@ -0,0 +1,45 @@
+import numpy as np
+
+from app.db import vector
+from app.services.face_gallery import parse_pgvector
+
+
+def test_text_fallback_round_trips(monkeypatch):
+    monkeypatch.setattr(vector, "_binary_vectors", False)
+    emb = np.random.default_rng(0).normal(size=512).astype(np.float32)
+
+    param = vector.vector_param(emb)
+
+    assert isinstance(param, str) and param.startswith("[")
+    np.testing.assert_allclose(parse_pgvector(param), emb, atol=1e-6)
+    assert vector.copy_embeddings(db=None, rows=[]) is False
+
+
+def test_binary_param_is_contiguous_float32(monkeypatch):
+    monkeypatch.setattr(vector, "_binary_vectors", True)
+    emb = np.arange(1024, dtype=np.float64)[::2]
+
+    param = vector.vector_param(emb)
+
+    assert param.dtype == np.float32 and param.flags["C_CONTIGUOUS"]
+    np.testing.assert_array_equal(param, emb.astype(np.float32))
+
+
+def test_queries_cast_to_halfvec_when_column_is_half_precision(monkeypatch):
+    monkeypatch.setattr(vector, "_column_type", "vector")
+    assert vector.vector_cast() == "::vector"
+    monkeypatch.setattr(vector, "_column_type", "halfvec")
+    assert vector.vector_cast() == "::vector::halfvec"
+
+
+def test_half_precision_values_parse_to_float32():
+    emb = np.random.default_rng(1).normal(size=512).astype(np.float32)
+
+    class Half:  # shape of pgvector.HalfVector
+        def to_numpy(self):
+            return emb.astype(np.float16)
+
+    parsed = parse_pgvector(Half())
+
+    assert parsed.dtype == np.float32
+    np.testing.assert_allclose(parsed, emb, atol=5e-3)